@@ -0,0 +1,151 @@
+"""
+Streaming usage export (GET /billing/export).
+Raw usage events for a date range are streamed as CSV or NDJSON. Rows are
+fetched USAGE_EXPORT_BATCH_SIZE at a time with yield_per (a server-side
+cursor on Postgres; SQLite steps its cursor lazily anyway) and encoded per
+batch, so memory stays constant regardless of how many rows are exported.
+
+Rows are ordered by id and every row carries its id. An interrupted
+export (or one cut into pages with a limit) resumes with
+after_id=<last id received>, a keyset seek on the tenant_id index.
+
+Only the hot table is exported. Events older than USAGE_RETENTION_DAYS have
+been compacted into the monthly archives (see retention.py).
+"""
+from datetime import datetime
+from typing import Iterable, Iterator, Optional, Sequence
+import csv
+import io
+import json
+import zlib
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.db.models import UsageEvent
+from app.utils.metrics import counter
+
+USAGE_EXPORT_ROWS = counter(
+    "billing_usage_export_rows_total",
+    "Usage events streamed by /billing/export, by format",
+    ["format"]
+)
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# Exported columns, in CSV column order
+EXPORT_COLUMNS = [
+    "id", "request_id", "request_timestamp", "tenant_id", "user_id", "kb_id",
+    "provider", "model", "model_tier", "prompt_tokens", "completion_tokens",
+    "total_tokens", "estimated_cost_usd", "latency_ms",
+]
+
+
+def iter_usage_event_batches(
+    db: Session,
+    tenant_id: str,
+    start: datetime,
+    end: datetime,
+    after_id: int = 0,
+    limit: Optional[int] = None,
+    batch_size: int = settings.USAGE_EXPORT_BATCH_SIZE
+) -> Iterator[Sequence[tuple]]:
+    """
+    A tenant's usage events in [start, end), ordered by id, in batches.
+    
+    Args:
+        db: Database session (held until the iterator is exhausted or closed)
+        tenant_id: Tenant ID
+        start: Range start (inclusive)
+        end: Range end (exclusive)
+        after_id: Only rows with a greater id (keyset resume)
+        limit: Maximum number of rows (None = all)
+        batch_size: Rows fetched per round trip
+    
+    Yields:
+        Lists of row tuples in EXPORT_COLUMNS order
+    """
+    statement = select(*(getattr(UsageEvent, name) for name in EXPORT_COLUMNS)).where(
+        UsageEvent.tenant_id == tenant_id,
+        UsageEvent.id > after_id,
+        UsageEvent.request_timestamp >= start,
+        UsageEvent.request_timestamp < end
+    ).order_by(UsageEvent.id)
+    if limit is not None:
+        statement = statement.limit(limit)
+    result = db.execute(statement.execution_options(yield_per=batch_size))
+    try:
+        for batch in result.partitions():
+            yield batch
+    finally:
+        result.close()
+
+
+def _encode_csv(rows: Iterable[tuple], header: bool) -> bytes:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator="\n")
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    for row in rows:
+        writer.writerow([value.isoformat() if isinstance(value, datetime) else value for value in row])
+    return buffer.getvalue().encode("utf-8")
+
+
+def _encode_ndjson(rows: Iterable[tuple]) -> bytes:
+    lines = []
+    for row in rows:
+        record = dict(zip(EXPORT_COLUMNS, row))
+        record["request_timestamp"] = record["request_timestamp"].isoformat()
+        lines.append(json.dumps(record) + "\n")
+    return "".join(lines).encode("utf-8")
+
+
+def export_usage_events(
+    db: Session,
+    tenant_id: str,
+    start: datetime,
+    end: datetime,
+    fmt: str = "csv",
+    after_id: int = 0,
+    limit: Optional[int] = None,
+    batch_size: int = settings.USAGE_EXPORT_BATCH_SIZE
+) -> Iterator[bytes]:
+    """
+    Encoded export, one chunk per fetched batch (CSV starts with a header row).
+    
+    Args:
+        db: Database session
+        tenant_id: Tenant ID
+        start: Range start (inclusive)
+        end: Range end (exclusive)
+        fmt: "csv" or "ndjson"
+        after_id: Only rows with a greater id (keyset resume)
+        limit: Maximum number of rows (None = all)
+        batch_size: Rows fetched and encoded per chunk
+    
+    Yields:
+        UTF-8 chunks
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}. Valid formats: {', '.join(EXPORT_FORMATS)}")
+    rows_exported = USAGE_EXPORT_ROWS.labels(format=fmt)
+    header = fmt == "csv"
+    if header:
+        yield _encode_csv([], header=True)
+    for batch in iter_usage_event_batches(db, tenant_id, start, end, after_id, limit, batch_size):
+        yield _encode_csv(batch, header=False) if fmt == "csv" else _encode_ndjson(batch)
+        rows_exported.inc(len(batch))
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip a chunk stream incrementally (one gzip member; constant memory)."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip container
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
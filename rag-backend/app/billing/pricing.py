@@ -18,6 +18,9 @@ PRICING_TABLE: Dict[str, Dict[str, float]] = {
         "gpt-4-turbo": {"input": 10.00, "output": 30.00},
         "gpt-3.5-turbo": {"input": 0.50, "output": 1.50},
         "default": {"input": 0.50, "output": 1.50}
+    },
+    "fake": {
+        "default": {"input": 0.0, "output": 0.0}  # Load/regression testing, never billed
     }
 }
 
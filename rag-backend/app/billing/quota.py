@@ -4,7 +4,7 @@ Quota management and enforcement.
 from sqlalchemy.orm import Session
 from sqlalchemy import func, and_
 from datetime import datetime, timedelta
-from typing import Optional, Tuple
+from typing import Iterable, Optional, Tuple
 import logging
 
 from app.db.models import TenantPlan, UsageMonthly, Tenant
@@ -23,6 +23,12 @@ def get_tenant_plan(db: Session, tenant_id: str) -> Optional[TenantPlan]:
     return db.query(TenantPlan).filter(TenantPlan.tenant_id == tenant_id).first()
 
 
+def get_tenant_plan_name(db: Session, tenant_id: str) -> str:
+    """Get tenant's plan name ("starter" when no plan is assigned). Cached; creates unknown tenants."""
+    from app.billing.tenant_cache import get_tenant_cache
+    return get_tenant_cache().get(db, tenant_id).plan_name
+
+
 def get_monthly_usage(db: Session, tenant_id: str, year: Optional[int] = None, month: Optional[int] = None) -> Optional[UsageMonthly]:
     """Get monthly usage for tenant."""
     now = datetime.utcnow()
@@ -47,15 +53,10 @@ def check_quota(db: Session, tenant_id: str) -> Tuple[bool, Optional[str]]:
         has_quota: True if quota available, False if exceeded
         error_message: None if quota available, error message if exceeded
     """
-    # Get tenant plan
-    plan = get_tenant_plan(db, tenant_id)
+    from app.billing.tenant_cache import get_tenant_cache
     
-    if not plan:
-        # Default to starter plan if no plan assigned
-        logger.warning(f"Tenant {tenant_id} has no plan assigned, defaulting to starter")
-        monthly_limit = PLAN_LIMITS.get("starter", 500)
-    else:
-        monthly_limit = plan.monthly_chat_limit
+    # Get tenant plan limit (cached; no plan assigned = starter)
+    monthly_limit = get_tenant_cache().get(db, tenant_id).monthly_chat_limit
     
     # Unlimited plan (-1) always passes
     if monthly_limit == -1:
@@ -75,22 +76,14 @@ def check_quota(db: Session, tenant_id: str) -> Tuple[bool, Optional[str]]:
 
 
 def ensure_tenant_exists(db: Session, tenant_id: str) -> None:
-    """Ensure tenant record exists in database."""
-    tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
-    if not tenant:
-        # Create tenant with default starter plan
-        tenant = Tenant(id=tenant_id, name=f"Tenant {tenant_id}")
-        db.add(tenant)
-        
-        # Create default starter plan
-        plan = TenantPlan(
-            tenant_id=tenant_id,
-            plan_name="starter",
-            monthly_chat_limit=PLAN_LIMITS["starter"]
-        )
-        db.add(plan)
-        db.commit()
-        logger.info(f"Created tenant {tenant_id} with starter plan")
+    """Ensure tenant record exists in database (created with the starter plan; no query for cached tenants)."""
+    ensure_tenants_exist(db, [tenant_id])
+
+
+def ensure_tenants_exist(db: Session, tenant_ids: Iterable[str]) -> None:
+    """Ensure several tenants exist: one query for the uncached ones, one commit for the new ones."""
+    from app.billing.tenant_cache import get_tenant_cache
+    get_tenant_cache().ensure(db, tenant_ids)
 
 
 def set_tenant_plan(db: Session, tenant_id: str, plan_name: str) -> TenantPlan:
@@ -127,5 +120,8 @@ def set_tenant_plan(db: Session, tenant_id: str, plan_name: str) -> TenantPlan:
     
     db.commit()
     db.refresh(plan)
+    
+    from app.billing.tenant_cache import get_tenant_cache
+    get_tenant_cache().invalidate(tenant_id)
     return plan
 
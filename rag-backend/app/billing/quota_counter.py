@@ -0,0 +1,271 @@
+"""
+In-memory quota admission with a shared SQLite counter.
+
+check_quota costs three billing-DB round trips per chat (tenant, plan,
+monthly usage). QuotaService admits from per-process memory instead:
+
+- A shared SQLite file (one row per tenant and month) holds `used`, the
+  admissions granted to all worker processes, and the plan limit.
+- Each process leases admissions in blocks (QUOTA_LEASE_SIZE) with one
+  atomic UPDATE and hands them out from memory. A lease is only granted while
+  used + lease <= limit + QUOTA_SLACK, so all processes together never admit
+  more than QUOTA_SLACK chats beyond the limit. Leases shrink near the limit.
+- Admissions that end up not billed (refusals, errors) go back to the lease.
+- Every QUOTA_RECONCILE_SECONDS, and when the month rolls over, a process
+  returns its unused lease and re-reads the plan limit and UsageMonthly.
+  The counter adopts the billed usage when it is higher (e.g. usage written
+  by other hosts), and a new month starts from that month's billed usage.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+import logging
+import sqlite3
+import threading
+import time
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.billing.quota import PLAN_LIMITS, ensure_tenant_exists, get_monthly_usage, get_tenant_plan
+from app.utils.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+QUOTA_ADMISSIONS = counter(
+    "billing_quota_admissions_total",
+    "Quota decisions by path (memory: from a local lease, lease: after taking a new lease, rejected)",
+    ["path"]
+)
+
+
+def current_period(now: Optional[datetime] = None) -> str:
+    """Quota period key ("YYYY-MM", UTC)."""
+    now = now or datetime.utcnow()
+    return f"{now.year:04d}-{now.month:02d}"
+
+
+def quota_exceeded_message(used: int, limit: int) -> str:
+    return f"AI quota exceeded ({used}/{limit} chats this month). Upgrade your plan."
+
+
+class SharedQuotaStore:
+    """Per-tenant monthly counters in a SQLite file shared by every worker process on the host."""
+    
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS quota_counters ("
+                "tenant_id TEXT NOT NULL, period TEXT NOT NULL, used INTEGER NOT NULL, "
+                "quota_limit INTEGER NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (tenant_id, period))"
+            )
+    
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # Autocommit mode; write transactions are opened explicitly with BEGIN IMMEDIATE
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def reconcile(self, tenant_id: str, period: str, limit: int, billed: int, returned: int = 0) -> None:
+        """
+        Return unused leased admissions and sync with the billing DB.
+        
+        Args:
+            tenant_id: Tenant ID
+            period: Quota period
+            limit: Current plan limit (-1 = unlimited)
+            billed: Billed chats this period according to UsageMonthly
+            returned: Leased admissions this process didn't use
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO quota_counters (tenant_id, period, used, quota_limit, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (tenant_id, period) DO UPDATE SET "
+                "used = MAX(used - ?, excluded.used), quota_limit = excluded.quota_limit, updated_at = excluded.updated_at",
+                (tenant_id, period, billed, limit, time.time(), returned)
+            )
+            # Keep the current and previous month only
+            conn.execute("DELETE FROM quota_counters WHERE tenant_id = ? AND period < ?", (tenant_id, _previous_period(period)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    
+    def lease(self, tenant_id: str, period: str, lease_size: int, slack: int) -> Tuple[int, int, int]:
+        """
+        Atomically take up to lease_size admissions.
+        
+        Returns:
+            (granted, used, limit) - granted is 0 when the quota (plus slack) is exhausted
+        """
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT used, quota_limit FROM quota_counters WHERE tenant_id = ? AND period = ?", (tenant_id, period)
+            ).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                raise KeyError(f"No quota counter for {tenant_id} in {period}")
+            used, limit = row
+            available = limit + slack - used
+            # Near the limit take half of what's left so other processes aren't starved
+            granted = max(1, min(lease_size, available // 2)) if available > 0 else 0
+            if granted:
+                conn.execute(
+                    "UPDATE quota_counters SET used = used + ?, updated_at = ? WHERE tenant_id = ? AND period = ?",
+                    (granted, time.time(), tenant_id, period)
+                )
+            conn.execute("COMMIT")
+            return granted, used + granted, limit
+        except KeyError:
+            raise
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    
+    def used(self, tenant_id: str, period: str) -> Optional[int]:
+        row = self._connect().execute(
+            "SELECT used FROM quota_counters WHERE tenant_id = ? AND period = ?", (tenant_id, period)
+        ).fetchone()
+        return row[0] if row else None
+
+
+def _previous_period(period: str) -> str:
+    year, month = int(period[:4]), int(period[5:])
+    return f"{year - 1:04d}-12" if month == 1 else f"{year:04d}-{month - 1:02d}"
+
+
+@dataclass
+class _TenantQuota:
+    period: str
+    limit: int
+    tokens: int = 0  # Leased admissions not yet handed out
+    admitted: int = 0  # Admissions handed out since the last reconcile (bounds release())
+    reconciled_at: float = 0.0
+
+
+class QuotaService:
+    """Per-process quota admission from leased counters."""
+    
+    def __init__(
+        self,
+        store: SharedQuotaStore,
+        lease_size: int = settings.QUOTA_LEASE_SIZE,
+        slack: int = settings.QUOTA_SLACK,
+        reconcile_seconds: float = settings.QUOTA_RECONCILE_SECONDS,
+        clock: Callable[[], datetime] = datetime.utcnow
+    ):
+        """
+        Args:
+            store: Shared counter store
+            lease_size: Admissions taken per shared-counter update
+            slack: Max chats all processes together may admit beyond a tenant's limit
+            reconcile_seconds: How often a tenant's counter is re-synced with the billing DB
+            clock: UTC time source (injectable for month rollover tests)
+        """
+        self.store = store
+        self.lease_size = max(1, lease_size)
+        self.slack = max(0, slack)
+        self.reconcile_seconds = reconcile_seconds
+        self._clock = clock
+        self._tenants: Dict[str, _TenantQuota] = {}
+        self._lock = threading.Lock()
+    
+    def admit(self, db: Session, tenant_id: str) -> Tuple[bool, Optional[str]]:
+        """
+        Admit one chat against the tenant's monthly quota (same contract as check_quota).
+        Call release() if the admitted chat ends up not billed.
+        
+        Returns:
+            (has_quota, error_message)
+        """
+        period = current_period(self._clock())
+        with self._lock:
+            state = self._tenants.get(tenant_id)
+            if state is None or state.period != period or time.monotonic() - state.reconciled_at >= self.reconcile_seconds:
+                state = self._reconcile(db, tenant_id, period, state)
+            if state.limit < 0:
+                QUOTA_ADMISSIONS.labels(path="memory").inc()
+                return True, None
+            if state.tokens > 0:
+                state.tokens -= 1
+                state.admitted += 1
+                QUOTA_ADMISSIONS.labels(path="memory").inc()
+                return True, None
+            
+            try:
+                granted, used, limit = self.store.lease(tenant_id, period, self.lease_size, self.slack)
+            except KeyError:
+                # Counter row missing (counter file reset): rebuild it from the billing DB
+                state = self._reconcile(db, tenant_id, period, None)
+                granted, used, limit = self.store.lease(tenant_id, period, self.lease_size, self.slack)
+            if not granted:
+                QUOTA_ADMISSIONS.labels(path="rejected").inc()
+                return False, quota_exceeded_message(min(used, limit), limit)
+            state.tokens += granted - 1
+            state.admitted += 1
+            QUOTA_ADMISSIONS.labels(path="lease").inc()
+            return True, None
+    
+    def release(self, tenant_id: str) -> None:
+        """Give back an admission that wasn't billed (refused or failed chat)."""
+        period = current_period(self._clock())
+        with self._lock:
+            state = self._tenants.get(tenant_id)
+            # Admissions from before the last reconcile or rollover stay counted (never over-admit)
+            if state is not None and state.period == period and state.admitted > 0:
+                state.admitted -= 1
+                state.tokens += 1
+    
+    def invalidate(self, tenant_id: str) -> None:
+        """Force a reconcile on the tenant's next admission (e.g. after a plan change)."""
+        with self._lock:
+            state = self._tenants.get(tenant_id)
+            if state is not None:
+                state.reconciled_at = 0.0
+    
+    def _reconcile(self, db: Session, tenant_id: str, period: str, state: Optional[_TenantQuota]) -> _TenantQuota:
+        """Return unused tokens and resync limit and billed usage (caller holds the lock)."""
+        if tenant_id not in self._tenants:
+            ensure_tenant_exists(db, tenant_id)
+        plan = get_tenant_plan(db, tenant_id)
+        limit = plan.monthly_chat_limit if plan else PLAN_LIMITS.get("starter", 500)
+        year, month = int(period[:4]), int(period[5:])
+        monthly = get_monthly_usage(db, tenant_id, year, month)
+        billed = monthly.total_requests if monthly else 0
+        returned = state.tokens if state is not None and state.period == period else 0
+        
+        self.store.reconcile(tenant_id, period, limit, billed, returned)
+        if state is not None and state.period != period:
+            logger.info(f"Quota period rolled over to {period} for tenant {tenant_id}")
+        state = _TenantQuota(period=period, limit=limit, reconciled_at=time.monotonic())
+        self._tenants[tenant_id] = state
+        return state
+
+
+# Global quota service instance
+_quota_service: Optional[QuotaService] = None
+_quota_service_lock = threading.Lock()
+
+
+def get_quota_service() -> Optional[QuotaService]:
+    """Get the global quota service (None when QUOTA_COUNTERS_ENABLED is off)."""
+    global _quota_service
+    if not settings.QUOTA_COUNTERS_ENABLED:
+        return None
+    with _quota_service_lock:
+        if _quota_service is None:
+            path = settings.QUOTA_COUNTER_PATH or settings.DATA_DIR / "billing" / "quota_counters.db"
+            _quota_service = QuotaService(SharedQuotaStore(path))
+        return _quota_service
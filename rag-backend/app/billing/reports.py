@@ -0,0 +1,193 @@
+"""
+Cost report queries.
+Totals come from the pre-aggregated UsageMonthly rows; provider, model and
+tier breakdowns come from one GROUP BY over usage_events. Month filters are
+half-open timestamp ranges (start <= ts < next month) so the
+(tenant_id, request_timestamp) index is used instead of scanning the
+tenant's events through EXTRACT().
+
+Events older than the retention window live in UsageRollupHourly instead
+of usage_events (see retention.py), so the breakdowns add the rollups'
+groups for the same range to the hot table's.
+
+Usage series (one point per day) are read from UsageDaily with one range
+scan on its (tenant_id, date) unique index.
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+import hashlib
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.db.models import UsageDaily, UsageEvent, UsageMonthly, UsageRollupHourly
+
+
+def month_bounds(year: int, month: int) -> Tuple[datetime, datetime]:
+    """Half-open [start, end) range covering one calendar month."""
+    start = datetime(year, month, 1)
+    end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+    return start, end
+
+
+def _add_group(breakdown: Dict[str, Dict[str, Any]], key: str, requests: int, tokens: int, cost: float) -> Dict[str, Any]:
+    stats = breakdown.setdefault(key, {"requests": 0, "tokens": 0, "cost_usd": 0.0})
+    stats["requests"] += requests
+    stats["tokens"] += tokens
+    stats["cost_usd"] += cost
+    return stats
+
+
+def get_cost_report(
+    db: Session,
+    tenant_id: str,
+    period: str = "month",
+    year: Optional[int] = None,
+    month: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Build a tenant's cost report.
+    
+    Args:
+        db: Database session
+        tenant_id: Tenant ID
+        period: "month" (one calendar month) or anything else for all time
+        year: Report year (default: current)
+        month: Report month (default: current)
+    
+    Returns:
+        Dict with the CostReportResponse fields
+    """
+    now = datetime.utcnow()
+    target_year = year or now.year
+    target_month = month or now.month
+    
+    # One grouped scan per table; the three breakdowns are folded from their (few) rows
+    groups = db.query(
+        UsageEvent.provider,
+        UsageEvent.model,
+        UsageEvent.model_tier,
+        func.count(UsageEvent.id),
+        func.coalesce(func.sum(UsageEvent.total_tokens), 0),
+        func.coalesce(func.sum(UsageEvent.estimated_cost_usd), 0.0),
+        func.coalesce(func.sum(UsageEvent.latency_ms), 0),
+        func.count(UsageEvent.latency_ms)
+    ).filter(UsageEvent.tenant_id == tenant_id)
+    rollups = db.query(
+        UsageRollupHourly.provider,
+        UsageRollupHourly.model,
+        UsageRollupHourly.model_tier,
+        func.sum(UsageRollupHourly.total_requests),
+        func.sum(UsageRollupHourly.total_tokens),
+        func.sum(UsageRollupHourly.total_cost_usd),
+        func.sum(UsageRollupHourly.latency_ms_total),
+        func.sum(UsageRollupHourly.latency_samples)
+    ).filter(UsageRollupHourly.tenant_id == tenant_id)
+    totals = db.query(
+        func.sum(UsageMonthly.total_requests),
+        func.sum(UsageMonthly.total_tokens),
+        func.sum(UsageMonthly.total_cost_usd)
+    ).filter(UsageMonthly.tenant_id == tenant_id)
+    if period == "month":
+        start, end = month_bounds(target_year, target_month)
+        groups = groups.filter(UsageEvent.request_timestamp >= start, UsageEvent.request_timestamp < end)
+        rollups = rollups.filter(UsageRollupHourly.hour >= start, UsageRollupHourly.hour < end)
+        totals = totals.filter(UsageMonthly.year == target_year, UsageMonthly.month == target_month)
+    groups = groups.group_by(UsageEvent.provider, UsageEvent.model, UsageEvent.model_tier).all()
+    groups += rollups.group_by(UsageRollupHourly.provider, UsageRollupHourly.model, UsageRollupHourly.model_tier).all()
+    
+    breakdown_by_provider: Dict[str, Dict[str, Any]] = {}
+    breakdown_by_model: Dict[str, Dict[str, Any]] = {}
+    breakdown_by_tier: Dict[str, Dict[str, Any]] = {}
+    for provider, model, tier, requests, tokens, cost, latency_total, latency_samples in groups:
+        _add_group(breakdown_by_provider, provider, requests, tokens, cost)
+        _add_group(breakdown_by_model, model, requests, tokens, cost)
+        stats = _add_group(breakdown_by_tier, tier or "default", requests, tokens, cost)
+        stats["latency_ms_total"] = stats.get("latency_ms_total", 0) + latency_total
+        stats["latency_samples"] = stats.get("latency_samples", 0) + latency_samples
+    for stats in breakdown_by_tier.values():
+        samples = stats.pop("latency_samples")
+        latency_total = stats.pop("latency_ms_total")
+        stats["avg_cost_usd"] = stats["cost_usd"] / stats["requests"]
+        stats["avg_latency_ms"] = latency_total / samples if samples else None
+    
+    total_requests, total_tokens, total_cost = totals.one()
+    if total_requests is None:
+        # No aggregate rows (e.g. events written before aggregation existed): total the groups
+        total_requests = sum(s["requests"] for s in breakdown_by_provider.values())
+        total_tokens = sum(s["tokens"] for s in breakdown_by_provider.values())
+        total_cost = sum(s["cost_usd"] for s in breakdown_by_provider.values())
+    
+    return {
+        "tenant_id": tenant_id,
+        "period": period,
+        "total_cost_usd": total_cost or 0.0,
+        "total_requests": total_requests or 0,
+        "total_tokens": total_tokens or 0,
+        "breakdown_by_provider": breakdown_by_provider,
+        "breakdown_by_model": breakdown_by_model,
+        "breakdown_by_tier": breakdown_by_tier
+    }
+
+
+def get_usage_series(db: Session, tenant_id: str, start: date, end: date) -> Dict[str, Any]:
+    """
+    Daily usage from start to end (inclusive), zero-filled for days without usage.
+    
+    Args:
+        db: Database session
+        tenant_id: Tenant ID
+        start: First day
+        end: Last day
+    
+    Returns:
+        Dict with the UsageSeriesResponse fields
+    """
+    range_start = datetime.combine(start, datetime.min.time())
+    range_end = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    rows = db.query(
+        UsageDaily.date,
+        UsageDaily.total_requests,
+        UsageDaily.total_tokens,
+        UsageDaily.total_cost_usd,
+        UsageDaily.gemini_requests,
+        UsageDaily.openai_requests,
+        UsageDaily.updated_at
+    ).filter(
+        UsageDaily.tenant_id == tenant_id,
+        UsageDaily.date >= range_start,
+        UsageDaily.date < range_end
+    ).all()
+    by_day = {row.date.date(): row for row in rows}
+    
+    series = {
+        "tenant_id": tenant_id,
+        "start_date": start,
+        "end_date": end,
+        "total_requests": 0,
+        "total_tokens": 0,
+        "total_cost_usd": 0.0,
+        "gemini_requests": 0,
+        "openai_requests": 0,
+        "last_updated": max((row.updated_at for row in rows), default=None),
+        "points": []
+    }
+    day = start
+    while day <= end:
+        point = {"date": day}
+        row = by_day.get(day)
+        for column in ("total_requests", "total_tokens", "total_cost_usd", "gemini_requests", "openai_requests"):
+            point[column] = getattr(row, column) if row else 0
+            series[column] += point[column]
+        series["points"].append(point)
+        day += timedelta(days=1)
+    return series
+
+
+def usage_series_etag(tenant_id: str, start: date, end: date, last_updated: Optional[datetime]) -> str:
+    """
+    ETag of a usage series. Every aggregate write bumps UsageDaily.updated_at,
+    so the latest update in the range identifies its content.
+    """
+    version = f"{tenant_id}|{start}|{end}|{last_updated.isoformat() if last_updated else '-'}"
+    return f'W/"{hashlib.sha1(version.encode("utf-8")).hexdigest()[:20]}"'
@@ -0,0 +1,187 @@
+"""
+Usage event retention: rollups and compressed archives.
+
+usage_events gets one row per chat and four indexes, so it slows down as it
+grows. compact_usage_events moves events older than USAGE_RETENTION_DAYS
+out of the hot table in batches:
+
+1. The batch is written to the archive as a gzip JSONL segment (one
+   directory per month), then fsynced and atomically renamed into place.
+2. In one transaction, the batch is added to UsageRollupHourly (one row per
+   tenant, hour, provider, model and tier) and the events are deleted.
+
+A crash between the two steps leaves the events in the hot table, and the
+next run archives them again. Segments may therefore overlap; read_archive
+drops duplicate request_ids. The rollups are always exact, because the
+rollup upserts and the deletes commit together.
+
+Billing queries combine the hot table with the rollups (see reports.py).
+UsageDaily and UsageMonthly are untouched, so quota and usage totals don't
+change when events are compacted.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field, fields
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+import gzip
+import logging
+import os
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.billing.usage_writer import UsageRecord
+from app.db.models import UsageEvent, UsageRollupHourly
+from app.db.upsert import increment_upsert
+from app.utils.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+USAGE_EVENTS_COMPACTED = counter(
+    "billing_usage_events_compacted_total",
+    "Usage events rolled up, archived and deleted from the hot table"
+)
+
+_RECORD_FIELDS = [f.name for f in fields(UsageRecord)]
+
+
+@dataclass
+class CompactionStats:
+    """Result of one compaction run."""
+    events: int = 0
+    batches: int = 0
+    rollup_rows: int = 0  # Rollup upserts applied (rows created or updated)
+    segments: List[Path] = field(default_factory=list)
+
+
+def hour_start(timestamp: datetime) -> datetime:
+    """Start of the timestamp's hour (the UsageRollupHourly.hour key)."""
+    return timestamp.replace(minute=0, second=0, microsecond=0)
+
+
+def default_archive_dir() -> Path:
+    return settings.USAGE_ARCHIVE_DIR or settings.DATA_DIR / "billing" / "archive"
+
+
+def month_archive_dir(archive_dir: Path, year: int, month: int) -> Path:
+    """Directory holding one month's archive segments."""
+    return Path(archive_dir) / f"{year:04d}-{month:02d}"
+
+
+def _write_segment(directory: Path, records: List[UsageRecord]) -> Path:
+    """Write records to a gzip JSONL segment (tmp file, fsync, rename); a re-archived identical batch replaces its segment."""
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"usage_events_{records[0].request_id}_{len(records)}.jsonl.gz"
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as raw:
+        with gzip.GzipFile(fileobj=raw, mode="wb") as archive:
+            for record in records:
+                archive.write((record.to_json() + "\n").encode("utf-8"))
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(tmp, path)
+    return path
+
+
+def read_archive(archive_dir: Path, year: int, month: int) -> Iterator[UsageRecord]:
+    """
+    Archived events of one month (duplicates from re-archived batches are dropped).
+    
+    Args:
+        archive_dir: Archive root (default_archive_dir())
+        year: Year
+        month: Month 1-12
+    """
+    seen = set()
+    for path in sorted(month_archive_dir(archive_dir, year, month).glob("*.jsonl.gz")):
+        with gzip.open(path, "rt", encoding="utf-8") as archive:
+            for line in archive:
+                record = UsageRecord.from_json(line)
+                if record.request_id not in seen:
+                    seen.add(record.request_id)
+                    yield record
+
+
+def _rollup_increments(records: List[UsageRecord]) -> Dict[Tuple, Dict[str, int]]:
+    """Sum records per (tenant, hour, provider, model, tier)."""
+    rollups: Dict[Tuple, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+    for r in records:
+        sums = rollups[(r.tenant_id, hour_start(r.request_timestamp), r.provider, r.model, r.model_tier or "")]
+        sums["total_requests"] += 1
+        sums["prompt_tokens"] += r.prompt_tokens
+        sums["completion_tokens"] += r.completion_tokens
+        sums["total_tokens"] += r.total_tokens
+        sums["total_cost_usd"] += r.estimated_cost_usd
+        if r.latency_ms is not None:
+            sums["latency_ms_total"] += r.latency_ms
+            sums["latency_samples"] += 1
+    return rollups
+
+
+def compact_usage_events(
+    db: Session,
+    older_than: Optional[datetime] = None,
+    archive_dir: Optional[Path] = None,
+    batch_size: int = settings.USAGE_COMPACTION_BATCH_SIZE,
+    max_batches: Optional[int] = None
+) -> CompactionStats:
+    """
+    Roll up, archive and delete usage events older than the retention window.
+    
+    Args:
+        db: Database session
+        older_than: Cutoff (default: now - USAGE_RETENTION_DAYS)
+        archive_dir: Archive root (default: default_archive_dir())
+        batch_size: Events per archive segment and transaction
+        max_batches: Stop after this many batches (None = until done)
+    
+    Returns:
+        CompactionStats
+    """
+    cutoff = older_than or datetime.utcnow() - timedelta(days=settings.USAGE_RETENTION_DAYS)
+    archive_dir = Path(archive_dir or default_archive_dir())
+    columns = [getattr(UsageEvent, name) for name in _RECORD_FIELDS]
+    stats = CompactionStats()
+    
+    while max_batches is None or stats.batches < max_batches:
+        rows = db.query(UsageEvent.id, *columns).filter(
+            UsageEvent.request_timestamp < cutoff
+        ).order_by(UsageEvent.id).limit(batch_size).all()
+        if not rows:
+            break
+        ids = [row[0] for row in rows]
+        records = [UsageRecord(**dict(zip(_RECORD_FIELDS, row[1:]))) for row in rows]
+        
+        # 1. Archive first: if anything below fails, the events are still in the hot table
+        by_month: Dict[Tuple[int, int], List[UsageRecord]] = defaultdict(list)
+        for record in records:
+            by_month[(record.request_timestamp.year, record.request_timestamp.month)].append(record)
+        for (year, month), month_records in sorted(by_month.items()):
+            stats.segments.append(_write_segment(month_archive_dir(archive_dir, year, month), month_records))
+        
+        # 2. Roll up and delete in one transaction
+        try:
+            rollups = _rollup_increments(records)
+            for (tenant_id, hour, provider, model, tier), sums in rollups.items():
+                key = {"tenant_id": tenant_id, "hour": hour, "provider": provider, "model": model, "model_tier": tier}
+                increment_upsert(db, UsageRollupHourly, key, dict(sums))
+            db.query(UsageEvent).filter(UsageEvent.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        
+        stats.events += len(records)
+        stats.batches += 1
+        stats.rollup_rows += len(rollups)
+        USAGE_EVENTS_COMPACTED.inc(len(records))
+        if len(rows) < batch_size:
+            break
+    
+    if stats.events:
+        logger.info(
+            f"Compacted {stats.events} usage events older than {cutoff:%Y-%m-%d} into "
+            f"{stats.rollup_rows} hourly rollups ({len(stats.segments)} archive segments in {archive_dir})"
+        )
+    return stats
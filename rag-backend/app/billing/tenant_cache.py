@@ -0,0 +1,170 @@
+"""
+Process-local cache of tenant and plan metadata.
+ensure_tenant_exists, get_tenant_plan_name and check_quota used to query
+tenants/tenant_plans on every call (twice per /chat). TenantCache keeps
+each tenant's plan for TENANT_CACHE_TTL_SECONDS, so known tenants cost no
+SELECTs on the hot path. Unknown tenants are loaded, and created if missing,
+in one batch. set_tenant_plan invalidates the entry in this process; other
+worker processes pick up plan changes when their entry expires.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, Optional
+import logging
+import threading
+import time
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.billing.quota import PLAN_LIMITS
+from app.db.models import Tenant, TenantPlan
+from app.utils.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+TENANT_CACHE_LOOKUPS = counter(
+    "billing_tenant_cache_lookups_total",
+    "Tenant metadata lookups by result (hit, miss)",
+    ["result"]
+)
+
+# Tenant IDs per IN (...) query
+_QUERY_CHUNK = 500
+
+
+@dataclass(frozen=True)
+class TenantInfo:
+    """Cached tenant metadata."""
+    tenant_id: str
+    plan_name: str
+    monthly_chat_limit: int  # -1 = unlimited
+
+
+class TenantCache:
+    """TTL cache of TenantInfo, scoped per database URL."""
+    
+    def __init__(
+        self,
+        ttl_seconds: float = settings.TENANT_CACHE_TTL_SECONDS,
+        max_entries: int = settings.TENANT_CACHE_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            ttl_seconds: How long an entry is trusted before it is re-read
+            max_entries: Entries kept before the oldest are evicted
+            clock: Monotonic time source (injectable for tests)
+        """
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max(1, max_entries)
+        self._clock = clock
+        # (database URL, tenant ID) -> (expires_at, info); the URL keeps scripts/tests with several databases apart
+        self._entries: "OrderedDict[tuple[str, str], tuple[float, TenantInfo]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, db: Session, tenant_id: str) -> TenantInfo:
+        """Tenant metadata, creating the tenant (starter plan) if it doesn't exist."""
+        return self.ensure(db, [tenant_id])[tenant_id]
+    
+    def ensure(self, db: Session, tenant_ids: Iterable[str]) -> Dict[str, TenantInfo]:
+        """
+        Metadata for several tenants; unknown ones are loaded with one query
+        and missing ones created in one commit.
+        
+        Returns:
+            Tenant ID -> TenantInfo
+        """
+        scope = str(db.get_bind().url)
+        now = self._clock()
+        found: Dict[str, TenantInfo] = {}
+        missing = []
+        with self._lock:
+            for tenant_id in dict.fromkeys(tenant_ids):
+                entry = self._entries.get((scope, tenant_id))
+                if entry is not None and entry[0] > now:
+                    found[tenant_id] = entry[1]
+                else:
+                    missing.append(tenant_id)
+        TENANT_CACHE_LOOKUPS.labels(result="hit").inc(len(found))
+        if not missing:
+            return found
+        
+        TENANT_CACHE_LOOKUPS.labels(result="miss").inc(len(missing))
+        loaded = self._load(db, missing)
+        unknown = [t for t in missing if t not in loaded]
+        if unknown:
+            loaded.update(self._create(db, unknown))
+        self._store(scope, loaded)
+        found.update(loaded)
+        return found
+    
+    def invalidate(self, tenant_id: str) -> None:
+        """Drop a tenant's entries (all databases), e.g. after a plan change."""
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == tenant_id]:
+                del self._entries[key]
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+    
+    def _load(self, db: Session, tenant_ids: list) -> Dict[str, TenantInfo]:
+        """Existing tenants with their plans (no plan row = starter)."""
+        loaded = {}
+        for start in range(0, len(tenant_ids), _QUERY_CHUNK):
+            rows = db.query(Tenant.id, TenantPlan.plan_name, TenantPlan.monthly_chat_limit).outerjoin(
+                TenantPlan, TenantPlan.tenant_id == Tenant.id
+            ).filter(Tenant.id.in_(tenant_ids[start:start + _QUERY_CHUNK]))
+            for tenant_id, plan_name, limit in rows:
+                loaded[tenant_id] = TenantInfo(
+                    tenant_id=tenant_id,
+                    plan_name=plan_name or "starter",
+                    monthly_chat_limit=PLAN_LIMITS["starter"] if limit is None else limit
+                )
+        return loaded
+    
+    def _create(self, db: Session, tenant_ids: list, retry: bool = True) -> Dict[str, TenantInfo]:
+        """Create tenants with the default starter plan in one commit."""
+        for tenant_id in tenant_ids:
+            db.add(Tenant(id=tenant_id, name=f"Tenant {tenant_id}"))
+            db.add(TenantPlan(tenant_id=tenant_id, plan_name="starter", monthly_chat_limit=PLAN_LIMITS["starter"]))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback()
+            if not retry:
+                raise
+            # Another process created some of them first: take whatever exists now
+            existing = self._load(db, tenant_ids)
+            remaining = [t for t in tenant_ids if t not in existing]
+            if remaining:
+                existing.update(self._create(db, remaining, retry=False))
+            return existing
+        logger.info(f"Created {len(tenant_ids)} tenant(s) with starter plan: {', '.join(tenant_ids[:10])}")
+        return {
+            tenant_id: TenantInfo(tenant_id=tenant_id, plan_name="starter", monthly_chat_limit=PLAN_LIMITS["starter"])
+            for tenant_id in tenant_ids
+        }
+    
+    def _store(self, scope: str, infos: Dict[str, TenantInfo]) -> None:
+        expires_at = self._clock() + self.ttl_seconds
+        with self._lock:
+            for tenant_id, info in infos.items():
+                self._entries.pop((scope, tenant_id), None)
+                self._entries[(scope, tenant_id)] = (expires_at, info)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+# Global tenant cache instance
+_tenant_cache: Optional[TenantCache] = None
+
+
+def get_tenant_cache() -> TenantCache:
+    """Get the global tenant cache."""
+    global _tenant_cache
+    if _tenant_cache is None:
+        _tenant_cache = TenantCache()
+    return _tenant_cache
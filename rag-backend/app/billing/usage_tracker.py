@@ -3,7 +3,8 @@ Usage tracking service.
 Tracks token usage and costs for each LLM request.
 """
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
+from sqlalchemy import func
+from dataclasses import dataclass
 from datetime import datetime, timedelta
 from typing import Optional
 import uuid
@@ -12,10 +13,16 @@ import logging
 from app.db.models import UsageEvent, UsageDaily, UsageMonthly, Tenant
 from app.billing.pricing import calculate_cost
 from app.billing.quota import ensure_tenant_exists
+from app.db.upsert import increment_upsert
 
 logger = logging.getLogger(__name__)
 
 
+def new_request_id() -> str:
+    """Unique usage event ID."""
+    return f"req_{uuid.uuid4().hex[:16]}"
+
+
 def track_usage(
     db: Session,
     tenant_id: str,
@@ -25,7 +32,9 @@ def track_usage(
     model: str,
     prompt_tokens: int,
     completion_tokens: int,
-    request_timestamp: Optional[datetime] = None
+    request_timestamp: Optional[datetime] = None,
+    model_tier: Optional[str] = None,
+    latency_ms: Optional[int] = None
 ) -> UsageEvent:
     """
     Track a single usage event.
@@ -40,6 +49,8 @@ def track_usage(
         prompt_tokens: Input tokens
         completion_tokens: Output tokens
         request_timestamp: Request timestamp (defaults to now)
+        model_tier: Model routing tier ("fast"/"large"), None when routing is off
+        latency_ms: Answer latency in milliseconds
         
     Returns:
         Created UsageEvent
@@ -52,7 +63,7 @@ def track_usage(
     estimated_cost = calculate_cost(provider, model, prompt_tokens, completion_tokens)
     
     # Create usage event
-    request_id = f"req_{uuid.uuid4().hex[:16]}"
+    request_id = new_request_id()
     timestamp = request_timestamp or datetime.utcnow()
     
     usage_event = UsageEvent(
@@ -66,16 +77,17 @@ def track_usage(
         completion_tokens=completion_tokens,
         total_tokens=total_tokens,
         estimated_cost_usd=estimated_cost,
+        model_tier=model_tier,
+        latency_ms=latency_ms,
         request_timestamp=timestamp
     )
     
     db.add(usage_event)
     
-    # Update daily aggregation
-    _update_daily_usage(db, tenant_id, timestamp, provider, total_tokens, estimated_cost)
-    
-    # Update monthly aggregation
-    _update_monthly_usage(db, tenant_id, timestamp, provider, total_tokens, estimated_cost)
+    # Update daily and monthly aggregations
+    increment = UsageIncrement().add(provider, total_tokens, estimated_cost)
+    apply_daily_increment(db, tenant_id, day_start(timestamp), increment)
+    apply_monthly_increment(db, tenant_id, timestamp.year, timestamp.month, increment)
     
     db.commit()
     db.refresh(usage_event)
@@ -88,86 +100,47 @@ def track_usage(
     return usage_event
 
 
-def _update_daily_usage(
-    db: Session,
-    tenant_id: str,
-    timestamp: datetime,
-    provider: str,
-    tokens: int,
-    cost: float
-):
-    """Update daily usage aggregation."""
-    date = timestamp.date()
-    date_start = datetime.combine(date, datetime.min.time())
-    
-    daily = db.query(UsageDaily).filter(
-        and_(
-            UsageDaily.tenant_id == tenant_id,
-            UsageDaily.date == date_start
-        )
-    ).first()
+@dataclass
+class UsageIncrement:
+    """Amounts to add to one daily or monthly aggregate row."""
+    requests: int = 0
+    tokens: int = 0
+    cost: float = 0.0
+    gemini_requests: int = 0
+    openai_requests: int = 0
     
-    if daily:
-        daily.total_requests += 1
-        daily.total_tokens += tokens
-        daily.total_cost_usd += cost
+    def add(self, provider: str, tokens: int, cost: float) -> "UsageIncrement":
+        """Count one request."""
+        self.requests += 1
+        self.tokens += tokens
+        self.cost += cost
         if provider == "gemini":
-            daily.gemini_requests += 1
+            self.gemini_requests += 1
         elif provider == "openai":
-            daily.openai_requests += 1
-        daily.updated_at = datetime.utcnow()
-    else:
-        daily = UsageDaily(
-            tenant_id=tenant_id,
-            date=date_start,
-            total_requests=1,
-            total_tokens=tokens,
-            total_cost_usd=cost,
-            gemini_requests=1 if provider == "gemini" else 0,
-            openai_requests=1 if provider == "openai" else 0
-        )
-        db.add(daily)
+            self.openai_requests += 1
+        return self
+    
+    def columns(self) -> dict:
+        """Aggregate column -> amount to add."""
+        return {
+            "total_requests": self.requests,
+            "total_tokens": self.tokens,
+            "total_cost_usd": self.cost,
+            "gemini_requests": self.gemini_requests,
+            "openai_requests": self.openai_requests
+        }
 
 
-def _update_monthly_usage(
-    db: Session,
-    tenant_id: str,
-    timestamp: datetime,
-    provider: str,
-    tokens: int,
-    cost: float
-):
-    """Update monthly usage aggregation."""
-    year = timestamp.year
-    month = timestamp.month
-    
-    monthly = db.query(UsageMonthly).filter(
-        and_(
-            UsageMonthly.tenant_id == tenant_id,
-            UsageMonthly.year == year,
-            UsageMonthly.month == month
-        )
-    ).first()
-    
-    if monthly:
-        monthly.total_requests += 1
-        monthly.total_tokens += tokens
-        monthly.total_cost_usd += cost
-        if provider == "gemini":
-            monthly.gemini_requests += 1
-        elif provider == "openai":
-            monthly.openai_requests += 1
-        monthly.updated_at = datetime.utcnow()
-    else:
-        monthly = UsageMonthly(
-            tenant_id=tenant_id,
-            year=year,
-            month=month,
-            total_requests=1,
-            total_tokens=tokens,
-            total_cost_usd=cost,
-            gemini_requests=1 if provider == "gemini" else 0,
-            openai_requests=1 if provider == "openai" else 0
-        )
-        db.add(monthly)
+def day_start(timestamp: datetime) -> datetime:
+    """Midnight of the timestamp's day (the UsageDaily.date key)."""
+    return datetime.combine(timestamp.date(), datetime.min.time())
+
+
+def apply_daily_increment(db: Session, tenant_id: str, date_start: datetime, increment: UsageIncrement):
+    """Atomically add an increment to a tenant's daily aggregate (one upsert statement)."""
+    increment_upsert(db, UsageDaily, {"tenant_id": tenant_id, "date": date_start}, increment.columns())
+
 
+def apply_monthly_increment(db: Session, tenant_id: str, year: int, month: int, increment: UsageIncrement):
+    """Atomically add an increment to a tenant's monthly aggregate (one upsert statement)."""
+    increment_upsert(db, UsageMonthly, {"tenant_id": tenant_id, "year": year, "month": month}, increment.columns())
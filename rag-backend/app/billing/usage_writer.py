@@ -0,0 +1,517 @@
+"""
+Write-behind usage tracking.
+Chat requests hand their usage to an in-process queue instead of writing to
+the billing DB on the critical path. A flusher thread writes queued events
+every USAGE_FLUSH_INTERVAL_MS (or as soon as USAGE_FLUSH_BATCH_SIZE are
+waiting): one bulk insert for the events and one increment per
+(tenant, day) and (tenant, month) instead of a read-modify-write per request.
+
+Every event is first appended to a local JSONL journal. A flush rotates the
+journal into a segment that is deleted once its events are committed, so a
+crash loses nothing: leftover segments are replayed on the next start, and
+events already committed (matched by request_id) are skipped.
+
+Each process journals to its own files (USAGE_JOURNAL_PATH + ".<pid>-<id>")
+and holds an exclusive flock on a matching ".lock" file while it runs. On
+start, a writer only replays journals whose lock it can take, i.e. those
+left behind by dead processes; live workers' journals are never touched.
+
+Quota checks read the monthly aggregate, so they lag by up to one flush interval.
+"""
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import itertools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from sqlalchemy.exc import DataError, IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.billing.pricing import calculate_cost
+from app.billing.quota import ensure_tenants_exist
+from app.billing.usage_tracker import (
+    UsageIncrement, apply_daily_increment, apply_monthly_increment, day_start, new_request_id
+)
+from app.db.models import UsageEvent
+from app.utils.metrics import counter, gauge, histogram
+
+logger = logging.getLogger(__name__)
+
+USAGE_WRITER_QUEUE_DEPTH = gauge(
+    "billing_usage_writer_queue_depth",
+    "Usage events waiting to be written to the billing DB"
+)
+USAGE_WRITER_EVENTS = counter(
+    "billing_usage_writer_events_total",
+    "Usage events by outcome (written, replayed, failed)",
+    ["outcome"]
+)
+USAGE_WRITER_FLUSH_SECONDS = histogram(
+    "billing_usage_writer_flush_seconds",
+    "Time to write one batch of usage events",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, so every journal on disk is treated as abandoned
+    fcntl = None
+
+# Rows per INSERT statement (stays under SQLite's bound-parameter limit)
+_INSERT_CHUNK = 500
+
+
+def _lock_file(path: Path, blocking: bool = True):
+    """
+    Open path and take an exclusive flock on it (released when the file is closed).
+    
+    Returns:
+        The open file, or None if another process holds the lock (non-blocking only)
+    """
+    handle = open(path, "a")
+    if fcntl is not None:
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            handle.close()
+            return None
+    return handle
+
+
+@dataclass
+class UsageRecord:
+    """One chat's usage, as journaled and as inserted into usage_events."""
+    request_id: str
+    tenant_id: str
+    user_id: str
+    kb_id: str
+    provider: str
+    model: str
+    prompt_tokens: int
+    completion_tokens: int
+    total_tokens: int
+    estimated_cost_usd: float
+    request_timestamp: datetime
+    model_tier: Optional[str] = None
+    latency_ms: Optional[int] = None
+    
+    def to_json(self) -> str:
+        data = asdict(self)
+        data["request_timestamp"] = self.request_timestamp.isoformat()
+        return json.dumps(data)
+    
+    @classmethod
+    def from_json(cls, line: str) -> "UsageRecord":
+        data = json.loads(line)
+        data["request_timestamp"] = datetime.fromisoformat(data["request_timestamp"])
+        return cls(**data)
+
+
+def build_usage_record(
+    tenant_id: str,
+    user_id: str,
+    kb_id: str,
+    provider: str,
+    model: str,
+    prompt_tokens: int,
+    completion_tokens: int,
+    request_timestamp: Optional[datetime] = None,
+    model_tier: Optional[str] = None,
+    latency_ms: Optional[int] = None
+) -> UsageRecord:
+    """Price a chat's usage and stamp it with a request ID (same fields track_usage stores)."""
+    return UsageRecord(
+        request_id=new_request_id(),
+        tenant_id=tenant_id,
+        user_id=user_id,
+        kb_id=kb_id,
+        provider=provider,
+        model=model,
+        prompt_tokens=prompt_tokens,
+        completion_tokens=completion_tokens,
+        total_tokens=prompt_tokens + completion_tokens,
+        estimated_cost_usd=calculate_cost(provider, model, prompt_tokens, completion_tokens),
+        request_timestamp=request_timestamp or datetime.utcnow(),
+        model_tier=model_tier,
+        latency_ms=latency_ms
+    )
+
+
+def _uncommitted(db: Session, records: List[UsageRecord]) -> List[UsageRecord]:
+    """Drop records whose request_id is already in usage_events (and duplicates within the batch)."""
+    records = list({r.request_id: r for r in records}.values())
+    ids = [r.request_id for r in records]
+    committed = set()
+    for start in range(0, len(ids), _INSERT_CHUNK):
+        rows = db.query(UsageEvent.request_id).filter(UsageEvent.request_id.in_(ids[start:start + _INSERT_CHUNK]))
+        committed.update(row[0] for row in rows)
+    return [r for r in records if r.request_id not in committed]
+
+
+def write_usage_batch(db: Session, records: List[UsageRecord]) -> int:
+    """
+    Write a batch in one transaction: bulk-insert the events and apply one
+    merged increment per (tenant, day) and (tenant, month). Events already
+    committed (same request_id) are skipped, so a batch can be retried or
+    replayed safely.
+    
+    Returns:
+        Number of events newly written
+    """
+    records = _uncommitted(db, records)
+    if not records:
+        return 0
+    ensure_tenants_exist(db, sorted({r.tenant_id for r in records}))
+    
+    mappings = [asdict(r) for r in records]
+    for start in range(0, len(mappings), _INSERT_CHUNK):
+        db.bulk_insert_mappings(UsageEvent, mappings[start:start + _INSERT_CHUNK])
+    
+    daily: Dict[Tuple[str, datetime], UsageIncrement] = defaultdict(UsageIncrement)
+    monthly: Dict[Tuple[str, int, int], UsageIncrement] = defaultdict(UsageIncrement)
+    for r in records:
+        daily[(r.tenant_id, day_start(r.request_timestamp))].add(r.provider, r.total_tokens, r.estimated_cost_usd)
+        monthly[(r.tenant_id, r.request_timestamp.year, r.request_timestamp.month)].add(
+            r.provider, r.total_tokens, r.estimated_cost_usd
+        )
+    for (tenant_id, date_start), increment in daily.items():
+        apply_daily_increment(db, tenant_id, date_start, increment)
+    for (tenant_id, year, month), increment in monthly.items():
+        apply_monthly_increment(db, tenant_id, year, month, increment)
+    db.commit()
+    return len(records)
+
+
+class UsageWriter:
+    """Queue + flusher thread + crash journal for usage events."""
+    
+    def __init__(
+        self,
+        session_factory: Callable[[], Session],
+        journal_path: Optional[Path] = None,
+        flush_interval_ms: int = settings.USAGE_FLUSH_INTERVAL_MS,
+        batch_size: int = settings.USAGE_FLUSH_BATCH_SIZE
+    ):
+        """
+        Args:
+            session_factory: Creates billing DB sessions (e.g. SessionLocal)
+            journal_path: Base path of the local JSONL journals (None = no crash journal);
+                this process writes to journal_path + ".<owner>"
+            flush_interval_ms: Max time an event waits before being written
+            batch_size: Queued events that trigger an early flush
+        """
+        self._session_factory = session_factory
+        self.journal_path = Path(journal_path) if journal_path else None
+        self.flush_interval = flush_interval_ms / 1000.0
+        self.batch_size = max(1, batch_size)
+        self._queue: List[UsageRecord] = []
+        self._lock = threading.Lock()  # Guards the queue and the journal file
+        self._flush_lock = threading.Lock()  # One flush at a time
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._journal = None
+        self._segments = itertools.count()
+        # Unique per writer: names this process's journal files and their lock
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._owner_lock = None
+        # Batch whose write failed: retried (with its journal segments) before newer events
+        self._retry: List[UsageRecord] = []
+        self._retry_segments: List[Path] = []
+    
+    def start(self) -> "UsageWriter":
+        """Replay leftover journal segments, then start the flusher thread."""
+        if self._thread is not None:
+            return self
+        if self.journal_path:
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            self._owner_lock = _lock_file(self._journal_file_path(f"{self.owner}.lock"))
+            try:
+                self.replay_journal()
+            except Exception as e:
+                # Abandoned journals stay on disk for the next start; billing must not block startup
+                logger.error(f"Usage journal replay failed: {e}", exc_info=True)
+            self._journal = open(self.journal_file, "a", encoding="utf-8")
+        self._stopping = False
+        self._thread = threading.Thread(target=self._run, name="usage-writer", daemon=True)
+        self._thread.start()
+        return self
+    
+    @property
+    def journal_file(self) -> Optional[Path]:
+        """This process's live journal."""
+        return self._journal_file_path(self.owner) if self.journal_path else None
+    
+    def submit(self, record: UsageRecord) -> None:
+        """Journal and enqueue one event (no DB work on the caller's thread)."""
+        with self._lock:
+            if self._journal is not None:
+                try:
+                    self._journal.write(record.to_json() + "\n")
+                    self._journal.flush()
+                except (OSError, ValueError) as e:
+                    logger.error(f"Could not journal usage event {record.request_id}: {e}")
+            self._queue.append(record)
+            depth = len(self._queue)
+        USAGE_WRITER_QUEUE_DEPTH.set(depth)
+        if depth >= self.batch_size:
+            self._wake.set()
+    
+    @property
+    def pending(self) -> int:
+        return len(self._queue) + len(self._retry)
+    
+    def flush(self) -> int:
+        """
+        Write everything queued so far, plus events whose earlier write failed.
+        
+        Returns:
+            Number of events written (failed ones stay queued and journaled for the next flush)
+        """
+        with self._flush_lock:
+            with self._lock:
+                batch, self._queue = self._queue, []
+                segment = None
+                if batch:
+                    try:
+                        segment = self._rotate_journal(batch)
+                    except OSError as e:
+                        # The batch is still written below; it just isn't covered by a segment
+                        logger.error(f"Could not rotate the usage journal: {e}", exc_info=True)
+            USAGE_WRITER_QUEUE_DEPTH.set(0)
+            
+            # Earlier failures are written separately so they can't hold back the new batch
+            groups = []
+            if self._retry:
+                groups.append((self._retry, self._retry_segments))
+            if batch:
+                groups.append((batch, [segment] if segment else []))
+            written = 0
+            failed: List[UsageRecord] = []
+            failed_segments: List[Path] = []
+            for records, segments in groups:
+                started = time.monotonic()
+                count, leftover = self._write(records)
+                written += count
+                if leftover:
+                    # Segments also hold written events; replay skips those (matched by request_id)
+                    failed += leftover
+                    failed_segments += segments
+                    continue
+                for path in segments:
+                    path.unlink(missing_ok=True)
+                USAGE_WRITER_FLUSH_SECONDS.observe(time.monotonic() - started)
+            self._retry, self._retry_segments = failed, failed_segments
+            if written:
+                USAGE_WRITER_EVENTS.labels(outcome="written").inc(written)
+            return written
+    
+    def _write(self, records: List[UsageRecord]) -> Tuple[int, List[UsageRecord]]:
+        """
+        Write records in one transaction. If a row is rejected (constraint or
+        data error), they are written one by one so only the bad rows fail.
+        
+        Returns:
+            Tuple of (events newly written, records that could not be written)
+        """
+        db = self._session_factory()
+        try:
+            return write_usage_batch(db, records), []
+        except (IntegrityError, DataError) as e:
+            db.rollback()
+            if len(records) == 1:
+                USAGE_WRITER_EVENTS.labels(outcome="failed").inc()
+                logger.error(f"Usage event {records[0].request_id} was rejected, will retry: {e}")
+                return 0, records
+            logger.warning(f"Usage write-behind batch of {len(records)} events was rejected, writing one by one: {e}")
+        except Exception as e:
+            db.rollback()
+            USAGE_WRITER_EVENTS.labels(outcome="failed").inc(len(records))
+            logger.error(f"Usage write-behind flush of {len(records)} events failed, will retry: {e}", exc_info=True)
+            return 0, records
+        finally:
+            db.close()
+        
+        written, failed = 0, []
+        for record in records:
+            count, leftover = self._write([record])
+            written += count
+            failed += leftover
+        return written, failed
+    
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the flusher and write whatever is still queued."""
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+                if self.journal_file.exists() and self.journal_file.stat().st_size == 0:
+                    self.journal_file.unlink()
+            if self._owner_lock is not None:
+                # Unwritten events keep their lock file so the next writer's replay finds them
+                if not self.pending:
+                    self._journal_file_path(f"{self.owner}.lock").unlink(missing_ok=True)
+                self._owner_lock.close()
+                self._owner_lock = None
+        if self.pending:
+            logger.error(f"Usage writer stopped with {self.pending} unwritten events (kept in the journal for replay)")
+    
+    def replay_journal(self) -> int:
+        """
+        Write events left in journals by dead processes, skipping any that
+        were already committed. Journals of running writers (whose lock is
+        held) are left alone. Events that can't be written (DB down, rejected
+        rows) are queued for retry by the flusher, and their files are adopted
+        into this writer's journal segments, so they are neither lost nor block
+        startup.
+        
+        Returns:
+            Number of events replayed
+        """
+        # One replay at a time, so two starting workers don't claim the same files
+        replay_lock = _lock_file(self.journal_path.with_name(f".{self.journal_path.name}.replay.lock"))
+        owner_locks = []
+        try:
+            files, owner_locks = self._claim_abandoned_journals()
+            records = list(self._read_journal(sorted(files)))
+            replayed, leftover = self._write(records) if records else (0, [])
+            if replayed:
+                USAGE_WRITER_EVENTS.labels(outcome="replayed").inc(replayed)
+                logger.warning(f"Replayed {replayed} usage events from abandoned write-behind journals")
+            if leftover:
+                logger.error(f"{len(leftover)} replayed usage events could not be written, will retry")
+                self._retry += leftover
+                self._retry_segments += [self._adopt_segment(path) for path in files]
+            else:
+                for path in files:
+                    path.unlink(missing_ok=True)
+            for handle in owner_locks:
+                Path(handle.name).unlink(missing_ok=True)
+            return replayed
+        finally:
+            for handle in owner_locks:
+                handle.close()
+            replay_lock.close()
+    
+    def _journal_file_path(self, suffix: str) -> Path:
+        return self.journal_path.with_name(f"{self.journal_path.name}.{suffix}")
+    
+    def _adopt_segment(self, path: Path) -> Path:
+        """Rename a claimed journal file into this writer's segments (covered by our owner lock)."""
+        segment = self._journal_file_path(f"{self.owner}.{time.time_ns()}.{next(self._segments)}")
+        try:
+            path.rename(segment)
+            return segment
+        except OSError as e:
+            logger.error(f"Could not adopt usage journal {path.name}: {e}")
+            return path
+    
+    def _claim_abandoned_journals(self) -> Tuple[List[Path], list]:
+        """
+        Journal files whose writer is gone, with the owner locks taken to claim them.
+        Files from before per-process journals (no owner in the name) are always claimed.
+        """
+        base = self.journal_path.name
+        files: List[Path] = []
+        by_owner: Dict[str, List[Path]] = defaultdict(list)
+        for path in self.journal_path.parent.glob(base + "*"):
+            suffix = path.name[len(base):]
+            if suffix == "":
+                files.append(path)  # Legacy single-process journal
+                continue
+            if not suffix.startswith("."):
+                continue
+            owner = suffix[1:].split(".")[0]
+            if "-" not in owner:
+                files.append(path)  # Legacy segment ("<ns>.<n>")
+            elif owner != self.owner:
+                by_owner[owner].append(path)
+        
+        owner_locks = []
+        for owner, paths in by_owner.items():
+            handle = _lock_file(self._journal_file_path(f"{owner}.lock"), blocking=False)
+            if handle is None:
+                continue  # Still running
+            owner_locks.append(handle)
+            files += [p for p in paths if not p.name.endswith(".lock")]
+        return files, owner_locks
+    
+    @staticmethod
+    def _read_journal(files: Iterable[Path]) -> Iterable[UsageRecord]:
+        seen = set()
+        for path in files:
+            for line in path.read_text(encoding="utf-8").splitlines():
+                try:
+                    record = UsageRecord.from_json(line)
+                except (ValueError, TypeError, KeyError):
+                    continue  # Torn last line from a crash mid-write
+                if record.request_id not in seen:
+                    seen.add(record.request_id)
+                    yield record
+    
+    def _rotate_journal(self, batch: List[UsageRecord]) -> Optional[Path]:
+        """Move the current journal aside as the segment for this batch (caller holds the lock)."""
+        if self._journal is None:
+            return None
+        self._journal.close()
+        segment = self._journal_file_path(f"{self.owner}.{time.time_ns()}.{next(self._segments)}")
+        try:
+            self.journal_file.rename(segment)
+        except FileNotFoundError:
+            # The journal was removed underneath us: journal the batch again so it stays crash-safe
+            logger.warning(f"Usage journal {self.journal_file} disappeared; rewriting {len(batch)} events to {segment.name}")
+            segment.parent.mkdir(parents=True, exist_ok=True)
+            segment.write_text("".join(r.to_json() + "\n" for r in batch), encoding="utf-8")
+        finally:
+            self._journal = open(self.journal_file, "a", encoding="utf-8")
+        return segment
+    
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Usage writer flush crashed: {e}", exc_info=True)
+
+
+# Global usage writer instance
+_usage_writer: Optional[UsageWriter] = None
+_usage_writer_lock = threading.Lock()
+
+
+def get_usage_writer() -> Optional[UsageWriter]:
+    """Get the started global usage writer (None when USAGE_WRITE_BEHIND is off)."""
+    global _usage_writer
+    if not settings.USAGE_WRITE_BEHIND:
+        return None
+    with _usage_writer_lock:
+        if _usage_writer is None:
+            from app.db.database import SessionLocal
+            journal = settings.USAGE_JOURNAL_PATH or settings.DATA_DIR / "billing" / "usage_journal.jsonl"
+            _usage_writer = UsageWriter(SessionLocal, journal_path=journal).start()
+        return _usage_writer
+
+
+def stop_usage_writer() -> None:
+    """Flush and stop the global usage writer (application shutdown)."""
+    global _usage_writer
+    with _usage_writer_lock:
+        if _usage_writer is not None:
+            _usage_writer.stop()
+            _usage_writer = None
@@ -1,28 +1,108 @@
 """
 Database setup and session management.
 Uses SQLAlchemy with SQLite for local dev, Postgres-compatible schema.
+Set DATABASE_URL to use Postgres (needs psycopg2-binary).
 """
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from pathlib import Path
+from typing import Any, Dict, Iterator, Optional
 import logging
 
 from app.config import settings
+from app.db.pool import InstrumentedQueuePool
 
 logger = logging.getLogger(__name__)
 
-# Database path
+# Database path (default SQLite location)
 DB_DIR = settings.DATA_DIR / "billing"
-DB_DIR.mkdir(parents=True, exist_ok=True)
-DATABASE_URL = f"sqlite:///{DB_DIR / 'billing.db'}"
+DATABASE_URL = settings.DATABASE_URL or f"sqlite:///{DB_DIR / 'billing.db'}"
+
+
+def sqlite_pragmas(
+    journal_mode: str = settings.SQLITE_JOURNAL_MODE,
+    synchronous: str = settings.SQLITE_SYNCHRONOUS,
+    busy_timeout_ms: int = settings.SQLITE_BUSY_TIMEOUT_MS,
+    mmap_size: int = settings.SQLITE_MMAP_SIZE
+) -> Dict[str, Any]:
+    """Connect-time PRAGMAs for SQLite connections (None values are left at SQLite's default)."""
+    return {
+        "journal_mode": journal_mode,
+        "synchronous": synchronous,
+        "busy_timeout": busy_timeout_ms,
+        "mmap_size": mmap_size
+    }
+
+
+def create_db_engine(
+    url: str,
+    pragmas: Optional[Dict[str, Any]] = None,
+    instrument: bool = False,
+    **engine_kwargs
+) -> Engine:
+    """
+    Create an engine for the billing database.
+    
+    SQLite gets its PRAGMAs on every new connection; other databases get a
+    sized QueuePool with pre-ping and recycling.
+    
+    Args:
+        url: SQLAlchemy database URL
+        pragmas: SQLite PRAGMAs (default: sqlite_pragmas())
+        instrument: Export pool metrics (InstrumentedQueuePool); meant for the one application engine
+        **engine_kwargs: Overrides passed to create_engine
+    
+    Returns:
+        SQLAlchemy engine
+    """
+    backend = make_url(url).get_backend_name()
+    pool_options = {"poolclass": InstrumentedQueuePool} if instrument else {}
+    if backend != "sqlite":
+        options = dict(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=True,  # Drop connections the server closed while idle
+            **pool_options
+        )
+        options.update(engine_kwargs)
+        return create_engine(url, **options)
+    
+    pragmas = sqlite_pragmas() if pragmas is None else pragmas
+    database = make_url(url).database
+    if database and database != ":memory:":
+        Path(database).parent.mkdir(parents=True, exist_ok=True)
+        options = dict(
+            # The driver's own lock wait (seconds) matches the busy_timeout PRAGMA
+            connect_args={"check_same_thread": False, "timeout": (pragmas.get("busy_timeout") or 5000) / 1000},
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            **pool_options
+        )
+    else:
+        # In-memory databases use a single-connection pool without sizing options
+        options = dict(connect_args={"check_same_thread": False})
+    options.update(engine_kwargs)
+    engine = create_engine(url, **options)
+    
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            if value is not None:
+                cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+    
+    return engine
+
 
 # Create engine
-engine = create_engine(
-    DATABASE_URL,
-    connect_args={"check_same_thread": False},  # SQLite specific
-    echo=False  # Set to True for SQL query logging
-)
+engine = create_db_engine(DATABASE_URL, instrument=True)
 
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -31,23 +111,51 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
 
-def get_db() -> Session:
-    """Get database session (dependency for FastAPI)."""
+def get_db() -> Iterator[Session]:
+    """
+    Request-scoped database session (FastAPI dependency: `db: Session = Depends(get_db)`).
+    Rolled back if the request fails and always closed, returning its connection to the pool.
+    """
     db = SessionLocal()
     try:
         yield db
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """
+    Database session for code outside a request's dependencies (streams, background work).
+    
+    Usage:
+        with session_scope() as db:
+            ...
+    """
+    db = SessionLocal()
+    try:
+        yield db
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
 
 
 def init_db():
     """Initialize database tables."""
+    from app.db.migrations import add_aggregate_unique_keys, add_missing_columns, add_missing_indexes
     Base.metadata.create_all(bind=engine)
-    logger.info("Database tables created/verified")
+    add_missing_columns(engine)
+    add_missing_indexes(engine)
+    add_aggregate_unique_keys(engine)
+    logger.info(f"Database tables created/verified ({engine.dialect.name})")
 
 
 def drop_db():
     """Drop all tables (use with caution!)."""
     Base.metadata.drop_all(bind=engine)
     logger.warning("All database tables dropped")
-
@@ -0,0 +1,138 @@
+"""
+Lightweight schema migrations for the billing database.
+create_all() creates missing tables but never alters existing ones, so
+nullable columns added to models later, indexes added to existing tables,
+and unique keys added to the usage aggregate tables, are added here on startup.
+"""
+import logging
+
+from sqlalchemy import and_, delete, func, inspect, select, text, update
+from sqlalchemy.engine import Engine
+
+from app.db.database import Base
+
+logger = logging.getLogger(__name__)
+
+
+def add_missing_columns(engine: Engine) -> list:
+    """
+    Add model columns that are missing from existing tables.
+    Only nullable columns without server defaults are added (safe on any dialect).
+    
+    Args:
+        engine: SQLAlchemy engine
+    
+    Returns:
+        List of "table.column" names that were added
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    added = []
+    with engine.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                if not column.nullable:
+                    logger.warning(f"Cannot add NOT NULL column {table.name}.{column.name} automatically")
+                    continue
+                column_type = column.type.compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+                added.append(f"{table.name}.{column.name}")
+    if added:
+        logger.info(f"Added missing columns: {', '.join(added)}")
+    return added
+
+
+def add_missing_indexes(engine: Engine) -> list:
+    """
+    Create non-unique model indexes that are missing from existing tables.
+    
+    Args:
+        engine: SQLAlchemy engine
+    
+    Returns:
+        List of index names that were created
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    created = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.unique or index.name in existing_indexes:
+                continue
+            index.create(bind=engine, checkfirst=True)
+            created.append(index.name)
+    if created:
+        logger.info(f"Added missing indexes: {', '.join(created)}")
+    return created
+
+
+# Aggregate tables whose rows must be unique per key: table -> (constraint name, key columns)
+AGGREGATE_KEYS = {
+    "usage_daily": ("uq_usage_daily_tenant_date", ("tenant_id", "date")),
+    "usage_monthly": ("uq_usage_monthly_tenant_month", ("tenant_id", "year", "month")),
+}
+AGGREGATE_METRICS = ("total_requests", "total_tokens", "total_cost_usd", "gemini_requests", "openai_requests")
+
+
+def add_aggregate_unique_keys(engine: Engine) -> dict:
+    """
+    Give existing usage aggregate tables their unique keys.
+    Duplicate rows (left by concurrent read-modify-write updates) are merged
+    first: metrics are summed into the oldest row and the others deleted.
+    
+    Args:
+        engine: SQLAlchemy engine
+    
+    Returns:
+        Table name -> number of duplicate rows merged away (tables that got a key)
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    merged = {}
+    for table_name, (constraint_name, key_columns) in AGGREGATE_KEYS.items():
+        if table_name not in existing_tables or _has_unique_key(inspector, table_name, key_columns):
+            continue
+        table = Base.metadata.tables[table_name]
+        with engine.begin() as conn:
+            merged[table_name] = _merge_duplicates(conn, table, key_columns)
+            columns = ", ".join(key_columns)
+            conn.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS {constraint_name} ON {table_name} ({columns})"))
+        logger.info(f"Added unique key {constraint_name} to {table_name} ({merged[table_name]} duplicate rows merged)")
+    return merged
+
+
+def _has_unique_key(inspector, table_name: str, key_columns: tuple) -> bool:
+    wanted = set(key_columns)
+    if any(set(c["column_names"]) == wanted for c in inspector.get_unique_constraints(table_name)):
+        return True
+    return any(i.get("unique") and set(i["column_names"]) == wanted for i in inspector.get_indexes(table_name))
+
+
+def _merge_duplicates(conn, table, key_columns: tuple) -> int:
+    """Sum duplicate key groups into their lowest-id row; return the number of rows deleted."""
+    keys = [table.c[name] for name in key_columns]
+    groups = conn.execute(
+        select(*keys, func.min(table.c.id)).group_by(*keys).having(func.count() > 1)
+    ).all()
+    deleted = 0
+    for *key_values, keep_id in groups:
+        same_key = and_(*(column == value for column, value in zip(keys, key_values)))
+        totals = conn.execute(
+            select(*(func.sum(table.c[m]) for m in AGGREGATE_METRICS), func.max(table.c.updated_at)).where(same_key)
+        ).one()
+        conn.execute(
+            update(table).where(table.c.id == keep_id).values(
+                updated_at=totals[-1],
+                **dict(zip(AGGREGATE_METRICS, totals[:-1]))
+            )
+        )
+        deleted += conn.execute(delete(table).where(and_(same_key, table.c.id != keep_id))).rowcount
+    return deleted
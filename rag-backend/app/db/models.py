@@ -1,7 +1,7 @@
 """
 Database models for billing and usage tracking.
 """
-from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import Column, String, Integer, Float, DateTime, Boolean, ForeignKey, Index, Text, UniqueConstraint
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from typing import Optional
@@ -62,9 +62,18 @@ class UsageEvent(Base):
     # Cost tracking
     estimated_cost_usd = Column(Float, nullable=False, default=0.0)
     
+    # Model routing
+    model_tier = Column(String, nullable=True)  # "fast", "large" or None (routing disabled)
+    latency_ms = Column(Integer, nullable=True)  # Draft + verifier latency
+    
     # Timestamp
     request_timestamp = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     
+    # Per-tenant time range scans (cost reports, exports)
+    __table_args__ = (
+        Index("ix_usage_events_tenant_timestamp", "tenant_id", "request_timestamp"),
+    )
+    
     # Relationships
     tenant = relationship("Tenant", back_populates="usage_events")
 
@@ -89,8 +98,9 @@ class UsageDaily(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
-    # Unique constraint: one record per tenant per day
+    # Unique constraint: one record per tenant per day (the upsert conflict target)
     __table_args__ = (
+        UniqueConstraint("tenant_id", "date", name="uq_usage_daily_tenant_date"),
         {"sqlite_autoincrement": True},
     )
     
@@ -119,11 +129,41 @@ class UsageMonthly(Base):
     created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
     
-    # Unique constraint: one record per tenant per month
+    # Unique constraint: one record per tenant per month (the upsert conflict target)
     __table_args__ = (
+        UniqueConstraint("tenant_id", "year", "month", name="uq_usage_monthly_tenant_month"),
         {"sqlite_autoincrement": True},
     )
     
     # Relationships
     tenant = relationship("Tenant", back_populates="monthly_usage")
 
+
+class UsageRollupHourly(Base):
+    """Hourly per-model usage rolled up from compacted usage events (see app/billing/retention.py)."""
+    __tablename__ = "usage_rollup_hourly"
+    
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    tenant_id = Column(String, ForeignKey("tenants.id"), nullable=False)
+    hour = Column(DateTime, nullable=False)  # Start of the hour (UTC)
+    provider = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    model_tier = Column(String, nullable=False, default="")  # "" = routing off (NULL would break the unique key)
+    
+    # Aggregated metrics
+    total_requests = Column(Integer, nullable=False, default=0)
+    prompt_tokens = Column(Integer, nullable=False, default=0)
+    completion_tokens = Column(Integer, nullable=False, default=0)
+    total_tokens = Column(Integer, nullable=False, default=0)
+    total_cost_usd = Column(Float, nullable=False, default=0.0)
+    latency_ms_total = Column(Integer, nullable=False, default=0)
+    latency_samples = Column(Integer, nullable=False, default=0)  # Events that reported a latency
+    
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    
+    # One row per tenant, hour and model (the upsert conflict target; also serves tenant/time range scans)
+    __table_args__ = (
+        UniqueConstraint("tenant_id", "hour", "provider", "model", "model_tier", name="uq_usage_rollup_hourly_key"),
+        {"sqlite_autoincrement": True},
+    )
@@ -0,0 +1,54 @@
+"""
+Connection pool instrumentation for the billing database.
+InstrumentedQueuePool is a QueuePool that reports how long checkouts wait
+for a connection, how many connections are checked out and how far the
+pool has grown into its overflow.
+"""
+import time
+
+from sqlalchemy import exc
+from sqlalchemy.pool import QueuePool
+
+from app.utils.metrics import counter, gauge, histogram
+
+DB_POOL_CHECKOUT_SECONDS = histogram(
+    "billing_db_pool_checkout_seconds",
+    "Time spent waiting for a billing DB connection from the pool",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 5.0, 30.0)
+)
+DB_POOL_CHECKOUT_TIMEOUTS = counter(
+    "billing_db_pool_checkout_timeouts_total",
+    "Checkouts that gave up after DB_POOL_TIMEOUT because the pool was exhausted"
+)
+DB_POOL_IN_USE = gauge(
+    "billing_db_pool_connections_in_use",
+    "Billing DB connections currently checked out"
+)
+DB_POOL_OVERFLOW = gauge(
+    "billing_db_pool_overflow",
+    "Billing DB connections open beyond DB_POOL_SIZE (negative while the pool is still filling)"
+)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that exports checkout wait, connections in use and overflow."""
+    
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            record = super()._do_get()
+        except exc.TimeoutError:
+            DB_POOL_CHECKOUT_TIMEOUTS.inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - started)
+        self._report()
+        return record
+    
+    def _do_return_conn(self, record) -> None:
+        super()._do_return_conn(record)
+        self._report()
+    
+    def _report(self) -> None:
+        DB_POOL_IN_USE.set(self.checkedout())
+        DB_POOL_OVERFLOW.set(self.overflow())
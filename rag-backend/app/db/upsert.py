@@ -0,0 +1,61 @@
+"""
+Atomic increment upserts for aggregate rows.
+One INSERT ... ON CONFLICT (key) DO UPDATE SET col = col + excluded.col
+statement replaces the SELECT-then-UPDATE/INSERT pattern, so concurrent
+writers neither create duplicate rows nor lose increments. Needs a unique
+constraint on the key columns (see UsageDaily/UsageMonthly).
+"""
+from datetime import datetime
+from typing import Any, Dict
+
+from sqlalchemy import and_, select, update
+from sqlalchemy.orm import Session
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+_UPSERT_DIALECTS = ("sqlite", "postgresql")
+
+
+def _dialect_insert(dialect_name: str):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert
+
+
+def increment_upsert(db: Session, model: Any, key: Dict[str, Any], increments: Dict[str, Any]) -> None:
+    """
+    Add increments to the row identified by key, creating it if missing.
+    
+    Args:
+        db: Database session (the statement joins its transaction)
+        model: Mapped class with a unique constraint on the key columns
+        key: Unique key column values, e.g. {"tenant_id": ..., "date": ...}
+        increments: Column -> amount to add (initial value for a new row)
+    """
+    now = datetime.utcnow()
+    table = model.__table__
+    dialect_name = db.get_bind().dialect.name
+    
+    if dialect_name not in _UPSERT_DIALECTS:
+        # No portable upsert: fall back to read-modify-write (not safe under concurrency)
+        conditions = and_(*(table.c[column] == value for column, value in key.items()))
+        if db.execute(select(table.c.id).where(conditions)).first():
+            db.execute(update(table).where(conditions).values(
+                updated_at=now,
+                **{column: table.c[column] + amount for column, amount in increments.items()}
+            ))
+        else:
+            db.execute(table.insert().values(created_at=now, updated_at=now, **key, **increments))
+        return
+    
+    insert = _dialect_insert(dialect_name)
+    statement = insert(table).values(created_at=now, updated_at=now, **key, **increments)
+    statement = statement.on_conflict_do_update(
+        index_elements=list(key),
+        set_={
+            "updated_at": statement.excluded.updated_at,
+            **{column: table.c[column] + statement.excluded[column] for column in increments}
+        }
+    )
+    db.execute(statement)
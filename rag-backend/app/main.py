@@ -5,11 +5,16 @@ Provides endpoints for knowledge base management and chat.
 from fastapi import FastAPI, File, UploadFile, HTTPException, Form, BackgroundTasks, Request, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from sqlalchemy.orm import Session
 from pathlib import Path
+import asyncio
 import shutil
 import uuid
-from datetime import datetime
+import json
+import time
+from datetime import date, datetime, timedelta
 from typing import Optional
 import logging
 
@@ -32,6 +37,7 @@ from app.models.schemas import (
 )
 from app.models.billing_schemas import (
     UsageResponse,
+    UsageSeriesResponse,
     PlanLimitsResponse,
     CostReportResponse,
     SetPlanRequest
@@ -40,11 +46,26 @@ from app.rag.ingest import parser
 from app.rag.chunking import chunker
 from app.rag.embeddings import get_embedding_service
 from app.rag.vectorstore import get_vector_store
+from app.rag.docstore import get_doc_store
+from app.rag.dedup import get_dedup_service
 from app.rag.retrieval import get_retrieval_service
 from app.rag.answer import get_answer_service
-from app.db.database import get_db, init_db
-from app.billing.quota import check_quota, ensure_tenant_exists
+from app.rag.coalescing import billable_usage, coalesce_key, get_chat_single_flight
+from app.rag.verdict_cache import kb_scope
+from app.rag.scheduler import AdmissionRejected, Ticket, get_admission_scheduler
+from app.rag.providers import close_http_clients
+from app.db.database import get_db, init_db, session_scope
+from app.billing.quota import check_quota, ensure_tenant_exists, get_tenant_plan_name
+from app.billing.quota_counter import get_quota_service
 from app.billing.usage_tracker import track_usage
+from app.billing.usage_writer import build_usage_record, get_usage_writer, stop_usage_writer
+from app.utils.metrics import (
+    PROMETHEUS_AVAILABLE,
+    metrics_payload,
+    CHAT_STREAM_TTFB,
+    CHAT_STREAM_DURATION,
+    CHAT_STREAM_OUTCOMES
+)
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -62,6 +83,14 @@ async def startup_event():
     """Initialize database on application startup."""
     init_db()
     logger.info("Database initialized")
+    get_usage_writer()  # Replays events a crashed process left in the journal
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Flush queued usage events and close pooled LLM HTTP connections on application shutdown."""
+    stop_usage_writer()
+    await close_http_clients()
 
 # Configure CORS - SECURITY: Restrict in production
 if settings.ALLOWED_ORIGINS == "*":
@@ -183,6 +212,15 @@ async def readiness():
         raise HTTPException(status_code=503, detail={"status": "not_ready", "checks": checks})
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus metrics (404 when prometheus-client is not installed)."""
+    if not PROMETHEUS_AVAILABLE:
+        raise HTTPException(status_code=404, detail="Metrics are not enabled")
+    payload, content_type = metrics_payload()
+    return Response(content=payload, media_type=content_type)
+
+
 # ============== Knowledge Base Endpoints ==============
 
 @app.post("/kb/upload", response_model=UploadResponse)
@@ -271,7 +309,7 @@ async def upload_document(
     )
 
 
-async def process_document(
+def process_document(
     file_path: Path,
     tenant_id: str,  # CRITICAL: Multi-tenant isolation
     user_id: str,
@@ -281,6 +319,8 @@ async def process_document(
 ):
     """
     Background task to process an uploaded document.
+    A plain def, so BackgroundTasks runs it in the threadpool: parsing, embedding
+    and the tenant lock (held by a re-embedding migration's catch-up) stay off the event loop.
     """
     try:
         logger.info(f"Processing document: {original_filename}")
@@ -289,17 +329,43 @@ async def process_document(
         parsed_doc = parser.parse(file_path)
         logger.info(f"Parsed document: {len(parsed_doc.text)} characters")
         
-        # Chunk document
-        chunks = chunker.chunk_text(
-            parsed_doc.text,
-            page_numbers=parsed_doc.page_map
-        )
-        logger.info(f"Created {len(chunks)} chunks")
+        # Chunk document: small child chunks are indexed, parent sections go to the doc store
+        parents = []
+        if settings.HIERARCHICAL_CHUNKING:
+            parents, chunks = chunker.chunk_hierarchical(
+                parsed_doc.text,
+                page_numbers=parsed_doc.page_map
+            )
+            logger.info(f"Created {len(parents)} parent sections and {len(chunks)} child chunks")
+        else:
+            chunks = chunker.chunk_text(
+                parsed_doc.text,
+                page_numbers=parsed_doc.page_map
+            )
+            logger.info(f"Created {len(chunks)} chunks")
         
         if not chunks:
             logger.warning(f"No chunks created from {original_filename}")
             return
         
+        parent_ids = {parent.chunk_index: chunker.create_parent_id(document_id, parent) for parent in parents}
+        if parents:
+            get_doc_store().add_parents([
+                {
+                    "parent_id": parent_ids[parent.chunk_index],
+                    "tenant_id": tenant_id,  # CRITICAL: Multi-tenant isolation
+                    "kb_id": kb_id,
+                    "user_id": user_id,
+                    "file_name": original_filename,
+                    "document_id": document_id,
+                    "heading_path": parent.heading_path,
+                    "content": parent.content,
+                    "token_count": parent.token_count,
+                    "page_number": parent.page_number
+                }
+                for parent in parents
+            ])
+        
         # Create metadata for each chunk
         metadatas = []
         chunk_ids = []
@@ -314,27 +380,64 @@ async def process_document(
                 file_name=original_filename,
                 file_type=parsed_doc.file_type,
                 total_chunks=len(chunks),
-                document_id=document_id
+                document_id=document_id,
+                parent_id=parent_ids.get(chunk.parent_index)
             )
             metadatas.append(metadata)
             chunk_ids.append(metadata["chunk_id"])
             chunk_texts.append(chunk.content)
         
-        # Generate embeddings
-        embedding_service = get_embedding_service()
-        embeddings = embedding_service.embed_texts(chunk_texts)
-        logger.info(f"Generated {len(embeddings)} embeddings")
+        # Near-duplicate detection before embedding (versions of the same doc, boilerplate)
+        dedup_result = None
+        if settings.DEDUP_MODE != "off":
+            dedup_service = get_dedup_service()
+            dedup_result = dedup_service.deduplicate(
+                chunk_texts,
+                chunk_ids,
+                tenant_id=tenant_id,  # CRITICAL: Multi-tenant isolation
+                kb_id=kb_id,
+                user_id=user_id,
+                file_name=original_filename
+            )
+            if settings.DEDUP_MODE == "drop":
+                keep = [i for i, dup in enumerate(dedup_result.duplicate_of) if not dup]
+                metadatas = [metadatas[i] for i in keep]
+                chunk_ids = [chunk_ids[i] for i in keep]
+                chunk_texts = [chunk_texts[i] for i in keep]
+            else:
+                for metadata, dup in zip(metadatas, dedup_result.duplicate_of):
+                    if dup:
+                        metadata["duplicate_of"] = dup
+        
+        if not chunk_texts:
+            if dedup_result:
+                dedup_service.record(dedup_result)
+            logger.info(f"All chunks of {original_filename} are near-duplicates of existing content")
+            return
         
-        # Store in vector database
+        # Generate embeddings with the tenant's current index model and store them.
+        # The tenant lock keeps a re-embedding migration from switching indexes mid-write.
         vector_store = get_vector_store()
-        vector_store.add_documents(
-            documents=chunk_texts,
-            embeddings=embeddings,
-            metadatas=metadatas,
-            ids=chunk_ids
-        )
+        with vector_store.tenant_lock(tenant_id):
+            index = vector_store.get_tenant_index(tenant_id)
+            embedding_service = get_embedding_service(index["embedding_model"])
+            embeddings = embedding_service.embed_texts(chunk_texts)
+            logger.info(f"Generated {len(embeddings)} embeddings with {index['embedding_model']}")
+            
+            # Store in vector database
+            vector_store.add_documents(
+                documents=chunk_texts,
+                embeddings=embeddings,
+                metadatas=metadatas,
+                ids=chunk_ids,
+                index=index
+            )
         
-        logger.info(f"Successfully processed {original_filename}: {len(chunks)} chunks stored")
+        if dedup_result:
+            dedup_service.record(dedup_result)
+        get_doc_store().bump_kb_version(tenant_id, kb_id)
+        
+        logger.info(f"Successfully processed {original_filename}: {len(chunk_texts)} chunks stored")
         
     except Exception as e:
         logger.error(f"Error processing document {original_filename}: {e}")
@@ -374,6 +477,9 @@ async def get_kb_stats(
     try:
         vector_store = get_vector_store()
         stats = vector_store.get_stats(tenant_id=tenant_id, kb_id=kb_id, user_id=user_id)
+        dedup_counts = get_doc_store().get_dedup_counts(
+            {"tenant_id": tenant_id, "kb_id": kb_id, "user_id": user_id}
+        )
         
         return KnowledgeBaseStats(
             tenant_id=tenant_id,  # CRITICAL: Multi-tenant isolation
@@ -382,6 +488,11 @@ async def get_kb_stats(
             total_documents=len(stats.get("file_names", [])),
             total_chunks=stats.get("total_chunks", 0),
             file_names=stats.get("file_names", []),
+            duplicate_chunks=dedup_counts["duplicate_chunks"],
+            dedup_ratio=(
+                dedup_counts["duplicate_chunks"] / dedup_counts["total_chunks"]
+                if dedup_counts["total_chunks"] else 0.0
+            ),
             last_updated=datetime.utcnow()
         )
     except Exception as e:
@@ -422,12 +533,17 @@ async def delete_document(
     
     try:
         vector_store = get_vector_store()
-        deleted = vector_store.delete_by_filter({
+        filter_dict = {
             "tenant_id": tenant_id,  # CRITICAL: Multi-tenant isolation
             "kb_id": kb_id,
             "user_id": user_id,
             "file_name": file_name
-        })
+        }
+        # Blocks on the tenant lock while a migration catches up; keep it off the event loop
+        deleted = await asyncio.to_thread(vector_store.delete_by_filter, filter_dict)
+        get_doc_store().delete_parents(filter_dict)
+        get_doc_store().delete_signatures(filter_dict)
+        get_doc_store().bump_kb_version(tenant_id, kb_id)
         
         return {
             "success": True,
@@ -470,11 +586,16 @@ async def clear_kb(
             )
     try:
         vector_store = get_vector_store()
-        deleted = vector_store.delete_by_filter({
+        filter_dict = {
             "tenant_id": tenant_id,  # CRITICAL: Multi-tenant isolation
             "kb_id": kb_id,
             "user_id": user_id
-        })
+        }
+        # Blocks on the tenant lock while a migration catches up; keep it off the event loop
+        deleted = await asyncio.to_thread(vector_store.delete_by_filter, filter_dict)
+        get_doc_store().delete_parents(filter_dict)
+        get_doc_store().delete_signatures(filter_dict)
+        get_doc_store().bump_kb_version(tenant_id, kb_id)
         
         return {
             "success": True,
@@ -486,11 +607,210 @@ async def clear_kb(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/kb/reembed")
+async def start_reembedding(
+    request: Request,
+    tenant_id: Optional[str] = None,  # Optional in dev, ignored in prod
+    model: Optional[str] = None,
+    revision: Optional[str] = None
+):
+    """
+    Start a background re-embedding migration for a tenant.
+    
+    Rebuilds the tenant's vectors with the target model (defaults to
+    EMBEDDING_MODEL) in a shadow index, then switches atomically.
+    Queries keep working against the old index until the switch.
+    """
+    # SECURITY: Get tenant_id from auth context
+    auth_context = await get_auth_context(request)
+    tenant_id_from_auth = auth_context.get("tenant_id")
+    
+    if settings.ENV == "prod":
+        if not tenant_id_from_auth:
+            raise HTTPException(
+                status_code=403,
+                detail="tenant_id must come from authentication token in production mode"
+            )
+        tenant_id = tenant_id_from_auth
+    else:
+        tenant_id = tenant_id or tenant_id_from_auth
+        if not tenant_id:
+            raise HTTPException(status_code=400, detail="tenant_id is required")
+    
+    from app.rag.migration import get_reembedding_service
+    
+    try:
+        job = get_reembedding_service().start_migration(tenant_id, model, revision)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    
+    return {"success": True, "job": job.to_dict()}
+
+
+@app.get("/kb/reembed/status")
+async def get_reembedding_status(
+    request: Request,
+    tenant_id: Optional[str] = None  # Optional in dev, ignored in prod
+):
+    """Get re-embedding progress and throughput for a tenant."""
+    auth_context = await get_auth_context(request)
+    tenant_id_from_auth = auth_context.get("tenant_id")
+    
+    if settings.ENV == "prod":
+        if not tenant_id_from_auth:
+            raise HTTPException(
+                status_code=403,
+                detail="tenant_id must come from authentication token in production mode"
+            )
+        tenant_id = tenant_id_from_auth
+    else:
+        tenant_id = tenant_id or tenant_id_from_auth
+        if not tenant_id:
+            raise HTTPException(status_code=400, detail="tenant_id is required")
+    
+    from app.rag.migration import get_reembedding_service
+    
+    vector_store = get_vector_store()
+    index = vector_store.get_tenant_index(tenant_id)
+    job = get_reembedding_service().get_job(tenant_id)
+    
+    return {
+        "tenant_id": tenant_id,
+        "embedding_model": index["embedding_model"],
+        "embedding_revision": index["embedding_revision"],
+        "collection_name": index["collection_name"],
+        "job": job.to_dict() if job else None
+    }
+
+
 # ============== Chat Endpoints ==============
 
+async def resolve_chat_identity(chat_request: ChatRequest, request: Request) -> None:
+    """
+    Set tenant_id/user_id on a chat request from the auth context.
+    In PROD they MUST come from the JWT token (never from the request body).
+    """
+    try:
+        auth_context = await get_auth_context(request)
+    except Exception as e:
+        logger.error(f"Error getting auth context: {e}", exc_info=True)
+        raise HTTPException(status_code=401, detail=f"Authentication error: {str(e)}")
+    
+    tenant_id_from_auth = auth_context.get("tenant_id")
+    user_id_from_auth = auth_context.get("user_id")
+    
+    if settings.ENV == "prod":
+        if not tenant_id_from_auth or not user_id_from_auth:
+            raise HTTPException(
+                status_code=403,
+                detail="tenant_id and user_id must come from authentication token in production mode"
+            )
+        # Override request values with auth context (security enforcement)
+        chat_request.tenant_id = tenant_id_from_auth
+        chat_request.user_id = user_id_from_auth
+    else:
+        # DEV mode: use from request if provided, otherwise from auth context
+        if not chat_request.tenant_id:
+            chat_request.tenant_id = tenant_id_from_auth
+        if not chat_request.user_id:
+            chat_request.user_id = user_id_from_auth
+        if not chat_request.tenant_id or not chat_request.user_id:
+            raise HTTPException(
+                status_code=400,
+                detail="tenant_id and user_id are required (provide via X-Tenant-Id/X-User-Id headers or request body)"
+            )
+    
+    # Log without PII in production
+    if settings.ENV == "prod":
+        logger.info(f"Chat request: tenant={chat_request.tenant_id}, user={chat_request.user_id}, kb={chat_request.kb_id}, q_length={len(chat_request.question)}")
+    else:
+        logger.info(f"Chat request: tenant={chat_request.tenant_id}, user={chat_request.user_id}, kb={chat_request.kb_id}, q={chat_request.question[:50]}...")
+
+
+def track_chat_usage(db, chat_request: ChatRequest, usage_info: Optional[dict]) -> None:
+    """Record LLM usage for a chat request (never fails the request; queued when write-behind is on)."""
+    if not usage_info:
+        return
+    # The provider router reports which provider actually answered
+    provider = usage_info.get("provider", settings.LLM_PROVIDER)
+    usage = dict(
+        tenant_id=chat_request.tenant_id,
+        user_id=chat_request.user_id,
+        kb_id=chat_request.kb_id,
+        provider=provider,
+        model=usage_info.get("model_used", settings.GEMINI_MODEL if provider == "gemini" else settings.OPENAI_MODEL),
+        prompt_tokens=usage_info.get("prompt_tokens", 0),
+        completion_tokens=usage_info.get("completion_tokens", 0),
+        model_tier=usage_info.get("model_tier"),
+        latency_ms=usage_info.get("latency_ms")
+    )
+    try:
+        writer = get_usage_writer()
+        if writer is not None:
+            writer.submit(build_usage_record(**usage))
+        else:
+            track_usage(db=db, **usage)
+    except Exception as e:
+        logger.error(f"Failed to track usage: {e}", exc_info=True)
+        # Don't fail the request if usage tracking fails
+
+
+def check_chat_quota(db, tenant_id: str) -> bool:
+    """
+    Admit one chat against the tenant's monthly quota.
+    
+    Returns:
+        True if the admission came from the quota service and must be given
+        back with release_chat_quota() when the chat ends up not billed
+    
+    Raises:
+        HTTPException: 402 when the quota is exhausted
+    """
+    quota_service = get_quota_service()
+    if quota_service is not None:
+        has_quota, quota_error = quota_service.admit(db, tenant_id)
+    else:
+        ensure_tenant_exists(db, tenant_id)
+        has_quota, quota_error = check_quota(db, tenant_id)
+    if not has_quota:
+        logger.warning(f"Quota exceeded for tenant {tenant_id}")
+        raise HTTPException(
+            status_code=402,
+            detail=quota_error or "AI quota exceeded. Upgrade your plan."
+        )
+    return quota_service is not None
+
+
+def release_chat_quota(tenant_id: str) -> None:
+    """Give back a quota admission for a chat that wasn't billed."""
+    quota_service = get_quota_service()
+    if quota_service is not None:
+        quota_service.release(tenant_id)
+
+
+async def admit_chat(tenant_id: str, plan_name: str) -> Optional[Ticket]:
+    """
+    Wait for an LLM slot from the admission scheduler (None when it is disabled).
+    
+    Raises:
+        HTTPException: 429 when the queue is full, 503 when the queue deadline passes
+    """
+    scheduler = get_admission_scheduler()
+    if scheduler is None:
+        return None
+    try:
+        return await scheduler.acquire(tenant_id, plan_name)
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+
 @app.post("/chat", response_model=ChatResponse)
 @limiter.limit("10/minute", key_func=get_tenant_rate_limit_key)
-async def chat(chat_request: ChatRequest, request: Request):
+async def chat(chat_request: ChatRequest, request: Request, db: Session = Depends(get_db)):
     """
     Process a chat message using RAG.
     
@@ -499,121 +819,91 @@ async def chat(chat_request: ChatRequest, request: Request):
     - Returns answer with citations
     """
     conversation_id = "unknown"
+    quota_held = False
     try:
         logger.info(f"=== CHAT REQUEST RECEIVED ===")
         logger.info(f"Request body: tenant_id={chat_request.tenant_id}, user_id={chat_request.user_id}, kb_id={chat_request.kb_id}, question_length={len(chat_request.question)}")
         logger.info(f"Request headers: {dict(request.headers)}")
         
         # SECURITY: Get tenant_id and user_id from auth context
-        # In PROD: MUST come from JWT token (never from request body)
-        try:
-            auth_context = await get_auth_context(request)
-        except Exception as e:
-            logger.error(f"Error getting auth context: {e}", exc_info=True)
-            raise HTTPException(status_code=401, detail=f"Authentication error: {str(e)}")
-        
-        tenant_id_from_auth = auth_context.get("tenant_id")
-        user_id_from_auth = auth_context.get("user_id")
-        
-        if settings.ENV == "prod":
-            if not tenant_id_from_auth or not user_id_from_auth:
-                raise HTTPException(
-                    status_code=403,
-                    detail="tenant_id and user_id must come from authentication token in production mode"
-                )
-            # Override request values with auth context (security enforcement)
-            chat_request.tenant_id = tenant_id_from_auth
-            chat_request.user_id = user_id_from_auth
-        else:
-            # DEV mode: use from request if provided, otherwise from auth context
-            if not chat_request.tenant_id:
-                chat_request.tenant_id = tenant_id_from_auth
-            if not chat_request.user_id:
-                chat_request.user_id = user_id_from_auth
-            if not chat_request.tenant_id or not chat_request.user_id:
-                raise HTTPException(
-                    status_code=400,
-                    detail="tenant_id and user_id are required (provide via X-Tenant-Id/X-User-Id headers or request body)"
-                )
-        
-        # Log without PII in production
-        if settings.ENV == "prod":
-            logger.info(f"Chat request: tenant={chat_request.tenant_id}, user={chat_request.user_id}, kb={chat_request.kb_id}, q_length={len(chat_request.question)}")
-        else:
-            logger.info(f"Chat request: tenant={chat_request.tenant_id}, user={chat_request.user_id}, kb={chat_request.kb_id}, q={chat_request.question[:50]}...")
+        await resolve_chat_identity(chat_request, request)
         
         # Generate conversation ID if not provided
         conversation_id = chat_request.conversation_id or f"conv_{uuid.uuid4().hex[:12]}"
         
-        # Get database session
-        try:
-            db = next(get_db())
-        except Exception as e:
-            logger.error(f"Database connection error: {e}", exc_info=True)
-            raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
-        
         try:
-            # Ensure tenant exists in billing DB
-            ensure_tenant_exists(db, chat_request.tenant_id)
-            
             # Check quota BEFORE making LLM call
-            has_quota, quota_error = check_quota(db, chat_request.tenant_id)
-            if not has_quota:
-                logger.warning(f"Quota exceeded for tenant {chat_request.tenant_id}")
-                raise HTTPException(
-                    status_code=402,
-                    detail=quota_error or "AI quota exceeded. Upgrade your plan."
-                )
-            
-            # Retrieve relevant context
-            retrieval_service = get_retrieval_service()
-            results, confidence, has_relevant = retrieval_service.retrieve(
-                query=chat_request.question,
-                tenant_id=chat_request.tenant_id,  # CRITICAL: Multi-tenant isolation
-                kb_id=chat_request.kb_id,
-                user_id=chat_request.user_id
-            )
-            
-            logger.info(f"Retrieval results: {len(results)} results, confidence={confidence:.3f}, has_relevant={has_relevant}")
+            quota_held = check_chat_quota(db, chat_request.tenant_id)
             
-            # Format context for LLM
-            context, citations_info = retrieval_service.get_context_for_llm(results)
+            plan_name = get_tenant_plan_name(db, chat_request.tenant_id)
             
-            logger.info(f"Formatted context length: {len(context)} chars, citations: {len(citations_info)}")
+            # End the read transaction so the pooled connection isn't held while waiting on the LLM
+            db.commit()
             
-            # Generate answer
-            answer_service = get_answer_service()
-            answer_result = answer_service.generate_answer(
-                question=chat_request.question,
-                context=context,
-                citations_info=citations_info,
-                confidence=confidence,
-                has_relevant_results=has_relevant
-            )
+            # The KB content version scopes request coalescing and cached verifier verdicts
+            kb_version = get_doc_store().get_kb_version(chat_request.tenant_id, chat_request.kb_id)
             
-            # Track usage if LLM was called (usage info present)
-            usage_info = answer_result.get("usage")
-            if usage_info:
+            async def compute_answer():
+                # Retrieve relevant context
+                retrieval_service = get_retrieval_service()
+                results, confidence, has_relevant = retrieval_service.retrieve(
+                    query=chat_request.question,
+                    tenant_id=chat_request.tenant_id,  # CRITICAL: Multi-tenant isolation
+                    kb_id=chat_request.kb_id,
+                    user_id=chat_request.user_id
+                )
+                
+                logger.info(f"Retrieval results: {len(results)} results, confidence={confidence:.3f}, has_relevant={has_relevant}")
+                
+                # Format context for LLM
+                context, citations_info = retrieval_service.get_context_for_llm(results, query=chat_request.question)
+                
+                logger.info(f"Formatted context length: {len(context)} chars, citations: {len(citations_info)}")
+                
+                # Generate answer once the scheduler admits it (only the coalescing leader takes a slot)
+                answer_service = get_answer_service()
+                ticket = await admit_chat(chat_request.tenant_id, plan_name)
                 try:
-                    track_usage(
-                        db=db,
-                        tenant_id=chat_request.tenant_id,
-                        user_id=chat_request.user_id,
-                        kb_id=chat_request.kb_id,
-                        provider=settings.LLM_PROVIDER,
-                        model=usage_info.get("model_used", settings.GEMINI_MODEL if settings.LLM_PROVIDER == "gemini" else settings.OPENAI_MODEL),
-                        prompt_tokens=usage_info.get("prompt_tokens", 0),
-                        completion_tokens=usage_info.get("completion_tokens", 0)
+                    answer_result = await answer_service.agenerate_answer(
+                        question=chat_request.question,
+                        context=context,
+                        citations_info=citations_info,
+                        confidence=confidence,
+                        has_relevant_results=has_relevant,
+                        cache_scope=kb_scope(chat_request.tenant_id, chat_request.kb_id, kb_version)
                     )
-                except Exception as e:
-                    logger.error(f"Failed to track usage: {e}", exc_info=True)
-                    # Don't fail the request if usage tracking fails
+                finally:
+                    if ticket is not None:
+                        ticket.release()
+                return answer_result, len(results)
+            
+            # Identical concurrent questions against the same KB version share one computation
+            coalesced = False
+            if settings.COALESCING_ENABLED:
+                key = coalesce_key(
+                    chat_request.tenant_id,
+                    chat_request.kb_id,
+                    chat_request.user_id,
+                    chat_request.question,
+                    kb_version
+                )
+                (answer_result, chunks_retrieved), coalesced = await get_chat_single_flight().do(key, compute_answer)
+            else:
+                answer_result, chunks_retrieved = await compute_answer()
+            
+            # Track usage if LLM was called (usage info present), per the coalesced billing policy
+            billed = billable_usage(answer_result.get("usage"), coalesced)
+            track_chat_usage(db, chat_request, billed)
+            if billed:
+                quota_held = False
             
             # Build metadata with refusal info
             metadata = {
-                "chunks_retrieved": len(results),
+                "chunks_retrieved": chunks_retrieved,
                 "kb_id": chat_request.kb_id
             }
+            if coalesced:
+                metadata["coalesced"] = True
             if "refused" in answer_result:
                 metadata["refused"] = answer_result["refused"]
             if "refusal_reason" in answer_result:
@@ -675,6 +965,10 @@ async def chat(chat_request: ChatRequest, request: Request):
                 conversation_id=conversation_id,
                 metadata={"error": str(e), "error_type": type(e).__name__}
             )
+        finally:
+            # Unbilled chats (errors, coalesced followers, rejected by the scheduler) don't use up quota
+            if quota_held:
+                release_chat_quota(chat_request.tenant_id)
     except HTTPException:
         # Re-raise HTTP exceptions from outer try block
         raise
@@ -692,6 +986,160 @@ async def chat(chat_request: ChatRequest, request: Request):
         )
 
 
+@app.post("/chat/stream")
+@limiter.limit("10/minute", key_func=get_tenant_rate_limit_key)
+async def chat_stream(chat_request: ChatRequest, request: Request):
+    """
+    Process a chat message using RAG and stream the answer as server-sent events.
+    
+    Events (each `data:` is JSON):
+    - citations: retrieved sources, sent right after retrieval
+    - token: draft answer text deltas from the provider's streaming API
+    - final: verifier verdict, usage and the authoritative answer; when
+      "retract" is true the client must replace the streamed text with "answer"
+    - error: generation failed after the stream started
+    
+    Auth, quota, gating and billing are the same as POST /chat.
+    """
+    started = time.monotonic()
+    
+    # SECURITY: Get tenant_id and user_id from auth context
+    await resolve_chat_identity(chat_request, request)
+    conversation_id = chat_request.conversation_id or f"conv_{uuid.uuid4().hex[:12]}"
+    
+    # Until the StreamingResponse exists, any failure (quota lookup, retrieval, admission)
+    # must give back the quota admission: the stream's own cleanup never runs.
+    quota_held = False
+    ticket = None
+    try:
+        # Quota is checked before the stream starts so it can still fail with a status code.
+        # The session is closed here so no pooled connection is held for the whole stream.
+        with session_scope() as db:
+            quota_held = check_chat_quota(db, chat_request.tenant_id)
+            plan_name = get_tenant_plan_name(db, chat_request.tenant_id)
+        
+        retrieval_service = get_retrieval_service()
+        results, confidence, has_relevant = retrieval_service.retrieve(
+            query=chat_request.question,
+            tenant_id=chat_request.tenant_id,  # CRITICAL: Multi-tenant isolation
+            kb_id=chat_request.kb_id,
+            user_id=chat_request.user_id
+        )
+        context, citations_info = retrieval_service.get_context_for_llm(results, query=chat_request.question)
+        cache_scope = kb_scope(
+            chat_request.tenant_id,
+            chat_request.kb_id,
+            get_doc_store().get_kb_version(chat_request.tenant_id, chat_request.kb_id)
+        )
+        logger.info(f"Streaming chat: {len(results)} results, confidence={confidence:.3f}, citations: {len(citations_info)}")
+        
+        # Admission happens before the stream starts so shedding can still use a status code
+        ticket = await admit_chat(chat_request.tenant_id, plan_name)
+        
+        def release_admission():
+            """Free the LLM slot and give back the quota admission if nothing was billed (idempotent)."""
+            nonlocal quota_held
+            if ticket is not None:
+                ticket.release()
+            if quota_held:
+                quota_held = False
+                release_chat_quota(chat_request.tenant_id)
+        
+        def sse(event: str, data: dict) -> str:
+            return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        
+        def event_stream():
+            nonlocal quota_held
+            first_token_seen = False
+            outcome = "error"
+            try:
+                yield sse("citations", {
+                    "conversation_id": conversation_id,
+                    "confidence": confidence,
+                    "citations": citations_info
+                })
+                CHAT_STREAM_TTFB.labels(event="citations").observe(time.monotonic() - started)
+                
+                answer_service = get_answer_service()
+                for event, payload in answer_service.stream_answer(
+                    question=chat_request.question,
+                    context=context,
+                    citations_info=citations_info,
+                    confidence=confidence,
+                    has_relevant_results=has_relevant,
+                    cache_scope=cache_scope
+                ):
+                    if event == "token":
+                        if not first_token_seen:
+                            first_token_seen = True
+                            CHAT_STREAM_TTFB.labels(event="token").observe(time.monotonic() - started)
+                        yield sse("token", {"text": payload})
+                        continue
+                    
+                    # Final result: bill first, then tell the client
+                    answer_result = payload
+                    with session_scope() as db:
+                        track_chat_usage(db, chat_request, answer_result.get("usage"))
+                    if answer_result.get("usage"):
+                        quota_held = False
+                    
+                    metadata = {
+                        "chunks_retrieved": len(results),
+                        "kb_id": chat_request.kb_id
+                    }
+                    for key in ("refused", "refusal_reason", "verifier_passed"):
+                        if key in answer_result:
+                            metadata[key] = answer_result[key]
+                    
+                    response = ChatResponse(
+                        success=True,
+                        answer=answer_result["answer"],
+                        citations=answer_result["citations"],
+                        confidence=answer_result["confidence"],
+                        from_knowledge_base=answer_result["from_knowledge_base"],
+                        escalation_suggested=answer_result["escalation_suggested"],
+                        conversation_id=conversation_id,
+                        metadata=metadata
+                    )
+                    final = response.model_dump(mode="json")
+                    final["refused"] = answer_result.get("refused", False)
+                    final["retract"] = answer_result.get("retract", False)
+                    final["verifier_passed"] = answer_result.get("verifier_passed")
+                    final["usage"] = answer_result.get("usage")
+                    yield sse("final", final)
+                    
+                    if final["retract"]:
+                        outcome = "retracted"
+                    elif final["refused"]:
+                        outcome = "refused"
+                    else:
+                        outcome = "answered"
+            except Exception as e:
+                logger.error(f"Streaming chat error: {e}", exc_info=True)
+                error_type = "configuration" if "api key" in str(e).lower() else type(e).__name__
+                yield sse("error", {"error": str(e), "error_type": error_type, "conversation_id": conversation_id})
+            finally:
+                release_admission()
+                CHAT_STREAM_OUTCOMES.labels(outcome=outcome).inc()
+                CHAT_STREAM_DURATION.observe(time.monotonic() - started)
+        
+        return StreamingResponse(
+            event_stream(),
+            media_type="text/event-stream",
+            headers={
+                "Cache-Control": "no-cache",
+                "X-Accel-Buffering": "no"  # Don't let reverse proxies buffer the stream
+            },
+            background=BackgroundTask(release_admission)  # Frees the slot and quota if the client left before the stream started
+        )
+    except BaseException:
+        if ticket is not None:
+            ticket.release()
+        if quota_held:
+            release_chat_quota(chat_request.tenant_id)
+        raise
+
+
 # ============== Utility Endpoints ==============
 
 @app.get("/kb/search")
@@ -761,7 +1209,8 @@ async def get_usage(
     range: str = "month",  # "day" or "month"
     year: Optional[int] = None,
     month: Optional[int] = None,
-    day: Optional[int] = None
+    day: Optional[int] = None,
+    db: Session = Depends(get_db)
 ):
     """
     Get usage statistics for the current tenant.
@@ -779,8 +1228,6 @@ async def get_usage(
     if not tenant_id:
         raise HTTPException(status_code=403, detail="tenant_id required")
     
-    db = next(get_db())
-    
     try:
         from app.db.models import UsageDaily, UsageMonthly
         from datetime import datetime
@@ -864,8 +1311,62 @@ async def get_usage(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/billing/usage/series", response_model=UsageSeriesResponse)
+async def get_usage_series(
+    request: Request,
+    response: Response,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Get daily usage for a date range in one call (days without usage are zero).
+    
+    Responses carry an ETag that changes whenever the range's aggregates do;
+    send it back as If-None-Match to get 304 Not Modified.
+    
+    Args:
+        start: First day (optional, defaults to 29 days before end)
+        end: Last day, inclusive (optional, defaults to today)
+    """
+    from app.billing.reports import get_usage_series as build_usage_series, usage_series_etag
+    
+    # Get tenant from auth
+    auth_context = await get_auth_context(request)
+    tenant_id = auth_context.get("tenant_id")
+    
+    if not tenant_id:
+        raise HTTPException(status_code=403, detail="tenant_id required")
+    
+    end = end or datetime.utcnow().date()
+    start = start or end - timedelta(days=29)
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    if (end - start).days + 1 > settings.USAGE_SERIES_MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"Range is limited to {settings.USAGE_SERIES_MAX_DAYS} days")
+    
+    try:
+        series = build_usage_series(db, tenant_id, start, end)
+    except Exception as e:
+        logger.error(f"Error getting usage series: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+    
+    headers = {
+        "ETag": usage_series_etag(tenant_id, start, end, series["last_updated"]),
+        "Cache-Control": f"private, max-age={settings.USAGE_SERIES_MAX_AGE_SECONDS}",
+        "Vary": "X-Tenant-Id, Authorization"
+    }
+    # Weak comparison (RFC 9110): a tag matches with or without its W/ prefix
+    if_none_match = request.headers.get("if-none-match", "")
+    client_tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    if headers["ETag"].removeprefix("W/") in client_tags or "*" in client_tags:
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return UsageSeriesResponse(**series)
+
+
 @app.get("/billing/limits", response_model=PlanLimitsResponse)
-async def get_limits(request: Request):
+async def get_limits(request: Request, db: Session = Depends(get_db)):
     """Get current plan limits and usage for the tenant."""
     # Get tenant from auth
     auth_context = await get_auth_context(request)
@@ -874,20 +1375,15 @@ async def get_limits(request: Request):
     if not tenant_id:
         raise HTTPException(status_code=403, detail="tenant_id required")
     
-    db = next(get_db())
-    
     try:
-        from app.billing.quota import get_tenant_plan, get_monthly_usage
+        from app.billing.quota import get_monthly_usage
+        from app.billing.tenant_cache import get_tenant_cache
         from datetime import datetime
         
-        plan = get_tenant_plan(db, tenant_id)
-        if not plan:
-            # Default to starter
-            plan_name = "starter"
-            monthly_limit = 500
-        else:
-            plan_name = plan.plan_name
-            monthly_limit = plan.monthly_chat_limit
+        # Cached plan metadata (unknown tenants are created on the starter plan)
+        tenant = get_tenant_cache().get(db, tenant_id)
+        plan_name = tenant.plan_name
+        monthly_limit = tenant.monthly_chat_limit
         
         # Get current month usage
         now = datetime.utcnow()
@@ -909,7 +1405,7 @@ async def get_limits(request: Request):
 
 
 @app.post("/billing/plan")
-async def set_plan(request_body: SetPlanRequest, http_request: Request):
+async def set_plan(request_body: SetPlanRequest, http_request: Request, db: Session = Depends(get_db)):
     """
     Set tenant's subscription plan (admin only in production).
     
@@ -926,12 +1422,13 @@ async def set_plan(request_body: SetPlanRequest, http_request: Request):
         if auth_tenant_id != request_body.tenant_id:
             raise HTTPException(status_code=403, detail="Cannot set plan for other tenants")
     
-    db = next(get_db())
-    
     try:
         from app.billing.quota import set_tenant_plan
         
         plan = set_tenant_plan(db, request_body.tenant_id, request_body.plan_name)
+        quota_service = get_quota_service()
+        if quota_service is not None:
+            quota_service.invalidate(request_body.tenant_id)
         
         return {
             "success": True,
@@ -951,7 +1448,8 @@ async def get_cost_report(
     request: Request,
     range: str = "month",
     year: Optional[int] = None,
-    month: Optional[int] = None
+    month: Optional[int] = None,
+    db: Session = Depends(get_db)
 ):
     """Get cost report with breakdown by provider and model."""
     # Get tenant from auth
@@ -961,78 +1459,73 @@ async def get_cost_report(
     if not tenant_id:
         raise HTTPException(status_code=403, detail="tenant_id required")
     
-    db = next(get_db())
-    
     try:
-        from app.db.models import UsageEvent
-        from datetime import datetime
-        from sqlalchemy import func, and_
-        
-        now = datetime.utcnow()
-        target_year = year or now.year
-        target_month = month or now.month
+        from app.billing.reports import get_cost_report as build_cost_report
         
-        # Query usage events for the period
-        if range == "month":
-            query = db.query(UsageEvent).filter(
-                and_(
-                    UsageEvent.tenant_id == tenant_id,
-                    func.extract('year', UsageEvent.request_timestamp) == target_year,
-                    func.extract('month', UsageEvent.request_timestamp) == target_month
-                )
-            )
-        else:  # all time
-            query = db.query(UsageEvent).filter(UsageEvent.tenant_id == tenant_id)
-        
-        events = query.all()
-        
-        # Calculate totals
-        total_cost = sum(e.estimated_cost_usd for e in events)
-        total_requests = len(events)
-        total_tokens = sum(e.total_tokens for e in events)
-        
-        # Breakdown by provider
-        breakdown_by_provider = {}
-        for event in events:
-            provider = event.provider
-            if provider not in breakdown_by_provider:
-                breakdown_by_provider[provider] = {
-                    "requests": 0,
-                    "tokens": 0,
-                    "cost_usd": 0.0
-                }
-            breakdown_by_provider[provider]["requests"] += 1
-            breakdown_by_provider[provider]["tokens"] += event.total_tokens
-            breakdown_by_provider[provider]["cost_usd"] += event.estimated_cost_usd
-        
-        # Breakdown by model
-        breakdown_by_model = {}
-        for event in events:
-            model = event.model
-            if model not in breakdown_by_model:
-                breakdown_by_model[model] = {
-                    "requests": 0,
-                    "tokens": 0,
-                    "cost_usd": 0.0
-                }
-            breakdown_by_model[model]["requests"] += 1
-            breakdown_by_model[model]["tokens"] += event.total_tokens
-            breakdown_by_model[model]["cost_usd"] += event.estimated_cost_usd
-        
-        return CostReportResponse(
-            tenant_id=tenant_id,
-            period=range,
-            total_cost_usd=total_cost,
-            total_requests=total_requests,
-            total_tokens=total_tokens,
-            breakdown_by_provider=breakdown_by_provider,
-            breakdown_by_model=breakdown_by_model
-        )
+        return CostReportResponse(**build_cost_report(db, tenant_id, range, year, month))
     except Exception as e:
         logger.error(f"Error getting cost report: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.get("/billing/export")
+async def export_usage(
+    request: Request,
+    start: Optional[date] = None,
+    end: Optional[date] = None,
+    format: str = "csv",  # "csv" or "ndjson"
+    after_id: int = 0,
+    limit: Optional[int] = None
+):
+    """
+    Stream the tenant's raw usage events as CSV or NDJSON.
+    
+    Rows are ordered by id. To resume an interrupted export (or fetch the next
+    page when using limit), pass the last received id as after_id. The body is
+    gzip-compressed when the client sends Accept-Encoding: gzip.
+    
+    Args:
+        start: First day (optional, defaults to the first of the current month)
+        end: Last day, inclusive (optional, defaults to today)
+        format: "csv" or "ndjson"
+        after_id: Only events with a greater id
+        limit: Maximum number of events (optional)
+    """
+    from app.billing.export import EXPORT_FORMATS, export_usage_events, gzip_chunks
+    
+    # Get tenant from auth
+    auth_context = await get_auth_context(request)
+    tenant_id = auth_context.get("tenant_id")
+    
+    if not tenant_id:
+        raise HTTPException(status_code=403, detail="tenant_id required")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of: {', '.join(EXPORT_FORMATS)}")
+    
+    today = datetime.utcnow().date()
+    start = start or today.replace(day=1)
+    end = end or today
+    if end < start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+    if limit is not None and limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    range_start = datetime.combine(start, datetime.min.time())
+    range_end = datetime.combine(end + timedelta(days=1), datetime.min.time())
+    
+    def stream():
+        # Own session: it has to live as long as the response body, not the endpoint call
+        with session_scope() as db:
+            yield from export_usage_events(db, tenant_id, range_start, range_end, format, after_id, limit)
+    
+    headers = {"Content-Disposition": f'attachment; filename="usage_{start}_{end}.{format}"'}
+    body = stream()
+    if "gzip" in request.headers.get("accept-encoding", ""):
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+        headers["Vary"] = "Accept-Encoding"
+    return StreamingResponse(body, media_type=EXPORT_FORMATS[format], headers=headers)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
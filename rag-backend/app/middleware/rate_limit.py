@@ -14,7 +14,8 @@ logger = logging.getLogger(__name__)
 # Initialize limiter with default limits (can be overridden per endpoint)
 limiter = Limiter(
     key_func=get_remote_address,
-    default_limits=["1000/hour"] if settings.RATE_LIMIT_ENABLED else []
+    default_limits=["1000/hour"] if settings.RATE_LIMIT_ENABLED else [],
+    enabled=settings.RATE_LIMIT_ENABLED  # Also switches off per-endpoint limits (e.g. for load tests)
 )
 
 
@@ -3,7 +3,7 @@ Pydantic schemas for billing endpoints.
 """
 from pydantic import BaseModel
 from typing import Optional, List
-from datetime import datetime
+from datetime import date, datetime
 
 
 class UsageResponse(BaseModel):
@@ -19,6 +19,30 @@ class UsageResponse(BaseModel):
     end_date: datetime
 
 
+class UsageSeriesPoint(BaseModel):
+    """One day of a usage series (zero-filled if there was no usage)."""
+    date: date
+    total_requests: int = 0
+    total_tokens: int = 0
+    total_cost_usd: float = 0.0
+    gemini_requests: int = 0
+    openai_requests: int = 0
+
+
+class UsageSeriesResponse(BaseModel):
+    """Daily usage over a date range."""
+    tenant_id: str
+    start_date: date
+    end_date: date  # Inclusive
+    total_requests: int
+    total_tokens: int
+    total_cost_usd: float
+    gemini_requests: int = 0
+    openai_requests: int = 0
+    last_updated: Optional[datetime] = None  # Latest aggregate update in the range (the ETag source)
+    points: List[UsageSeriesPoint]
+
+
 class PlanLimitsResponse(BaseModel):
     """Current plan limits response."""
     tenant_id: str
@@ -37,6 +61,7 @@ class CostReportResponse(BaseModel):
     total_tokens: int
     breakdown_by_provider: dict
     breakdown_by_model: dict
+    breakdown_by_tier: dict = {}  # "fast" / "large" / "default" with avg cost and latency
 
 
 class SetPlanRequest(BaseModel):
@@ -90,6 +90,7 @@ class RetrievalResult(BaseModel):
     content: str
     metadata: Dict[str, Any]
     similarity_score: float
+    embedding: Optional[List[float]] = Field(default=None, exclude=True)  # For MMR diversity selection
 
 
 class KnowledgeBaseStats(BaseModel):
@@ -100,6 +101,8 @@ class KnowledgeBaseStats(BaseModel):
     total_documents: int
     total_chunks: int
     file_names: List[str]
+    duplicate_chunks: int = 0  # Near-duplicate chunks detected at ingestion
+    dedup_ratio: float = 0.0  # duplicate_chunks / chunks checked by the dedup index
     last_updated: Optional[datetime] = None
 
 
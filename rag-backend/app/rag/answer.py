@@ -3,21 +3,28 @@ Answer generation using LLM with RAG context.
 Supports Gemini and OpenAI as providers.
 """
 import google.generativeai as genai
-from openai import OpenAI
-from typing import Optional, Dict, Any, List
+from openai import AsyncOpenAI, OpenAI
+from typing import Optional, Dict, Any, List, Iterator, Iterable, Tuple, Union
+import asyncio
 import logging
 import os
 import re
+import threading
+import time
 
 from app.config import settings
 from app.rag.prompts import (
     format_rag_prompt,
     format_draft_prompt,
+    format_structured_prompt,
     get_no_context_response,
     get_low_confidence_response
 )
 from app.rag.verifier import get_verifier_service
+from app.rag.structured import check_structured_answer, parse_structured_answer
+from app.rag.providers import get_async_http_client, get_http_client
 from app.rag.intent import detect_intents
+from app.rag.model_router import get_model_router, model_for_tier, tier_kwargs
 from app.models.schemas import Citation
 from abc import ABC, abstractmethod
 
@@ -25,24 +32,100 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+def provider_kwargs(tier: Optional[str] = None, json_mode: bool = False) -> Dict[str, Any]:
+    """Optional provider-call keywords, passed only when set (so minimal providers needn't accept them)."""
+    kwargs: Dict[str, Any] = dict(tier_kwargs(tier))
+    if json_mode:
+        kwargs["json_mode"] = True
+    return kwargs
+
+
+class LLMStream:
+    """
+    Iterator over answer text deltas from a streaming LLM call.
+    `text` accumulates the deltas; `usage` (same keys as generate_with_usage)
+    is filled in once the stream has been consumed.
+    """
+    
+    def __init__(self, items: Iterable[Union[str, dict]]):
+        """
+        Args:
+            items: Provider generator yielding text deltas, then one usage dict
+        """
+        self._items = items
+        self.text = ""
+        self.usage: Dict[str, Any] = {}
+    
+    def __iter__(self) -> Iterator[str]:
+        for item in self._items:
+            if isinstance(item, dict):
+                self.usage = item
+                continue
+            if item:
+                self.text += item
+                yield item
+
+
 class LLMProvider(ABC):
     """Base class for LLM providers."""
     
     @abstractmethod
-    def generate(self, system_prompt: str, user_prompt: str) -> str:
+    def generate(self, system_prompt: str, user_prompt: str, tier: Optional[str] = None) -> str:
         """Generate response from prompts."""
         raise NotImplementedError
     
     @abstractmethod
-    def generate_with_usage(self, system_prompt: str, user_prompt: str) -> tuple[str, dict]:
+    def generate_with_usage(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        tier: Optional[str] = None,
+        json_mode: bool = False
+    ) -> tuple[str, dict]:
         """
         Generate response and return usage information.
         
+        Args:
+            system_prompt: System prompt
+            user_prompt: User prompt
+            tier: Model tier ("fast"/"large"); None uses the provider's configured model
+            json_mode: Ask the provider for a JSON object response (structured answers)
+        
         Returns:
             (response_text, usage_info)
             usage_info: dict with keys: prompt_tokens, completion_tokens, total_tokens, model_used
         """
         raise NotImplementedError
+    
+    async def agenerate_with_usage(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        tier: Optional[str] = None,
+        json_mode: bool = False
+    ) -> tuple[str, dict]:
+        """
+        Async variant of generate_with_usage.
+        Providers without an async client run the sync call in a worker thread.
+        """
+        return await asyncio.to_thread(
+            self.generate_with_usage, system_prompt, user_prompt, **provider_kwargs(tier, json_mode)
+        )
+    
+    async def agenerate(self, system_prompt: str, user_prompt: str, tier: Optional[str] = None) -> str:
+        """Async variant of generate (runs the sync call in a worker thread by default)."""
+        return await asyncio.to_thread(self.generate, system_prompt, user_prompt, **tier_kwargs(tier))
+    
+    def stream_with_usage(self, system_prompt: str, user_prompt: str, tier: Optional[str] = None) -> LLMStream:
+        """
+        Stream the response as text deltas; usage is available on the stream afterwards.
+        Providers without a streaming API return the whole answer as a single delta.
+        """
+        def items():
+            text, usage_info = self.generate_with_usage(system_prompt, user_prompt, **tier_kwargs(tier))
+            yield text
+            yield usage_info
+        return LLMStream(items())
 
 
 class GeminiProvider(LLMProvider):
@@ -58,36 +141,48 @@ class GeminiProvider(LLMProvider):
         
         genai.configure(api_key=self.api_key)
         
-        # Don't initialize client here - do it lazily in generate() to handle errors better
-        self._client = None
+        # GenerativeModel objects are created lazily and reused (they keep their transport channel)
+        self._models: Dict[str, Any] = {}
+        self._models_lock = threading.Lock()
+        self._available_models: Optional[List[str]] = None
+        self._available_models_at = 0.0
         logger.info(f"Gemini provider initialized (will use model: {self.model})")
     
-    def generate(self, system_prompt: str, user_prompt: str) -> str:
+    def generate(self, system_prompt: str, user_prompt: str, tier: Optional[str] = None) -> str:
         """Generate response using Gemini."""
-        text, _ = self.generate_with_usage(system_prompt, user_prompt)
+        text, _ = self.generate_with_usage(system_prompt, user_prompt, tier=tier)
         return text
     
-    def generate_with_usage(self, system_prompt: str, user_prompt: str) -> tuple[str, dict]:
-        """Generate response using Gemini and return usage info."""
-        # Combine system and user prompts for Gemini
-        full_prompt = f"{system_prompt}\n\n{user_prompt}"
-        
-        # Estimate prompt tokens (rough: 1 token ≈ 4 chars)
-        prompt_tokens = len(full_prompt) // 4
+    def _get_model(self, model_name: str):
+        """Get the cached GenerativeModel for a model name."""
+        with self._models_lock:
+            if model_name not in self._models:
+                self._models[model_name] = genai.GenerativeModel(model_name)
+            return self._models[model_name]
+    
+    def _list_available_models(self) -> List[str]:
+        """Model names supporting generateContent, cached for GEMINI_MODEL_LIST_TTL seconds."""
+        now = time.monotonic()
+        if self._available_models is not None and now - self._available_models_at < settings.GEMINI_MODEL_LIST_TTL:
+            return self._available_models
         
+        available_models = genai.list_models()
+        model_names = [m.name for m in available_models if 'generateContent' in m.supported_generation_methods]
+        # Extract just the model name (remove 'models/' prefix if present)
+        self._available_models = [name.split('/')[-1] if '/' in name else name for name in model_names]
+        self._available_models_at = now
+        logger.info(f"Found {len(model_names)} available models, will try: {self._available_models[:3]}")
+        return self._available_models
+    
+    def _models_to_try(self, tier: Optional[str] = None) -> List[str]:
+        """Configured (or tier) model first, then available models, then common fallbacks."""
         # Try to list available models first, then use the first available one
         # If that fails, try common model names
         models_to_try = []
         
         # First, try to get available models
         try:
-            available_models = genai.list_models()
-            model_names = [m.name for m in available_models if 'generateContent' in m.supported_generation_methods]
-            if model_names:
-                # Extract just the model name (remove 'models/' prefix if present)
-                clean_names = [name.split('/')[-1] if '/' in name else name for name in model_names]
-                models_to_try.extend(clean_names[:3])  # Use first 3 available models
-                logger.info(f"Found {len(model_names)} available models, will try: {clean_names[:3]}")
+            models_to_try.extend(self._list_available_models()[:3])  # Use first 3 available models
         except Exception as e:
             logger.warning(f"Could not list available models: {e}, using fallback list")
         
@@ -95,57 +190,53 @@ class GeminiProvider(LLMProvider):
         if not models_to_try:
             models_to_try = ["gemini-pro", "gemini-1.0-pro", "models/gemini-pro"]
         
-        # Add configured model if different
-        if self.model and self.model not in models_to_try:
-            models_to_try.insert(0, self.model)
+        # Configured model (for the requested tier) goes first
+        primary = model_for_tier("gemini", tier, self.model)
+        if primary:
+            models_to_try = [primary] + [m for m in models_to_try if m != primary]
         
         # Remove duplicates while preserving order
         seen = set()
         models_to_try = [m for m in models_to_try if not (m in seen or seen.add(m))]
         
+        return models_to_try
+    
+    def generate_with_usage(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        tier: Optional[str] = None,
+        json_mode: bool = False
+    ) -> tuple[str, dict]:
+        """Generate response using Gemini and return usage info."""
+        # Combine system and user prompts for Gemini
+        full_prompt = f"{system_prompt}\n\n{user_prompt}"
+        
+        # Estimate prompt tokens (rough: 1 token ≈ 4 chars)
+        prompt_tokens = len(full_prompt) // 4
+        
+        models_to_try = self._models_to_try(tier)
+        
         last_error = None
         for model_name in models_to_try:
             try:
                 logger.info(f"Attempting to generate with model: {model_name}")
-                # Create a new client for this model
-                client = genai.GenerativeModel(model_name)
-                response = client.generate_content(
+                response = self._get_model(model_name).generate_content(
                     full_prompt,
-                    generation_config=genai.types.GenerationConfig(
-                        temperature=settings.TEMPERATURE,
-                        max_output_tokens=1024,
-                    )
+                    generation_config=self._generation_config(json_mode)
                 )
                 
                 # Extract response text
                 response_text = response.text
+                usage_info = self._usage_info(model_name, prompt_tokens, response_text, response)
                 
-                # Try to get usage info from response
-                usage_info = {
-                    "prompt_tokens": prompt_tokens,
-                    "completion_tokens": len(response_text) // 4,  # Estimate
-                    "total_tokens": prompt_tokens + (len(response_text) // 4),
-                    "model_used": model_name.split('/')[-1] if '/' in model_name else model_name
-                }
-                
-                # Try to get actual usage from response if available
-                if hasattr(response, 'usage_metadata'):
-                    usage_metadata = response.usage_metadata
-                    if hasattr(usage_metadata, 'prompt_token_count'):
-                        usage_info["prompt_tokens"] = usage_metadata.prompt_token_count
-                    if hasattr(usage_metadata, 'candidates_token_count'):
-                        usage_info["completion_tokens"] = usage_metadata.candidates_token_count
-                    if hasattr(usage_metadata, 'total_token_count'):
-                        usage_info["total_tokens"] = usage_metadata.total_token_count
-                
-                if model_name != self.model:
+                if model_name != models_to_try[0]:
                     logger.info(f"✅ Successfully used model: {model_name}")
                 
                 return response_text, usage_info
             except Exception as e:
-                error_str = str(e).lower()
                 last_error = e
-                if "not found" in error_str or "not supported" in error_str or "404" in error_str:
+                if self._is_model_unavailable(e):
                     logger.warning(f"Model {model_name} failed: {e}")
                     continue  # Try next model
                 else:
@@ -157,6 +248,129 @@ class GeminiProvider(LLMProvider):
         error_msg = f"All Gemini model attempts failed. Last error: {last_error}. Please check your GEMINI_API_KEY and ensure it has access to Gemini models."
         logger.error(error_msg)
         raise Exception(error_msg)
+    
+    async def agenerate(self, system_prompt: str, user_prompt: str, tier: Optional[str] = None) -> str:
+        """Generate response with Gemini's async API."""
+        text, _ = await self.agenerate_with_usage(system_prompt, user_prompt, tier=tier)
+        return text
+    
+    async def agenerate_with_usage(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        tier: Optional[str] = None,
+        json_mode: bool = False
+    ) -> tuple[str, dict]:
+        """Generate response with Gemini's async API (same model fallback as generate_with_usage)."""
+        full_prompt = f"{system_prompt}\n\n{user_prompt}"
+        prompt_tokens = len(full_prompt) // 4
+        
+        # Model listing is cached, so this rarely touches the network
+        models_to_try = await asyncio.to_thread(self._models_to_try, tier)
+        
+        last_error = None
+        for model_name in models_to_try:
+            try:
+                response = await self._get_model(model_name).generate_content_async(
+                    full_prompt,
+                    generation_config=self._generation_config(json_mode)
+                )
+                response_text = response.text
+                return response_text, self._usage_info(model_name, prompt_tokens, response_text, response)
+            except Exception as e:
+                last_error = e
+                if self._is_model_unavailable(e):
+                    logger.warning(f"Model {model_name} failed: {e}")
+                    continue
+                logger.error(f"Gemini generation error with {model_name}: {e}")
+                raise
+        
+        error_msg = f"All Gemini model attempts failed. Last error: {last_error}. Please check your GEMINI_API_KEY and ensure it has access to Gemini models."
+        logger.error(error_msg)
+        raise Exception(error_msg)
+    
+    @staticmethod
+    def _generation_config(json_mode: bool = False):
+        if json_mode:
+            return genai.types.GenerationConfig(
+                temperature=settings.TEMPERATURE,
+                max_output_tokens=1024,
+                response_mime_type="application/json",
+            )
+        return genai.types.GenerationConfig(
+            temperature=settings.TEMPERATURE,
+            max_output_tokens=1024,
+        )
+    
+    @staticmethod
+    def _is_model_unavailable(error: Exception) -> bool:
+        """Whether an error means the model doesn't exist for this key (so the next one may be tried)."""
+        error_str = str(error).lower()
+        return "not found" in error_str or "not supported" in error_str or "404" in error_str
+    
+    @staticmethod
+    def _usage_info(model_name: str, prompt_tokens: int, response_text: str, response: Any) -> Dict[str, Any]:
+        """Build usage info, preferring the response's usage_metadata over estimates."""
+        usage_info = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(response_text) // 4,  # Estimate
+            "total_tokens": prompt_tokens + (len(response_text) // 4),
+            "model_used": model_name.split('/')[-1] if '/' in model_name else model_name
+        }
+        
+        # Try to get actual usage from response if available
+        usage_metadata = getattr(response, 'usage_metadata', None)
+        if usage_metadata is not None:
+            if getattr(usage_metadata, 'prompt_token_count', None):
+                usage_info["prompt_tokens"] = usage_metadata.prompt_token_count
+            if getattr(usage_metadata, 'candidates_token_count', None):
+                usage_info["completion_tokens"] = usage_metadata.candidates_token_count
+            if getattr(usage_metadata, 'total_token_count', None):
+                usage_info["total_tokens"] = usage_metadata.total_token_count
+        
+        return usage_info
+    
+    def stream_with_usage(self, system_prompt: str, user_prompt: str, tier: Optional[str] = None) -> LLMStream:
+        """Stream response deltas from Gemini; usage is read from the final response."""
+        full_prompt = f"{system_prompt}\n\n{user_prompt}"
+        prompt_tokens = len(full_prompt) // 4
+        
+        def items():
+            last_error = None
+            for model_name in self._models_to_try(tier):
+                started = False
+                try:
+                    response = self._get_model(model_name).generate_content(
+                        full_prompt,
+                        generation_config=self._generation_config(),
+                        stream=True
+                    )
+                    text = ""
+                    for chunk in response:
+                        try:
+                            delta = chunk.text
+                        except ValueError:
+                            continue  # Chunk without text parts (e.g. finish/safety metadata)
+                        started = True
+                        text += delta
+                        yield delta
+                    
+                    yield self._usage_info(model_name, prompt_tokens, text, response)
+                    return
+                except Exception as e:
+                    last_error = e
+                    # Only fall back to another model before anything was streamed
+                    if not started and self._is_model_unavailable(e):
+                        logger.warning(f"Model {model_name} failed: {e}")
+                        continue
+                    logger.error(f"Gemini streaming error with {model_name}: {e}")
+                    raise
+            
+            error_msg = f"All Gemini model attempts failed. Last error: {last_error}. Please check your GEMINI_API_KEY and ensure it has access to Gemini models."
+            logger.error(error_msg)
+            raise Exception(error_msg)
+        
+        return LLMStream(items())
 
 
 class OpenAIProvider(LLMProvider):
@@ -169,41 +383,126 @@ class OpenAIProvider(LLMProvider):
         if not self.api_key:
             raise ValueError("OpenAI API key not configured. Set OPENAI_API_KEY environment variable.")
         
-        self.client = OpenAI(api_key=self.api_key)
+        # Both clients ride on the process-wide connection pools (keep-alive, HTTP/2 when available)
+        self.client = OpenAI(api_key=self.api_key, http_client=get_http_client())
+        self.async_client = AsyncOpenAI(api_key=self.api_key, http_client=get_async_http_client())
         logger.info(f"OpenAI provider initialized with model: {model}")
     
-    def generate(self, system_prompt: str, user_prompt: str) -> str:
+    def generate(self, system_prompt: str, user_prompt: str, tier: Optional[str] = None) -> str:
         """Generate response using OpenAI."""
-        text, _ = self.generate_with_usage(system_prompt, user_prompt)
+        text, _ = self.generate_with_usage(system_prompt, user_prompt, tier=tier)
         return text
     
-    def generate_with_usage(self, system_prompt: str, user_prompt: str) -> tuple[str, dict]:
+    def generate_with_usage(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        tier: Optional[str] = None,
+        json_mode: bool = False
+    ) -> tuple[str, dict]:
         """Generate response using OpenAI and return usage info."""
+        model = model_for_tier("openai", tier, self.model)
         try:
             response = self.client.chat.completions.create(
-                model=self.model,
+                model=model,
                 messages=[
                     {"role": "system", "content": system_prompt},
                     {"role": "user", "content": user_prompt}
                 ],
                 temperature=settings.TEMPERATURE,
-                max_tokens=1024
+                max_tokens=1024,
+                **self._response_format(json_mode)
             )
-            
-            response_text = response.choices[0].message.content
-            
-            # Extract usage info from OpenAI response
-            usage_info = {
-                "prompt_tokens": response.usage.prompt_tokens,
-                "completion_tokens": response.usage.completion_tokens,
-                "total_tokens": response.usage.total_tokens,
-                "model_used": self.model
-            }
-            
-            return response_text, usage_info
+            return self._parse_response(response, model)
+        except Exception as e:
+            logger.error(f"OpenAI generation error: {e}")
+            raise
+    
+    async def agenerate(self, system_prompt: str, user_prompt: str, tier: Optional[str] = None) -> str:
+        """Generate response with the async OpenAI client."""
+        text, _ = await self.agenerate_with_usage(system_prompt, user_prompt, tier=tier)
+        return text
+    
+    async def agenerate_with_usage(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        tier: Optional[str] = None,
+        json_mode: bool = False
+    ) -> tuple[str, dict]:
+        """Generate response with the async OpenAI client and return usage info."""
+        model = model_for_tier("openai", tier, self.model)
+        try:
+            response = await self.async_client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt}
+                ],
+                temperature=settings.TEMPERATURE,
+                max_tokens=1024,
+                **self._response_format(json_mode)
+            )
+            return self._parse_response(response, model)
         except Exception as e:
             logger.error(f"OpenAI generation error: {e}")
             raise
+    
+    @staticmethod
+    def _response_format(json_mode: bool) -> Dict[str, Any]:
+        """JSON mode request argument (the prompt must mention JSON, ours do)."""
+        return {"response_format": {"type": "json_object"}} if json_mode else {}
+    
+    def _parse_response(self, response: Any, model: str) -> tuple[str, dict]:
+        response_text = response.choices[0].message.content
+        
+        # Extract usage info from OpenAI response
+        usage_info = {
+            "prompt_tokens": response.usage.prompt_tokens,
+            "completion_tokens": response.usage.completion_tokens,
+            "total_tokens": response.usage.total_tokens,
+            "model_used": model
+        }
+        
+        return response_text, usage_info
+    
+    def stream_with_usage(self, system_prompt: str, user_prompt: str, tier: Optional[str] = None) -> LLMStream:
+        """Stream response deltas from OpenAI; usage arrives in the last chunk."""
+        model = model_for_tier("openai", tier, self.model)
+        
+        def items():
+            try:
+                response = self.client.chat.completions.create(
+                    model=model,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    temperature=settings.TEMPERATURE,
+                    max_tokens=1024,
+                    stream=True,
+                    stream_options={"include_usage": True}
+                )
+                
+                usage_info = {
+                    "prompt_tokens": 0,
+                    "completion_tokens": 0,
+                    "total_tokens": 0,
+                    "model_used": model
+                }
+                for chunk in response:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+                    if getattr(chunk, "usage", None):
+                        usage_info["prompt_tokens"] = chunk.usage.prompt_tokens
+                        usage_info["completion_tokens"] = chunk.usage.completion_tokens
+                        usage_info["total_tokens"] = chunk.usage.total_tokens
+                yield usage_info
+            except Exception as e:
+                logger.error(f"OpenAI streaming error: {e}")
+                raise
+        
+        return LLMStream(items())
 
 
 class AnswerService:
@@ -229,14 +528,10 @@ class AnswerService:
     
     @property
     def provider(self) -> LLMProvider:
-        """Lazy load the LLM provider."""
+        """Lazy load the LLM provider (shared with the verifier; routed when fallbacks are configured)."""
         if self._provider is None:
-            if self.provider_name == "gemini":
-                self._provider = GeminiProvider()
-            elif self.provider_name == "openai":
-                self._provider = OpenAIProvider()
-            else:
-                raise ValueError(f"Unknown LLM provider: {self.provider_name}")
+            from app.rag.routing import get_routed_provider
+            self._provider = get_routed_provider(self.provider_name)
         return self._provider
     
     def generate_answer(
@@ -246,7 +541,8 @@ class AnswerService:
         citations_info: List[Dict[str, Any]],
         confidence: float,
         has_relevant_results: bool,
-        use_verifier: bool = None  # None = use config default
+        use_verifier: bool = None,  # None = use config default
+        cache_scope: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Generate an answer based on retrieved context with mandatory verifier.
@@ -258,6 +554,7 @@ class AnswerService:
             confidence: Average confidence score from retrieval
             has_relevant_results: Whether any results passed the threshold
             use_verifier: Whether to use verifier mode (None = use config default)
+            cache_scope: Verifier verdict cache scope (see verdict_cache.kb_scope)
             
         Returns:
             Dictionary with answer, citations, confidence, and metadata
@@ -266,6 +563,193 @@ class AnswerService:
         if use_verifier is None:
             use_verifier = settings.REQUIRE_VERIFIER
         
+        refusal = self._apply_gates(question, context, confidence, has_relevant_results)
+        if refusal:
+            return refusal
+        
+        # Case 3: Passed all gates - generate answer with MANDATORY verifier
+        logger.info(f"Confidence ({confidence:.3f}) passed all gates, generating answer with verifier={use_verifier}")
+        
+        try:
+            tier = self._choose_tier(question, confidence, citations_info)
+            started = time.monotonic()
+            if settings.ANSWER_MODE == "structured":
+                # Single call: answer + per-sentence quotes, checked locally instead of by a verifier call
+                system_prompt, user_prompt = format_structured_prompt(context, question)
+                raw, usage_info = self.provider.generate_with_usage(
+                    system_prompt, user_prompt, **provider_kwargs(tier, json_mode=True)
+                )
+                return self._check_structured(raw, context, citations_info, confidence, usage_info, tier, started)
+            
+            # VERIFIER MODE IS MANDATORY: Draft → Verify → Final
+            # Step 1: Generate draft answer with usage tracking
+            draft_system, draft_user = format_draft_prompt(context, question)
+            draft_answer, usage_info = self.provider.generate_with_usage(draft_system, draft_user, **tier_kwargs(tier))
+            logger.info("Generated draft answer, running verifier...")
+            
+            # Step 2 + 3: Verify draft answer (MANDATORY) and handle the result
+            return self._verify_draft(draft_answer, context, citations_info, confidence, usage_info, tier, started, cache_scope)
+        
+        except ValueError as e:
+            # Configuration errors (e.g., missing API key)
+            error_msg = str(e)
+            logger.error(f"Configuration error in answer generation: {error_msg}")
+            if "API key" in error_msg.lower():
+                raise ValueError(f"LLM API key not configured: {error_msg}")
+            raise
+        except Exception as e:
+            logger.error(f"Error generating answer: {e}", exc_info=True)
+            # Re-raise to be handled by the endpoint
+            raise
+    
+    async def agenerate_answer(
+        self,
+        question: str,
+        context: str,
+        citations_info: List[Dict[str, Any]],
+        confidence: float,
+        has_relevant_results: bool,
+        cache_scope: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Async variant of generate_answer (verifier always on).
+        Draft and verifier calls are awaited on the shared async clients, so
+        concurrent requests don't each hold a worker thread while waiting on the LLM.
+        
+        Returns:
+            Dictionary with the same keys as generate_answer
+        """
+        refusal = self._apply_gates(question, context, confidence, has_relevant_results)
+        if refusal:
+            return refusal
+        
+        logger.info(f"Confidence ({confidence:.3f}) passed all gates, generating answer with verifier=True")
+        
+        try:
+            tier = self._choose_tier(question, confidence, citations_info)
+            started = time.monotonic()
+            if settings.ANSWER_MODE == "structured":
+                system_prompt, user_prompt = format_structured_prompt(context, question)
+                raw, usage_info = await self.provider.agenerate_with_usage(
+                    system_prompt, user_prompt, **provider_kwargs(tier, json_mode=True)
+                )
+                return self._check_structured(raw, context, citations_info, confidence, usage_info, tier, started)
+            
+            draft_system, draft_user = format_draft_prompt(context, question)
+            draft_answer, usage_info = await self.provider.agenerate_with_usage(draft_system, draft_user, **tier_kwargs(tier))
+            logger.info("Generated draft answer, running verifier...")
+            
+            verification = await get_verifier_service().averify_answer(
+                draft_answer=draft_answer,
+                context=context,
+                citations_info=citations_info,
+                tier=tier,
+                cache_scope=cache_scope
+            )
+            usage_info = self._annotate_usage(usage_info, tier, started)
+            return self._result_from_verification(draft_answer, verification, citations_info, confidence, usage_info)
+        
+        except ValueError as e:
+            error_msg = str(e)
+            logger.error(f"Configuration error in answer generation: {error_msg}")
+            if "API key" in error_msg.lower():
+                raise ValueError(f"LLM API key not configured: {error_msg}")
+            raise
+        except Exception as e:
+            logger.error(f"Error generating answer: {e}", exc_info=True)
+            raise
+    
+    def stream_answer(
+        self,
+        question: str,
+        context: str,
+        citations_info: List[Dict[str, Any]],
+        confidence: float,
+        has_relevant_results: bool,
+        cache_scope: Optional[str] = None
+    ) -> Iterator[Tuple[str, Any]]:
+        """
+        Stream an answer: draft tokens as they arrive, then the verified result.
+        
+        The same gates and verifier as generate_answer apply. Tokens are shown
+        before verification, so a failed verification yields a result with
+        "retract": True whose answer replaces everything streamed so far.
+        In structured mode the JSON can't be shown as it arrives, so the checked
+        answer is yielded as a single token (never retracted).
+        
+        Args:
+            question: User's question
+            context: Retrieved context from knowledge base
+            citations_info: List of citation information
+            confidence: Average confidence score from retrieval
+            has_relevant_results: Whether any results passed the threshold
+            cache_scope: Verifier verdict cache scope (see verdict_cache.kb_scope)
+        
+        Yields:
+            ("token", text_delta) events, then exactly one ("result", answer_result)
+            with the same keys as generate_answer returns
+        """
+        refusal = self._apply_gates(question, context, confidence, has_relevant_results)
+        if refusal:
+            yield "result", refusal
+            return
+        
+        logger.info(f"Confidence ({confidence:.3f}) passed all gates, streaming draft answer")
+        tier = self._choose_tier(question, confidence, citations_info)
+        started = time.monotonic()
+        if settings.ANSWER_MODE == "structured":
+            system_prompt, user_prompt = format_structured_prompt(context, question)
+            raw, usage_info = self.provider.generate_with_usage(
+                system_prompt, user_prompt, **provider_kwargs(tier, json_mode=True)
+            )
+            result = self._check_structured(raw, context, citations_info, confidence, usage_info, tier, started)
+            result["retract"] = False
+            yield "token", result["answer"]
+            yield "result", result
+            return
+        
+        draft_system, draft_user = format_draft_prompt(context, question)
+        stream = self.provider.stream_with_usage(draft_system, draft_user, **tier_kwargs(tier))
+        for delta in stream:
+            yield "token", delta
+        logger.info("Streamed draft answer, running verifier...")
+        
+        result = self._verify_draft(stream.text, context, citations_info, confidence, stream.usage, tier, started, cache_scope)
+        result["retract"] = not result.get("verifier_passed", False)
+        yield "result", result
+    
+    def _choose_tier(
+        self,
+        question: str,
+        confidence: float,
+        citations_info: List[Dict[str, Any]]
+    ) -> Optional[str]:
+        """Model tier for this answer, or None when model routing is disabled."""
+        if not settings.MODEL_ROUTING_ENABLED:
+            return None
+        return get_model_router().classify(question, confidence, len(citations_info)).tier
+    
+    @staticmethod
+    def _annotate_usage(usage_info: Dict[str, Any], tier: Optional[str], started: float) -> Dict[str, Any]:
+        """Add the model tier and draft + verifier latency to usage info (for the cost report)."""
+        usage_info = dict(usage_info or {})
+        usage_info["model_tier"] = tier
+        usage_info["latency_ms"] = int((time.monotonic() - started) * 1000)
+        return usage_info
+    
+    def _apply_gates(
+        self,
+        question: str,
+        context: str,
+        confidence: float,
+        has_relevant_results: bool
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Run the refusal gates that come before any LLM call.
+        
+        Returns:
+            Refusal result if a gate fails, None if the question may be answered
+        """
         # GATE 1: No relevant results found - REFUSE
         if not has_relevant_results or not context:
             logger.info("No relevant context found, returning no-context response")
@@ -313,76 +797,101 @@ class AnswerService:
                     "refusal_reason": "Integration/API questions require higher confidence"
                 }
         
-        # Case 3: Passed all gates - generate answer with MANDATORY verifier
-        logger.info(f"Confidence ({confidence:.3f}) passed all gates, generating answer with verifier={use_verifier}")
-        
+        return None
+    
+    def _verify_draft(
+        self,
+        draft_answer: str,
+        context: str,
+        citations_info: List[Dict[str, Any]],
+        confidence: float,
+        usage_info: Dict[str, Any],
+        tier: Optional[str] = None,
+        started: Optional[float] = None,
+        cache_scope: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Run the verifier on a draft and build the final (or refusal) result."""
+        verifier = get_verifier_service()
+        verification = verifier.verify_answer(
+            draft_answer=draft_answer,
+            context=context,
+            citations_info=citations_info,
+            tier=tier,
+            cache_scope=cache_scope
+        )
+        usage_info = self._annotate_usage(usage_info, tier, started if started is not None else time.monotonic())
+        return self._result_from_verification(draft_answer, verification, citations_info, confidence, usage_info)
+    
+    def _check_structured(
+        self,
+        raw_response: str,
+        context: str,
+        citations_info: List[Dict[str, Any]],
+        confidence: float,
+        usage_info: Dict[str, Any],
+        tier: Optional[str],
+        started: float
+    ) -> Dict[str, Any]:
+        """Parse a structured answer, check its quotes locally and build the final (or refusal) result."""
         try:
-            # VERIFIER MODE IS MANDATORY: Draft → Verify → Final
-            # Step 1: Generate draft answer with usage tracking
-            draft_system, draft_user = format_draft_prompt(context, question)
-            draft_answer, usage_info = self.provider.generate_with_usage(draft_system, draft_user)
-            logger.info("Generated draft answer, running verifier...")
-            
-            # Step 2: Verify draft answer (MANDATORY)
-            verifier = get_verifier_service()
-            verification = verifier.verify_answer(
-                draft_answer=draft_answer,
-                context=context,
-                citations_info=citations_info
-            )
-            
-            # Step 3: Handle verification result
-            if verification["pass"]:
-                logger.info("✅ Verifier PASSED - Using draft answer")
-                citations = self._extract_citations(draft_answer, citations_info)
-                return {
-                    "answer": draft_answer,
-                    "citations": citations,
-                    "confidence": confidence,
-                    "from_knowledge_base": True,
-                    "escalation_suggested": confidence < self.HIGH_CONFIDENCE_THRESHOLD,
-                    "verifier_passed": True,
-                    "refused": False,
-                    "usage": usage_info  # Include usage info for tracking
-                }
-            else:
-                # Verifier failed - REFUSE to answer
-                issues = verification.get('issues', [])
-                unsupported = verification.get('unsupported_claims', [])
-                logger.warning(
-                    f"❌ Verifier FAILED - Issues: {issues}, "
-                    f"Unsupported claims: {unsupported}"
-                )
-                refusal_message = (
-                    get_no_context_response() + 
-                    "\n\n**Note:** The system could not verify the accuracy of the information needed to answer your question. "
-                    "This helps prevent providing incorrect information."
-                )
-                return {
-                    "answer": refusal_message,
-                    "citations": [],
-                    "confidence": 0.0,
-                    "from_knowledge_base": False,
-                    "escalation_suggested": True,
-                    "verifier_passed": False,
-                    "verifier_issues": issues,
-                    "unsupported_claims": unsupported,
-                    "refused": True,
-                    "refusal_reason": "Verifier failed: claims not supported by context",
-                    "usage": usage_info  # Still track usage even if refused
-                }
-                
+            structured = parse_structured_answer(raw_response)
+            answer = structured.render()
+            verification = check_structured_answer(structured, context)
         except ValueError as e:
-            # Configuration errors (e.g., missing API key)
-            error_msg = str(e)
-            logger.error(f"Configuration error in answer generation: {error_msg}")
-            if "API key" in error_msg.lower():
-                raise ValueError(f"LLM API key not configured: {error_msg}")
-            raise
-        except Exception as e:
-            logger.error(f"Error generating answer: {e}", exc_info=True)
-            # Re-raise to be handled by the endpoint
-            raise
+            logger.warning(f"Could not parse structured answer: {e}")
+            answer = ""
+            verification = {"pass": False, "issues": [str(e)], "unsupported_claims": [], "final_answer": None}
+        usage_info = self._annotate_usage(usage_info, tier, started)
+        return self._result_from_verification(answer, verification, citations_info, confidence, usage_info)
+    
+    def _result_from_verification(
+        self,
+        draft_answer: str,
+        verification: Dict[str, Any],
+        citations_info: List[Dict[str, Any]],
+        confidence: float,
+        usage_info: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """Build the final answer (verifier passed) or refusal (verifier failed)."""
+        if verification["pass"]:
+            logger.info("✅ Verifier PASSED - Using draft answer")
+            citations = self._extract_citations(draft_answer, citations_info)
+            return {
+                "answer": draft_answer,
+                "citations": citations,
+                "confidence": confidence,
+                "from_knowledge_base": True,
+                "escalation_suggested": confidence < self.HIGH_CONFIDENCE_THRESHOLD,
+                "verifier_passed": True,
+                "refused": False,
+                "usage": usage_info  # Include usage info for tracking
+            }
+        
+        # Verifier failed - REFUSE to answer
+        issues = verification.get('issues', [])
+        unsupported = verification.get('unsupported_claims', [])
+        logger.warning(
+            f"❌ Verifier FAILED - Issues: {issues}, "
+            f"Unsupported claims: {unsupported}"
+        )
+        refusal_message = (
+            get_no_context_response() + 
+            "\n\n**Note:** The system could not verify the accuracy of the information needed to answer your question. "
+            "This helps prevent providing incorrect information."
+        )
+        return {
+            "answer": refusal_message,
+            "citations": [],
+            "confidence": 0.0,
+            "from_knowledge_base": False,
+            "escalation_suggested": True,
+            "verifier_passed": False,
+            "verifier_issues": issues,
+            "unsupported_claims": unsupported,
+            "refused": True,
+            "refusal_reason": "Verifier failed: claims not supported by context",
+            "usage": usage_info  # Still track usage even if refused
+        }
     
     def _extract_citations(
         self,
@@ -2,13 +2,14 @@
 Document chunking with overlap and metadata preservation.
 """
 import tiktoken
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 from dataclasses import dataclass
 import re
 import uuid
 from datetime import datetime
 
 from app.config import settings
+from app.rag.intent import lexical_tokens
 
 
 @dataclass
@@ -20,6 +21,9 @@ class TextChunk:
     end_char: int
     page_number: Optional[int] = None
     token_count: int = 0
+    heading_path: str = ""  # e.g. "Billing > Refunds" (hierarchical chunking only)
+    parent_index: Optional[int] = None  # Index of the parent section a child chunk belongs to
+    overlap_chars: int = 0  # Length of the leading text repeated from the previous chunk
 
 
 class DocumentChunker:
@@ -77,6 +81,7 @@ class DocumentChunker:
         chunks = []
         current_chunk = ""
         current_start = 0
+        current_overlap = 0
         chunk_index = 0
         
         # First, split into paragraphs for natural boundaries
@@ -104,7 +109,8 @@ class DocumentChunker:
                         start_char=current_start,
                         end_char=char_position,
                         page_number=page_num,
-                        token_count=current_tokens
+                        token_count=current_tokens,
+                        overlap_chars=current_overlap
                     ))
                     chunk_index += 1
                 
@@ -112,6 +118,7 @@ class DocumentChunker:
                 overlap_text = self._get_overlap_text(current_chunk)
                 current_chunk = overlap_text + "\n\n" + para if overlap_text else para
                 current_start = char_position - len(overlap_text) if overlap_text else char_position
+                current_overlap = len(overlap_text)
             else:
                 # Add paragraph to current chunk
                 if current_chunk:
@@ -119,6 +126,7 @@ class DocumentChunker:
                 else:
                     current_chunk = para
                     current_start = char_position
+                    current_overlap = 0
             
             char_position += len(para) + 2  # +2 for paragraph separator
         
@@ -136,11 +144,176 @@ class DocumentChunker:
                 start_char=current_start,
                 end_char=len(text),
                 page_number=page_num,
-                token_count=self.count_tokens(current_chunk)
+                token_count=self.count_tokens(current_chunk),
+                overlap_chars=current_overlap
             ))
         
         return chunks
     
+    def chunk_hierarchical(
+        self,
+        text: str,
+        page_numbers: Optional[Dict[int, int]] = None,
+        parent_size: int = settings.PARENT_CHUNK_SIZE,
+        child_size: int = settings.CHILD_CHUNK_SIZE
+    ) -> Tuple[List[TextChunk], List[TextChunk]]:
+        """
+        Chunk text into parent sections and small child chunks (small-to-big).
+        
+        Sections follow markdown-style heading lines ("# ...", as produced by the
+        parser for Markdown and DOCX). Each section becomes one or more parents of
+        at most parent_size tokens; each parent is split into children of at most
+        child_size tokens. Children are embedded for precise matching and expanded
+        back to their parent at query time.
+        
+        Args:
+            text: The text to chunk
+            page_numbers: Optional mapping of character positions to page numbers
+            parent_size: Max tokens per parent section
+            child_size: Max tokens per child chunk
+        
+        Returns:
+            Tuple of (parents, children); child.parent_index refers to parent.chunk_index
+        """
+        if not text.strip():
+            return [], []
+        
+        parents: List[TextChunk] = []
+        children: List[TextChunk] = []
+        # Parents keep the regular overlap; sections are split without dropping short tails
+        parent_splitter = DocumentChunker(
+            chunk_size=parent_size,
+            chunk_overlap=min(self.chunk_overlap, parent_size // 4),
+            min_chunk_size=1
+        )
+        
+        for heading_path, body, body_start in self._split_into_sections(text):
+            body_tokens = self.count_tokens(body)
+            if body_tokens <= parent_size:
+                pieces = [TextChunk(
+                    content=body,
+                    chunk_index=0,
+                    start_char=0,
+                    end_char=len(body),
+                    token_count=body_tokens
+                )]
+            else:
+                pieces = parent_splitter.chunk_text(body)
+            
+            for piece in pieces:
+                parent = TextChunk(
+                    content=piece.content,
+                    chunk_index=len(parents),
+                    start_char=body_start + piece.start_char,
+                    end_char=body_start + piece.end_char,
+                    page_number=self._page_for_position(body_start + piece.start_char, page_numbers),
+                    token_count=piece.token_count,
+                    heading_path=heading_path
+                )
+                parents.append(parent)
+                
+                for child_text, child_start, child_end in self._pack_sentences(parent.content, child_size):
+                    # Prefix the heading path so the child embeds with its section context
+                    content = f"{heading_path}\n{child_text}" if heading_path else child_text
+                    children.append(TextChunk(
+                        content=content,
+                        chunk_index=len(children),
+                        start_char=parent.start_char + child_start,
+                        end_char=parent.start_char + child_end,
+                        page_number=self._page_for_position(parent.start_char + child_start, page_numbers),
+                        token_count=self.count_tokens(content),
+                        heading_path=heading_path,
+                        parent_index=parent.chunk_index
+                    ))
+        
+        return parents, children
+    
+    def _split_into_sections(self, text: str) -> List[Tuple[str, str, int]]:
+        """
+        Split text on markdown-style heading lines.
+        
+        Returns:
+            List of (heading_path, body_text, body_start_char); heading lines themselves
+            are carried in heading_path rather than in the body
+        """
+        sections = []
+        heading_stack: List[Tuple[int, str]] = []
+        body_lines: List[str] = []
+        body_start = 0
+        position = 0
+        
+        def flush():
+            raw_body = "\n".join(body_lines)
+            body = raw_body.strip()
+            if body:
+                path = " > ".join(title for _, title in heading_stack)
+                sections.append((path, body, body_start + len(raw_body) - len(raw_body.lstrip())))
+        
+        for line in text.split("\n"):
+            match = re.match(r'^(#{1,6})\s+(.+)$', line.strip())
+            if match:
+                flush()
+                level = len(match.group(1))
+                while heading_stack and heading_stack[-1][0] >= level:
+                    heading_stack.pop()
+                heading_stack.append((level, match.group(2).strip()))
+                body_lines = []
+                body_start = position + len(line) + 1
+            else:
+                body_lines.append(line)
+            position += len(line) + 1
+        flush()
+        
+        return sections
+    
+    def _pack_sentences(self, text: str, max_tokens: int) -> List[Tuple[str, int, int]]:
+        """
+        Greedily pack paragraphs/sentences into pieces of at most max_tokens (no overlap).
+        
+        Returns:
+            List of (piece_text, start_char, end_char); offsets are into text
+        """
+        pieces = []
+        current = ""
+        current_tokens = 0
+        current_start = current_end = 0
+        position = 0
+        
+        for para in self._split_into_paragraphs(text):
+            units = [para] if self.count_tokens(para) <= max_tokens else self._split_into_sentences(para)
+            for i, unit in enumerate(units):
+                # Units are stripped slices of text, so they are found in order
+                unit_start = text.find(unit, position)
+                if unit_start < 0:
+                    unit_start = position
+                position = unit_start + len(unit)
+                
+                unit_tokens = self.count_tokens(unit)
+                if current and current_tokens + unit_tokens > max_tokens:
+                    pieces.append((current, current_start, current_end))
+                    current, current_tokens = "", 0
+                # A single sentence longer than max_tokens becomes its own piece
+                separator = " " if i > 0 else "\n\n"
+                if current:
+                    current = f"{current}{separator}{unit}"
+                else:
+                    current, current_start = unit, unit_start
+                current_end = position
+                current_tokens += unit_tokens
+        if current:
+            pieces.append((current, current_start, current_end))
+        
+        return pieces
+    
+    def _page_for_position(self, position: int, page_numbers: Optional[Dict[int, int]]) -> Optional[int]:
+        """Find the page number for a character position."""
+        page_num = None
+        if page_numbers:
+            for pos, page in sorted(page_numbers.items()):
+                if pos <= position:
+                    page_num = page
+        return page_num
+    
     def _get_overlap_text(self, text: str) -> str:
         """Get the overlap text from the end of a chunk."""
         sentences = self._split_into_sentences(text)
@@ -170,7 +343,8 @@ class DocumentChunker:
         file_name: str,
         file_type: str,
         total_chunks: int,
-        document_id: Optional[str] = None
+        document_id: Optional[str] = None,
+        parent_id: Optional[str] = None
     ) -> Dict[str, Any]:
         """Create metadata dictionary for a chunk."""
         chunk_id = f"{tenant_id}_{kb_id}_{file_name}_{chunk.chunk_index}_{uuid.uuid4().hex[:8]}"
@@ -185,10 +359,18 @@ class DocumentChunker:
             "chunk_index": chunk.chunk_index,
             "page_number": chunk.page_number,
             "total_chunks": total_chunks,
-            "token_count": chunk.token_count,
+            "token_count": chunk.token_count,  # Exact tiktoken count, used by the context packer
+            "overlap_chars": chunk.overlap_chars,  # Leading text shared with the previous chunk
+            "lexical_tokens": lexical_tokens(chunk.content),  # Token set for lexical gating at query time
             "document_id": document_id,  # Track original document
+            "parent_id": parent_id,  # Parent section for small-to-big expansion
+            "heading_path": chunk.heading_path or None,
             "created_at": datetime.utcnow().isoformat()
         }
+    
+    def create_parent_id(self, document_id: Optional[str], parent: TextChunk) -> str:
+        """Create a stable ID for a parent section of a document."""
+        return f"{document_id or uuid.uuid4().hex[:8]}_p{parent.chunk_index}"
 
 
 # Global chunker instance
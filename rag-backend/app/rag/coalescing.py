@@ -0,0 +1,130 @@
+"""
+Single-flight coalescing of identical in-flight chat requests.
+When the same question hits the same knowledge base concurrently, one request
+(the leader) runs retrieval and generation and the others (followers) await its
+result. Nothing is cached: once the computation finishes the key is released.
+"""
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+import asyncio
+import hashlib
+import logging
+import re
+
+from app.config import settings
+from app.utils.metrics import counter, gauge
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+# Coalescing ratio = followers / (leaders + followers)
+CHAT_COALESCED_REQUESTS = counter(
+    "rag_chat_coalesced_requests_total",
+    "Chat requests by single-flight role (leader computed the answer, follower reused it)",
+    ["role"]
+)
+CHAT_COALESCING_IN_FLIGHT = gauge(
+    "rag_chat_coalescing_in_flight_keys",
+    "Distinct chat computations currently in flight"
+)
+
+BILLING_POLICIES = ("full", "leader_only", "request_only")
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing punctuation."""
+    return _WHITESPACE.sub(" ", question.casefold()).strip().rstrip("?!. ")
+
+
+def coalesce_key(tenant_id: str, kb_id: str, user_id: str, question: str, kb_version: int) -> str:
+    """
+    Build the single-flight key for a chat request.
+    user_id is part of the key because retrieval is scoped by it; kb_version
+    keeps a request that arrives after an ingest from joining an older computation.
+    """
+    raw = "\x1f".join([tenant_id, kb_id, user_id or "", str(kb_version), normalize_question(question)])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent async computations by key.
+    The computation runs in its own task, so a leader whose client disconnects
+    doesn't cancel it for the followers.
+    """
+    
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Task] = {}
+    
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Run fn() unless a computation for key is already in flight.
+        
+        Args:
+            key: Coalescing key
+            fn: Zero-argument coroutine function producing the result
+        
+        Returns:
+            (result, shared) - shared is True when another request computed the result.
+            Exceptions from the computation propagate to every waiter.
+        """
+        task = self._calls.get(key)
+        if task is not None:
+            CHAT_COALESCED_REQUESTS.labels(role="follower").inc()
+            return await asyncio.shield(task), True
+        
+        task = asyncio.ensure_future(fn())
+        self._calls[key] = task
+        CHAT_COALESCING_IN_FLIGHT.set(len(self._calls))
+        task.add_done_callback(lambda t: self._release(key, t))
+        CHAT_COALESCED_REQUESTS.labels(role="leader").inc()
+        return await asyncio.shield(task), False
+    
+    def _release(self, key: str, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        CHAT_COALESCING_IN_FLIGHT.set(len(self._calls))
+        if not task.cancelled() and task.exception() is not None:
+            # Mark the exception retrieved even if every waiter went away
+            logger.debug(f"Coalesced computation failed: {task.exception()}")
+    
+    @property
+    def in_flight(self) -> int:
+        return len(self._calls)
+
+
+def billable_usage(usage_info: Optional[Dict[str, Any]], shared: bool) -> Optional[Dict[str, Any]]:
+    """
+    Apply COALESCED_BILLING_POLICY to a request's usage.
+    
+    Args:
+        usage_info: Usage of the (possibly shared) LLM computation
+        shared: Whether this request reused another request's computation
+    
+    Returns:
+        Usage to record for this request, or None to record nothing
+    """
+    if not usage_info or not shared:
+        return usage_info
+    policy = settings.COALESCED_BILLING_POLICY
+    if policy == "leader_only":
+        return None
+    if policy == "request_only":
+        return {**usage_info, "prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+    if policy != "full":
+        logger.warning(f"Unknown COALESCED_BILLING_POLICY '{policy}', billing as 'full'")
+    return usage_info
+
+
+# Global single-flight group for /chat
+_chat_single_flight: Optional[SingleFlight] = None
+
+
+def get_chat_single_flight() -> SingleFlight:
+    """Get the global single-flight group for chat requests."""
+    global _chat_single_flight
+    if _chat_single_flight is None:
+        _chat_single_flight = SingleFlight()
+    return _chat_single_flight
@@ -0,0 +1,169 @@
+"""
+Extractive context compression.
+Scores the sentences of each packed passage against the query with the
+embedding model and keeps only the most relevant ones, so the draft and
+verifier prompts carry fewer tokens. Runs locally on CPU; passage order and
+[Source N] headers are untouched.
+"""
+from dataclasses import dataclass
+from typing import Callable, List, Optional
+import logging
+import math
+import re
+
+import numpy as np
+
+from app.config import settings
+from app.utils.metrics import counter
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+CONTEXT_COMPRESSION_TOKENS = counter(
+    "rag_context_compression_tokens_total",
+    "Context tokens before and after extractive compression",
+    ["stage"]
+)
+
+ELISION = " … "
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9\"'(\[])")
+_HEADING = re.compile(r"^\s*#{1,6}\s")
+
+
+@dataclass
+class _Sentence:
+    start: int
+    end: int
+    text: str
+    tokens: int
+    is_heading: bool
+
+
+class ContextCompressor:
+    """
+    Keeps the query-relevant sentences of each passage within a token ratio.
+    """
+    
+    def __init__(
+        self,
+        ratio: float = settings.CONTEXT_COMPRESSION_RATIO,
+        min_sentences: int = settings.CONTEXT_COMPRESSION_MIN_SENTENCES,
+        count_tokens: Optional[Callable[[str], int]] = None
+    ):
+        """
+        Initialize the compressor.
+        
+        Args:
+            ratio: Fraction of each passage's tokens to keep (1.0 = no compression)
+            min_sentences: Passages with fewer sentences are kept whole
+            count_tokens: Token counter (defaults to the chunker's tiktoken encoding)
+        """
+        self.ratio = ratio
+        self.min_sentences = min_sentences
+        if count_tokens is None:
+            from app.rag.chunking import chunker
+            count_tokens = chunker.count_tokens
+        self.count_tokens = count_tokens
+    
+    def compress(self, query: str, passages: List[str], embedding_service) -> List[str]:
+        """
+        Compress passages for a query.
+        
+        Args:
+            query: User's question
+            passages: Passage texts in context order (without source headers)
+            embedding_service: EmbeddingService of the tenant's index model
+        
+        Returns:
+            Compressed passages, one per input passage
+        """
+        if self.ratio >= 1.0 or not passages:
+            return passages
+        
+        split = [self._split(passage) for passage in passages]
+        scored_texts = [s.text for sentences in split if len(sentences) >= self.min_sentences for s in sentences]
+        if not scored_texts:
+            return passages
+        
+        query_vector = _normalize(np.asarray([embedding_service.embed_query(query)], dtype=float))[0]
+        sentence_vectors = _normalize(np.asarray(embedding_service.embed_texts(scored_texts), dtype=float))
+        scores = iter(sentence_vectors @ query_vector)
+        
+        compressed = []
+        tokens_before = tokens_after = 0
+        for passage, sentences in zip(passages, split):
+            passage_tokens = sum(s.tokens for s in sentences)
+            tokens_before += passage_tokens
+            if len(sentences) < self.min_sentences:
+                compressed.append(passage)
+                tokens_after += passage_tokens
+                continue
+            keep = self._select([next(scores) for _ in sentences], sentences, passage_tokens)
+            compressed.append(self._join(passage, sentences, keep))
+            tokens_after += sum(sentences[i].tokens for i in keep)
+        
+        CONTEXT_COMPRESSION_TOKENS.labels(stage="before").inc(tokens_before)
+        CONTEXT_COMPRESSION_TOKENS.labels(stage="after").inc(tokens_after)
+        logger.info(f"Compressed context from ~{tokens_before} to ~{tokens_after} tokens (ratio={self.ratio})")
+        return compressed
+    
+    def _split(self, text: str) -> List[_Sentence]:
+        """Split into sentences; lines (headings, list items) are never merged."""
+        sentences = []
+        offset = 0
+        for line in text.splitlines(keepends=True):
+            stripped = line.strip()
+            if stripped:
+                is_heading = bool(_HEADING.match(line))
+                line_start = offset + (len(line) - len(line.lstrip()))
+                pieces = [stripped] if is_heading else _SENTENCE_END.split(stripped)
+                cursor = line_start
+                for piece in pieces:
+                    start = text.index(piece, cursor)
+                    cursor = start + len(piece)
+                    sentences.append(_Sentence(start, cursor, piece, self.count_tokens(piece), is_heading))
+            offset += len(line)
+        return sentences
+    
+    def _select(self, scores: List[float], sentences: List[_Sentence], passage_tokens: int) -> List[int]:
+        """Indices of the best-scoring sentences that fit the budget (headings are always kept)."""
+        budget = math.ceil(self.ratio * passage_tokens)
+        keep = {i for i, s in enumerate(sentences) if s.is_heading}
+        used = sum(sentences[i].tokens for i in keep)
+        ranked = sorted((i for i in range(len(sentences)) if i not in keep), key=lambda i: scores[i], reverse=True)
+        for rank, i in enumerate(ranked):
+            if rank == 0 or used + sentences[i].tokens <= budget:
+                keep.add(i)
+                used += sentences[i].tokens
+        return sorted(keep)
+    
+    @staticmethod
+    def _join(text: str, sentences: List[_Sentence], keep: List[int]) -> str:
+        """Rebuild the passage from kept sentences, marking gaps with an ellipsis."""
+        parts = []
+        previous = None
+        for i in keep:
+            if previous is not None:
+                parts.append(text[sentences[previous].end:sentences[i].start] if i == previous + 1 else ELISION)
+            parts.append(sentences[i].text)
+            previous = i
+        return "".join(parts)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+# Global context compressor instance
+_context_compressor: Optional[ContextCompressor] = None
+
+
+def get_context_compressor() -> ContextCompressor:
+    """Get the global context compressor instance."""
+    global _context_compressor
+    if _context_compressor is None:
+        _context_compressor = ContextCompressor()
+    return _context_compressor
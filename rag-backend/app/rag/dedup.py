@@ -0,0 +1,268 @@
+"""
+Near-duplicate chunk detection with MinHash and LSH.
+Catches overlapping uploads (several versions of the same policy, boilerplate
+footers on every page) before they are embedded, and collapses duplicate hits
+at query time so they don't crowd out the top-k.
+
+Candidates are scoped like retrieval (tenant, KB and user). In "drop" mode a
+duplicate chunk is never embedded, so deleting the document that holds its
+canonical copy removes that content from the KB; there is no restore path
+other than re-uploading the duplicate document. "flag" mode keeps every chunk
+and has no such gap.
+"""
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional
+import hashlib
+import logging
+import re
+import zlib
+
+import numpy as np
+
+from app.config import settings
+from app.rag.docstore import get_doc_store
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Universal hashing modulo a Mersenne prime: (a * x + b) % p with 32-bit x fits in uint64
+_MERSENNE_PRIME = np.uint64((1 << 31) - 1)
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+@dataclass
+class DedupResult:
+    """Outcome of deduplicating one document's chunks."""
+    duplicate_of: List[Optional[str]]  # Per chunk: canonical chunk_id, or None if unique
+    signatures: List[Dict[str, Any]] = field(default_factory=list)
+    
+    @property
+    def duplicate_count(self) -> int:
+        return sum(1 for d in self.duplicate_of if d)
+    
+    @property
+    def dedup_ratio(self) -> float:
+        return self.duplicate_count / len(self.duplicate_of) if self.duplicate_of else 0.0
+
+
+class MinHasher:
+    """
+    Computes MinHash signatures over word shingles and LSH band keys.
+    Permutations are seeded so signatures stay comparable across restarts.
+    """
+    
+    def __init__(
+        self,
+        num_perm: int = settings.DEDUP_NUM_PERM,
+        bands: int = settings.DEDUP_LSH_BANDS,
+        shingle_size: int = settings.DEDUP_SHINGLE_SIZE,
+        seed: int = 1
+    ):
+        """
+        Initialize the hasher.
+        
+        Args:
+            num_perm: Number of hash permutations (signature length)
+            bands: Number of LSH bands (num_perm must be divisible by bands)
+            shingle_size: Words per shingle
+            seed: Seed for the permutation coefficients
+        """
+        if num_perm % bands != 0:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, int(_MERSENNE_PRIME), size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, int(_MERSENNE_PRIME), size=num_perm).astype(np.uint64)
+    
+    def _shingles(self, text: str) -> np.ndarray:
+        """Hash the text's word shingles to 32-bit integers."""
+        words = _WORD_PATTERN.findall(text.lower())
+        if len(words) < self.shingle_size:
+            shingles = {" ".join(words)}
+        else:
+            shingles = {
+                " ".join(words[i:i + self.shingle_size])
+                for i in range(len(words) - self.shingle_size + 1)
+            }
+        return np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles),
+            dtype=np.uint64,
+            count=len(shingles)
+        )
+    
+    def signature(self, text: str) -> np.ndarray:
+        """
+        Compute the MinHash signature of a text.
+        
+        Args:
+            text: Chunk text
+        
+        Returns:
+            uint32 array of length num_perm
+        """
+        hashes = self._shingles(text)
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME
+        return permuted.min(axis=0).astype(np.uint32)
+    
+    def band_keys(self, signature: np.ndarray) -> List[str]:
+        """
+        Split a signature into LSH band keys.
+        Two chunks become candidates when any band key matches.
+        """
+        keys = []
+        for band in range(self.bands):
+            rows = signature[band * self.rows:(band + 1) * self.rows]
+            digest = hashlib.blake2b(rows.tobytes(), digest_size=8).hexdigest()
+            keys.append(f"{band}:{digest}")
+        return keys
+    
+    @staticmethod
+    def similarity(sig1: np.ndarray, sig2: np.ndarray) -> float:
+        """Estimated Jaccard similarity of two signatures."""
+        return float(np.mean(sig1 == sig2))
+
+
+class DedupService:
+    """
+    Per tenant/KB near-duplicate index.
+    Signatures and LSH bands are persisted in the doc store so later uploads
+    are checked against everything already in the knowledge base.
+    """
+    
+    def __init__(
+        self,
+        threshold: float = settings.DEDUP_THRESHOLD,
+        hasher: Optional[MinHasher] = None
+    ):
+        """
+        Initialize the dedup service.
+        
+        Args:
+            threshold: Estimated Jaccard similarity at or above which chunks are duplicates
+            hasher: MinHasher to use (defaults to one built from settings)
+        """
+        self.threshold = threshold
+        self.hasher = hasher or MinHasher()
+    
+    def deduplicate(
+        self,
+        texts: List[str],
+        chunk_ids: List[str],
+        tenant_id: str,  # CRITICAL: Multi-tenant isolation
+        kb_id: str,
+        user_id: str,
+        file_name: str
+    ) -> DedupResult:
+        """
+        Find near-duplicates among a document's chunks and the existing KB.
+        Chunks are checked in order, so repeated boilerplate inside the same
+        document is caught too (the first occurrence stays canonical).
+        
+        Args:
+            texts: Chunk texts
+            chunk_ids: Chunk IDs (same order as texts)
+            tenant_id: Tenant ID (CRITICAL)
+            kb_id: Knowledge base ID
+            user_id: User ID
+            file_name: Source file name
+        
+        Returns:
+            DedupResult with the canonical chunk_id per duplicate and the
+            signatures to persist once the chunks are stored
+        """
+        doc_store = get_doc_store()
+        duplicate_of: List[Optional[str]] = []
+        signatures: List[Dict[str, Any]] = []
+        # In-document index: band_key -> chunk_ids, chunk_id -> signature
+        local_bands: Dict[str, List[str]] = {}
+        local_signatures: Dict[str, np.ndarray] = {}
+        
+        for text, chunk_id in zip(texts, chunk_ids):
+            signature = self.hasher.signature(text)
+            band_keys = self.hasher.band_keys(signature)
+            
+            candidates = {
+                cid: np.frombuffer(sig, dtype=np.uint32)
+                for cid, sig in doc_store.find_signature_candidates(tenant_id, kb_id, user_id, band_keys).items()
+                if cid != chunk_id  # Re-uploading the same file must not match itself
+            }
+            for band_key in band_keys:
+                for cid in local_bands.get(band_key, []):
+                    candidates[cid] = local_signatures[cid]
+            
+            match = None
+            best = self.threshold
+            for cid, candidate_signature in candidates.items():
+                score = self.hasher.similarity(signature, candidate_signature)
+                if score >= best:
+                    match, best = cid, score
+            
+            duplicate_of.append(match)
+            signatures.append({
+                "chunk_id": chunk_id,
+                "tenant_id": tenant_id,  # CRITICAL: Multi-tenant isolation
+                "kb_id": kb_id,
+                "user_id": user_id,
+                "file_name": file_name,
+                "signature": signature.tobytes(),
+                "band_keys": band_keys,
+                "duplicate_of": match
+            })
+            if match is None:
+                local_signatures[chunk_id] = signature
+                for band_key in band_keys:
+                    local_bands.setdefault(band_key, []).append(chunk_id)
+        
+        result = DedupResult(duplicate_of=duplicate_of, signatures=signatures)
+        logger.info(
+            f"Dedup {file_name}: {result.duplicate_count}/{len(texts)} near-duplicate chunks "
+            f"(ratio {result.dedup_ratio:.2f})"
+        )
+        return result
+    
+    def record(self, result: DedupResult) -> None:
+        """Persist signatures after the chunks were stored."""
+        get_doc_store().add_signatures(result.signatures)
+
+
+def collapse_duplicates(results: List[Any], limit: Optional[int] = None) -> List[Any]:
+    """
+    Collapse near-duplicate retrieval hits, keeping the best-ranked one.
+    Hits are grouped by their canonical chunk (duplicate_of metadata set at
+    ingestion) and by normalized text for chunks indexed before dedup.
+    
+    Args:
+        results: RetrievalResult objects, best first
+        limit: Optional maximum number of results to return
+    
+    Returns:
+        Diverse results in the original order
+    """
+    seen = set()
+    collapsed = []
+    for result in results:
+        canonical = result.metadata.get("duplicate_of") or result.chunk_id
+        text_key = " ".join(_WORD_PATTERN.findall(result.content.lower()))
+        if canonical in seen or text_key in seen:
+            continue
+        seen.add(canonical)
+        seen.add(text_key)
+        collapsed.append(result)
+        if limit and len(collapsed) >= limit:
+            break
+    return collapsed
+
+
+# Global dedup service instance
+_dedup_service: Optional[DedupService] = None
+
+
+def get_dedup_service() -> DedupService:
+    """Get the global dedup service instance."""
+    global _dedup_service
+    if _dedup_service is None:
+        _dedup_service = DedupService()
+    return _dedup_service
@@ -0,0 +1,332 @@
+"""
+Local document store for data that lives next to the vector index.
+Holds parent sections for small-to-big retrieval (children are embedded,
+parents are looked up by ID at query time), the MinHash/LSH index used
+for near-duplicate detection and per-KB content versions.
+"""
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List, Dict, Any, Optional
+from datetime import datetime
+import logging
+
+from app.config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class DocStore:
+    """
+    SQLite-backed store for parent sections.
+    Every lookup is scoped by tenant_id for multi-tenant isolation.
+    """
+    
+    def __init__(self, db_path: Path = settings.PROCESSED_DIR / "docstore.db"):
+        """
+        Initialize the document store.
+        
+        Args:
+            db_path: Path to the SQLite file
+        """
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(db_path), check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._create_tables()
+        logger.info(f"Document store initialized at {db_path}")
+    
+    def _create_tables(self) -> None:
+        """Create tables if they don't exist."""
+        with self._lock, self._conn:
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS parents (
+                    parent_id TEXT PRIMARY KEY,
+                    tenant_id TEXT NOT NULL,
+                    kb_id TEXT NOT NULL,
+                    user_id TEXT,
+                    file_name TEXT,
+                    document_id TEXT,
+                    heading_path TEXT,
+                    content TEXT NOT NULL,
+                    token_count INTEGER NOT NULL DEFAULT 0,
+                    page_number INTEGER,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_parents_scope ON parents (tenant_id, kb_id, user_id, file_name)"
+            )
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS minhash_signatures (
+                    chunk_id TEXT PRIMARY KEY,
+                    tenant_id TEXT NOT NULL,
+                    kb_id TEXT NOT NULL,
+                    user_id TEXT,
+                    file_name TEXT,
+                    signature BLOB NOT NULL,
+                    duplicate_of TEXT,
+                    created_at TEXT NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_minhash_scope ON minhash_signatures (tenant_id, kb_id, user_id, file_name)"
+            )
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS minhash_bands (
+                    tenant_id TEXT NOT NULL,
+                    kb_id TEXT NOT NULL,
+                    band_key TEXT NOT NULL,
+                    chunk_id TEXT NOT NULL
+                )
+            """)
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_minhash_bands_lookup ON minhash_bands (tenant_id, kb_id, band_key)"
+            )
+            self._conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_minhash_bands_chunk ON minhash_bands (chunk_id)"
+            )
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS kb_versions (
+                    tenant_id TEXT NOT NULL,
+                    kb_id TEXT NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 0,
+                    updated_at TEXT NOT NULL,
+                    PRIMARY KEY (tenant_id, kb_id)
+                )
+            """)
+    
+    def add_parents(self, parents: List[Dict[str, Any]]) -> None:
+        """
+        Store parent sections.
+        
+        Args:
+            parents: Dicts with parent_id, tenant_id, kb_id, user_id, file_name,
+                document_id, heading_path, content, token_count, page_number
+        """
+        if not parents:
+            return
+        now = datetime.utcnow().isoformat()
+        rows = [
+            (
+                p["parent_id"], p["tenant_id"], p["kb_id"], p.get("user_id"), p.get("file_name"),
+                p.get("document_id"), p.get("heading_path"), p["content"],
+                p.get("token_count", 0), p.get("page_number"), now
+            )
+            for p in parents
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                """INSERT OR REPLACE INTO parents
+                   (parent_id, tenant_id, kb_id, user_id, file_name, document_id,
+                    heading_path, content, token_count, page_number, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                rows
+            )
+        logger.info(f"Stored {len(parents)} parent sections")
+    
+    def get_parents(self, tenant_id: str, parent_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Fetch parent sections by ID.
+        
+        Args:
+            tenant_id: Tenant ID (CRITICAL: only this tenant's parents are returned)
+            parent_ids: Parent IDs to fetch
+        
+        Returns:
+            Mapping of parent_id -> parent dict
+        """
+        if not parent_ids:
+            return {}
+        placeholders = ",".join("?" for _ in parent_ids)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT * FROM parents WHERE tenant_id = ? AND parent_id IN ({placeholders})",
+                [tenant_id, *parent_ids]
+            ).fetchall()
+        return {row["parent_id"]: dict(row) for row in rows}
+    
+    def delete_parents(self, filter_dict: Dict[str, Any]) -> int:
+        """
+        Delete parent sections matching a filter.
+        
+        Args:
+            filter_dict: Equality filter on tenant_id (required), kb_id, user_id, file_name
+        
+        Returns:
+            Number of parents deleted
+        """
+        allowed = ("tenant_id", "kb_id", "user_id", "file_name")
+        conditions = {k: v for k, v in filter_dict.items() if k in allowed and v is not None}
+        if "tenant_id" not in conditions:
+            raise ValueError("tenant_id is required to delete parent sections")
+        where = " AND ".join(f"{k} = ?" for k in conditions)
+        with self._lock, self._conn:
+            cursor = self._conn.execute(f"DELETE FROM parents WHERE {where}", list(conditions.values()))
+        return cursor.rowcount
+    
+    def add_signatures(self, signatures: List[Dict[str, Any]]) -> None:
+        """
+        Store MinHash signatures and index the LSH bands of canonical chunks.
+        
+        Args:
+            signatures: Dicts with chunk_id, tenant_id, kb_id, user_id, file_name,
+                signature (bytes), band_keys (list of str) and duplicate_of (None
+                for canonical chunks). Duplicates are recorded for the dedup ratio
+                but not added to the band index.
+        """
+        if not signatures:
+            return
+        now = datetime.utcnow().isoformat()
+        signature_rows = [
+            (
+                s["chunk_id"], s["tenant_id"], s["kb_id"], s.get("user_id"), s.get("file_name"),
+                s["signature"], s.get("duplicate_of"), now
+            )
+            for s in signatures
+        ]
+        band_rows = [
+            (s["tenant_id"], s["kb_id"], band_key, s["chunk_id"])
+            for s in signatures if not s.get("duplicate_of")
+            for band_key in s["band_keys"]
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM minhash_bands WHERE chunk_id = ?",
+                [(s["chunk_id"],) for s in signatures]
+            )
+            self._conn.executemany(
+                """INSERT OR REPLACE INTO minhash_signatures
+                   (chunk_id, tenant_id, kb_id, user_id, file_name, signature, duplicate_of, created_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                signature_rows
+            )
+            self._conn.executemany(
+                "INSERT INTO minhash_bands (tenant_id, kb_id, band_key, chunk_id) VALUES (?, ?, ?, ?)",
+                band_rows
+            )
+    
+    def find_signature_candidates(
+        self, tenant_id: str, kb_id: str, user_id: str, band_keys: List[str]
+    ) -> Dict[str, bytes]:
+        """
+        Find canonical chunks sharing at least one LSH band with the given keys.
+        Scoped like retrieval (tenant, KB and user), so a canonical copy is
+        always visible to whoever can see its duplicates.
+        
+        Args:
+            tenant_id: Tenant ID (CRITICAL: only this tenant's chunks are returned)
+            kb_id: Knowledge base ID
+            user_id: User ID
+            band_keys: LSH band keys of the probe chunk
+        
+        Returns:
+            Mapping of chunk_id -> stored signature bytes
+        """
+        if not band_keys:
+            return {}
+        placeholders = ",".join("?" for _ in band_keys)
+        with self._lock:
+            rows = self._conn.execute(
+                f"""SELECT s.chunk_id, s.signature FROM minhash_signatures s
+                    WHERE s.user_id = ? AND s.chunk_id IN (
+                        SELECT b.chunk_id FROM minhash_bands b
+                        WHERE b.tenant_id = ? AND b.kb_id = ? AND b.band_key IN ({placeholders})
+                    )""",
+                [user_id, tenant_id, kb_id, *band_keys]
+            ).fetchall()
+        return {row["chunk_id"]: row["signature"] for row in rows}
+    
+    def delete_signatures(self, filter_dict: Dict[str, Any]) -> int:
+        """
+        Delete MinHash signatures (and their bands) matching a filter.
+        
+        Args:
+            filter_dict: Equality filter on tenant_id (required), kb_id, user_id, file_name
+        
+        Returns:
+            Number of signatures deleted
+        """
+        allowed = ("tenant_id", "kb_id", "user_id", "file_name")
+        conditions = {k: v for k, v in filter_dict.items() if k in allowed and v is not None}
+        if "tenant_id" not in conditions:
+            raise ValueError("tenant_id is required to delete signatures")
+        where = " AND ".join(f"{k} = ?" for k in conditions)
+        params = list(conditions.values())
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"DELETE FROM minhash_bands WHERE chunk_id IN (SELECT chunk_id FROM minhash_signatures WHERE {where})",
+                params
+            )
+            cursor = self._conn.execute(f"DELETE FROM minhash_signatures WHERE {where}", params)
+        return cursor.rowcount
+    
+    def get_dedup_counts(self, filter_dict: Dict[str, Any]) -> Dict[str, int]:
+        """
+        Count chunks seen by the dedup index and how many were near-duplicates.
+        
+        Args:
+            filter_dict: Equality filter on tenant_id (required), kb_id, user_id, file_name
+        
+        Returns:
+            Dict with total_chunks and duplicate_chunks
+        """
+        allowed = ("tenant_id", "kb_id", "user_id", "file_name")
+        conditions = {k: v for k, v in filter_dict.items() if k in allowed and v is not None}
+        if "tenant_id" not in conditions:
+            raise ValueError("tenant_id is required for dedup counts")
+        where = " AND ".join(f"{k} = ?" for k in conditions)
+        with self._lock:
+            row = self._conn.execute(
+                f"""SELECT COUNT(*) AS total, COUNT(duplicate_of) AS duplicates
+                    FROM minhash_signatures WHERE {where}""",
+                list(conditions.values())
+            ).fetchone()
+        return {"total_chunks": row["total"], "duplicate_chunks": row["duplicates"]}
+
+    
+    def get_kb_version(self, tenant_id: str, kb_id: str) -> int:
+        """
+        Get the content version of a knowledge base (0 if it was never changed).
+        The version changes whenever documents are added or deleted.
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT version FROM kb_versions WHERE tenant_id = ? AND kb_id = ?",
+                (tenant_id, kb_id)
+            ).fetchone()
+        return row["version"] if row else 0
+    
+    def bump_kb_version(self, tenant_id: str, kb_id: str) -> int:
+        """
+        Increment the content version of a knowledge base.
+        
+        Returns:
+            The new version
+        """
+        now = datetime.utcnow().isoformat()
+        with self._lock, self._conn:
+            self._conn.execute(
+                """INSERT INTO kb_versions (tenant_id, kb_id, version, updated_at) VALUES (?, ?, 1, ?)
+                   ON CONFLICT (tenant_id, kb_id) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at""",
+                (tenant_id, kb_id, now)
+            )
+            row = self._conn.execute(
+                "SELECT version FROM kb_versions WHERE tenant_id = ? AND kb_id = ?",
+                (tenant_id, kb_id)
+            ).fetchone()
+        return row["version"]
+
+
+# Global document store instance
+_doc_store: Optional[DocStore] = None
+
+
+def get_doc_store() -> DocStore:
+    """Get the global document store instance."""
+    global _doc_store
+    if _doc_store is None:
+        _doc_store = DocStore()
+    return _doc_store
@@ -3,7 +3,7 @@ Embedding generation using Sentence Transformers.
 Supports local models for privacy and offline use.
 """
 from sentence_transformers import SentenceTransformer
-from typing import List, Optional
+from typing import Dict, List, Optional
 import numpy as np
 import logging
 from functools import lru_cache
@@ -130,16 +130,22 @@ class EmbeddingService:
         return float(dot_product / (norm1 * norm2))
 
 
-# Global embedding service instance (lazy loaded)
-_embedding_service: Optional[EmbeddingService] = None
+# Global embedding service instances, one per model (lazy loaded)
+_embedding_services: Dict[str, EmbeddingService] = {}
 
 
-def get_embedding_service() -> EmbeddingService:
-    """Get the global embedding service instance."""
-    global _embedding_service
-    if _embedding_service is None:
-        _embedding_service = EmbeddingService()
-    return _embedding_service
+def get_embedding_service(model_name: Optional[str] = None) -> EmbeddingService:
+    """
+    Get the global embedding service instance for a model.
+    
+    Args:
+        model_name: Sentence Transformer model name (defaults to settings.EMBEDDING_MODEL).
+            Tenants whose index has not been migrated yet still need their old model.
+    """
+    model_name = model_name or settings.EMBEDDING_MODEL
+    if model_name not in _embedding_services:
+        _embedding_services[model_name] = EmbeddingService(model_name)
+    return _embedding_services[model_name]
 
 
 
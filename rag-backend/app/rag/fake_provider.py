@@ -0,0 +1,415 @@
+"""
+Deterministic fake LLM provider and a recorder for real provider traffic.
+
+LLM_PROVIDER="fake" runs the whole pipeline without network or API keys:
+- synthesize: context-grounded drafts (cited sentences from the prompt's
+  sources) and verifier verdicts, deterministic per prompt
+- replay: responses recorded with LLM_RECORD_PATH, keyed by prompt hash
+
+Latency (log-normal, median/p99), token counts and injected errors are
+configurable so load tests see realistic timing without burning quota.
+"""
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import random
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+from app.config import settings
+from app.rag.answer import LLMProvider, LLMStream, provider_kwargs
+from app.rag.model_router import tier_kwargs
+from app.utils.metrics import counter
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FAKE_MODEL = "fake-llm"
+SYNTHESIZE = "synthesize"
+REPLAY = "replay"
+
+FAKE_LLM_CALLS = counter(
+    "rag_fake_llm_calls_total",
+    "Fake LLM provider calls by source (replay, synthesized, replay_miss, error)",
+    ["source"]
+)
+
+# z-score of the 99th percentile of a standard normal distribution
+_Z_P99 = 2.326
+
+_CONTEXT_PATTERN = re.compile(r"## Context:\n(.*?)\n\n## Question:\n(.*?)(?:\n\n|\Z)", re.DOTALL)
+_SOURCE_PATTERN = re.compile(r"\[Source (\d+)[^\]]*\][^\n]*\n(.*?)(?=\n\[Source \d+|\Z)", re.DOTALL)
+_DRAFT_PATTERN = re.compile(r"## DRAFT ANSWER TO VERIFY:\n(.*?)(?:\n---|\Z)", re.DOTALL)
+_CITATION_PATTERN = re.compile(r"\[Source \d+\]")
+_NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)*")
+_STRUCTURED_MARKER = "Return the JSON object described above"
+_SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+")
+_WORD_PATTERN = re.compile(r"\w+")
+
+NO_ANSWER = "I don't have enough information in the knowledge base to answer that."
+
+
+class FakeLLMError(RuntimeError):
+    """Error injected by the fake provider (FAKE_LLM_ERROR_RATE)."""
+
+
+def prompt_key(system_prompt: str, user_prompt: str) -> str:
+    """Stable key for a prompt pair (shared by the recorder and replay)."""
+    return hashlib.sha256(f"{system_prompt}\n\x00\n{user_prompt}".encode("utf-8")).hexdigest()
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token); avoids loading a tokenizer."""
+    return max(1, math.ceil(len(text) / 4)) if text else 0
+
+
+def load_recordings(path: Path) -> Dict[str, Dict[str, Any]]:
+    """
+    Load recorded responses keyed by prompt hash (last recording wins).
+    
+    Args:
+        path: JSONL file written by RecordingProvider
+    """
+    recordings: Dict[str, Dict[str, Any]] = {}
+    if not path.exists():
+        logger.warning(f"No LLM recordings found at {path}")
+        return recordings
+    with open(path, "r", encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                recordings[record["key"]] = record
+            except (json.JSONDecodeError, KeyError) as e:
+                logger.warning(f"Skipping bad recording at {path}:{line_no}: {e}")
+    logger.info(f"Loaded {len(recordings)} LLM recordings from {path}")
+    return recordings
+
+
+def _default_recordings_path() -> Path:
+    return Path(settings.FAKE_LLM_RECORDINGS_PATH or settings.DATA_DIR / "llm_recordings.jsonl")
+
+
+class FakeLLMProvider(LLMProvider):
+    """
+    LLM provider that never touches the network.
+    Response text is a pure function of the prompt; latency and errors are
+    sampled from a seeded generator.
+    """
+    
+    def __init__(
+        self,
+        mode: str = settings.FAKE_LLM_MODE,
+        recordings_path: Optional[Path] = None,
+        latency_ms: float = settings.FAKE_LLM_LATENCY_MS,
+        latency_p99_ms: float = settings.FAKE_LLM_LATENCY_P99_MS,
+        error_rate: float = settings.FAKE_LLM_ERROR_RATE,
+        seed: Optional[int] = settings.FAKE_LLM_SEED,
+        strict_replay: bool = settings.FAKE_LLM_REPLAY_STRICT,
+        hallucination_rate: float = settings.FAKE_LLM_HALLUCINATION_RATE
+    ):
+        """
+        Args:
+            mode: "synthesize" or "replay"
+            recordings_path: JSONL recordings for replay mode
+            latency_ms: Median simulated latency (0 = no delay)
+            latency_p99_ms: 99th percentile simulated latency
+            error_rate: Fraction of calls that raise FakeLLMError
+            seed: Seed for latency/error sampling (None = nondeterministic)
+            strict_replay: In replay mode, raise KeyError on unrecorded prompts instead of synthesizing
+            hallucination_rate: Fraction of synthesized answers given an unsupported number
+        """
+        if mode not in (SYNTHESIZE, REPLAY):
+            raise ValueError(f"Unknown FAKE_LLM_MODE: {mode}")
+        self.mode = mode
+        self.latency_ms = latency_ms
+        self.latency_p99_ms = max(latency_p99_ms, latency_ms)
+        self.error_rate = error_rate
+        self.strict_replay = strict_replay
+        self.hallucination_rate = hallucination_rate
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._recordings: Dict[str, Dict[str, Any]] = {}
+        if mode == REPLAY:
+            self._recordings = load_recordings(recordings_path or _default_recordings_path())
+        logger.info(f"Fake LLM provider initialized (mode={mode}, latency={latency_ms}ms, error_rate={error_rate})")
+    
+    def generate(self, system_prompt: str, user_prompt: str, tier: Optional[str] = None) -> str:
+        text, _ = self.generate_with_usage(system_prompt, user_prompt, tier=tier)
+        return text
+    
+    def generate_with_usage(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        tier: Optional[str] = None,
+        json_mode: bool = False
+    ) -> tuple[str, dict]:
+        text, usage_info, delay = self._respond(system_prompt, user_prompt)
+        time.sleep(delay)
+        self._maybe_fail()
+        return text, usage_info
+    
+    async def agenerate(self, system_prompt: str, user_prompt: str, tier: Optional[str] = None) -> str:
+        text, _ = await self.agenerate_with_usage(system_prompt, user_prompt, tier=tier)
+        return text
+    
+    async def agenerate_with_usage(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        tier: Optional[str] = None,
+        json_mode: bool = False
+    ) -> tuple[str, dict]:
+        text, usage_info, delay = self._respond(system_prompt, user_prompt)
+        await asyncio.sleep(delay)
+        self._maybe_fail()
+        return text, usage_info
+    
+    def stream_with_usage(self, system_prompt: str, user_prompt: str, tier: Optional[str] = None) -> LLMStream:
+        """Stream a few words at a time; a third of the latency passes before the first token."""
+        def items():
+            text, usage_info, delay = self._respond(system_prompt, user_prompt)
+            time.sleep(delay / 3)
+            self._maybe_fail()
+            words = text.split(" ")
+            groups = [" ".join(words[i:i + 5]) for i in range(0, len(words), 5)]
+            for i, group in enumerate(groups):
+                if i:
+                    time.sleep(2 * delay / 3 / len(groups))
+                yield group if i == len(groups) - 1 else group + " "
+            yield usage_info
+        return LLMStream(items())
+    
+    def _respond(self, system_prompt: str, user_prompt: str) -> Tuple[str, dict, float]:
+        """Pick the response text, usage and simulated delay (seconds) for a prompt."""
+        if self.mode == REPLAY:
+            record = self._recordings.get(prompt_key(system_prompt, user_prompt))
+            if record is not None:
+                FAKE_LLM_CALLS.labels(source="replay").inc()
+                usage_info = dict(record.get("usage") or {})
+                usage_info.setdefault("model_used", record.get("model", FAKE_MODEL))
+                recorded_ms = record.get("latency_ms")
+                delay = recorded_ms / 1000 if recorded_ms is not None else self._sample_delay()
+                return record["response"], usage_info, delay
+            FAKE_LLM_CALLS.labels(source="replay_miss").inc()
+            if self.strict_replay:
+                raise KeyError(f"No recorded LLM response for prompt {prompt_key(system_prompt, user_prompt)[:12]}")
+        
+        FAKE_LLM_CALLS.labels(source="synthesized").inc()
+        text = synthesize_response(user_prompt, self.hallucination_rate)
+        prompt_tokens = estimate_tokens(system_prompt) + estimate_tokens(user_prompt)
+        completion_tokens = estimate_tokens(text)
+        usage_info = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "model_used": FAKE_MODEL
+        }
+        return text, usage_info, self._sample_delay()
+    
+    def _sample_delay(self) -> float:
+        """Log-normal delay in seconds with the configured median and p99."""
+        if self.latency_ms <= 0:
+            return 0.0
+        sigma = math.log(self.latency_p99_ms / self.latency_ms) / _Z_P99
+        with self._random_lock:
+            return self._random.lognormvariate(math.log(self.latency_ms), sigma) / 1000
+    
+    def _maybe_fail(self) -> None:
+        if self.error_rate <= 0:
+            return
+        with self._random_lock:
+            failed = self._random.random() < self.error_rate
+        if failed:
+            FAKE_LLM_CALLS.labels(source="error").inc()
+            raise FakeLLMError("Injected fake LLM error (503 Service Unavailable)")
+
+
+def synthesize_response(user_prompt: str, hallucination_rate: float = 0.0) -> str:
+    """
+    Deterministic response for a prompt: a verifier verdict for verifier
+    prompts, otherwise an answer built from the best-matching cited sentences
+    (plain draft, or JSON with quotes for structured prompts).
+    
+    Args:
+        user_prompt: Prompt to answer
+        hallucination_rate: Fraction of prompts (chosen by prompt hash) whose
+            answer gets an unsupported number, to exercise verification
+    """
+    draft = _DRAFT_PATTERN.search(user_prompt)
+    if draft:
+        return _synthesize_verdict(draft.group(1), user_prompt)
+    
+    match = _CONTEXT_PATTERN.search(user_prompt)
+    context, question = (match.group(1), match.group(2)) if match else (user_prompt, "")
+    claims = _select_claims(context, question)
+    if claims and hallucination_rate > 0 and _prompt_fraction(user_prompt) < hallucination_rate:
+        claims = _hallucinate(claims)
+    
+    if _STRUCTURED_MARKER in user_prompt:
+        return json.dumps({
+            "answerable": bool(claims),
+            "sentences": [{"text": text, "sources": [int(source)], "quote": quote} for source, text, quote in claims]
+        })
+    if not claims:
+        return NO_ANSWER
+    parts = []
+    for source_number, text, _ in claims:
+        body = text.rstrip(".!?")
+        ending = text[len(body):] or "."
+        parts.append(f"{body} [Source {source_number}]{ending}")
+    return " ".join(parts)
+
+
+def _synthesize_verdict(draft: str, user_prompt: str) -> str:
+    """Pass drafts that cite sources and only state numbers found in the context."""
+    context = user_prompt.split("## DRAFT ANSWER TO VERIFY:")[0].split("## PROVIDED CONTEXT:")[-1]
+    issues = []
+    if not _CITATION_PATTERN.search(draft):
+        issues.append("Draft answer has no citations")
+    context_numbers = set(_NUMBER_PATTERN.findall(_CITATION_PATTERN.sub("", context)))
+    unsupported = [n for n in _NUMBER_PATTERN.findall(_CITATION_PATTERN.sub("", draft)) if n not in context_numbers]
+    if unsupported:
+        issues.append(f"Numbers {unsupported} are not in the context")
+    return json.dumps({
+        "pass": not issues,
+        "issues": issues,
+        "unsupported_claims": unsupported,
+        "final_answer": None
+    })
+
+
+def _select_claims(context: str, question: str) -> List[Tuple[str, str, str]]:
+    """Up to two (source number, claim text, supporting quote) with the most question-word overlap."""
+    question_words = {w for w in _WORD_PATTERN.findall(question.lower()) if len(w) > 2}
+    candidates: List[Tuple[int, int, str, str]] = []
+    for source_number, passage in _SOURCE_PATTERN.findall(context):
+        for sentence in _SENTENCE_SPLIT.split(passage.strip()):
+            sentence = " ".join(sentence.split())
+            if not sentence or sentence.startswith("#"):
+                continue
+            overlap = len(question_words & set(_WORD_PATTERN.findall(sentence.lower())))
+            if overlap:
+                candidates.append((overlap, len(candidates), source_number, sentence))
+    best = sorted(candidates, key=lambda c: (-c[0], c[1]))[:2]
+    return [(source, sentence, sentence) for _, _, source, sentence in sorted(best, key=lambda c: c[1])]
+
+
+def _prompt_fraction(user_prompt: str) -> float:
+    """Deterministic value in [0, 1) derived from the prompt."""
+    return int(hashlib.sha256(user_prompt.encode("utf-8")).hexdigest()[:8], 16) / 16 ** 8
+
+
+def _hallucinate(claims: List[Tuple[str, str, str]]) -> List[Tuple[str, str, str]]:
+    """Alter the first number in the claims (quotes stay true), or add an unsupported claim."""
+    for i, (source, text, quote) in enumerate(claims):
+        number = _NUMBER_PATTERN.search(text)
+        if number:
+            wrong = str(int(re.sub(r"\D", "", number.group(0)) or 0) + 7)
+            altered = text[:number.start()] + wrong + text[number.end():]
+            return claims[:i] + [(source, altered, quote)] + claims[i + 1:]
+    source, _, quote = claims[0]
+    return claims + [(source, "Support is available 24/7 by phone.", quote)]
+
+
+class RecordingProvider(LLMProvider):
+    """
+    Wraps a real provider and appends every response to a JSONL file,
+    replayable with LLM_PROVIDER="fake" and FAKE_LLM_MODE="replay".
+    """
+    
+    def __init__(self, inner: LLMProvider, path: Path, provider_name: str):
+        """
+        Args:
+            inner: Provider that makes the real calls
+            path: JSONL file to append recordings to
+            provider_name: Name recorded with each response
+        """
+        self.inner = inner
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.provider_name = provider_name
+        self._lock = threading.Lock()
+        logger.info(f"Recording {provider_name} LLM traffic to {self.path}")
+    
+    def generate(self, system_prompt: str, user_prompt: str, tier: Optional[str] = None) -> str:
+        started = time.monotonic()
+        text = self.inner.generate(system_prompt, user_prompt, **tier_kwargs(tier))
+        self._record(system_prompt, user_prompt, text, {}, started, tier)
+        return text
+    
+    def generate_with_usage(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        tier: Optional[str] = None,
+        json_mode: bool = False
+    ) -> tuple[str, dict]:
+        started = time.monotonic()
+        text, usage_info = self.inner.generate_with_usage(system_prompt, user_prompt, **provider_kwargs(tier, json_mode))
+        self._record(system_prompt, user_prompt, text, usage_info, started, tier)
+        return text, usage_info
+    
+    async def agenerate(self, system_prompt: str, user_prompt: str, tier: Optional[str] = None) -> str:
+        started = time.monotonic()
+        text = await self.inner.agenerate(system_prompt, user_prompt, **tier_kwargs(tier))
+        self._record(system_prompt, user_prompt, text, {}, started, tier)
+        return text
+    
+    async def agenerate_with_usage(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        tier: Optional[str] = None,
+        json_mode: bool = False
+    ) -> tuple[str, dict]:
+        started = time.monotonic()
+        text, usage_info = await self.inner.agenerate_with_usage(
+            system_prompt, user_prompt, **provider_kwargs(tier, json_mode)
+        )
+        self._record(system_prompt, user_prompt, text, usage_info, started, tier)
+        return text, usage_info
+    
+    def stream_with_usage(self, system_prompt: str, user_prompt: str, tier: Optional[str] = None) -> LLMStream:
+        """Pass deltas through; the full text is recorded once the stream is consumed."""
+        def items() -> Iterator[Any]:
+            started = time.monotonic()
+            stream = self.inner.stream_with_usage(system_prompt, user_prompt, **tier_kwargs(tier))
+            yield from stream
+            self._record(system_prompt, user_prompt, stream.text, stream.usage, started, tier)
+            yield stream.usage
+        return LLMStream(items())
+    
+    def _record(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        text: str,
+        usage_info: dict,
+        started: float,
+        tier: Optional[str]
+    ) -> None:
+        record = {
+            "key": prompt_key(system_prompt, user_prompt),
+            "provider": self.provider_name,
+            "model": (usage_info or {}).get("model_used"),
+            "tier": tier,
+            "response": text,
+            "usage": usage_info or {},
+            "latency_ms": int((time.monotonic() - started) * 1000),
+            "recorded_at": datetime.utcnow().isoformat()
+        }
+        try:
+            with self._lock, open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        except OSError as e:
+            logger.error(f"Failed to record LLM response: {e}")
@@ -12,6 +12,8 @@ import re
 from dataclasses import dataclass
 import logging
 
+from app.config import settings
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -103,14 +105,19 @@ class DocumentParser:
             raise
     
     def _parse_docx(self, file_path: Path) -> ParsedDocument:
-        """Parse DOCX file."""
+        """Parse DOCX file (heading styles become markdown-style heading lines with hierarchical chunking)."""
         try:
             doc = DocxDocument(file_path)
             paragraphs = []
             
             for para in doc.paragraphs:
                 if para.text.strip():
-                    paragraphs.append(para.text)
+                    heading_level = self._docx_heading_level(para) if settings.HIERARCHICAL_CHUNKING else None
+                    if heading_level:
+                        # Keep section structure for the hierarchical chunker
+                        paragraphs.append(f"{'#' * heading_level} {para.text.strip()}")
+                    else:
+                        paragraphs.append(para.text)
             
             # Also extract text from tables
             for table in doc.tables:
@@ -134,6 +141,16 @@ class DocumentParser:
             logger.error(f"Error parsing DOCX {file_path}: {e}")
             raise
     
+    def _docx_heading_level(self, para) -> Optional[int]:
+        """Get the heading level (1-6) of a DOCX paragraph from its style, if any."""
+        style_name = (para.style.name if para.style is not None else "") or ""
+        if style_name == "Title":
+            return 1
+        match = re.match(r'Heading\s*(\d)', style_name)
+        if match:
+            return min(max(int(match.group(1)), 1), 6)
+        return None
+    
     def _parse_text(self, file_path: Path) -> ParsedDocument:
         """Parse plain text file with encoding detection."""
         try:
@@ -204,8 +221,12 @@ class DocumentParser:
         md_text = re.sub(r'```[\s\S]*?```', '', md_text)
         md_text = re.sub(r'`([^`]+)`', r'\1', md_text)
         
-        # Convert headers to plain text with emphasis
-        md_text = re.sub(r'^#{1,6}\s+(.+)$', r'\1:', md_text, flags=re.MULTILINE)
+        if settings.HIERARCHICAL_CHUNKING:
+            # Normalize headers but keep the "#" markers so the chunker can track sections
+            md_text = re.sub(r'^(#{1,6})\s+(.+?)\s*#*\s*$', r'\1 \2', md_text, flags=re.MULTILINE)
+        else:
+            # Convert headers to plain text with emphasis
+            md_text = re.sub(r'^#{1,6}\s+(.+)$', r'\1:', md_text, flags=re.MULTILINE)
         
         # Remove bold/italic markers
         md_text = re.sub(r'\*\*([^*]+)\*\*', r'\1', md_text)
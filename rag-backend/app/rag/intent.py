@@ -3,7 +3,9 @@ Intent detection module for RAG pipeline.
 Detects user intent from queries to enable intent-based gating.
 """
 import re
-from typing import List, Dict, Set
+from bisect import bisect_left
+from functools import lru_cache
+from typing import List, Dict, Set, Optional, FrozenSet, Iterable, Any
 import logging
 
 logging.basicConfig(level=logging.INFO)
@@ -36,6 +38,139 @@ INTENT_KEYWORDS: Dict[str, List[str]] = {
     "general": []  # Catch-all for general queries
 }
 
+STOP_WORDS: FrozenSet[str] = frozenset({
+    "the", "a", "an", "is", "are", "was", "were", "be", "been",
+    "to", "of", "and", "or", "but", "in", "on", "at", "for",
+    "with", "how", "what", "when", "where", "why", "do", "does"
+})
+
+_TOKEN_PATTERN = re.compile(r"\w+")
+
+
+def _keyword_alternation(keywords: Iterable[str]) -> "re.Pattern":
+    """One word-bounded alternation for all keywords (longest first so phrases win)."""
+    ordered = sorted({kw.lower() for kw in keywords}, key=len, reverse=True)
+    return re.compile(r"\b(?:" + "|".join(re.escape(kw) for kw in ordered) + r")\b")
+
+
+def _build_keyword_intents() -> Dict[str, FrozenSet[str]]:
+    """
+    Map each keyword to the intents it signals.
+    A phrase also carries the intents of keywords inside it ("payment gateway"
+    signals billing via "payment"), since the alternation matches it as a whole.
+    """
+    keyword_intents: Dict[str, Set[str]] = {}
+    for intent, keywords in INTENT_KEYWORDS.items():
+        for keyword in keywords:
+            keyword_intents.setdefault(keyword.lower(), set()).add(intent)
+    for phrase in [kw for kw in keyword_intents if " " in kw]:
+        for keyword, intents in list(keyword_intents.items()):
+            if keyword != phrase and re.search(r"\b" + re.escape(keyword) + r"\b", phrase):
+                keyword_intents[phrase] |= intents
+    return {kw: frozenset(intents) for kw, intents in keyword_intents.items()}
+
+
+# Built once at import: a single pass over the query finds every intent keyword
+_KEYWORD_INTENTS = _build_keyword_intents()
+_INTENT_PATTERN = _keyword_alternation(_KEYWORD_INTENTS)
+
+
+@lru_cache(maxsize=64)
+def _phrase_pattern(phrases: FrozenSet[str]) -> "re.Pattern":
+    """Compiled alternation for a set of multi-word keywords (cached per keyword set)."""
+    return _keyword_alternation(phrases)
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Sorted unique lowercase word tokens of a text.
+    
+    Args:
+        text: Text to tokenize
+    
+    Returns:
+        Sorted list of unique tokens
+    """
+    return sorted(set(_TOKEN_PATTERN.findall(text.lower())))
+
+
+def lexical_tokens(text: str) -> str:
+    """Token set of a chunk in the form stored with its metadata at ingest."""
+    return " ".join(tokenize(text))
+
+
+class ChunkTokens:
+    """
+    Precomputed token set of a chunk for lexical gating.
+    Supports exact word lookups and prefix lookups (so "refund" matches "refunds").
+    The stored token string is only split when the chunk is actually checked.
+    """
+    
+    __slots__ = ("text", "_stored", "_tokens")
+    
+    def __init__(self, text: str, stored_tokens: Optional[str] = None):
+        """
+        Args:
+            text: Chunk text (used for phrase checks and for chunks without stored tokens)
+            stored_tokens: Space-separated sorted tokens from lexical_tokens()
+        """
+        self.text = text
+        self._stored = stored_tokens
+        self._tokens: Optional[List[str]] = None
+    
+    @classmethod
+    def from_metadata(cls, text: str, metadata: Optional[Dict[str, Any]]) -> "ChunkTokens":
+        """Use the token set stored at ingest; chunks indexed before that are tokenized on use."""
+        stored = (metadata or {}).get("lexical_tokens")
+        return cls(text, stored if isinstance(stored, str) else None)
+    
+    @property
+    def tokens(self) -> List[str]:
+        """Sorted unique tokens."""
+        if self._tokens is None:
+            self._tokens = self._stored.split() if self._stored is not None else tokenize(self.text)
+        return self._tokens
+    
+    def has(self, word: str) -> bool:
+        """Whether the chunk contains the word as a whole token."""
+        tokens = self.tokens
+        i = bisect_left(tokens, word)
+        return i < len(tokens) and tokens[i] == word
+    
+    def has_prefix(self, prefix: str) -> bool:
+        """Whether any token of the chunk starts with prefix."""
+        tokens = self.tokens
+        i = bisect_left(tokens, prefix)
+        return i < len(tokens) and tokens[i].startswith(prefix)
+    
+    def has_any_keyword(self, words: FrozenSet[str], phrase_pattern: Optional["re.Pattern"] = None) -> bool:
+        """Whether the chunk contains any single-word keyword, or matches the phrase pattern."""
+        if any(self.has(word) for word in words):
+            return True
+        return phrase_pattern is not None and phrase_pattern.search(self.text.lower()) is not None
+
+
+def important_query_words(query: str) -> Set[str]:
+    """Query words that aren't stop words."""
+    return set(_TOKEN_PATTERN.findall(query.lower())) - STOP_WORDS
+
+
+def has_important_word_match(query: str, chunks: List[ChunkTokens]) -> bool:
+    """
+    Lenient direct-match check: at least one important query word appears in some chunk.
+    
+    Args:
+        query: User's question
+        chunks: Token sets of the retrieved chunks
+    
+    Returns:
+        True if any chunk contains an important query word
+    """
+    important_words = important_query_words(query)
+    if not important_words:
+        return False
+    return any(chunk.has_prefix(word) for chunk in chunks for word in important_words)
+
 
 def detect_intents(query: str) -> List[str]:
     """
@@ -47,20 +182,12 @@ def detect_intents(query: str) -> List[str]:
     Returns:
         List of detected intent labels (e.g., ["integration", "billing"])
     """
-    query_lower = query.lower()
-    detected = []
+    matched: Set[str] = set()
+    for match in _INTENT_PATTERN.finditer(query.lower()):
+        matched |= _KEYWORD_INTENTS[match.group(0)]
     
-    for intent, keywords in INTENT_KEYWORDS.items():
-        if intent == "general":
-            continue  # Skip general, it's a catch-all
-        
-        # Check if any keyword matches
-        for keyword in keywords:
-            # Use word boundary matching for better accuracy
-            pattern = r'\b' + re.escape(keyword.lower()) + r'\b'
-            if re.search(pattern, query_lower):
-                detected.append(intent)
-                break  # Only add intent once
+    # Keep INTENT_KEYWORDS order; "general" is the catch-all
+    detected = [intent for intent in INTENT_KEYWORDS if intent != "general" and intent in matched]
     
     # If no specific intent detected, return general
     if not detected:
@@ -90,7 +217,8 @@ def get_intent_keywords(intents: List[str]) -> Set[str]:
 def check_direct_match(
     query: str,
     retrieved_chunks: List[str],
-    intent_keywords: Set[str] = None
+    intent_keywords: Set[str] = None,
+    chunk_tokens: Optional[List[ChunkTokens]] = None
 ) -> bool:
     """
     Check if at least one retrieved chunk contains direct matches for query intent.
@@ -99,6 +227,7 @@ def check_direct_match(
         query: User's question
         retrieved_chunks: List of retrieved chunk texts
         intent_keywords: Optional set of intent keywords to check
+        chunk_tokens: Optional precomputed token sets (same order as retrieved_chunks)
         
     Returns:
         True if at least one chunk has direct match, False otherwise
@@ -106,48 +235,40 @@ def check_direct_match(
     if not retrieved_chunks:
         return False
     
-    query_lower = query.lower()
-    query_words = set(re.findall(r'\b\w+\b', query_lower))
-    
     # Get intent keywords if not provided
     if intent_keywords is None:
         intents = detect_intents(query)
         intent_keywords = get_intent_keywords(intents)
+    keywords = {kw.lower() for kw in intent_keywords}
+    keyword_words = frozenset(kw for kw in keywords if " " not in kw)
+    keyword_phrases = frozenset(kw for kw in keywords if " " in kw)
+    phrase_pattern = _phrase_pattern(keyword_phrases) if keyword_phrases else None
+    
+    # Important words (excluding common stop words) are computed once per query
+    important_words = important_query_words(query)
+    
+    if chunk_tokens is None:
+        chunk_tokens = [ChunkTokens(chunk) for chunk in retrieved_chunks]
     
     # Check each chunk for direct matches
-    for chunk in retrieved_chunks:
-        chunk_lower = chunk.lower()
-        
+    for chunk in chunk_tokens:
         # Check 1: Intent keywords must be present in chunk
-        if intent_keywords:
-            intent_found = any(
-                re.search(r'\b' + re.escape(kw.lower()) + r'\b', chunk_lower)
-                for kw in intent_keywords
-            )
-            if not intent_found:
-                continue  # Skip this chunk if no intent keywords
+        if keywords and not chunk.has_any_keyword(keyword_words, phrase_pattern):
+            continue  # Skip this chunk if no intent keywords
         
         # Check 2: At least 2-3 important query words should be in chunk
-        # (excluding common stop words)
-        stop_words = {"the", "a", "an", "is", "are", "was", "were", "be", "been",
-                     "to", "of", "and", "or", "but", "in", "on", "at", "for",
-                     "with", "how", "what", "when", "where", "why", "do", "does"}
-        important_words = query_words - stop_words
-        
         if len(important_words) >= 2:
             # Need at least 2 important words to match
-            matches = sum(1 for word in important_words if word in chunk_lower)
+            matches = sum(1 for word in important_words if chunk.has_prefix(word))
             if matches >= 2:
                 logger.info(f"Direct match found: {matches} important words matched in chunk")
                 return True
         elif len(important_words) == 1:
-            # Single important word - require exact phrase match
+            # Single important word - require exact word match
             for word in important_words:
-                if re.search(r'\b' + re.escape(word) + r'\b', chunk_lower):
+                if chunk.has(word):
                     logger.info(f"Direct match found: single important word '{word}' matched")
                     return True
     
     logger.warning("No direct match found in retrieved chunks")
     return False
-
-
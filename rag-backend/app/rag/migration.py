@@ -0,0 +1,263 @@
+"""
+Background re-embedding migration.
+Rebuilds a tenant's vectors with a new embedding model into a shadow index,
+then switches the tenant over atomically. Queries keep using the old index
+(and the old model) until the switch.
+"""
+from typing import Dict, Any, Optional, List
+from datetime import datetime
+import threading
+import logging
+import time
+
+from app.config import settings
+from app.rag.embeddings import get_embedding_service
+from app.rag.vectorstore import get_vector_store
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class ReembeddingJob:
+    """
+    Re-embeds one tenant's chunks from stored chunk text.
+    Runs on a daemon thread and exposes progress/throughput via to_dict().
+    """
+    
+    def __init__(
+        self,
+        tenant_id: str,
+        target_model: str,
+        target_revision: str,
+        batch_size: int = settings.REEMBED_BATCH_SIZE,
+        max_chunks_per_second: float = settings.REEMBED_MAX_CHUNKS_PER_SECOND
+    ):
+        """
+        Initialize the job.
+        
+        Args:
+            tenant_id: Tenant whose index is rebuilt
+            target_model: Embedding model to migrate to
+            target_revision: Embedding revision to migrate to
+            batch_size: Chunks re-embedded per batch
+            max_chunks_per_second: Throttle (0 = unthrottled)
+        """
+        self.tenant_id = tenant_id
+        self.target_model = target_model
+        self.target_revision = target_revision
+        self.batch_size = max(1, batch_size)
+        self.max_chunks_per_second = max_chunks_per_second
+        
+        self.status = "pending"  # pending, running, completed, failed
+        self.source_index: Optional[Dict[str, Any]] = None
+        self.target_index: Optional[Dict[str, Any]] = None
+        self.total_chunks = 0
+        self.migrated_chunks = 0
+        self.started_at: Optional[datetime] = None
+        self.finished_at: Optional[datetime] = None
+        self.error: Optional[str] = None
+        self._started_monotonic: Optional[float] = None
+        self._elapsed: float = 0.0
+        self._thread: Optional[threading.Thread] = None
+    
+    @property
+    def is_active(self) -> bool:
+        """Whether the job is still pending or running."""
+        return self.status in ("pending", "running")
+    
+    def start(self) -> None:
+        """Start the job on a background thread."""
+        self._thread = threading.Thread(
+            target=self.run,
+            name=f"reembed-{self.tenant_id}",
+            daemon=True
+        )
+        self._thread.start()
+    
+    def run(self) -> None:
+        """Run the migration (blocking)."""
+        vector_store = get_vector_store()
+        self.status = "running"
+        self.started_at = datetime.utcnow()
+        self._started_monotonic = time.monotonic()
+        tenant_filter = {"tenant_id": self.tenant_id}
+        
+        try:
+            self.source_index = vector_store.get_tenant_index(self.tenant_id)
+            self.source_index.pop("shadow", None)
+            self.target_index = {
+                "collection_name": vector_store.collection_name_for(self.target_model, self.target_revision),
+                "embedding_model": self.target_model,
+                "embedding_revision": self.target_revision
+            }
+            vector_store.set_shadow_index(self.tenant_id, self.target_index)
+            embedding_service = get_embedding_service(self.target_model)
+            
+            # Bulk pass: copy a snapshot of the tenant's chunks at a throttled rate
+            source_ids = vector_store.get_chunk_ids(self.source_index, tenant_filter)
+            already_copied = set(vector_store.get_chunk_ids(self.target_index, tenant_filter))
+            pending_ids = [chunk_id for chunk_id in source_ids if chunk_id not in already_copied]
+            self.total_chunks = len(source_ids)
+            self.migrated_chunks = len(source_ids) - len(pending_ids)
+            logger.info(
+                f"Re-embedding tenant {self.tenant_id}: {len(pending_ids)} chunks "
+                f"{self.source_index['collection_name']} -> {self.target_index['collection_name']}"
+            )
+            self._copy_chunks(vector_store, embedding_service, pending_ids)
+            
+            # Catch-up pass under the tenant lock: pick up uploads made during the bulk pass,
+            # drop chunks deleted since they were copied, then switch. Ingestion and deletes
+            # hold the same lock, so nothing lands in between.
+            with vector_store.tenant_lock(self.tenant_id):
+                source_ids = vector_store.get_chunk_ids(self.source_index, tenant_filter)
+                copied_ids = set(vector_store.get_chunk_ids(self.target_index, tenant_filter))
+                # The bulk pass reads batches without the lock, so a delete can land between a
+                # read and the shadow write; earlier failed attempts can also leave stale copies
+                stale_ids = list(copied_ids.difference(source_ids))
+                if stale_ids:
+                    logger.info(f"Re-embedding tenant {self.tenant_id}: dropping {len(stale_ids)} deleted chunks")
+                    vector_store.get_collection_for_index(self.target_index).delete(ids=stale_ids)
+                    copied_ids.difference_update(stale_ids)
+                missing_ids = [chunk_id for chunk_id in source_ids if chunk_id not in copied_ids]
+                self.total_chunks = len(copied_ids) + len(missing_ids)
+                self.migrated_chunks = len(copied_ids)
+                if missing_ids:
+                    logger.info(f"Re-embedding tenant {self.tenant_id}: catching up {len(missing_ids)} new chunks")
+                    self._copy_chunks(vector_store, embedding_service, missing_ids, throttle=False)
+                vector_store.switch_tenant_index(self.tenant_id, self.target_index)
+            
+            # Old vectors are no longer read; drop them from the source collection
+            vector_store.get_collection_for_index(self.source_index).delete(where=tenant_filter)
+            
+            self.status = "completed"
+            logger.info(
+                f"Re-embedding tenant {self.tenant_id} completed: {self.migrated_chunks} chunks "
+                f"at {self.chunks_per_second:.1f} chunks/s"
+            )
+        except Exception as e:
+            self.status = "failed"
+            self.error = str(e)
+            logger.error(f"Re-embedding tenant {self.tenant_id} failed: {e}", exc_info=True)
+            try:
+                # Keep serving from the source index; a retry resumes from the shadow contents
+                vector_store.set_shadow_index(self.tenant_id, None)
+            except Exception:
+                logger.error("Failed to clear shadow index after migration failure", exc_info=True)
+        finally:
+            self.finished_at = datetime.utcnow()
+            self._elapsed = time.monotonic() - self._started_monotonic
+    
+    def _copy_chunks(self, vector_store, embedding_service, chunk_ids: List[str], throttle: bool = True) -> None:
+        """Re-embed chunks by ID from stored text and write them to the shadow index."""
+        for start in range(0, len(chunk_ids), self.batch_size):
+            batch_started = time.monotonic()
+            batch = vector_store.get_chunks(self.source_index, chunk_ids[start:start + self.batch_size])
+            # Chunks deleted since the snapshot are simply absent from the batch
+            if batch["ids"]:
+                embeddings = embedding_service.embed_texts(batch["documents"], batch_size=self.batch_size)
+                vector_store.add_documents(
+                    documents=batch["documents"],
+                    embeddings=embeddings,
+                    metadatas=batch["metadatas"],
+                    ids=batch["ids"],
+                    index=self.target_index
+                )
+                self.migrated_chunks += len(batch["ids"])
+            
+            if throttle and self.max_chunks_per_second > 0:
+                min_duration = len(batch["ids"]) / self.max_chunks_per_second
+                remaining = min_duration - (time.monotonic() - batch_started)
+                if remaining > 0:
+                    time.sleep(remaining)
+    
+    @property
+    def chunks_per_second(self) -> float:
+        """Observed re-embedding throughput."""
+        if self._started_monotonic is None:
+            return 0.0
+        elapsed = self._elapsed if self.finished_at else time.monotonic() - self._started_monotonic
+        return self.migrated_chunks / elapsed if elapsed > 0 else 0.0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """Progress report for the status endpoint."""
+        return {
+            "tenant_id": self.tenant_id,
+            "status": self.status,
+            "source_model": self.source_index["embedding_model"] if self.source_index else None,
+            "target_model": self.target_model,
+            "target_revision": self.target_revision,
+            "total_chunks": self.total_chunks,
+            "migrated_chunks": self.migrated_chunks,
+            "progress": (self.migrated_chunks / self.total_chunks) if self.total_chunks else (1.0 if self.status == "completed" else 0.0),
+            "chunks_per_second": round(self.chunks_per_second, 2),
+            "started_at": self.started_at.isoformat() if self.started_at else None,
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "error": self.error
+        }
+
+
+class ReembeddingService:
+    """
+    Starts and tracks re-embedding jobs (one active job per tenant).
+    """
+    
+    def __init__(self):
+        self._jobs: Dict[str, ReembeddingJob] = {}
+        self._lock = threading.Lock()
+    
+    def start_migration(
+        self,
+        tenant_id: str,
+        target_model: Optional[str] = None,
+        target_revision: Optional[str] = None
+    ) -> ReembeddingJob:
+        """
+        Start re-embedding a tenant's chunks.
+        
+        Args:
+            tenant_id: Tenant to migrate
+            target_model: Model to migrate to (defaults to settings.EMBEDDING_MODEL)
+            target_revision: Revision to migrate to (defaults to settings.EMBEDDING_MODEL_REVISION)
+        
+        Returns:
+            The started job
+        
+        Raises:
+            ValueError: If a job is already running or the tenant is already on the target index
+        """
+        target_model = target_model or settings.EMBEDDING_MODEL
+        target_revision = str(target_revision or settings.EMBEDDING_MODEL_REVISION)
+        
+        with self._lock:
+            existing = self._jobs.get(tenant_id)
+            if existing and existing.is_active:
+                raise ValueError(f"A re-embedding job is already running for tenant {tenant_id}")
+            
+            current = get_vector_store().get_tenant_index(tenant_id)
+            if (current["embedding_model"] == target_model
+                    and current["embedding_revision"] == target_revision):
+                raise ValueError(
+                    f"Tenant {tenant_id} is already indexed with {target_model} (revision {target_revision})"
+                )
+            
+            job = ReembeddingJob(tenant_id, target_model, target_revision)
+            self._jobs[tenant_id] = job
+        
+        job.start()
+        return job
+    
+    def get_job(self, tenant_id: str) -> Optional[ReembeddingJob]:
+        """Get the most recent job for a tenant."""
+        return self._jobs.get(tenant_id)
+
+
+# Global re-embedding service instance
+_reembedding_service: Optional[ReembeddingService] = None
+
+
+def get_reembedding_service() -> ReembeddingService:
+    """Get the global re-embedding service instance."""
+    global _reembedding_service
+    if _reembedding_service is None:
+        _reembedding_service = ReembeddingService()
+    return _reembedding_service
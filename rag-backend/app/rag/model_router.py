@@ -0,0 +1,130 @@
+"""
+Model tier routing by query complexity.
+Simple FAQ-style questions with strong retrieval go to a cheap/fast model;
+multi-part, integration or weakly grounded questions go to a larger model.
+Classification only uses signals the pipeline already computed.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import logging
+import re
+
+from app.config import settings
+from app.rag.intent import detect_intents
+from app.utils.metrics import counter
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FAST = "fast"
+LARGE = "large"
+TIERS = (FAST, LARGE)
+
+MODEL_TIER_REQUESTS = counter(
+    "rag_model_tier_requests_total",
+    "Answers generated per model tier",
+    ["tier"]
+)
+
+_WORD_PATTERN = re.compile(r"\w+")
+
+
+@dataclass
+class RoutingDecision:
+    """Chosen tier and the signals that led to it."""
+    tier: str
+    reasons: List[str] = field(default_factory=list)
+
+
+class ModelRouter:
+    """
+    Classifies a question into a model tier from retrieval signals:
+    confidence, detected intents, number of relevant chunks and question length.
+    """
+    
+    def __init__(
+        self,
+        fast_min_confidence: float = settings.MODEL_ROUTING_FAST_MIN_CONFIDENCE,
+        fast_max_words: int = settings.MODEL_ROUTING_FAST_MAX_WORDS,
+        large_min_chunks: int = settings.MODEL_ROUTING_LARGE_MIN_CHUNKS,
+        large_intents: str = settings.MODEL_ROUTING_LARGE_INTENTS
+    ):
+        """
+        Args:
+            fast_min_confidence: Retrieval confidence below this needs the large tier
+            fast_max_words: Questions longer than this need the large tier
+            large_min_chunks: This many relevant chunks means a synthesis question
+            large_intents: Comma-separated intents that always use the large tier
+        """
+        self.fast_min_confidence = fast_min_confidence
+        self.fast_max_words = fast_max_words
+        self.large_min_chunks = large_min_chunks
+        self.large_intents = {i.strip() for i in large_intents.split(",") if i.strip()}
+    
+    def classify(self, question: str, confidence: float, relevant_chunks: int) -> RoutingDecision:
+        """
+        Pick the model tier for a question.
+        
+        Args:
+            question: User's question
+            confidence: Retrieval confidence
+            relevant_chunks: Number of passages that made it into the context
+        
+        Returns:
+            RoutingDecision (large if any complexity signal fires, otherwise fast)
+        """
+        reasons = []
+        intents = set(detect_intents(question)) & self.large_intents
+        if intents:
+            reasons.append(f"intent:{','.join(sorted(intents))}")
+        word_count = len(_WORD_PATTERN.findall(question))
+        if word_count > self.fast_max_words:
+            reasons.append(f"words:{word_count}")
+        if question.count("?") > 1:
+            reasons.append("multi_part")
+        if relevant_chunks >= self.large_min_chunks:
+            reasons.append(f"chunks:{relevant_chunks}")
+        if confidence < self.fast_min_confidence:
+            reasons.append(f"confidence:{confidence:.2f}")
+        
+        decision = RoutingDecision(tier=LARGE if reasons else FAST, reasons=reasons)
+        MODEL_TIER_REQUESTS.labels(tier=decision.tier).inc()
+        logger.info(f"Model tier '{decision.tier}' ({', '.join(reasons) or 'simple question'})")
+        return decision
+
+
+def model_for_tier(provider: str, tier: Optional[str], default: str) -> str:
+    """
+    Resolve the model name a provider should use for a tier.
+    
+    Args:
+        provider: "gemini" or "openai"
+        tier: FAST, LARGE or None (no routing)
+        default: Model to use when tier is None or unknown
+    """
+    if tier not in TIERS:
+        return default
+    configured = {
+        ("gemini", FAST): settings.GEMINI_MODEL_FAST,
+        ("gemini", LARGE): settings.GEMINI_MODEL_LARGE,
+        ("openai", FAST): settings.OPENAI_MODEL_FAST,
+        ("openai", LARGE): settings.OPENAI_MODEL_LARGE,
+    }.get((provider, tier))
+    return configured or default
+
+
+def tier_kwargs(tier: Optional[str]) -> Dict[str, str]:
+    """Keyword arguments for provider calls: only pass tier when routing chose one."""
+    return {"tier": tier} if tier else {}
+
+
+# Global model router instance
+_model_router: Optional[ModelRouter] = None
+
+
+def get_model_router() -> ModelRouter:
+    """Get the global model router instance."""
+    global _model_router
+    if _model_router is None:
+        _model_router = ModelRouter()
+    return _model_router
@@ -0,0 +1,291 @@
+"""
+Token-exact context packing for the LLM prompt.
+Selects retrieved passages with MMR (relevance vs. redundancy) until the real
+token budget is used, and strips text that adjacent chunks share because of
+the chunker's overlap.
+"""
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Tuple, Callable
+import logging
+import re
+
+import numpy as np
+
+from app.config import settings
+from app.models.schemas import RetrievalResult
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SEPARATOR = "\n\n---\n\n"
+_WORD_PATTERN = re.compile(r"\w+")
+_MIN_HEURISTIC_OVERLAP = 20  # chars; shorter shared text is likely coincidence
+
+
+@dataclass
+class _Variant:
+    """One way to render a candidate: its parent section or the matched chunk itself."""
+    text: str
+    tokens: int
+    heading_path: Optional[str]
+    position_key: Optional[Tuple[str, str]]  # (kind, document) for adjacency
+    position: Optional[int]
+    overlap_chars: Optional[int]  # Known leading overlap with position - 1 (None = unknown)
+    parent_id: Optional[str] = None
+
+
+@dataclass
+class _Candidate:
+    result: RetrievalResult
+    variants: List[_Variant]
+    embedding: Optional[np.ndarray]
+    words: set = field(default_factory=set)
+
+
+@dataclass
+class _Packed:
+    candidate: _Candidate
+    variant: _Variant
+    text: str
+    tokens: int
+
+
+class ContextPacker:
+    """
+    Packs retrieved passages into a context string within an exact token budget.
+    """
+    
+    def __init__(
+        self,
+        mmr_lambda: float = settings.MMR_LAMBDA,
+        count_tokens: Optional[Callable[[str], int]] = None
+    ):
+        """
+        Initialize the packer.
+        
+        Args:
+            mmr_lambda: Trade-off between relevance (1.0) and diversity (0.0)
+            count_tokens: Token counter (defaults to the chunker's tiktoken encoding)
+        """
+        self.mmr_lambda = mmr_lambda
+        if count_tokens is None:
+            from app.rag.chunking import chunker
+            count_tokens = chunker.count_tokens
+        self.count_tokens = count_tokens
+        self._separator_tokens = count_tokens(SEPARATOR)
+    
+    def pack(
+        self,
+        results: List[RetrievalResult],
+        max_tokens: int = settings.MAX_CONTEXT_TOKENS,
+        parents: Optional[Dict[str, Dict[str, Any]]] = None,
+        compress: Optional[Callable[[List[str]], List[str]]] = None
+    ) -> Tuple[str, List[Dict[str, Any]]]:
+        """
+        Select and format passages for the LLM.
+        
+        Args:
+            results: Retrieval results, best first
+            max_tokens: Token budget for the whole context string
+            parents: Parent sections by parent_id (small-to-big expansion)
+            compress: Optional transform of the selected passage texts (e.g. extractive compression)
+        
+        Returns:
+            Tuple of (formatted_context, citation_info)
+        """
+        if not results:
+            return "", []
+        
+        candidates = [self._build_candidate(result, parents or {}) for result in results]
+        packed, used_tokens = self._select(candidates, max_tokens)
+        texts = [item.text for item in packed]
+        if compress and texts:
+            texts = compress(texts)
+        
+        context_parts = []
+        citations = []
+        for source_index, (item, text) in enumerate(zip(packed, texts), start=1):
+            result = item.candidate.result
+            context_parts.append(f"{self._source_header(result, item.variant, source_index)}\n{text}")
+            citations.append({
+                "index": source_index,
+                "file_name": result.metadata.get('file_name', 'Unknown'),
+                "chunk_id": result.chunk_id,
+                "page_number": result.metadata.get('page_number'),
+                "similarity_score": result.similarity_score,
+                "excerpt": result.content[:200] + "..." if len(result.content) > 200 else result.content
+            })
+        
+        logger.info(f"Packed {len(packed)}/{len(results)} passages into {used_tokens}/{max_tokens} tokens")
+        return SEPARATOR.join(context_parts), citations
+    
+    def _build_candidate(self, result: RetrievalResult, parents: Dict[str, Dict[str, Any]]) -> _Candidate:
+        """Build the render variants for one result (parent first, then the chunk itself)."""
+        metadata = result.metadata
+        document = str(metadata.get('document_id') or metadata.get('file_name') or "")
+        variants = []
+        
+        parent_id = metadata.get('parent_id')
+        parent = parents.get(parent_id) if parent_id else None
+        if parent:
+            variants.append(_Variant(
+                text=parent["content"],
+                tokens=parent.get("token_count") or self.count_tokens(parent["content"]),
+                heading_path=parent.get("heading_path") or metadata.get('heading_path'),
+                position_key=("parent", document),
+                position=_parent_position(parent_id),
+                overlap_chars=None,
+                parent_id=parent_id
+            ))
+        
+        token_count = metadata.get('token_count')
+        variants.append(_Variant(
+            text=result.content,
+            tokens=token_count if isinstance(token_count, int) and token_count > 0 else self.count_tokens(result.content),
+            heading_path=metadata.get('heading_path'),
+            position_key=("chunk", document),
+            position=metadata.get('chunk_index'),
+            overlap_chars=metadata.get('overlap_chars')
+        ))
+        
+        embedding = np.asarray(result.embedding, dtype=float) if result.embedding else None
+        return _Candidate(
+            result=result,
+            variants=variants,
+            embedding=embedding,
+            words=set(_WORD_PATTERN.findall(result.content.lower()))
+        )
+    
+    def _select(self, candidates: List[_Candidate], max_tokens: int) -> Tuple[List[_Packed], int]:
+        """Greedy MMR selection under the token budget (skips what doesn't fit, keeps filling)."""
+        packed: List[_Packed] = []
+        used_tokens = 0
+        used_parents = set()
+        remaining = list(candidates)
+        
+        while remaining:
+            scored = sorted(
+                remaining,
+                key=lambda c: self._mmr_score(c, packed),
+                reverse=True
+            )
+            chosen = None
+            for candidate in scored:
+                if any(v.parent_id and v.parent_id in used_parents for v in candidate.variants):
+                    # Section already in context via a better child
+                    remaining.remove(candidate)
+                    continue
+                for variant in candidate.variants:
+                    text, tokens = self._render(variant, packed)
+                    if not text:
+                        break  # Fully covered by adjacent passages already packed
+                    header_tokens = self.count_tokens(
+                        self._source_header(candidate.result, variant, len(packed) + 1) + "\n"
+                    )
+                    cost = tokens + header_tokens + (self._separator_tokens if packed else 0)
+                    if used_tokens + cost <= max_tokens:
+                        chosen = _Packed(candidate, variant, text, tokens)
+                        used_tokens += cost
+                        break
+                if chosen:
+                    break
+                remaining.remove(candidate)  # Doesn't fit the remaining budget
+            
+            if not chosen:
+                break
+            packed.append(chosen)
+            remaining.remove(chosen.candidate)
+            if chosen.variant.parent_id:
+                used_parents.add(chosen.variant.parent_id)
+        
+        return packed, used_tokens
+    
+    def _mmr_score(self, candidate: _Candidate, packed: List[_Packed]) -> float:
+        """Maximal marginal relevance of a candidate given what's already packed."""
+        redundancy = max((self._similarity(candidate, p.candidate) for p in packed), default=0.0)
+        return self.mmr_lambda * candidate.result.similarity_score - (1 - self.mmr_lambda) * redundancy
+    
+    @staticmethod
+    def _similarity(a: _Candidate, b: _Candidate) -> float:
+        """Cosine similarity of embeddings, falling back to word overlap."""
+        if a.embedding is not None and b.embedding is not None:
+            norm = np.linalg.norm(a.embedding) * np.linalg.norm(b.embedding)
+            return float(np.dot(a.embedding, b.embedding) / norm) if norm else 0.0
+        if not a.words or not b.words:
+            return 0.0
+        return len(a.words & b.words) / len(a.words | b.words)
+    
+    def _render(self, variant: _Variant, packed: List[_Packed]) -> Tuple[str, int]:
+        """Text and exact token count of a variant after stripping overlap with packed neighbours."""
+        text = variant.text
+        if variant.position_key is None or variant.position is None:
+            return text, variant.tokens
+        
+        neighbours = {
+            p.variant.position: p for p in packed
+            if p.variant.position_key == variant.position_key and p.variant.position is not None
+        }
+        previous = neighbours.get(variant.position - 1)
+        if previous:
+            shared = _overlap_length(previous.variant.text, text, variant.overlap_chars)
+            text = text[shared:].lstrip()
+        following = neighbours.get(variant.position + 1)
+        if following:
+            # The following passage kept its full text; drop our tail that it repeats
+            shared = _overlap_length(text, following.variant.text, following.variant.overlap_chars)
+            text = text[:len(text) - shared].rstrip()
+        
+        if text == variant.text:
+            return text, variant.tokens
+        return text, self.count_tokens(text) if text else 0
+    
+    @staticmethod
+    def _source_header(result: RetrievalResult, variant: _Variant, source_index: int) -> str:
+        """Format the source line for a passage."""
+        header = f"[Source {source_index}: {result.metadata.get('file_name', 'Unknown')}]"
+        if result.metadata.get('page_number'):
+            header += f" (Page {result.metadata['page_number']})"
+        if variant.heading_path:
+            header += f" (Section: {variant.heading_path})"
+        return header
+
+
+def _parent_position(parent_id: str) -> Optional[int]:
+    """Parent ordinal within its document (parent IDs end in _p<index>)."""
+    match = re.search(r"_p(\d+)$", parent_id)
+    return int(match.group(1)) if match else None
+
+
+def _overlap_length(previous: str, text: str, overlap_chars: Optional[int]) -> int:
+    """
+    Length of the leading part of text that repeats the end of previous.
+    Uses the overlap recorded by the chunker when available and checks it;
+    otherwise finds the longest suffix of previous that prefixes text.
+    """
+    if overlap_chars is not None:
+        if overlap_chars > 0 and previous.endswith(text[:overlap_chars]):
+            return overlap_chars
+        return 0
+    
+    probe = text[:_MIN_HEURISTIC_OVERLAP]
+    if len(probe) < _MIN_HEURISTIC_OVERLAP:
+        return 0
+    start = previous.find(probe)
+    while start != -1:
+        shared = len(previous) - start
+        if text.startswith(previous[start:]):
+            return shared
+        start = previous.find(probe, start + 1)
+    return 0
+
+
+# Global context packer instance
+_context_packer: Optional[ContextPacker] = None
+
+
+def get_context_packer() -> ContextPacker:
+    """Get the global context packer instance."""
+    global _context_packer
+    if _context_packer is None:
+        _context_packer = ContextPacker()
+    return _context_packer
@@ -160,3 +160,44 @@ def format_draft_prompt(context: str, question: str) -> tuple:
     
     return DRAFT_PROMPT_SYSTEM, user_prompt
 
+
+# Structured prompt: one call returns the answer with a supporting quote per sentence,
+# and the quotes are checked locally against the context (no verifier call)
+STRUCTURED_PROMPT_SYSTEM = """You are a customer support assistant. Answer based STRICTLY on the provided context and return ONLY a JSON object.
+
+## CRITICAL RULES - EVERY SENTENCE WILL BE CHECKED AGAINST THE CONTEXT:
+
+1. **ONLY use information explicitly stated in the context** - Do NOT use prior knowledge or general knowledge.
+
+2. **If the context doesn't contain the answer** - Return "answerable": false and an empty "sentences" list. DO NOT attempt to answer from memory.
+
+3. **One claim per sentence** - Each sentence lists the source numbers it relies on.
+
+4. **Quote your evidence** - For each sentence, "quote" MUST be copied word for word from one of its sources. Do not paraphrase quotes.
+
+5. **DO NOT extrapolate** - If the context says "30 days", don't say "about a month".
+
+## JSON format:
+{"answerable": true, "sentences": [{"text": "Returns are accepted within 30 days of purchase.", "sources": [1], "quote": "returns within 30 days of purchase"}]}"""
+
+STRUCTURED_PROMPT_USER = """## Context:
+{context}
+
+## Question:
+{question}
+
+Return the JSON object described above (no markdown, no code blocks)."""
+
+
+def format_structured_prompt(context: str, question: str) -> tuple:
+    """
+    Format the single-call structured answer prompt.
+    
+    Args:
+        context: Retrieved context from knowledge base
+        question: User's question
+        
+    Returns:
+        Tuple of (system_prompt, user_prompt)
+    """
+    return STRUCTURED_PROMPT_SYSTEM, STRUCTURED_PROMPT_USER.format(context=context, question=question)
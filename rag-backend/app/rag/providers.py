@@ -0,0 +1,238 @@
+"""
+Shared LLM provider instances and pooled HTTP clients.
+One provider per name and one sync + one async HTTP client per process, so
+draft, verifier and concurrent requests reuse warm keep-alive connections
+instead of repeating TLS handshakes.
+"""
+from typing import Dict, Optional
+import logging
+import threading
+import time
+
+import httpx
+
+from app.config import settings
+from app.utils.metrics import gauge, histogram
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+try:
+    import h2  # noqa: F401  (httpx only negotiates HTTP/2 when h2 is installed)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+LLM_HTTP_IN_FLIGHT = gauge(
+    "rag_llm_http_in_flight_requests",
+    "LLM HTTP requests currently in flight on the shared pool",
+    ["client"]
+)
+LLM_HTTP_POOL_SATURATION = gauge(
+    "rag_llm_http_pool_saturation_ratio",
+    "In-flight LLM HTTP requests divided by the pool's max connections",
+    ["client"]
+)
+LLM_HTTP_REQUEST_SECONDS = histogram(
+    "rag_llm_http_request_seconds",
+    "LLM HTTP request latency on the shared pool (until response headers)",
+    ["client"]
+)
+
+
+class _PoolStats:
+    """In-flight request accounting for one pooled client."""
+    
+    def __init__(self, client_name: str, max_connections: int):
+        self.client_name = client_name
+        self.max_connections = max(1, max_connections)
+        self.in_flight = 0
+        self._lock = threading.Lock()
+    
+    def enter(self) -> None:
+        with self._lock:
+            self.in_flight += 1
+            self._publish()
+    
+    def exit(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._publish()
+    
+    def _publish(self) -> None:
+        LLM_HTTP_IN_FLIGHT.labels(client=self.client_name).set(self.in_flight)
+        LLM_HTTP_POOL_SATURATION.labels(client=self.client_name).set(self.in_flight / self.max_connections)
+
+
+class _TrackedStream(httpx.SyncByteStream):
+    """Response body that releases its in-flight slot when closed (covers streamed responses)."""
+    
+    def __init__(self, inner: httpx.SyncByteStream, stats: _PoolStats):
+        self._inner = inner
+        self._stats = stats
+        self._closed = False
+    
+    def __iter__(self):
+        yield from self._inner
+    
+    def close(self) -> None:
+        try:
+            self._inner.close()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._stats.exit()
+
+
+class _AsyncTrackedStream(httpx.AsyncByteStream):
+    """Async response body that releases its in-flight slot when closed."""
+    
+    def __init__(self, inner: httpx.AsyncByteStream, stats: _PoolStats):
+        self._inner = inner
+        self._stats = stats
+        self._closed = False
+    
+    async def __aiter__(self):
+        async for chunk in self._inner:
+            yield chunk
+    
+    async def aclose(self) -> None:
+        try:
+            await self._inner.aclose()
+        finally:
+            if not self._closed:
+                self._closed = True
+                self._stats.exit()
+
+
+class InstrumentedTransport(httpx.HTTPTransport):
+    """Sync transport that reports in-flight requests and pool saturation."""
+    
+    def __init__(self, stats: _PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+    
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.enter()
+        started = time.monotonic()
+        try:
+            response = super().handle_request(request)
+        except BaseException:
+            self.stats.exit()
+            raise
+        finally:
+            LLM_HTTP_REQUEST_SECONDS.labels(client=self.stats.client_name).observe(time.monotonic() - started)
+        response.stream = _TrackedStream(response.stream, self.stats)
+        return response
+
+
+class AsyncInstrumentedTransport(httpx.AsyncHTTPTransport):
+    """Async transport that reports in-flight requests and pool saturation."""
+    
+    def __init__(self, stats: _PoolStats, **kwargs):
+        super().__init__(**kwargs)
+        self.stats = stats
+    
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.enter()
+        started = time.monotonic()
+        try:
+            response = await super().handle_async_request(request)
+        except BaseException:
+            self.stats.exit()
+            raise
+        finally:
+            LLM_HTTP_REQUEST_SECONDS.labels(client=self.stats.client_name).observe(time.monotonic() - started)
+        response.stream = _AsyncTrackedStream(response.stream, self.stats)
+        return response
+
+
+def _pool_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=settings.LLM_HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.LLM_HTTP_MAX_KEEPALIVE,
+        keepalive_expiry=settings.LLM_HTTP_KEEPALIVE_EXPIRY
+    )
+
+
+def _use_http2() -> bool:
+    if settings.LLM_HTTP2 and not HTTP2_AVAILABLE:
+        logger.warning("LLM_HTTP2 is enabled but the 'h2' package is not installed, using HTTP/1.1")
+    return settings.LLM_HTTP2 and HTTP2_AVAILABLE
+
+
+_http_client: Optional[httpx.Client] = None
+_async_http_client: Optional[httpx.AsyncClient] = None
+_clients_lock = threading.Lock()
+
+
+def get_http_client() -> httpx.Client:
+    """Get the process-wide pooled sync HTTP client (used from worker threads, e.g. streaming)."""
+    global _http_client
+    with _clients_lock:
+        if _http_client is None or _http_client.is_closed:
+            stats = _PoolStats("sync", settings.LLM_HTTP_MAX_CONNECTIONS)
+            _http_client = httpx.Client(
+                transport=InstrumentedTransport(stats, limits=_pool_limits(), http2=_use_http2()),
+                timeout=httpx.Timeout(settings.LLM_HTTP_TIMEOUT, connect=10.0)
+            )
+            logger.info(f"Created pooled LLM HTTP client (http2={_use_http2()})")
+        return _http_client
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Get the process-wide pooled async HTTP client (used from request handlers)."""
+    global _async_http_client
+    with _clients_lock:
+        if _async_http_client is None or _async_http_client.is_closed:
+            stats = _PoolStats("async", settings.LLM_HTTP_MAX_CONNECTIONS)
+            _async_http_client = httpx.AsyncClient(
+                transport=AsyncInstrumentedTransport(stats, limits=_pool_limits(), http2=_use_http2()),
+                timeout=httpx.Timeout(settings.LLM_HTTP_TIMEOUT, connect=10.0)
+            )
+            logger.info(f"Created pooled async LLM HTTP client (http2={_use_http2()})")
+        return _async_http_client
+
+
+async def close_http_clients() -> None:
+    """Close the shared HTTP clients (application shutdown)."""
+    global _http_client, _async_http_client
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+        _async_http_client = None
+    if _http_client is not None:
+        _http_client.close()
+        _http_client = None
+
+
+# Global provider instances, one per provider name
+_providers: Dict[str, "LLMProvider"] = {}  # noqa: F821
+_providers_lock = threading.Lock()
+
+
+def get_llm_provider(name: Optional[str] = None) -> "LLMProvider":  # noqa: F821
+    """
+    Get the shared LLM provider instance.
+    AnswerService and VerifierService both use this, so they share clients.
+    
+    Args:
+        name: Provider name ("gemini", "openai" or "fake"); defaults to settings.LLM_PROVIDER
+    """
+    name = name or settings.LLM_PROVIDER
+    with _providers_lock:
+        if name not in _providers:
+            from app.rag.answer import GeminiProvider, OpenAIProvider
+            from app.rag.fake_provider import FakeLLMProvider, RecordingProvider
+            if name == "gemini":
+                provider = GeminiProvider()
+            elif name == "openai":
+                provider = OpenAIProvider()
+            elif name == "fake":
+                provider = FakeLLMProvider()
+            else:
+                raise ValueError(f"Unknown LLM provider: {name}")
+            if settings.LLM_RECORD_PATH and name != "fake":
+                provider = RecordingProvider(provider, settings.LLM_RECORD_PATH, name)
+            _providers[name] = provider
+        return _providers[name]
@@ -1,14 +1,20 @@
 """
 Retrieval pipeline with confidence scoring and filtering.
 """
+from functools import partial
 from typing import List, Dict, Any, Optional, Tuple
 import logging
-import re
 
 from app.config import settings
 from app.rag.embeddings import get_embedding_service
 from app.rag.vectorstore import get_vector_store
-from app.rag.intent import detect_intents, check_direct_match, get_intent_keywords
+from app.rag.docstore import get_doc_store
+from app.rag.dedup import collapse_duplicates
+from app.rag.packing import get_context_packer
+from app.rag.compression import get_context_compressor
+from app.rag.intent import (
+    detect_intents, check_direct_match, get_intent_keywords, has_important_word_match, ChunkTokens
+)
 from app.models.schemas import RetrievalResult
 
 logging.basicConfig(level=logging.INFO)
@@ -61,9 +67,12 @@ class RetrievalService:
         """
         k = top_k or self.top_k
         
-        # Generate query embedding
+        # Generate query embedding with the model the tenant's index was built with
+        # (during a re-embedding migration this is still the old model)
+        index = self.vector_store.get_tenant_index(tenant_id)
+        embedding_service = get_embedding_service(index["embedding_model"])
         logger.info(f"Generating embedding for query: {query[:50]}...")
-        query_embedding = self.embedding_service.embed_query(query)
+        query_embedding = embedding_service.embed_query(query)
         
         # Search vector store with filters - MUST include tenant_id for isolation
         filter_dict = {
@@ -72,11 +81,16 @@ class RetrievalService:
             "user_id": user_id
         }
         
+        # Over-fetch so collapsing near-duplicate hits still leaves k diverse results
+        fetch_k = k * settings.DEDUP_OVERFETCH_FACTOR if settings.DEDUP_MODE != "off" else k
+        
         logger.info(f"Searching vector store with filters: {filter_dict}")
         raw_results = self.vector_store.search(
             query_embedding=query_embedding,
-            top_k=k,
-            filter_dict=filter_dict
+            top_k=fetch_k,
+            filter_dict=filter_dict,
+            index=index,
+            include_embeddings=True  # Used by the context packer for MMR
         )
         
         if not raw_results:
@@ -90,9 +104,16 @@ class RetrievalService:
                 chunk_id=r['id'],
                 content=r['content'],
                 metadata=r['metadata'],
-                similarity_score=r['similarity_score']
+                similarity_score=r['similarity_score'],
+                embedding=r.get('embedding')
             ))
         
+        if settings.DEDUP_MODE != "off":
+            fetched = len(results)
+            results = collapse_duplicates(results, limit=k)
+            if len(results) < fetched:
+                logger.info(f"Collapsed {fetched} hits to {len(results)} after removing near-duplicates")
+        
         # HEAVY CONFIDENCE MODE: Use maximum similarity score from top results
         # This ensures confidence reflects the best match found, not dragged down by weaker results
         if results:
@@ -136,29 +157,18 @@ class RetrievalService:
         has_direct_match = False
         if filtered_results:
             chunk_texts = [r.content for r in filtered_results]
+            # Token sets were computed at ingest; no per-query lowercasing/scanning of chunks
+            chunk_tokens = [ChunkTokens.from_metadata(r.content, r.metadata) for r in filtered_results]
             intents = detect_intents(query)
             intent_keywords = get_intent_keywords(intents)
             
             # For integration/API questions, require direct match
             if "integration" in intents or "api" in query.lower():
-                has_direct_match = check_direct_match(query, chunk_texts, intent_keywords)
+                has_direct_match = check_direct_match(query, chunk_texts, intent_keywords, chunk_tokens=chunk_tokens)
                 logger.info(f"Direct match check (strict for integration): {has_direct_match} (intents: {intents})")
             else:
                 # For other questions, be more lenient - just check if important words match
-                query_words = set(re.findall(r'\b\w+\b', query.lower()))
-                stop_words = {"the", "a", "an", "is", "are", "was", "were", "be", "been",
-                             "to", "of", "and", "or", "but", "in", "on", "at", "for",
-                             "with", "how", "what", "when", "where", "why", "do", "does"}
-                important_words = query_words - stop_words
-                
-                # Check if at least one important word appears in chunks
-                for chunk in chunk_texts:
-                    chunk_lower = chunk.lower()
-                    matches = sum(1 for word in important_words if word in chunk_lower)
-                    if matches >= 1 and len(important_words) > 0:  # At least one important word
-                        has_direct_match = True
-                        break
-                
+                has_direct_match = has_important_word_match(query, chunk_tokens)
                 logger.info(f"Direct match check (lenient): {has_direct_match} (intents: {intents})")
         
         # Only consider relevant if we have filtered results AND (direct match OR high confidence)
@@ -177,14 +187,23 @@ class RetrievalService:
     def get_context_for_llm(
         self,
         results: List[RetrievalResult],
-        max_tokens: int = settings.MAX_CONTEXT_TOKENS
+        max_tokens: int = settings.MAX_CONTEXT_TOKENS,
+        query: Optional[str] = None
     ) -> Tuple[str, List[Dict[str, Any]]]:
         """
         Format retrieved results into context for the LLM.
         
+        Child chunks from hierarchical chunking are expanded to their parent
+        section (small-to-big); when a parent doesn't fit the remaining budget
+        the matched child is used instead. Passages are chosen with MMR and
+        counted with the real tokenizer (see ContextPacker). With a query and
+        CONTEXT_COMPRESSION_RATIO < 1, the selected passages are then reduced
+        to their query-relevant sentences (see ContextCompressor).
+        
         Args:
             results: List of retrieval results
             max_tokens: Maximum tokens for context
+            query: User's question (enables extractive compression)
             
         Returns:
             Tuple of (formatted_context, citation_info)
@@ -192,41 +211,37 @@ class RetrievalService:
         if not results:
             return "", []
         
-        context_parts = []
-        citations = []
-        current_tokens = 0
-        
-        # Estimate tokens (rough approximation: 1 token ≈ 4 chars)
-        for i, result in enumerate(results):
-            chunk_text = result.content
-            estimated_tokens = len(chunk_text) // 4
-            
-            if current_tokens + estimated_tokens > max_tokens:
-                logger.info(f"Truncating context at {i} chunks due to token limit")
-                break
-            
-            # Format chunk with source info
-            source_info = f"[Source {i+1}: {result.metadata.get('file_name', 'Unknown')}]"
-            if result.metadata.get('page_number'):
-                source_info += f" (Page {result.metadata['page_number']})"
-            
-            context_parts.append(f"{source_info}\n{chunk_text}")
-            
-            # Build citation info
-            citations.append({
-                "index": i + 1,
-                "file_name": result.metadata.get('file_name', 'Unknown'),
-                "chunk_id": result.chunk_id,
-                "page_number": result.metadata.get('page_number'),
-                "similarity_score": result.similarity_score,
-                "excerpt": chunk_text[:200] + "..." if len(chunk_text) > 200 else chunk_text
-            })
-            
-            current_tokens += estimated_tokens
+        parents = self._load_parents(results)
+        compress = None
+        tenant_id = results[0].metadata.get('tenant_id')
+        if query and tenant_id and settings.CONTEXT_COMPRESSION_RATIO < 1.0:
+            # Score sentences with the same model the tenant's index (and query) use
+            index = self.vector_store.get_tenant_index(tenant_id)
+            embedding_service = get_embedding_service(index["embedding_model"])
+            compress = partial(get_context_compressor().compress, query, embedding_service=embedding_service)
+        return get_context_packer().pack(results, max_tokens=max_tokens, parents=parents, compress=compress)
+    
+    def _load_parents(self, results: List[RetrievalResult]) -> Dict[str, Dict[str, Any]]:
+        """Fetch parent sections for child results in one lookup per tenant."""
+        parent_ids_by_tenant: Dict[str, List[str]] = {}
+        for result in results:
+            parent_id = result.metadata.get('parent_id')
+            tenant_id = result.metadata.get('tenant_id')
+            if parent_id and tenant_id:
+                parent_ids_by_tenant.setdefault(tenant_id, []).append(parent_id)
         
-        formatted_context = "\n\n---\n\n".join(context_parts)
+        parents: Dict[str, Dict[str, Any]] = {}
+        if not parent_ids_by_tenant:
+            return parents
         
-        return formatted_context, citations
+        doc_store = get_doc_store()
+        for tenant_id, parent_ids in parent_ids_by_tenant.items():
+            try:
+                parents.update(doc_store.get_parents(tenant_id, list(dict.fromkeys(parent_ids))))
+            except Exception as e:
+                # Fall back to child chunks rather than failing the chat
+                logger.error(f"Failed to load parent sections: {e}")
+        return parents
 
 
 # Global retrieval service instance
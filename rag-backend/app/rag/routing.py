@@ -0,0 +1,422 @@
+"""
+Routing across LLM providers.
+Per-provider circuit breakers, latency-aware ordering, failover and optional
+hedged requests, so a slow or failing provider doesn't turn into user-facing errors.
+"""
+from collections import deque
+from typing import Any, Callable, Deque, Dict, List, Optional, Set
+import asyncio
+import logging
+import threading
+import time
+
+from app.config import settings
+from app.rag.answer import LLMProvider, LLMStream, provider_kwargs
+from app.rag.model_router import tier_kwargs
+from app.rag.providers import get_llm_provider
+from app.utils.metrics import counter, gauge
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+LLM_PROVIDER_REQUESTS = counter(
+    "rag_llm_provider_requests_total",
+    "LLM calls made by the provider router, by provider and outcome (success, error)",
+    ["provider", "outcome"]
+)
+LLM_BREAKER_STATE = gauge(
+    "rag_llm_breaker_state",
+    "Circuit breaker state per provider (0 = closed, 1 = half-open, 2 = open)",
+    ["provider"]
+)
+LLM_HEDGED_REQUESTS = counter(
+    "rag_llm_hedged_requests_total",
+    "Hedged LLM requests (launched, backup_won)",
+    ["outcome"]
+)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+    closed → open after `failure_threshold` failures in a row; open → half-open
+    after `reset_seconds`, letting a single probe through; the probe's outcome
+    closes or re-opens it.
+    """
+    
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+    
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = None,
+        reset_seconds: float = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold or settings.LLM_BREAKER_FAILURE_THRESHOLD
+        self.reset_seconds = reset_seconds if reset_seconds is not None else settings.LLM_BREAKER_RESET_SECONDS
+        self._clock = clock
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        self._publish()
+    
+    def available(self) -> bool:
+        """Whether a request could be sent now (doesn't claim the half-open probe)."""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN:
+                return self._clock() - self._opened_at >= self.reset_seconds
+            return not self._probe_in_flight
+    
+    def allow(self) -> bool:
+        """Claim permission to send a request; in half-open state only one caller gets it."""
+        with self._lock:
+            if self.state == self.OPEN and self._clock() - self._opened_at >= self.reset_seconds:
+                self.state = self.HALF_OPEN
+                self._probe_in_flight = False
+                self._publish()
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+    
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info(f"Circuit breaker for {self.name} closed")
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probe_in_flight = False
+            self._publish()
+    
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning(f"Circuit breaker for {self.name} opened after {self.failures} failure(s)")
+                self.state = self.OPEN
+                self._opened_at = self._clock()
+            self._probe_in_flight = False
+            self._publish()
+    
+    def release(self) -> None:
+        """Give back a half-open probe that ended without an outcome (e.g. cancelled hedge)."""
+        with self._lock:
+            self._probe_in_flight = False
+    
+    def _publish(self) -> None:
+        LLM_BREAKER_STATE.labels(provider=self.name).set(self._STATE_VALUES[self.state])
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies for one provider."""
+    
+    def __init__(self, window: int = None):
+        self._samples: Deque[float] = deque(maxlen=window or settings.LLM_LATENCY_WINDOW)
+        self._lock = threading.Lock()
+    
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+    
+    @property
+    def count(self) -> int:
+        return len(self._samples)
+    
+    def mean(self) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            return sum(self._samples) / len(self._samples)
+    
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+
+class ProviderRouter(LLMProvider):
+    """
+    LLM provider that routes each call across several underlying providers.
+    
+    Providers are tried in configured order, except that a provider whose
+    average latency exceeds the fastest measured one by LLM_ROUTING_SLOW_FACTOR
+    is moved to the back. Providers with an open breaker are skipped. On error
+    the next provider is tried; streams only fail over before the first token.
+    Usage info gets a "provider" key so billing is attributed to whoever answered.
+    """
+    
+    def __init__(
+        self,
+        provider_names: List[str],
+        providers: Optional[Dict[str, LLMProvider]] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            provider_names: Providers in preference order
+            providers: Pre-built providers by name (default: shared registry instances)
+            clock: Time source for breakers (tests)
+        """
+        self.provider_names = provider_names
+        self._providers: Dict[str, LLMProvider] = dict(providers or {})
+        self._unavailable: Set[str] = set()
+        self.breakers = {name: CircuitBreaker(name, clock=clock) for name in provider_names}
+        self.latency = {name: LatencyTracker() for name in provider_names}
+    
+    def _provider(self, name: str) -> Optional[LLMProvider]:
+        """Resolve a provider, remembering ones that can't be built (e.g. no API key)."""
+        if name in self._providers:
+            return self._providers[name]
+        if name in self._unavailable:
+            return None
+        try:
+            self._providers[name] = get_llm_provider(name)
+        except ValueError as e:
+            logger.warning(f"LLM provider {name} unavailable for routing: {e}")
+            self._unavailable.add(name)
+            return None
+        return self._providers[name]
+    
+    def candidates(self) -> List[str]:
+        """Providers to try, in order, for the next call."""
+        names = [n for n in self.provider_names if self.breakers[n].available() and self._provider(n) is not None]
+        means = {n: self.latency[n].mean() for n in names}
+        measured = [m for m in means.values() if m is not None]
+        if len(measured) < 2:
+            return names
+        fastest = min(measured)
+        slow = {n for n, m in means.items() if m is not None and m > fastest * settings.LLM_ROUTING_SLOW_FACTOR}
+        return [n for n in names if n not in slow] + [n for n in names if n in slow]
+    
+    def hedge_delay(self, name: str) -> Optional[float]:
+        """Seconds to wait on `name` before hedging, or None if hedging doesn't apply."""
+        if not settings.LLM_HEDGE_ENABLED or self.latency[name].count < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return self.latency[name].percentile(0.95)
+    
+    def _record(self, name: str, ok: bool, seconds: float = 0.0) -> None:
+        if ok:
+            self.breakers[name].record_success()
+            self.latency[name].record(seconds)
+        else:
+            self.breakers[name].record_failure()
+        LLM_PROVIDER_REQUESTS.labels(provider=name, outcome="success" if ok else "error").inc()
+    
+    @staticmethod
+    def _attributed(usage_info: dict, name: str) -> dict:
+        usage_info = dict(usage_info or {})
+        usage_info["provider"] = name
+        return usage_info
+    
+    @staticmethod
+    def _no_provider_error(last_error: Optional[Exception]) -> Exception:
+        if last_error is not None:
+            return last_error
+        return RuntimeError("No LLM provider available (all circuit breakers open or providers unconfigured)")
+    
+    def generate(self, system_prompt: str, user_prompt: str, tier: Optional[str] = None) -> str:
+        text, _ = self.generate_with_usage(system_prompt, user_prompt, tier=tier)
+        return text
+    
+    def generate_with_usage(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        tier: Optional[str] = None,
+        json_mode: bool = False
+    ) -> tuple[str, dict]:
+        """Call providers in order until one succeeds."""
+        last_error = None
+        for name in self.candidates():
+            if not self.breakers[name].allow():
+                continue
+            started = time.monotonic()
+            try:
+                text, usage_info = self._providers[name].generate_with_usage(
+                    system_prompt, user_prompt, **provider_kwargs(tier, json_mode)
+                )
+            except Exception as e:
+                self._record(name, ok=False)
+                logger.warning(f"LLM provider {name} failed, trying next: {e}")
+                last_error = e
+                continue
+            self._record(name, ok=True, seconds=time.monotonic() - started)
+            return text, self._attributed(usage_info, name)
+        raise self._no_provider_error(last_error)
+    
+    async def agenerate(self, system_prompt: str, user_prompt: str, tier: Optional[str] = None) -> str:
+        text, _ = await self.agenerate_with_usage(system_prompt, user_prompt, tier=tier)
+        return text
+    
+    async def agenerate_with_usage(
+        self,
+        system_prompt: str,
+        user_prompt: str,
+        tier: Optional[str] = None,
+        json_mode: bool = False
+    ) -> tuple[str, dict]:
+        """
+        Call providers in order until one succeeds, hedging the first attempt.
+        
+        With LLM_HEDGE_ENABLED, if the first provider hasn't answered within its
+        p95 latency the next provider is started too and the first success wins.
+        The loser is cancelled, but the provider may still bill for it.
+        """
+        candidates = self.candidates()
+        call_kwargs = provider_kwargs(tier, json_mode)
+        last_error = None
+        index = 0
+        while index < len(candidates):
+            name = candidates[index]
+            backup = candidates[index + 1] if index == 0 and len(candidates) > 1 else None
+            delay = self.hedge_delay(name) if backup else None
+            try:
+                if delay is not None:
+                    index += 2
+                    return await self._ahedged(name, backup, delay, system_prompt, user_prompt, call_kwargs)
+                index += 1
+                return await self._acall(name, system_prompt, user_prompt, call_kwargs)
+            except _Skipped:
+                continue
+            except Exception as e:
+                logger.warning(f"LLM provider call failed, trying next: {e}")
+                last_error = e
+        raise self._no_provider_error(last_error)
+    
+    async def _acall(
+        self,
+        name: str,
+        system_prompt: str,
+        user_prompt: str,
+        call_kwargs: Optional[Dict[str, Any]] = None
+    ) -> tuple[str, dict]:
+        if not self.breakers[name].allow():
+            raise _Skipped(name)
+        started = time.monotonic()
+        try:
+            text, usage_info = await self._providers[name].agenerate_with_usage(system_prompt, user_prompt, **(call_kwargs or {}))
+        except asyncio.CancelledError:
+            self.breakers[name].release()
+            raise
+        except Exception:
+            self._record(name, ok=False)
+            raise
+        self._record(name, ok=True, seconds=time.monotonic() - started)
+        return text, self._attributed(usage_info, name)
+    
+    async def _ahedged(
+        self,
+        primary: str,
+        backup: str,
+        delay: float,
+        system_prompt: str,
+        user_prompt: str,
+        call_kwargs: Optional[Dict[str, Any]] = None
+    ) -> tuple[str, dict]:
+        primary_task = asyncio.ensure_future(self._acall(primary, system_prompt, user_prompt, call_kwargs))
+        done, _ = await asyncio.wait({primary_task}, timeout=delay)
+        if done:
+            error = primary_task.exception()
+            if error is None:
+                return primary_task.result()
+            # Primary failed fast: plain failover to the backup
+            try:
+                return await self._acall(backup, system_prompt, user_prompt, call_kwargs)
+            except _Skipped:
+                raise error
+        
+        LLM_HEDGED_REQUESTS.labels(outcome="launched").inc()
+        logger.info(f"{primary} exceeded p95 ({delay:.2f}s), hedging with {backup}")
+        backup_task = asyncio.ensure_future(self._acall(backup, system_prompt, user_prompt, call_kwargs))
+        pending = {primary_task, backup_task}
+        last_error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup_task:
+                            LLM_HEDGED_REQUESTS.labels(outcome="backup_won").inc()
+                        return task.result()
+                    if not isinstance(task.exception(), _Skipped):
+                        last_error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise last_error or _Skipped(backup)
+    
+    def stream_with_usage(self, system_prompt: str, user_prompt: str, tier: Optional[str] = None) -> LLMStream:
+        """Stream from the first healthy provider; fail over only before the first token."""
+        def items():
+            last_error = None
+            for name in self.candidates():
+                if not self.breakers[name].allow():
+                    continue
+                started_at = time.monotonic()
+                emitted = False
+                try:
+                    stream = self._providers[name].stream_with_usage(system_prompt, user_prompt, **tier_kwargs(tier))
+                    for delta in stream:
+                        emitted = True
+                        yield delta
+                except Exception as e:
+                    self._record(name, ok=False)
+                    last_error = e
+                    if emitted:
+                        raise
+                    logger.warning(f"LLM provider {name} failed before streaming, trying next: {e}")
+                    continue
+                self._record(name, ok=True, seconds=time.monotonic() - started_at)
+                yield self._attributed(stream.usage, name)
+                return
+            raise self._no_provider_error(last_error)
+        
+        return LLMStream(items())
+
+
+class _Skipped(Exception):
+    """A provider was passed over because its breaker didn't allow the call."""
+
+
+# Global routed providers, one per primary provider name
+_routers: Dict[str, LLMProvider] = {}
+_routers_lock = threading.Lock()
+
+
+def get_routed_provider(primary: Optional[str] = None) -> LLMProvider:
+    """
+    Get the provider answer generation and verification should call.
+    
+    Args:
+        primary: Preferred provider name; defaults to settings.LLM_PROVIDER
+    
+    Returns:
+        A ProviderRouter over primary + LLM_FALLBACK_PROVIDERS, or the plain
+        shared provider when no fallbacks are configured
+    """
+    primary = primary or settings.LLM_PROVIDER
+    fallbacks = [p.strip() for p in settings.LLM_FALLBACK_PROVIDERS.split(",") if p.strip()]
+    names = [primary] + [p for p in fallbacks if p != primary]
+    if len(names) == 1:
+        return get_llm_provider(primary)
+    with _routers_lock:
+        if primary not in _routers:
+            _routers[primary] = ProviderRouter(names)
+            logger.info(f"LLM provider routing enabled: {names}")
+        return _routers[primary]
@@ -0,0 +1,249 @@
+"""
+Admission scheduler for LLM work.
+Caps how many chat answers (draft + verifier calls) are generating at once and
+queues the rest with weighted fair queuing across tenants: each tenant's
+requests get virtual finish tags spaced 1/weight apart, weights come from the
+tenant's plan, and the smallest tag is admitted next. A burst from one tenant
+therefore waits behind its own backlog instead of starving everyone else.
+
+Requests are shed fast instead of piling up: a full queue rejects immediately
+with 429, and a request that waits longer than its queue deadline gets 503.
+"""
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+import asyncio
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from app.config import settings
+from app.utils.metrics import counter, gauge, histogram
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+LLM_SCHEDULER_IN_FLIGHT = gauge(
+    "rag_llm_scheduler_in_flight",
+    "Chat answers currently admitted to the LLM"
+)
+LLM_SCHEDULER_QUEUE_DEPTH = gauge(
+    "rag_llm_scheduler_queue_depth",
+    "Chat answers waiting for an LLM slot, by plan",
+    ["plan"]
+)
+LLM_SCHEDULER_WAIT = histogram(
+    "rag_llm_scheduler_wait_seconds",
+    "Time admitted chat answers spent queued, by plan",
+    ["plan"],
+    buckets=(0.0, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+)
+LLM_SCHEDULER_REJECTIONS = counter(
+    "rag_llm_scheduler_rejections_total",
+    "Chat answers shed by the scheduler (queue_full, tenant_queue_full: 429; deadline: 503)",
+    ["reason"]
+)
+
+
+def parse_plan_weights(raw: str) -> Dict[str, float]:
+    """Parse "starter:1,growth:2,pro:4" into {plan: weight}."""
+    weights = {}
+    for item in raw.split(","):
+        if ":" not in item:
+            continue
+        plan, weight = item.split(":", 1)
+        try:
+            weights[plan.strip()] = max(float(weight), 0.01)
+        except ValueError:
+            logger.warning(f"Ignoring invalid scheduler plan weight '{item}'")
+    return weights
+
+
+class AdmissionRejected(Exception):
+    """A request was shed; status_code is 429 (queue full) or 503 (queue deadline)."""
+    
+    def __init__(self, status_code: int, reason: str, retry_after: int):
+        self.status_code = status_code
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"LLM capacity exhausted ({reason}), retry in {retry_after}s")
+
+
+@dataclass(eq=False)
+class _Waiter:
+    tenant_id: str
+    plan: str
+    future: asyncio.Future
+    loop: asyncio.AbstractEventLoop
+    granted: bool = False
+    abandoned: bool = False
+
+
+@dataclass(eq=False)
+class Ticket:
+    """An admitted slot. release() is idempotent and safe from any thread."""
+    scheduler: "AdmissionScheduler"
+    tenant_id: str
+    plan: str
+    waited: float
+    _released: bool = field(default=False, repr=False)
+    
+    def release(self) -> None:
+        with self.scheduler._lock:
+            if self._released:
+                return
+            self._released = True
+        self.scheduler._release()
+
+
+class AdmissionScheduler:
+    """Global concurrency cap with weighted fair queuing across tenants."""
+    
+    def __init__(
+        self,
+        max_concurrency: int = settings.LLM_MAX_CONCURRENCY,
+        max_queue: int = settings.LLM_QUEUE_MAX_DEPTH,
+        max_queue_per_tenant: int = settings.LLM_QUEUE_MAX_PER_TENANT,
+        queue_timeout: float = settings.LLM_QUEUE_TIMEOUT_SECONDS,
+        plan_weights: Optional[Dict[str, float]] = None
+    ):
+        """
+        Args:
+            max_concurrency: Chat answers allowed to generate at once
+            max_queue: Waiting requests across all tenants before new ones get 429
+            max_queue_per_tenant: Waiting requests per tenant before that tenant gets 429
+            queue_timeout: Seconds a request may wait for a slot before it gets 503
+            plan_weights: Share of slots per plan (unknown plans weigh 1)
+        """
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max_queue
+        self.max_queue_per_tenant = max_queue_per_tenant
+        self.queue_timeout = queue_timeout
+        self.plan_weights = plan_weights if plan_weights is not None else parse_plan_weights(settings.LLM_SCHEDULER_PLAN_WEIGHTS)
+        self._lock = threading.Lock()
+        self._heap: List[tuple] = []
+        self._sequence = itertools.count()
+        self._in_flight = 0
+        self._queued = 0
+        self._tenant_queued: Dict[str, int] = {}
+        self._plan_queued: Dict[str, int] = {}
+        self._last_finish: Dict[str, float] = {}
+        self._virtual_time = 0.0
+    
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+    
+    @property
+    def queued(self) -> int:
+        return self._queued
+    
+    def weight(self, plan: str) -> float:
+        return self.plan_weights.get(plan, 1.0)
+    
+    async def acquire(self, tenant_id: str, plan: str = "starter") -> Ticket:
+        """
+        Wait for a slot.
+        
+        Args:
+            tenant_id: Tenant the work is for (fairness is per tenant)
+            plan: Tenant's plan name (sets its weight)
+        
+        Returns:
+            Ticket to release when the LLM work is done
+        
+        Raises:
+            AdmissionRejected: Queue full (429) or queue deadline passed (503)
+        """
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._in_flight < self.max_concurrency and not self._queued:
+                self._in_flight += 1
+                LLM_SCHEDULER_IN_FLIGHT.set(self._in_flight)
+                LLM_SCHEDULER_WAIT.labels(plan=plan).observe(0.0)
+                return Ticket(self, tenant_id, plan, 0.0)
+            if self._queued >= self.max_queue:
+                raise self._reject(429, "queue_full")
+            if self._tenant_queued.get(tenant_id, 0) >= self.max_queue_per_tenant:
+                raise self._reject(429, "tenant_queue_full")
+            
+            # Virtual finish tag: a tenant's requests are spaced 1/weight apart, and an idle
+            # tenant restarts at the current virtual time (no credit saved up while idle)
+            tag = max(self._virtual_time, self._last_finish.get(tenant_id, 0.0)) + 1.0 / self.weight(plan)
+            self._last_finish[tenant_id] = tag
+            waiter = _Waiter(tenant_id, plan, loop.create_future(), loop)
+            heapq.heappush(self._heap, (tag, next(self._sequence), waiter))
+            self._enqueue(waiter, 1)
+        
+        try:
+            await asyncio.wait_for(waiter.future, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            with self._lock:
+                if not waiter.granted:
+                    waiter.abandoned = True
+                    self._enqueue(waiter, -1)
+                    if isinstance(e, asyncio.TimeoutError):
+                        raise self._reject(503, "deadline")
+                    raise
+            # Granted just as the wait ended: keep the slot, or hand it back if cancelled
+            if isinstance(e, asyncio.CancelledError):
+                self._release()
+                raise
+        
+        waited = time.monotonic() - started
+        LLM_SCHEDULER_WAIT.labels(plan=plan).observe(waited)
+        return Ticket(self, tenant_id, plan, waited)
+    
+    def _reject(self, status_code: int, reason: str) -> AdmissionRejected:
+        LLM_SCHEDULER_REJECTIONS.labels(reason=reason).inc()
+        logger.warning(f"LLM scheduler shed a request ({reason}): {self._in_flight} in flight, {self._queued} queued")
+        return AdmissionRejected(status_code, reason, retry_after=max(1, int(self.queue_timeout)))
+    
+    def _enqueue(self, waiter: _Waiter, delta: int) -> None:
+        """Adjust queue counts (caller holds the lock)."""
+        self._queued += delta
+        self._tenant_queued[waiter.tenant_id] = self._tenant_queued.get(waiter.tenant_id, 0) + delta
+        if not self._tenant_queued[waiter.tenant_id]:
+            del self._tenant_queued[waiter.tenant_id]
+        self._plan_queued[waiter.plan] = self._plan_queued.get(waiter.plan, 0) + delta
+        LLM_SCHEDULER_QUEUE_DEPTH.labels(plan=waiter.plan).set(self._plan_queued[waiter.plan])
+    
+    def _release(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            while self._heap and self._in_flight < self.max_concurrency:
+                tag, _, waiter = heapq.heappop(self._heap)
+                if waiter.abandoned:
+                    continue
+                waiter.granted = True
+                self._virtual_time = tag
+                self._enqueue(waiter, -1)
+                self._in_flight += 1
+                waiter.loop.call_soon_threadsafe(_wake, waiter.future)
+            if not self._queued:
+                # Nothing waiting (only abandoned entries left): forget finish tags so they don't grow without bound
+                self._heap.clear()
+                self._last_finish.clear()
+                self._virtual_time = 0.0
+            LLM_SCHEDULER_IN_FLIGHT.set(self._in_flight)
+
+
+def _wake(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+# Global scheduler instance
+_admission_scheduler: Optional[AdmissionScheduler] = None
+
+
+def get_admission_scheduler() -> Optional[AdmissionScheduler]:
+    """Get the global admission scheduler (None when LLM_SCHEDULER_ENABLED is off)."""
+    global _admission_scheduler
+    if not settings.LLM_SCHEDULER_ENABLED:
+        return None
+    if _admission_scheduler is None:
+        _admission_scheduler = AdmissionScheduler()
+    return _admission_scheduler
@@ -0,0 +1,173 @@
+"""
+Single-call structured answers (ANSWER_MODE="structured").
+The model returns JSON with one claim per sentence, the sources it cites and
+a supporting quote. Quotes are checked locally against the cited sources
+(exact, then fuzzy with difflib), replacing the second verifier LLM call.
+"""
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional
+import json
+import logging
+import re
+
+from app.config import settings
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+_SOURCE_PATTERN = re.compile(r"\[Source (\d+)[^\]]*\][^\n]*\n(.*?)(?=\n\[Source \d+|\Z)", re.DOTALL)
+_NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)*")
+_WORD_PATTERN = re.compile(r"\w+")
+_CITATION_PATTERN = re.compile(r"\s*\[Source\s*\d+\]")
+
+
+@dataclass
+class StructuredSentence:
+    """One claim of a structured answer."""
+    text: str
+    sources: List[int] = field(default_factory=list)
+    quote: str = ""
+
+
+@dataclass
+class StructuredAnswer:
+    """Parsed structured model output."""
+    answerable: bool
+    sentences: List[StructuredSentence] = field(default_factory=list)
+    
+    def render(self) -> str:
+        """Answer text with [Source X] citations, as the draft flow produces it."""
+        parts = []
+        for sentence in self.sentences:
+            body = sentence.text.strip()
+            stripped = body.rstrip(".!?")
+            ending = body[len(stripped):] or "."
+            citations = "".join(f" [Source {n}]" for n in sentence.sources)
+            parts.append(f"{stripped}{citations}{ending}")
+        return " ".join(parts)
+
+
+def parse_structured_answer(raw_response: str) -> StructuredAnswer:
+    """
+    Parse the model's JSON output.
+    
+    Raises:
+        ValueError: If the output is not the expected JSON object
+    """
+    cleaned = raw_response.strip()
+    if cleaned.startswith("```"):
+        cleaned = re.sub(r"^```(?:json)?\s*|\s*```$", "", cleaned)
+    try:
+        data = json.loads(cleaned)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Structured answer is not valid JSON: {e}") from e
+    if not isinstance(data, dict) or not isinstance(data.get("sentences", []), list):
+        raise ValueError("Structured answer must be an object with a 'sentences' list")
+    
+    sentences = []
+    for item in data.get("sentences", []):
+        if not isinstance(item, dict) or not str(item.get("text", "")).strip():
+            continue
+        if not isinstance(item.get("sources", []), list):
+            raise ValueError("Structured answer sentence 'sources' must be a list")
+        if not isinstance(item.get("quote") or "", str):
+            raise ValueError("Structured answer sentence 'quote' must be a string")
+        sources = [int(s) for s in item.get("sources", []) if str(s).isdigit()]
+        text = _CITATION_PATTERN.sub("", str(item["text"])).strip()  # Citations are rendered from "sources"
+        sentences.append(StructuredSentence(text=text, sources=sources, quote=item.get("quote") or ""))
+    answerable = bool(data.get("answerable", bool(sentences))) and bool(sentences)
+    return StructuredAnswer(answerable=answerable, sentences=sentences)
+
+
+def context_sources(context: str) -> Dict[int, str]:
+    """Source number -> passage text, from a context built by ContextPacker."""
+    return {int(number): text for number, text in _SOURCE_PATTERN.findall(context)}
+
+
+def _normalize(text: str) -> str:
+    return " ".join(_WORD_PATTERN.findall(text.lower()))
+
+
+def quote_match_ratio(quote: str, source: str) -> float:
+    """
+    How well a quote matches the best same-length window of a source (1.0 = verbatim).
+    Comparison ignores case, punctuation and whitespace.
+    """
+    quote_norm, source_norm = _normalize(quote), _normalize(source)
+    if not quote_norm:
+        return 0.0
+    if quote_norm in source_norm:
+        return 1.0
+    
+    quote_words = quote_norm.split()
+    source_words = source_norm.split()
+    width = len(quote_words)
+    best = 0.0
+    matcher = SequenceMatcher(autojunk=False)
+    matcher.set_seq2(quote_norm)
+    for start in range(max(1, len(source_words) - width + 1)):
+        matcher.set_seq1(" ".join(source_words[start:start + width]))
+        if matcher.real_quick_ratio() <= best or matcher.quick_ratio() <= best:
+            continue
+        best = max(best, matcher.ratio())
+    return best
+
+
+def check_structured_answer(
+    answer: StructuredAnswer,
+    context: str,
+    min_ratio: float = settings.STRUCTURED_QUOTE_MIN_RATIO
+) -> Dict[str, Any]:
+    """
+    Check every sentence's quote against its cited sources.
+    A sentence is supported when its quote matches a cited source (at least
+    min_ratio) and every number it states appears in that quote.
+    
+    Args:
+        answer: Parsed structured answer
+        context: Context the answer was generated from
+        min_ratio: Minimum fuzzy match ratio for a quote
+    
+    Returns:
+        Verification dict with the verifier's keys (pass, issues, unsupported_claims, final_answer)
+    """
+    issues: List[str] = []
+    unsupported: List[str] = []
+    if not answer.answerable:
+        issues.append("Model reported that the context does not answer the question")
+    
+    sources = context_sources(context)
+    for sentence in answer.sentences:
+        problem = _sentence_problem(sentence, sources, min_ratio)
+        if problem:
+            issues.append(problem)
+            unsupported.append(sentence.text)
+    
+    return {
+        "pass": not issues,
+        "issues": issues,
+        "unsupported_claims": unsupported,
+        "final_answer": None
+    }
+
+
+def _sentence_problem(sentence: StructuredSentence, sources: Dict[int, str], min_ratio: float) -> Optional[str]:
+    """Why a sentence is unsupported, or None if its quote backs it."""
+    if not sentence.sources:
+        return f"No source cited for: '{sentence.text}'"
+    if not sentence.quote.strip():
+        return f"No supporting quote for: '{sentence.text}'"
+    cited = [sources[n] for n in sentence.sources if n in sources]
+    if not cited:
+        return f"Cited sources {sentence.sources} are not in the context"
+    
+    ratio = max(quote_match_ratio(sentence.quote, source) for source in cited)
+    if ratio < min_ratio:
+        return f"Quote not found in cited sources (match {ratio:.2f}): '{sentence.quote}'"
+    
+    quote_numbers = set(_NUMBER_PATTERN.findall(sentence.quote))
+    missing = [n for n in _NUMBER_PATTERN.findall(sentence.text) if n not in quote_numbers]
+    if missing:
+        return f"Numbers {missing} in '{sentence.text}' are not in its quote"
+    return None
@@ -5,7 +5,12 @@ Supports efficient similarity search and filtering.
 import chromadb
 from chromadb.config import Settings as ChromaSettings
 from typing import List, Dict, Any, Optional
+from contextlib import contextmanager
+import json
 import logging
+import os
+import re
+import threading
 from pathlib import Path
 
 from app.config import settings
@@ -19,8 +24,14 @@ class VectorStore:
     """
     Vector store using ChromaDB for persistent local storage.
     Supports CRUD operations and similarity search.
+    
+    Each tenant is routed to a collection built with one embedding model/revision.
+    The routing table lives in a small JSON registry next to the Chroma files so a
+    re-embedding migration can switch a tenant atomically (see app/rag/migration.py).
     """
     
+    REGISTRY_FILE = "embedding_registry.json"
+    
     def __init__(
         self,
         persist_directory: Path = settings.VECTORDB_DIR,
@@ -45,20 +56,198 @@ class VectorStore:
             )
         )
         
-        # Get or create collection
+        # Tenant routing registry and per-tenant write locks
+        self._registry_path = Path(persist_directory) / self.REGISTRY_FILE
+        self._registry: Dict[str, Any] = {"tenants": {}}
+        self._registry_mtime: Optional[float] = None
+        self._registry_lock = threading.RLock()
+        self._tenant_locks: Dict[str, threading.RLock] = {}
+        self._collections: Dict[str, Any] = {}
+        
+        # Get or create the default (legacy) collection
         self.collection = self.client.get_or_create_collection(
             name=collection_name,
-            metadata={"hnsw:space": "cosine"}  # Use cosine similarity
+            metadata={
+                "hnsw:space": "cosine",  # Use cosine similarity
+                "embedding_model": settings.EMBEDDING_MODEL,
+                "embedding_revision": settings.EMBEDDING_MODEL_REVISION
+            }
         )
+        self._stamp_legacy_collection()
+        self._collections[collection_name] = self.collection
         
         logger.info(f"Vector store initialized. Collection: {collection_name}, Items: {self.collection.count()}")
     
+    def _stamp_legacy_collection(self) -> None:
+        """Record the embedding model on collections created before model versioning."""
+        metadata = dict(self.collection.metadata or {})
+        if "embedding_model" in metadata:
+            return
+        # Collections created before versioning were built with the configured model
+        metadata["embedding_model"] = settings.EMBEDDING_MODEL
+        metadata["embedding_revision"] = settings.EMBEDDING_MODEL_REVISION
+        # Older ChromaDB keeps hnsw:* in metadata and needs it resent; newer versions reject it
+        candidates = [metadata, {k: v for k, v in metadata.items() if not k.startswith("hnsw:")}]
+        for candidate in candidates:
+            try:
+                self.collection.modify(metadata=candidate)
+                logger.info(f"Stamped collection {self.collection_name} with embedding model {settings.EMBEDDING_MODEL}")
+                return
+            except Exception as e:
+                last_error = e
+        logger.warning(f"Could not stamp embedding model on {self.collection_name}: {last_error}")
+    
+    # ============== Embedding index routing ==============
+    
+    def collection_name_for(self, embedding_model: str, embedding_revision: str) -> str:
+        """Get the collection name that holds vectors for a model/revision."""
+        default_index = self._default_index()
+        if (embedding_model == default_index["embedding_model"]
+                and embedding_revision == default_index["embedding_revision"]):
+            return self.collection_name
+        slug = re.sub(r'[^a-zA-Z0-9]+', '-', embedding_model).strip('-').lower()
+        return f"{self.collection_name}__{slug}_r{embedding_revision}"
+    
+    def _default_index(self) -> Dict[str, Any]:
+        """Index description for tenants that have never been migrated."""
+        metadata = self.collection.metadata or {}
+        return {
+            "collection_name": self.collection_name,
+            "embedding_model": metadata.get("embedding_model", settings.EMBEDDING_MODEL),
+            "embedding_revision": str(metadata.get("embedding_revision", settings.EMBEDDING_MODEL_REVISION))
+        }
+    
+    def _get_collection(self, name: str, embedding_model: Optional[str] = None, embedding_revision: Optional[str] = None):
+        """Get (or create) a collection by name, stamping its embedding model on creation."""
+        if name not in self._collections:
+            metadata = {"hnsw:space": "cosine"}
+            if embedding_model:
+                metadata["embedding_model"] = embedding_model
+                metadata["embedding_revision"] = embedding_revision or settings.EMBEDDING_MODEL_REVISION
+            self._collections[name] = self.client.get_or_create_collection(name=name, metadata=metadata)
+        return self._collections[name]
+    
+    def _load_registry(self) -> Dict[str, Any]:
+        """Load the tenant routing registry, re-reading it when another process switched a tenant."""
+        with self._registry_lock:
+            try:
+                mtime = self._registry_path.stat().st_mtime
+            except FileNotFoundError:
+                return self._registry
+            if mtime != self._registry_mtime:
+                try:
+                    with open(self._registry_path, "r", encoding="utf-8") as f:
+                        self._registry = json.load(f)
+                    self._registry.setdefault("tenants", {})
+                    self._registry_mtime = mtime
+                except (OSError, ValueError) as e:
+                    logger.error(f"Failed to read embedding registry {self._registry_path}: {e}")
+            return self._registry
+    
+    def _save_registry(self) -> None:
+        """Persist the registry atomically (write temp file, then rename)."""
+        tmp_path = self._registry_path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._registry, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self._registry_path)
+        self._registry_mtime = self._registry_path.stat().st_mtime
+    
+    def get_tenant_index(self, tenant_id: Optional[str]) -> Dict[str, Any]:
+        """
+        Get the embedding index a tenant currently reads from and writes to.
+        
+        Returns:
+            Dict with collection_name, embedding_model, embedding_revision and,
+            while a migration is running, the shadow index under "shadow"
+        """
+        registry = self._load_registry()
+        entry = registry["tenants"].get(tenant_id) if tenant_id else None
+        if not entry:
+            return self._default_index()
+        return dict(entry)
+    
+    def set_shadow_index(self, tenant_id: str, shadow: Optional[Dict[str, Any]]) -> None:
+        """Register (or clear) the shadow index a migration is building for a tenant."""
+        with self._registry_lock:
+            self._load_registry()
+            entry = self._registry["tenants"].get(tenant_id) or self._default_index()
+            if shadow:
+                entry["shadow"] = shadow
+            else:
+                entry.pop("shadow", None)
+            self._registry["tenants"][tenant_id] = entry
+            self._save_registry()
+    
+    def switch_tenant_index(self, tenant_id: str, index: Dict[str, Any]) -> None:
+        """Atomically point a tenant at a new embedding index (drops any shadow entry)."""
+        with self._registry_lock:
+            self._load_registry()
+            self._registry["tenants"][tenant_id] = {
+                "collection_name": index["collection_name"],
+                "embedding_model": index["embedding_model"],
+                "embedding_revision": index["embedding_revision"]
+            }
+            self._save_registry()
+        logger.info(
+            f"Tenant {tenant_id} switched to index {index['collection_name']} "
+            f"(model={index['embedding_model']}, revision={index['embedding_revision']})"
+        )
+    
+    def get_collection_for_index(self, index: Dict[str, Any]):
+        """Get the Chroma collection behind an index description."""
+        return self._get_collection(
+            index["collection_name"],
+            index.get("embedding_model"),
+            index.get("embedding_revision")
+        )
+    
+    @contextmanager
+    def tenant_lock(self, tenant_id: str):
+        """
+        Serialize index writes for a tenant within this process.
+        Held by ingestion and by the final catch-up/switch step of a migration.
+        """
+        with self._registry_lock:
+            lock = self._tenant_locks.setdefault(tenant_id, threading.RLock())
+        with lock:
+            yield
+    
+    def get_chunk_ids(self, index: Dict[str, Any], filter_dict: Dict[str, Any]) -> List[str]:
+        """List the IDs of chunks matching a filter in one index (no documents loaded)."""
+        collection = self.get_collection_for_index(index)
+        results = collection.get(where=self._build_where(filter_dict), include=[])
+        return list(results['ids']) if results and results['ids'] else []
+    
+    def get_chunks(self, index: Dict[str, Any], ids: List[str]) -> Dict[str, Any]:
+        """Fetch stored chunk text and metadata by ID from one index."""
+        if not ids:
+            return {"ids": [], "documents": [], "metadatas": []}
+        collection = self.get_collection_for_index(index)
+        results = collection.get(ids=ids, include=["documents", "metadatas"])
+        return {
+            "ids": results['ids'] or [],
+            "documents": results['documents'] or [],
+            "metadatas": results['metadatas'] or []
+        }
+    
+    @staticmethod
+    def _build_where(filter_dict: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Build a ChromaDB where clause ($and for multiple conditions)."""
+        if not filter_dict:
+            return None
+        if len(filter_dict) == 1:
+            return dict(filter_dict)
+        return {"$and": [{k: v} for k, v in filter_dict.items()]}
+    
     def add_documents(
         self,
         documents: List[str],
         embeddings: List[List[float]],
         metadatas: List[Dict[str, Any]],
-        ids: List[str]
+        ids: List[str],
+        index: Optional[Dict[str, Any]] = None
     ) -> None:
         """
         Add documents to the vector store.
@@ -68,11 +257,16 @@ class VectorStore:
             embeddings: List of embedding vectors
             metadatas: List of metadata dictionaries
             ids: List of unique document IDs
+            index: Embedding index the vectors were computed for
+                (defaults to the tenant's current index)
         """
         if not documents:
             logger.warning("No documents to add")
             return
         
+        if index is None:
+            index = self.get_tenant_index(metadatas[0].get("tenant_id") if metadatas else None)
+        
         # ChromaDB doesn't accept None values in metadata
         clean_metadatas = []
         for meta in metadatas:
@@ -80,22 +274,28 @@ class VectorStore:
             for k, v in meta.items():
                 if v is not None:
                     clean_meta[k] = v
+            # Record which model produced the vector so stale chunks can be detected
+            clean_meta["embedding_model"] = index["embedding_model"]
+            clean_meta["embedding_revision"] = index["embedding_revision"]
             clean_metadatas.append(clean_meta)
         
-        self.collection.add(
+        collection = self.get_collection_for_index(index)
+        collection.add(
             documents=documents,
             embeddings=embeddings,
             metadatas=clean_metadatas,
             ids=ids
         )
         
-        logger.info(f"Added {len(documents)} documents to vector store")
+        logger.info(f"Added {len(documents)} documents to vector store ({index['collection_name']})")
     
     def search(
         self,
         query_embedding: List[float],
         top_k: int = settings.TOP_K,
-        filter_dict: Optional[Dict[str, Any]] = None
+        filter_dict: Optional[Dict[str, Any]] = None,
+        index: Optional[Dict[str, Any]] = None,
+        include_embeddings: bool = False
     ) -> List[Dict[str, Any]]:
         """
         Search for similar documents.
@@ -104,29 +304,25 @@ class VectorStore:
             query_embedding: Query embedding vector
             top_k: Number of results to return
             filter_dict: Optional filter criteria (e.g., {"kb_id": "123"})
+            index: Embedding index the query vector was computed for
+                (defaults to the tenant's current index)
+            include_embeddings: Also return each result's embedding (for diversity selection)
             
         Returns:
             List of results with document, metadata, and similarity score
         """
+        if index is None:
+            index = self.get_tenant_index((filter_dict or {}).get("tenant_id"))
+        
         # ChromaDB requires filters in $and/$or format for multiple conditions
-        where_filter = None
-        if filter_dict:
-            if len(filter_dict) == 1:
-                # Single condition - use directly
-                where_filter = filter_dict
-            else:
-                # Multiple conditions - use $and operator
-                where_filter = {
-                    "$and": [
-                        {k: v} for k, v in filter_dict.items()
-                    ]
-                }
+        where_filter = self._build_where(filter_dict)
         
-        results = self.collection.query(
+        collection = self.get_collection_for_index(index)
+        results = collection.query(
             query_embeddings=[query_embedding],
             n_results=top_k,
             where=where_filter,
-            include=["documents", "metadatas", "distances"]
+            include=["documents", "metadatas", "distances"] + (["embeddings"] if include_embeddings else [])
         )
         
         # Format results
@@ -144,6 +340,8 @@ class VectorStore:
                     'metadata': results['metadatas'][0][i] if results['metadatas'] else {},
                     'similarity_score': max(0, min(1, similarity))  # Clamp to 0-1
                 })
+                if include_embeddings and results.get('embeddings') is not None:
+                    formatted_results[-1]['embedding'] = [float(x) for x in results['embeddings'][0][i]]
         
         return formatted_results
     
@@ -158,34 +356,49 @@ class VectorStore:
             Number of documents deleted
         """
         # ChromaDB requires filters in $and/$or format for multiple conditions
-        where_filter = None
-        if len(filter_dict) == 1:
-            where_filter = filter_dict
-        else:
-            where_filter = {
-                "$and": [
-                    {k: v} for k, v in filter_dict.items()
-                ]
-            }
+        where_filter = self._build_where(filter_dict)
+        
+        tenant_id = filter_dict.get("tenant_id")
+        if not tenant_id:
+            return self._delete_from_collection(self.collection, where_filter)
         
+        with self.tenant_lock(tenant_id):
+            index = self.get_tenant_index(tenant_id)
+            deleted = self._delete_from_collection(self.get_collection_for_index(index), where_filter)
+            # Mirror deletes into a shadow index so they don't reappear after the switch
+            if index.get("shadow"):
+                self._delete_from_collection(self.get_collection_for_index(index["shadow"]), where_filter)
+        return deleted
+    
+    def _delete_from_collection(self, collection, where_filter: Optional[Dict[str, Any]]) -> int:
+        """Delete documents matching a where clause from one collection."""
         # First, find matching documents
-        results = self.collection.get(
+        results = collection.get(
             where=where_filter,
             include=["metadatas"]
         )
         
         if results and results['ids']:
-            self.collection.delete(ids=results['ids'])
+            collection.delete(ids=results['ids'])
             logger.info(f"Deleted {len(results['ids'])} documents matching filter")
             return len(results['ids'])
         
         return 0
     
-    def delete_by_ids(self, ids: List[str]) -> None:
-        """Delete documents by their IDs."""
-        if ids:
+    def delete_by_ids(self, ids: List[str], tenant_id: Optional[str] = None) -> None:
+        """Delete documents by their IDs (from the tenant's index when tenant_id is given)."""
+        if not ids:
+            return
+        if not tenant_id:
             self.collection.delete(ids=ids)
-            logger.info(f"Deleted {len(ids)} documents by ID")
+        else:
+            with self.tenant_lock(tenant_id):
+                index = self.get_tenant_index(tenant_id)
+                self.get_collection_for_index(index).delete(ids=ids)
+                # Mirror deletes into a shadow index so they don't reappear after the switch
+                if index.get("shadow"):
+                    self.get_collection_for_index(index["shadow"]).delete(ids=ids)
+        logger.info(f"Deleted {len(ids)} documents by ID")
     
     def get_stats(
         self, 
@@ -214,17 +427,11 @@ class VectorStore:
         
         if filter_dict:
             # ChromaDB requires filters in $and/$or format for multiple conditions
-            where_filter = None
-            if len(filter_dict) == 1:
-                where_filter = filter_dict
-            else:
-                where_filter = {
-                    "$and": [
-                        {k: v} for k, v in filter_dict.items()
-                    ]
-                }
+            where_filter = self._build_where(filter_dict)
             
-            results = self.collection.get(
+            index = self.get_tenant_index(tenant_id)
+            collection = self.get_collection_for_index(index)
+            results = collection.get(
                 where=where_filter,
                 include=["metadatas"]
             )
@@ -242,7 +449,9 @@ class VectorStore:
                 "file_names": list(file_names),
                 "tenant_id": tenant_id,
                 "kb_id": kb_id,
-                "user_id": user_id
+                "user_id": user_id,
+                "embedding_model": index["embedding_model"],
+                "embedding_revision": index["embedding_revision"]
             }
         else:
             return {
@@ -255,8 +464,13 @@ class VectorStore:
         self.client.delete_collection(self.collection_name)
         self.collection = self.client.create_collection(
             name=self.collection_name,
-            metadata={"hnsw:space": "cosine"}
+            metadata={
+                "hnsw:space": "cosine",
+                "embedding_model": settings.EMBEDDING_MODEL,
+                "embedding_revision": settings.EMBEDDING_MODEL_REVISION
+            }
         )
+        self._collections[self.collection_name] = self.collection
         logger.info(f"Cleared collection: {self.collection_name}")
 
 
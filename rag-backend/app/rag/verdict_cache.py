@@ -0,0 +1,138 @@
+"""
+Verifier verdict cache.
+At temperature 0 the same context and draft get the same fact-check verdict,
+so verdicts are cached by a fingerprint of (verifier prompt version, scope,
+model tier, context, draft). The scope carries the tenant, KB and KB content
+version, so any document change makes that KB's old verdicts unreachable.
+Failures expire sooner than passes (a borderline fail may pass on retry
+after a prompt or model change, and should not be pinned for long).
+"""
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional
+import copy
+import hashlib
+import logging
+import threading
+import time
+
+from app.config import settings
+from app.utils.metrics import counter, gauge
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+VERDICT_CACHE_LOOKUPS = counter(
+    "rag_verifier_cache_lookups_total",
+    "Verifier verdict cache lookups by result (hit, miss)",
+    ["result"]
+)
+VERDICT_CACHE_ENTRIES = gauge(
+    "rag_verifier_cache_entries",
+    "Verdicts currently held in the verifier cache"
+)
+
+
+def verdict_key(prompt_version: str, scope: Optional[str], tier: Optional[str], context: str, draft: str) -> str:
+    """
+    Fingerprint of everything a verdict depends on.
+    
+    Args:
+        prompt_version: Hash of the verifier prompts
+        scope: Tenant/KB/KB-version scope (None = unscoped)
+        tier: Model tier used for verification
+        context: Context the draft was checked against
+        draft: Draft answer
+    """
+    digest = hashlib.sha256()
+    for part in (prompt_version, scope or "", tier or "", context, draft):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def kb_scope(tenant_id: str, kb_id: str, kb_version: int) -> str:
+    """Cache scope for a knowledge base at one content version."""
+    return f"{tenant_id}:{kb_id}:v{kb_version}"
+
+
+class VerdictCache:
+    """Thread-safe LRU cache of verifier verdicts with separate pass/fail TTLs."""
+    
+    def __init__(
+        self,
+        max_entries: int = settings.VERDICT_CACHE_MAX_ENTRIES,
+        pass_ttl: float = settings.VERDICT_CACHE_PASS_TTL,
+        fail_ttl: float = settings.VERDICT_CACHE_FAIL_TTL,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            max_entries: Least recently used verdicts are evicted beyond this
+            pass_ttl: Seconds a passing verdict stays valid
+            fail_ttl: Seconds a failing verdict stays valid
+            clock: Time source (injectable for tests)
+        """
+        self.max_entries = max_entries
+        self.pass_ttl = pass_ttl
+        self.fail_ttl = fail_ttl
+        self._clock = clock
+        self._entries: "OrderedDict[str, tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+    
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return a copy of the cached verdict, or None if missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= self._clock():
+                del self._entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                VERDICT_CACHE_LOOKUPS.labels(result="miss").inc()
+                VERDICT_CACHE_ENTRIES.set(len(self._entries))
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+        VERDICT_CACHE_LOOKUPS.labels(result="hit").inc()
+        return copy.deepcopy(entry[1])
+    
+    def put(self, key: str, verdict: Dict[str, Any]) -> None:
+        """Cache a verdict parsed from the verifier LLM (never cache error fallbacks)."""
+        ttl = self.pass_ttl if verdict.get("pass") else self.fail_ttl
+        if ttl <= 0 or self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, copy.deepcopy(verdict))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            VERDICT_CACHE_ENTRIES.set(len(self._entries))
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            VERDICT_CACHE_ENTRIES.set(0)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+# Global verdict cache instance
+_verdict_cache: Optional[VerdictCache] = None
+
+
+def get_verdict_cache() -> Optional[VerdictCache]:
+    """Get the global verdict cache (None when VERDICT_CACHE_ENABLED is off)."""
+    global _verdict_cache
+    if not settings.VERDICT_CACHE_ENABLED:
+        return None
+    if _verdict_cache is None:
+        _verdict_cache = VerdictCache()
+    return _verdict_cache
@@ -2,12 +2,15 @@
 Verifier module for RAG pipeline.
 Implements Draft → Verify → Final flow to minimize hallucination.
 """
+import hashlib
 import json
 import re
 from typing import Dict, Any, List, Optional
 import logging
 
 from app.config import settings
+from app.rag.model_router import tier_kwargs
+from app.rag.verdict_cache import get_verdict_cache, verdict_key
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -67,6 +70,17 @@ VERIFIER_PROMPT = """You are a strict fact-checker for a customer support chatbo
 Now verify the draft answer and return ONLY valid JSON (no markdown, no code blocks, just raw JSON):"""
 
 
+VERIFIER_SYSTEM_PROMPT = "You are a strict fact-checker. Return ONLY valid JSON."
+
+# Cached verdicts are only reused while the prompts are unchanged
+VERIFIER_PROMPT_VERSION = hashlib.sha256(
+    (VERIFIER_SYSTEM_PROMPT + VERIFIER_PROMPT).encode("utf-8")
+).hexdigest()[:16]
+
+# Marks verdicts guessed from a non-JSON response (never cached)
+_INFERRED_KEY = "_inferred"
+
+
 class VerifierService:
     """
     Verifies that draft answers are supported by retrieved context.
@@ -84,22 +98,19 @@ class VerifierService:
     
     @property
     def provider(self):
-        """Get or create the LLM provider for verification."""
+        """Get the LLM provider for verification (the same shared instance the answer service uses)."""
         if self._provider is None:
-            from app.rag.answer import GeminiProvider, OpenAIProvider
-            if settings.LLM_PROVIDER == "gemini":
-                self._provider = GeminiProvider()
-            elif settings.LLM_PROVIDER == "openai":
-                self._provider = OpenAIProvider()
-            else:
-                raise ValueError(f"Unknown LLM provider: {settings.LLM_PROVIDER}")
+            from app.rag.routing import get_routed_provider
+            self._provider = get_routed_provider(settings.LLM_PROVIDER)
         return self._provider
     
     def verify_answer(
         self,
         draft_answer: str,
         context: str,
-        citations_info: List[Dict[str, Any]]
+        citations_info: List[Dict[str, Any]],
+        tier: Optional[str] = None,
+        cache_scope: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Verify that a draft answer is supported by the context.
@@ -108,6 +119,8 @@ class VerifierService:
             draft_answer: The draft answer to verify
             context: The retrieved context from knowledge base
             citations_info: List of citation information
+            tier: Model tier chosen for the draft (None = configured model)
+            cache_scope: Verdict cache scope (tenant/KB/KB version, see verdict_cache.kb_scope)
             
         Returns:
             Dictionary with verification results:
@@ -119,70 +132,138 @@ class VerifierService:
             }
         """
         if not context or not draft_answer:
-            logger.warning("Empty context or draft answer provided to verifier")
-            return {
-                "pass": False,
-                "issues": ["Empty context or draft answer"],
-                "unsupported_claims": [],
-                "final_answer": None
-            }
+            return self._empty_input_result()
         
-        # Format verifier prompt
-        verifier_prompt = VERIFIER_PROMPT.format(
-            context=context,
-            draft_answer=draft_answer
-        )
+        cache_key = verdict_key(VERIFIER_PROMPT_VERSION, cache_scope, tier, context, draft_answer)
+        cached = self._cached_verdict(cache_key)
+        if cached is not None:
+            return cached
         
         try:
             logger.info("Running verifier on draft answer...")
             # Use a more deterministic temperature for verification
             try:
                 raw_response = self.provider.generate(
-                    system_prompt="You are a strict fact-checker. Return ONLY valid JSON.",
-                    user_prompt=verifier_prompt
+                    system_prompt=VERIFIER_SYSTEM_PROMPT,
+                    user_prompt=VERIFIER_PROMPT.format(context=context, draft_answer=draft_answer),
+                    **tier_kwargs(tier)
                 )
             except Exception as e:
-                logger.error(f"Error calling LLM in verifier: {e}", exc_info=True)
-                # On LLM error, fail conservatively
-                return {
-                    "pass": False,
-                    "issues": [f"Verifier LLM error: {str(e)}"],
-                    "unsupported_claims": [],
-                    "final_answer": None
-                }
-            
-            # Parse JSON response
+                return self._llm_error_result(e)
+            return self._result_from_response(raw_response, cache_key)
+        except Exception as e:
+            return self._unexpected_error_result(e)
+    
+    async def averify_answer(
+        self,
+        draft_answer: str,
+        context: str,
+        citations_info: List[Dict[str, Any]],
+        tier: Optional[str] = None,
+        cache_scope: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Async variant of verify_answer, awaited on the provider's async client.
+        
+        Returns:
+            Same dictionary as verify_answer
+        """
+        if not context or not draft_answer:
+            return self._empty_input_result()
+        
+        cache_key = verdict_key(VERIFIER_PROMPT_VERSION, cache_scope, tier, context, draft_answer)
+        cached = self._cached_verdict(cache_key)
+        if cached is not None:
+            return cached
+        
+        try:
+            logger.info("Running verifier on draft answer...")
             try:
-                verification_result = self._parse_verifier_response(raw_response)
-            except Exception as e:
-                logger.error(f"Error parsing verifier response: {e}", exc_info=True)
-                logger.error(f"Raw response was: {raw_response[:500]}")
-                # On parse error, fail conservatively
-                return {
-                    "pass": False,
-                    "issues": [f"Verifier parse error: {str(e)}"],
-                    "unsupported_claims": [],
-                    "final_answer": None
-                }
-            
-            if verification_result["pass"]:
-                logger.info("✅ Verifier PASSED - All claims supported by context")
-            else:
-                logger.warning(
-                    f"❌ Verifier FAILED - Issues: {verification_result.get('issues', [])}"
+                raw_response = await self.provider.agenerate(
+                    system_prompt=VERIFIER_SYSTEM_PROMPT,
+                    user_prompt=VERIFIER_PROMPT.format(context=context, draft_answer=draft_answer),
+                    **tier_kwargs(tier)
                 )
-            
-            return verification_result
-            
+            except Exception as e:
+                return self._llm_error_result(e)
+            return self._result_from_response(raw_response, cache_key)
+        except Exception as e:
+            return self._unexpected_error_result(e)
+    
+    @staticmethod
+    def _cached_verdict(cache_key: str) -> Optional[Dict[str, Any]]:
+        """Verdict from the cache, if enabled and present."""
+        cache = get_verdict_cache()
+        if cache is None:
+            return None
+        verdict = cache.get(cache_key)
+        if verdict is not None:
+            logger.info(f"Verifier cache hit ({'PASS' if verdict['pass'] else 'FAIL'})")
+        return verdict
+    
+    def _result_from_response(self, raw_response: str, cache_key: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Parse the raw verifier output, failing conservatively if it can't be parsed.
+        Verdicts parsed from valid JSON are cached under cache_key; parse errors
+        and verdicts guessed from free text are not.
+        """
+        try:
+            verification_result = self._parse_verifier_response(raw_response)
         except Exception as e:
-            logger.error(f"Unexpected error in verifier: {e}", exc_info=True)
-            # On error, fail conservatively
+            logger.error(f"Error parsing verifier response: {e}", exc_info=True)
+            logger.error(f"Raw response was: {raw_response[:500]}")
+            # On parse error, fail conservatively
             return {
                 "pass": False,
-                "issues": [f"Verifier error: {str(e)}"],
+                "issues": [f"Verifier parse error: {str(e)}"],
                 "unsupported_claims": [],
                 "final_answer": None
             }
+        
+        if verification_result["pass"]:
+            logger.info("✅ Verifier PASSED - All claims supported by context")
+        else:
+            logger.warning(
+                f"❌ Verifier FAILED - Issues: {verification_result.get('issues', [])}"
+            )
+        
+        inferred = verification_result.pop(_INFERRED_KEY, False)
+        cache = get_verdict_cache()
+        if cache is not None and cache_key is not None and not inferred:
+            cache.put(cache_key, verification_result)
+        return verification_result
+    
+    @staticmethod
+    def _empty_input_result() -> Dict[str, Any]:
+        logger.warning("Empty context or draft answer provided to verifier")
+        return {
+            "pass": False,
+            "issues": ["Empty context or draft answer"],
+            "unsupported_claims": [],
+            "final_answer": None
+        }
+    
+    @staticmethod
+    def _llm_error_result(error: Exception) -> Dict[str, Any]:
+        logger.error(f"Error calling LLM in verifier: {error}", exc_info=True)
+        # On LLM error, fail conservatively
+        return {
+            "pass": False,
+            "issues": [f"Verifier LLM error: {str(error)}"],
+            "unsupported_claims": [],
+            "final_answer": None
+        }
+    
+    @staticmethod
+    def _unexpected_error_result(error: Exception) -> Dict[str, Any]:
+        logger.error(f"Unexpected error in verifier: {error}", exc_info=True)
+        # On error, fail conservatively
+        return {
+            "pass": False,
+            "issues": [f"Verifier error: {str(error)}"],
+            "unsupported_claims": [],
+            "final_answer": None
+        }
     
     def _parse_verifier_response(self, raw_response: str) -> Dict[str, Any]:
         """
@@ -192,7 +273,7 @@ class VerifierService:
             raw_response: Raw response from LLM
             
         Returns:
-            Parsed verification result
+            Parsed verification result (results guessed from free text carry _INFERRED_KEY)
         """
         # Try to extract JSON from response
         # Remove markdown code blocks if present
@@ -241,7 +322,8 @@ class VerifierService:
                     "pass": True,
                     "issues": [],
                     "unsupported_claims": [],
-                    "final_answer": None
+                    "final_answer": None,
+                    _INFERRED_KEY: True
                 }
             elif ("pass" in response_lower and ("false" in response_lower or "no" in response_lower)) or \
                  ("not supported" in response_lower or "unsupported" in response_lower):
@@ -250,7 +332,8 @@ class VerifierService:
                     "pass": False,
                     "issues": ["Failed to parse verifier response - inferred fail from text"],
                     "unsupported_claims": [],
-                    "final_answer": None
+                    "final_answer": None,
+                    _INFERRED_KEY: True
                 }
             else:
                 # Default to fail for safety
@@ -259,7 +342,8 @@ class VerifierService:
                     "pass": False,
                     "issues": [f"Failed to parse verifier response: {str(e)}"],
                     "unsupported_claims": [],
-                    "final_answer": None
+                    "final_answer": None,
+                    _INFERRED_KEY: True
                 }
 
 
@@ -0,0 +1,86 @@
+"""
+Prometheus metrics for the RAG backend.
+prometheus-client is optional: without it every metric is a no-op and
+/metrics returns 404.
+"""
+from typing import Optional, Sequence, Tuple
+import logging
+
+logger = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import (
+        Counter, Gauge, Histogram, CONTENT_TYPE_LATEST, generate_latest
+    )
+    PROMETHEUS_AVAILABLE = True
+except ImportError:  # pragma: no cover - depends on installed extras
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = "text/plain"
+    logger.warning("prometheus-client not installed, metrics are disabled")
+
+
+class _NoopMetric:
+    """Stand-in used when prometheus-client is not installed."""
+    
+    def labels(self, *args, **kwargs) -> "_NoopMetric":
+        return self
+    
+    def inc(self, amount: float = 1) -> None:
+        pass
+    
+    def dec(self, amount: float = 1) -> None:
+        pass
+    
+    def set(self, value: float) -> None:
+        pass
+    
+    def observe(self, value: float) -> None:
+        pass
+
+
+# Latency buckets (seconds) sized for LLM calls: sub-second TTFB up to slow double-LLM answers
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 7.5, 10.0, 20.0, 30.0)
+
+
+def histogram(name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Optional[Tuple[float, ...]] = None):
+    """Create a histogram (no-op without prometheus-client)."""
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    return Histogram(name, documentation, labelnames, buckets=buckets or LATENCY_BUCKETS)
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()):
+    """Create a counter (no-op without prometheus-client)."""
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    return Counter(name, documentation, labelnames)
+
+
+def gauge(name: str, documentation: str, labelnames: Sequence[str] = ()):
+    """Create a gauge (no-op without prometheus-client)."""
+    if not PROMETHEUS_AVAILABLE:
+        return _NoopMetric()
+    return Gauge(name, documentation, labelnames)
+
+
+def metrics_payload() -> Tuple[bytes, str]:
+    """Render all metrics in the Prometheus text format."""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+# ============== Chat streaming ==============
+
+CHAT_STREAM_TTFB = histogram(
+    "rag_chat_stream_ttfb_seconds",
+    "Time from request start to the first SSE event of each kind (citations, token)",
+    ["event"]
+)
+CHAT_STREAM_DURATION = histogram(
+    "rag_chat_stream_duration_seconds",
+    "Total duration of a streamed chat response"
+)
+CHAT_STREAM_OUTCOMES = counter(
+    "rag_chat_stream_outcomes_total",
+    "Streamed chat responses by outcome (answered, refused, retracted, error)",
+    ["outcome"]
+)
@@ -5,7 +5,7 @@ Tests retrieval accuracy and answer quality.
 import httpx
 import json
 import time
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from pathlib import Path
 import sys
 
@@ -216,30 +216,15 @@ def check_kb_stats(client: httpx.Client) -> Dict[str, Any]:
     return {}
 
 
-def run_test_case(client: httpx.Client, test_case: Dict[str, Any]) -> Dict[str, Any]:
-    """Run a single test case."""
-    question = test_case["question"]
+def score_answer(test_case: Dict[str, Any], data: Dict[str, Any]) -> Tuple[bool, str]:
+    """
+    Score a chat response against a test case's expected behavior.
+    
+    Returns:
+        (passed, reason)
+    """
     expected_behavior = test_case["expected_behavior"]
     expected_keywords = test_case["expected_keywords"]
-    
-        response = client.post(
-            f"{BASE_URL}/chat",
-            json={
-                "tenant_id": TEST_TENANT_ID,  # CRITICAL: Multi-tenant isolation
-                "user_id": TEST_USER_ID,
-                "kb_id": TEST_KB_ID,
-                "question": question
-            }
-        )
-    
-    if response.status_code != 200:
-        return {
-            "passed": False,
-            "error": f"HTTP {response.status_code}",
-            "response": None
-        }
-    
-    data = response.json()
     answer = data.get("answer", "").lower()
     from_kb = data.get("from_knowledge_base", False)
     escalation = data.get("escalation_suggested", False)
@@ -273,6 +258,37 @@ def run_test_case(client: httpx.Client, test_case: Dict[str, Any]) -> Dict[str,
         else:
             reason = f"Should have refused. Got: from_kb={from_kb}, escalation={escalation}"
     
+    return passed, reason
+
+
+def run_test_case(client: httpx.Client, test_case: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a single test case."""
+    question = test_case["question"]
+    
+    response = client.post(
+        f"{BASE_URL}/chat",
+        json={
+            "tenant_id": TEST_TENANT_ID,  # CRITICAL: Multi-tenant isolation
+            "user_id": TEST_USER_ID,
+            "kb_id": TEST_KB_ID,
+            "question": question
+        }
+    )
+    
+    if response.status_code != 200:
+        return {
+            "passed": False,
+            "error": f"HTTP {response.status_code}",
+            "response": None
+        }
+    
+    data = response.json()
+    from_kb = data.get("from_knowledge_base", False)
+    escalation = data.get("escalation_suggested", False)
+    confidence = data.get("confidence", 0)
+    
+    passed, reason = score_answer(test_case, data)
+    
     return {
         "passed": passed,
         "reason": reason,
@@ -0,0 +1,182 @@
+"""
+A/B the two answer modes: draft + verifier LLM calls vs. one structured call.
+
+Ingests the evaluate.py sample knowledge base into a scratch data directory,
+runs every evaluate.py test case under ANSWER_MODE=verify and
+ANSWER_MODE=structured, and reports per mode:
+- pass rate (evaluate.py scoring) and refusal rate
+- verification rejections (verifier or local quote check said no)
+- unsupported numbers shipped: accepted answers stating a number that is not
+  in the context (hallucinations the check missed)
+- LLM calls, tokens and latency per answered question
+
+Runs on the fake provider by default (no API key); FAKE_LLM_HALLUCINATION_RATE
+makes some synthesized answers state a wrong number, so both modes have
+something to catch. Set LLM_PROVIDER=gemini/openai to compare real models.
+
+Usage:
+    python scripts/ab_answer_modes.py [--repeat 3] [--hallucination-rate 0.3]
+    LLM_PROVIDER=gemini python scripts/ab_answer_modes.py
+"""
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Keep the eval knowledge base out of the real data directory
+_scratch = Path(tempfile.mkdtemp(prefix="ab_answer_modes_"))
+for _name in ("DATA_DIR", "UPLOADS_DIR", "PROCESSED_DIR", "VECTORDB_DIR"):
+    os.environ.setdefault(_name, str(_scratch / _name.lower()))
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("FAKE_LLM_LATENCY_MS", "400")
+os.environ.setdefault("VERDICT_CACHE_ENABLED", "false")  # Repeats must pay for verification like first runs
+
+import evaluate  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.main import process_document  # noqa: E402
+from app.rag.answer import LLMProvider, get_answer_service  # noqa: E402
+from app.rag.retrieval import get_retrieval_service  # noqa: E402
+from app.rag.routing import get_routed_provider  # noqa: E402
+from app.rag.verifier import get_verifier_service  # noqa: E402
+
+MODES = ("verify", "structured")
+_NUMBER_PATTERN = re.compile(r"\d+(?:[.,]\d+)*")
+_CITATION_PATTERN = re.compile(r"\[Source[^\]]*\]")
+
+
+class CountingProvider(LLMProvider):
+    """Counts calls and tokens for the answer service and verifier."""
+    
+    def __init__(self, inner: LLMProvider):
+        self.inner = inner
+        self.calls = 0
+        self.tokens = 0
+    
+    def generate(self, system_prompt: str, user_prompt: str, **kwargs) -> str:
+        return self.generate_with_usage(system_prompt, user_prompt, **kwargs)[0]
+    
+    def generate_with_usage(self, system_prompt: str, user_prompt: str, **kwargs) -> tuple[str, dict]:
+        text, usage_info = self.inner.generate_with_usage(system_prompt, user_prompt, **kwargs)
+        return text, self._count(usage_info)
+    
+    async def agenerate(self, system_prompt: str, user_prompt: str, **kwargs) -> str:
+        return (await self.agenerate_with_usage(system_prompt, user_prompt, **kwargs))[0]
+    
+    async def agenerate_with_usage(self, system_prompt: str, user_prompt: str, **kwargs) -> tuple[str, dict]:
+        text, usage_info = await self.inner.agenerate_with_usage(system_prompt, user_prompt, **kwargs)
+        return text, self._count(usage_info)
+    
+    def _count(self, usage_info: dict) -> dict:
+        self.calls += 1
+        self.tokens += (usage_info or {}).get("total_tokens", 0)
+        return usage_info
+
+
+def ingest_sample_kb() -> None:
+    path = _scratch / "sample_faq.md"
+    path.write_text(evaluate.create_sample_kb())
+    process_document(
+        path,
+        tenant_id=evaluate.TEST_TENANT_ID,
+        user_id=evaluate.TEST_USER_ID,
+        kb_id=evaluate.TEST_KB_ID,
+        original_filename="sample_faq.md",
+        document_id=f"doc_{uuid.uuid4().hex[:12]}"
+    )
+
+
+def unsupported_numbers(answer: str, context: str) -> list:
+    """Numbers an answer states that the context never mentions."""
+    context_numbers = set(_NUMBER_PATTERN.findall(_CITATION_PATTERN.sub("", context)))
+    return [n for n in _NUMBER_PATTERN.findall(_CITATION_PATTERN.sub("", answer)) if n not in context_numbers]
+
+
+def run_mode(mode: str, repeat: int, counter: CountingProvider) -> dict:
+    """Run all test cases `repeat` times under one answer mode."""
+    settings.ANSWER_MODE = mode
+    counter.calls = counter.tokens = 0
+    retrieval_service = get_retrieval_service()
+    answer_service = get_answer_service()
+    
+    stats = {"mode": mode, "total": 0, "passed": 0, "refused": 0, "rejected": 0, "shipped_unsupported": 0, "generated": 0}
+    latencies = []
+    for _ in range(repeat):
+        for case in evaluate.TEST_CASES:
+            results, confidence, has_relevant = retrieval_service.retrieve(
+                query=case["question"],
+                tenant_id=evaluate.TEST_TENANT_ID,
+                kb_id=evaluate.TEST_KB_ID,
+                user_id=evaluate.TEST_USER_ID
+            )
+            context, citations_info = retrieval_service.get_context_for_llm(results, query=case["question"])
+            started = time.perf_counter()
+            answer_result = asyncio.run(answer_service.agenerate_answer(
+                question=case["question"],
+                context=context,
+                citations_info=citations_info,
+                confidence=confidence,
+                has_relevant_results=has_relevant
+            ))
+            
+            stats["total"] += 1
+            stats["passed"] += evaluate.score_answer(case, answer_result)[0]
+            stats["refused"] += bool(answer_result.get("refused"))
+            if "usage" in answer_result:  # Passed the gates and reached the LLM
+                stats["generated"] += 1
+                latencies.append(time.perf_counter() - started)
+                if not answer_result.get("verifier_passed"):
+                    stats["rejected"] += 1
+                elif unsupported_numbers(answer_result["answer"], context):
+                    stats["shipped_unsupported"] += 1
+    
+    generated = stats["generated"] or 1
+    stats["calls_per_answer"] = counter.calls / generated
+    stats["tokens_per_answer"] = counter.tokens / generated
+    ordered = sorted(latencies) or [0.0]
+    stats["p50_ms"] = statistics.median(ordered) * 1000
+    stats["p95_ms"] = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] * 1000
+    return stats
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="A/B draft+verifier vs. structured single-call answers")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per test case (latency samples)")
+    parser.add_argument("--hallucination-rate", type=float, default=0.3, help="Fake provider only: share of answers given a wrong number")
+    args = parser.parse_args()
+    
+    print(f"LLM provider: {settings.LLM_PROVIDER} | ingesting sample knowledge base into {_scratch} ...")
+    ingest_sample_kb()
+    
+    inner = get_routed_provider(settings.LLM_PROVIDER)
+    if hasattr(inner, "hallucination_rate"):
+        inner.hallucination_rate = args.hallucination_rate
+    counter = CountingProvider(inner)
+    get_answer_service()._provider = counter
+    get_verifier_service()._provider = counter
+    
+    rows = [run_mode(mode, args.repeat, counter) for mode in MODES]
+    
+    print(f"\n{'mode':>10} {'pass':>6} {'refused':>8} {'rejected':>9} {'slipped':>8} {'calls':>6} {'tokens':>7} {'p50 ms':>7} {'p95 ms':>7}")
+    for row in rows:
+        total = row["total"] or 1
+        print(
+            f"{row['mode']:>10} {row['passed'] / total:>6.0%} {row['refused'] / total:>8.0%} "
+            f"{row['rejected']:>9} {row['shipped_unsupported']:>8} {row['calls_per_answer']:>6.1f} "
+            f"{row['tokens_per_answer']:>7.0f} {row['p50_ms']:>7.0f} {row['p95_ms']:>7.0f}"
+        )
+    print("\nrejected = answers refused by verification; slipped = accepted answers with numbers absent from the context.")
+    print("calls/tokens/latency are per question that reached the LLM (gate refusals excluded).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""
+Load test for billing database engine configurations.
+Worker threads run the chat path's billing work in a loop: a quota check
+(reads) and a usage write (event insert + daily/monthly upserts in one
+transaction). Reports write throughput, write latency and the estimated
+lock wait (mean write latency minus the uncontended single-thread latency)
+for each configuration:
+
+- sqlite-legacy: the previous engine (rollback journal, synchronous=FULL, default pool)
+- sqlite-wal: create_db_engine defaults (WAL, synchronous=NORMAL, busy_timeout, mmap)
+- postgres: create_db_engine with --postgres-url (pooled; rows for bench tenants are removed afterwards)
+
+Usage:
+    python scripts/bench_billing_db.py [--threads 16] [--seconds 10] [--postgres-url postgresql://...]
+"""
+import argparse
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import create_engine  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.billing.quota import check_quota, ensure_tenant_exists  # noqa: E402
+from app.billing.usage_tracker import track_usage  # noqa: E402
+from app.db.database import Base, create_db_engine  # noqa: E402
+from app.db.models import Tenant, TenantPlan, UsageDaily, UsageEvent, UsageMonthly  # noqa: E402
+
+TENANTS = [f"bench_tenant_{i}" for i in range(8)]
+
+
+def run_load(engine, threads: int, seconds: float) -> dict:
+    """Run the billing workload on `threads` threads for `seconds`; return latency samples and counts."""
+    Session = sessionmaker(bind=engine)
+    deadline = time.monotonic() + seconds
+    write_latencies, read_latencies, errors = [], [], []
+    lock = threading.Lock()
+    
+    def worker(index: int):
+        tenant_id = TENANTS[index % len(TENANTS)]
+        writes, reads, failed = [], [], 0
+        while time.monotonic() < deadline:
+            db = Session()
+            try:
+                started = time.perf_counter()
+                check_quota(db, tenant_id)
+                db.commit()
+                reads.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                track_usage(db, tenant_id, "u1", "kb1", "gemini", "gemini-1.5-flash", 800, 120)
+                writes.append(time.perf_counter() - started)
+            except Exception:
+                db.rollback()
+                failed += 1
+            finally:
+                db.close()
+        with lock:
+            write_latencies.extend(writes)
+            read_latencies.extend(reads)
+            errors.append(failed)
+    
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    started = time.monotonic()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    return {
+        "elapsed": time.monotonic() - started,
+        "writes": write_latencies,
+        "reads": read_latencies,
+        "errors": sum(errors)
+    }
+
+
+def percentile(samples, q: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def bench(name: str, engine, threads: int, seconds: float) -> None:
+    Base.metadata.create_all(bind=engine)
+    db = sessionmaker(bind=engine)()
+    for tenant_id in TENANTS:
+        ensure_tenant_exists(db, tenant_id)
+    db.close()
+    
+    baseline = run_load(engine, 1, min(seconds, 3.0))
+    uncontended = statistics.mean(baseline["writes"]) if baseline["writes"] else 0.0
+    result = run_load(engine, threads, seconds)
+    writes = result["writes"]
+    mean_write = statistics.mean(writes) if writes else 0.0
+    print(
+        f"{name:>14} | {len(writes) / result['elapsed']:8.1f} writes/s | {len(result['reads']) / result['elapsed']:8.1f} reads/s | "
+        f"write p50 {percentile(writes, 0.5) * 1000:7.1f}ms p95 {percentile(writes, 0.95) * 1000:7.1f}ms | "
+        f"est. lock wait {max(0.0, mean_write - uncontended) * 1000:7.1f}ms/write | errors {result['errors']}"
+    )
+
+
+def cleanup(engine) -> None:
+    """Remove the bench tenants' rows (shared databases only)."""
+    db = sessionmaker(bind=engine)()
+    for model in (UsageEvent, UsageDaily, UsageMonthly, TenantPlan):
+        db.query(model).filter(model.tenant_id.in_(TENANTS)).delete(synchronize_session=False)
+    db.query(Tenant).filter(Tenant.id.in_(TENANTS)).delete(synchronize_session=False)
+    db.commit()
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test billing DB engine configurations")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--postgres-url", default=None, help="Also benchmark this Postgres database")
+    args = parser.parse_args()
+    
+    print(f"{args.threads} threads, {args.seconds:.0f}s per configuration (quota check + usage write per iteration)")
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy = create_engine(f"sqlite:///{Path(tmp) / 'legacy.db'}", connect_args={"check_same_thread": False})
+        bench("sqlite-legacy", legacy, args.threads, args.seconds)
+        legacy.dispose()
+        
+        wal = create_db_engine(f"sqlite:///{Path(tmp) / 'wal.db'}")
+        bench("sqlite-wal", wal, args.threads, args.seconds)
+        wal.dispose()
+    
+    if args.postgres_url:
+        postgres = create_db_engine(args.postgres_url)
+        try:
+            bench("postgres", postgres, args.threads, args.seconds)
+        finally:
+            cleanup(postgres)
+            postgres.dispose()
+
+
+if __name__ == "__main__":
+    main()
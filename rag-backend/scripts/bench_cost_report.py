@@ -0,0 +1,147 @@
+"""
+Benchmark for /billing/cost-report at scale.
+Fills a temporary SQLite billing DB with synthetic usage events (one large
+tenant plus many small ones over several months) and compares the previous
+report (load every event of the month through EXTRACT(), sum in Python)
+against the SQL-side GROUP BY report on the (tenant_id, request_timestamp) index.
+
+Usage:
+    python scripts/bench_cost_report.py [--events 1000000] [--tenants 50] [--repeat 3]
+"""
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sqlalchemy import and_, create_engine, func, text  # noqa: E402
+from sqlalchemy.orm import sessionmaker  # noqa: E402
+
+from app.billing.reports import get_cost_report  # noqa: E402
+from app.db.database import Base  # noqa: E402
+from app.db.models import UsageEvent  # noqa: E402
+
+MODELS = [("gemini", "gemini-1.5-flash", "fast"), ("gemini", "gemini-1.5-pro", "large"), ("openai", "gpt-4o-mini", None)]
+START = datetime(2025, 1, 1)
+MONTHS = 6
+BIG_TENANT_SHARE = 0.4
+
+
+def legacy_cost_report(db, tenant_id: str, year: int, month: int) -> dict:
+    """The previous implementation: every event of the month loaded and summed in Python."""
+    events = db.query(UsageEvent).filter(
+        and_(
+            UsageEvent.tenant_id == tenant_id,
+            func.extract('year', UsageEvent.request_timestamp) == year,
+            func.extract('month', UsageEvent.request_timestamp) == month
+        )
+    ).all()
+    breakdown_by_provider, breakdown_by_model, breakdown_by_tier = {}, {}, {}
+    for event in events:
+        for breakdown, key in ((breakdown_by_provider, event.provider), (breakdown_by_model, event.model),
+                               (breakdown_by_tier, event.model_tier or "default")):
+            stats = breakdown.setdefault(key, {"requests": 0, "tokens": 0, "cost_usd": 0.0})
+            stats["requests"] += 1
+            stats["tokens"] += event.total_tokens
+            stats["cost_usd"] += event.estimated_cost_usd
+    return {
+        "total_requests": len(events),
+        "total_tokens": sum(e.total_tokens for e in events),
+        "total_cost_usd": sum(e.estimated_cost_usd for e in events),
+        "breakdown_by_provider": breakdown_by_provider,
+        "breakdown_by_model": breakdown_by_model,
+        "breakdown_by_tier": breakdown_by_tier
+    }
+
+
+def populate(engine, events: int, tenants: int) -> None:
+    """Bulk-load synthetic events, then build the monthly aggregates from them."""
+    rng = random.Random(7)
+    span = (datetime(2025, 1 + MONTHS, 1) - START).total_seconds()
+    tenant_ids = [f"tenant_{i:03d}" for i in range(tenants)]
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO tenants (id, name, created_at, updated_at) VALUES (:id, :id, :now, :now)"),
+                     [{"id": t, "now": START} for t in tenant_ids])
+        batch = []
+        for i in range(events):
+            tenant_id = tenant_ids[0] if rng.random() < BIG_TENANT_SHARE else rng.choice(tenant_ids[1:])
+            provider, model, tier = rng.choice(MODELS)
+            tokens = rng.randint(200, 4000)
+            batch.append({
+                "request_id": f"req_{i}",
+                "tenant_id": tenant_id,
+                "user_id": "u1",
+                "kb_id": "kb1",
+                "provider": provider,
+                "model": model,
+                "prompt_tokens": tokens - 100,
+                "completion_tokens": 100,
+                "total_tokens": tokens,
+                "estimated_cost_usd": tokens * 2e-7,
+                "model_tier": tier,
+                "latency_ms": rng.randint(300, 3000),
+                "request_timestamp": START + timedelta(seconds=rng.random() * span)
+            })
+            if len(batch) == 50_000:
+                conn.execute(UsageEvent.__table__.insert(), batch)
+                batch = []
+        if batch:
+            conn.execute(UsageEvent.__table__.insert(), batch)
+        conn.execute(text(
+            "INSERT INTO usage_monthly (tenant_id, year, month, total_requests, total_tokens, total_cost_usd, "
+            "gemini_requests, openai_requests, created_at, updated_at) "
+            "SELECT tenant_id, CAST(strftime('%Y', request_timestamp) AS INTEGER), CAST(strftime('%m', request_timestamp) AS INTEGER), "
+            "count(*), sum(total_tokens), sum(estimated_cost_usd), sum(provider = 'gemini'), sum(provider = 'openai'), "
+            "datetime('now'), datetime('now') FROM usage_events GROUP BY 1, 2, 3"
+        ))
+        conn.execute(text("ANALYZE"))
+
+
+def timed(fn, repeat: int):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append(time.perf_counter() - started)
+    return result, statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the cost report query")
+    parser.add_argument("--events", type=int, default=1_000_000)
+    parser.add_argument("--tenants", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{Path(tmp) / 'billing.db'}")
+        Base.metadata.create_all(bind=engine)
+        started = time.perf_counter()
+        populate(engine, args.events, args.tenants)
+        print(f"Loaded {args.events:,} events for {args.tenants} tenants in {time.perf_counter() - started:.1f}s")
+        
+        db = sessionmaker(bind=engine)()
+        for tenant_id, label in (("tenant_000", "large tenant"), ("tenant_001", "small tenant")):
+            legacy, legacy_s = timed(lambda: legacy_cost_report(db, tenant_id, 2025, 3), args.repeat)
+            db.expunge_all()
+            report, report_s = timed(lambda: get_cost_report(db, tenant_id, "month", 2025, 3), args.repeat)
+            assert report["total_requests"] == legacy["total_requests"]
+            assert abs(report["total_cost_usd"] - legacy["total_cost_usd"]) < 1e-6
+            assert {k: v["requests"] for k, v in report["breakdown_by_model"].items()} == \
+                {k: v["requests"] for k, v in legacy["breakdown_by_model"].items()}
+            print(f"{label:>12}: {report['total_requests']:>7,} events in month | "
+                  f"legacy {legacy_s * 1000:8.1f}ms | grouped {report_s * 1000:7.1f}ms | {legacy_s / report_s:5.1f}x")
+        _, all_time_s = timed(lambda: get_cost_report(db, "tenant_000", "all"), args.repeat)
+        print(f"large tenant all-time grouped report: {all_time_s * 1000:.1f}ms")
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Micro-benchmark for lexical gating (intent detection + direct-match checks).
+Compares the previous per-keyword regex implementation against the
+precompiled matcher with token sets stored at ingest, at top_k=10 and 50.
+
+Usage:
+    python scripts/bench_gating.py [--iterations 200]
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+from typing import List, Set
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.rag.intent import (  # noqa: E402
+    INTENT_KEYWORDS, ChunkTokens, check_direct_match, detect_intents,
+    get_intent_keywords, has_important_word_match, lexical_tokens
+)
+
+STOP_WORDS = {"the", "a", "an", "is", "are", "was", "were", "be", "been",
+              "to", "of", "and", "or", "but", "in", "on", "at", "for",
+              "with", "how", "what", "when", "where", "why", "do", "does"}
+
+QUERIES = [
+    "How do I integrate the API with Shopify webhooks?",
+    "What is the refund policy for yearly subscription plans?",
+    "I forgot my password, how do I get a password reset link?",
+    "Can I connect WhatsApp and Slack through Zapier automation?",
+    "Where do I update my profile preferences?",
+    "How long does shipping take to Canada?",
+    "Is there an API rate limit for bulk exports?",  # Few matches: every chunk gets scanned
+]
+
+
+# ---- Previous implementation (kept here for comparison only) ----
+
+def legacy_detect_intents(query: str) -> List[str]:
+    query_lower = query.lower()
+    detected = []
+    for intent, keywords in INTENT_KEYWORDS.items():
+        if intent == "general":
+            continue
+        for keyword in keywords:
+            pattern = r'\b' + re.escape(keyword.lower()) + r'\b'
+            if re.search(pattern, query_lower):
+                detected.append(intent)
+                break
+    return detected or ["general"]
+
+
+def legacy_check_direct_match(query: str, chunks: List[str], intent_keywords: Set[str]) -> bool:
+    query_words = set(re.findall(r'\b\w+\b', query.lower()))
+    for chunk in chunks:
+        chunk_lower = chunk.lower()
+        if intent_keywords:
+            if not any(re.search(r'\b' + re.escape(kw.lower()) + r'\b', chunk_lower) for kw in intent_keywords):
+                continue
+        important_words = query_words - STOP_WORDS
+        if len(important_words) >= 2:
+            if sum(1 for word in important_words if word in chunk_lower) >= 2:
+                return True
+        elif len(important_words) == 1:
+            for word in important_words:
+                if re.search(r'\b' + re.escape(word) + r'\b', chunk_lower):
+                    return True
+    return False
+
+
+def legacy_gate(query: str, chunks: List[str]) -> bool:
+    intents = legacy_detect_intents(query)
+    keywords = get_intent_keywords(intents)
+    if "integration" in intents or "api" in query.lower():
+        return legacy_check_direct_match(query, chunks, keywords)
+    important_words = set(re.findall(r'\b\w+\b', query.lower())) - STOP_WORDS
+    for chunk in chunks:
+        chunk_lower = chunk.lower()
+        if important_words and sum(1 for word in important_words if word in chunk_lower) >= 1:
+            return True
+    return False
+
+
+# ---- Current implementation (as called from RetrievalService.retrieve) ----
+
+def current_gate(query: str, chunks: List[str], metadatas: List[dict]) -> bool:
+    chunk_tokens = [ChunkTokens.from_metadata(text, meta) for text, meta in zip(chunks, metadatas)]
+    intents = detect_intents(query)
+    keywords = get_intent_keywords(intents)
+    if "integration" in intents or "api" in query.lower():
+        return check_direct_match(query, chunks, keywords, chunk_tokens=chunk_tokens)
+    return has_important_word_match(query, chunk_tokens)
+
+
+def make_chunks(count: int, words_per_chunk: int = 450) -> List[str]:
+    """Synthetic chunks (~600 tokens) mixing intent keywords into filler text."""
+    rng = random.Random(42)
+    vocabulary = [kw for kws in INTENT_KEYWORDS.values() for kw in kws] + [
+        f"term{i}" for i in range(3000)
+    ]
+    return [
+        " ".join(rng.choice(vocabulary) for _ in range(words_per_chunk)).capitalize() + "."
+        for _ in range(count)
+    ]
+
+
+def bench(top_k: int, iterations: int) -> None:
+    chunks = make_chunks(top_k)
+    metadatas = [{"lexical_tokens": lexical_tokens(chunk)} for chunk in chunks]  # Done once at ingest
+    
+    for query in QUERIES:
+        assert legacy_detect_intents(query) == detect_intents(query), query
+    
+    timings = {}
+    for name, gate in (
+        ("legacy", lambda q: legacy_gate(q, chunks)),
+        ("precompiled", lambda q: current_gate(q, chunks, metadatas)),
+    ):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            for query in QUERIES:
+                gate(query)
+        timings[name] = (time.perf_counter() - started) / (iterations * len(QUERIES)) * 1000
+    
+    print(
+        f"top_k={top_k:>3}  legacy={timings['legacy']:.3f} ms/query  "
+        f"precompiled={timings['precompiled']:.3f} ms/query  "
+        f"speedup={timings['legacy'] / timings['precompiled']:.1f}x"
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark lexical gating cost")
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    
+    import logging
+    logging.disable(logging.CRITICAL)  # Gating logs every call; keep timings clean
+    
+    for top_k in (10, 50):
+        bench(top_k, args.iterations)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,48 @@
+"""
+Compact old usage events.
+Rolls usage events older than the retention window up into
+usage_rollup_hourly, archives them as gzip JSONL segments (one directory
+per month) and deletes them from usage_events. Safe to rerun and to run
+from cron; an interrupted run is picked up by the next one.
+
+Usage:
+    python scripts/compact_usage.py [--retention-days 90] [--archive-dir DIR] [--batch-size 5000] [--max-batches N]
+"""
+import argparse
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.config import settings  # noqa: E402
+from app.billing.retention import compact_usage_events, default_archive_dir  # noqa: E402
+from app.db.database import init_db, session_scope  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Roll up and archive old usage events")
+    parser.add_argument("--retention-days", type=int, default=settings.USAGE_RETENTION_DAYS)
+    parser.add_argument("--archive-dir", type=Path, default=None)
+    parser.add_argument("--batch-size", type=int, default=settings.USAGE_COMPACTION_BATCH_SIZE)
+    parser.add_argument("--max-batches", type=int, default=None)
+    args = parser.parse_args()
+    
+    init_db()
+    cutoff = datetime.utcnow() - timedelta(days=args.retention_days)
+    archive_dir = args.archive_dir or default_archive_dir()
+    print(f"Compacting usage events before {cutoff:%Y-%m-%d %H:%M} into {archive_dir}...")
+    started = time.monotonic()
+    with session_scope() as db:
+        stats = compact_usage_events(db, cutoff, archive_dir, args.batch_size, args.max_batches)
+    elapsed = time.monotonic() - started
+    print(
+        f"✅ {stats.events} events in {stats.batches} batches -> {stats.rollup_rows} hourly rollup upserts, "
+        f"{len(stats.segments)} archive segments ({elapsed:.1f}s)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -24,6 +24,7 @@ def main():
         print("  - usage_events")
         print("  - usage_daily")
         print("  - usage_monthly")
+        print("  - usage_rollup_hourly")
     except Exception as e:
         print(f"❌ Error creating tables: {e}")
         sys.exit(1)
@@ -0,0 +1,130 @@
+"""
+Load test /chat without network or API keys.
+
+Runs the app in-process with LLM_PROVIDER=fake (unless already set) against a
+scratch copy of the evaluate.py sample knowledge base, fires requests at a
+fixed concurrency and reports latency percentiles and status codes.
+Retrieval, gating, packing, verifier and billing all run for real; only the
+LLM is simulated (see app/rag/fake_provider.py for latency/error settings).
+
+Usage:
+    python scripts/load_test_chat.py [--requests 200] [--concurrency 20] [--distinct]
+    FAKE_LLM_ERROR_RATE=0.05 FAKE_LLM_LATENCY_MS=800 python scripts/load_test_chat.py
+    python scripts/load_test_chat.py --base-url http://localhost:8000   # running server
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from pathlib import Path
+
+# Add parent directory to path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+# Keep the load-test knowledge base and billing rows out of the real data directory
+_scratch = Path(tempfile.mkdtemp(prefix="load_test_chat_"))
+for _name in ("DATA_DIR", "UPLOADS_DIR", "PROCESSED_DIR", "VECTORDB_DIR"):
+    os.environ.setdefault(_name, str(_scratch / _name.lower()))
+os.environ.setdefault("LLM_PROVIDER", "fake")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx  # noqa: E402
+
+import evaluate  # noqa: E402
+
+
+def percentile(values: list, p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+async def ingest_sample_kb() -> None:
+    from app.main import process_document, startup_event
+    await startup_event()
+    path = _scratch / "sample_faq.md"
+    path.write_text(evaluate.create_sample_kb())
+    process_document(
+        path,
+        tenant_id=evaluate.TEST_TENANT_ID,
+        user_id=evaluate.TEST_USER_ID,
+        kb_id=evaluate.TEST_KB_ID,
+        original_filename="sample_faq.md",
+        document_id=f"doc_{uuid.uuid4().hex[:12]}"
+    )
+
+
+async def run_load(client: httpx.AsyncClient, total: int, concurrency: int, distinct: bool) -> tuple:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    statuses = Counter()
+    outcomes = Counter()
+    
+    async def one(i: int) -> None:
+        case = evaluate.TEST_CASES[i % len(evaluate.TEST_CASES)]
+        question = f"{case['question']} (#{i})" if distinct else case["question"]
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await client.post(
+                    "/chat",
+                    json={
+                        "tenant_id": evaluate.TEST_TENANT_ID,
+                        "user_id": evaluate.TEST_USER_ID,
+                        "kb_id": evaluate.TEST_KB_ID,
+                        "question": question
+                    },
+                    headers={"X-Tenant-Id": evaluate.TEST_TENANT_ID, "X-User-Id": evaluate.TEST_USER_ID}
+                )
+                statuses[response.status_code] += 1
+                if response.status_code == 200:
+                    data = response.json()
+                    metadata = data.get("metadata") or {}
+                    outcomes["refused" if metadata.get("refused") else "answered"] += 1
+                    if metadata.get("coalesced"):
+                        outcomes["coalesced"] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+    
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(total)))
+    return latencies, statuses, outcomes, time.perf_counter() - started
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--distinct", action="store_true", help="Make every question unique (defeats request coalescing)")
+    parser.add_argument("--base-url", default=None, help="Target a running server instead of the in-process app")
+    args = parser.parse_args()
+    
+    if args.base_url:
+        client = httpx.AsyncClient(base_url=args.base_url, timeout=120)
+    else:
+        from app.config import settings
+        from app.main import app
+        print(f"LLM provider: {settings.LLM_PROVIDER} | data: {_scratch}")
+        await ingest_sample_kb()
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://load-test", timeout=120)
+    
+    async with client:
+        latencies, statuses, outcomes, elapsed = await run_load(client, args.requests, args.concurrency, args.distinct)
+    if not args.base_url:
+        from app.main import shutdown_event
+        await shutdown_event()  # Flush write-behind usage events
+    
+    print(f"\n{args.requests} requests, concurrency {args.concurrency}, {elapsed:.1f}s ({args.requests / elapsed:.1f} req/s)")
+    print(f"Latency  p50 {percentile(latencies, 50) * 1000:.0f}ms  p95 {percentile(latencies, 95) * 1000:.0f}ms  "
+          f"p99 {percentile(latencies, 99) * 1000:.0f}ms  mean {statistics.mean(latencies) * 1000:.0f}ms")
+    print(f"Status   {dict(statuses)}")
+    print(f"Outcomes {dict(outcomes)}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,109 @@
+"""
+Shared test fixtures and helpers: a temporary SQLite billing database, a
+fake LLM provider and retrieval results for the context packer.
+"""
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.billing.usage_tracker import track_usage
+from app.db import database
+from app.db.database import Base, create_db_engine, init_db
+from app.models.schemas import RetrievalResult
+from app.rag.answer import LLMProvider
+
+
+def make_billing_engine(path):
+    # Generous busy timeout: multi-process tests serialize on SQLite's write lock
+    return create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False, "timeout": 60})
+
+
+@pytest.fixture
+def billing_db_path(tmp_path) -> Path:
+    return tmp_path / "billing.db"
+
+
+@pytest.fixture
+def billing_engine(billing_db_path):
+    """Engine for a fresh billing DB with all tables."""
+    engine = make_billing_engine(billing_db_path)
+    Base.metadata.create_all(bind=engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def session_factory(billing_engine):
+    return sessionmaker(bind=billing_engine)
+
+
+@pytest.fixture
+def db(session_factory):
+    session = session_factory()
+    yield session
+    session.close()
+
+
+@pytest.fixture
+def app_billing_db(session_factory, monkeypatch):
+    """Point the app's billing sessions (get_db, session_scope) at the temporary billing DB."""
+    monkeypatch.setattr(database, "SessionLocal", session_factory)
+    return session_factory
+
+
+@pytest.fixture
+def app_billing_engine(tmp_path, monkeypatch):
+    """
+    Replace the app's engine itself with an instrumented one on a temporary DB
+    (for tests that check the application pool, not just sessions).
+    """
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'app_billing.db'}", instrument=True)
+    monkeypatch.setattr(database, "engine", engine)
+    monkeypatch.setattr(database, "SessionLocal", sessionmaker(autocommit=False, autoflush=False, bind=engine))
+    init_db()
+    yield engine
+    engine.dispose()
+
+
+def track(db, when: datetime, provider="gemini", model="gemini-1.5-flash", tier=None, latency=None, tenant_id="t1"):
+    """Record one chat (100 prompt + 20 completion tokens) at a given time."""
+    track_usage(db, tenant_id, "u1", "kb1", provider, model, 100, 20, request_timestamp=when, model_tier=tier, latency_ms=latency)
+
+
+class FakeProvider(LLMProvider):
+    """Returns a fixed draft and a fixed verifier verdict."""
+    
+    def __init__(self, verdict_pass: bool):
+        self.verdict_pass = verdict_pass
+    
+    def generate(self, system_prompt: str, user_prompt: str, **kwargs) -> str:
+        passed = "true" if self.verdict_pass else "false"
+        return f'{{"pass": {passed}, "issues": [], "unsupported_claims": []}}'
+    
+    def generate_with_usage(self, system_prompt: str, user_prompt: str) -> tuple[str, dict]:
+        return "Refunds take 5 days [Source 1].", {
+            "prompt_tokens": 10, "completion_tokens": 8, "total_tokens": 18, "model_used": "fake"
+        }
+
+
+CONTEXT = "[Source 1: policy.md]\nRefunds take 5 days."
+CITATIONS = [{"index": 1, "file_name": "policy.md", "chunk_id": "c1", "similarity_score": 0.8, "excerpt": "Refunds"}]
+
+
+def count_words(text: str) -> int:
+    """Deterministic stand-in tokenizer: one token per whitespace-separated word."""
+    return len(text.split())
+
+
+def make_result(chunk_id, content, score, embedding=None, **metadata):
+    metadata.setdefault("file_name", "policy.pdf")
+    return RetrievalResult(
+        chunk_id=chunk_id,
+        content=content,
+        metadata=metadata,
+        similarity_score=score,
+        embedding=embedding
+    )
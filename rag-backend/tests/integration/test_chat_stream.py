@@ -0,0 +1,27 @@
+"""
+Integration test: /chat/stream gives back its quota admission when it fails
+before the stream starts.
+"""
+from fastapi.testclient import TestClient
+
+import app.main as main
+
+client = TestClient(main.app, raise_server_exceptions=False)
+
+
+class FailingRetrieval:
+    def retrieve(self, **kwargs):
+        raise RuntimeError("vector store unavailable")
+
+
+def test_quota_released_when_retrieval_fails(app_billing_db, monkeypatch):
+    released = []
+    monkeypatch.setattr(main, "check_chat_quota", lambda db, tenant_id: True)
+    monkeypatch.setattr(main, "release_chat_quota", released.append)
+    monkeypatch.setattr(main, "get_retrieval_service", FailingRetrieval)
+    
+    response = client.post("/chat/stream", json={
+        "tenant_id": "stream_tenant", "user_id": "u1", "kb_id": "kb1", "question": "How long do refunds take?"
+    })
+    assert response.status_code == 500
+    assert released == ["stream_tenant"]
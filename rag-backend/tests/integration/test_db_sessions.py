@@ -0,0 +1,52 @@
+"""
+Integration test: billing endpoints return every pooled connection.
+(scripts/soak_billing_db.py runs the same check for 100k requests.)
+"""
+import gc
+
+from fastapi.testclient import TestClient
+from sqlalchemy.orm import Session
+
+from app.db.database import session_scope
+from app.db.pool import InstrumentedQueuePool
+from app.main import app
+
+client = TestClient(app)
+REQUESTS = 400
+
+
+def test_billing_endpoints_do_not_leak_sessions(app_billing_engine):
+    engine = app_billing_engine
+    assert isinstance(engine.pool, InstrumentedQueuePool)
+    calls = [
+        lambda h: client.get("/billing/usage", headers=h),
+        lambda h: client.get("/billing/limits", headers=h),
+        lambda h: client.get("/billing/cost-report", headers=h),
+        lambda h: client.post("/billing/plan", json={"tenant_id": h["X-Tenant-Id"], "plan_name": "growth"}, headers=h),
+        lambda h: client.post("/billing/plan", json={"tenant_id": h["X-Tenant-Id"], "plan_name": "bogus"}, headers=h),
+    ]
+    gc.collect()
+    sessions_before = sum(1 for o in gc.get_objects() if isinstance(o, Session))
+    gc.disable()  # Leaked sessions would otherwise be cleaned up by the GC
+    try:
+        statuses = set()
+        for i in range(REQUESTS):
+            statuses.add(calls[i % len(calls)]({"X-Tenant-Id": f"leak_tenant_{i % 7}"}).status_code)
+        assert engine.pool.checkedout() == 0
+    finally:
+        gc.enable()
+    assert statuses == {200, 400}
+    gc.collect()
+    assert sum(1 for o in gc.get_objects() if isinstance(o, Session)) <= sessions_before
+
+
+def test_session_scope_rolls_back_and_returns_connection(app_billing_engine):
+    engine = app_billing_engine
+    try:
+        with session_scope() as db:
+            db.connection()
+            assert engine.pool.checkedout() == 1
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert engine.pool.checkedout() == 0
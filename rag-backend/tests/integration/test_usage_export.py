@@ -0,0 +1,36 @@
+"""
+Integration test: GET /billing/export streams the tenant's events.
+"""
+from datetime import datetime
+import gzip
+import json
+
+from fastapi.testclient import TestClient
+
+from app.billing.usage_tracker import track_usage
+from app.db.database import session_scope
+from app.main import app
+
+client = TestClient(app)
+HEADERS = {"X-Tenant-Id": "export_tenant"}
+
+
+def test_export_endpoint_formats_gzip_and_validation(app_billing_db):
+    with session_scope() as db:
+        for day in (1, 2, 3):
+            track_usage(db, "export_tenant", "u1", "kb1", "gemini", "gemini-1.5-flash", 10, day, request_timestamp=datetime(2024, 6, day, 8))
+    
+    response = client.get("/billing/export?start=2024-06-01&end=2024-06-02", headers=HEADERS)
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    lines = response.text.splitlines()
+    assert lines[0].startswith("id,request_id,request_timestamp") and len(lines) == 3
+    
+    url = "/billing/export?start=2024-06-01&end=2024-06-30&format=ndjson"
+    with client.stream("GET", url, headers={**HEADERS, "Accept-Encoding": "gzip"}) as response:
+        assert response.headers["content-encoding"] == "gzip"
+        body = gzip.decompress(b"".join(response.iter_raw()))
+    assert [json.loads(line)["completion_tokens"] for line in body.splitlines()] == [1, 2, 3]
+    
+    assert client.get("/billing/export?format=xml", headers=HEADERS).status_code == 400
+    assert client.get("/billing/export?start=2024-06-02&end=2024-06-01", headers=HEADERS).status_code == 400
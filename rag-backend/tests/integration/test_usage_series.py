@@ -0,0 +1,43 @@
+"""
+Integration test: GET /billing/usage/series with ETag revalidation.
+"""
+from datetime import datetime
+
+from fastapi.testclient import TestClient
+
+from app.billing.usage_tracker import track_usage
+from app.db.database import session_scope
+from app.main import app
+
+client = TestClient(app)
+HEADERS = {"X-Tenant-Id": "series_tenant"}
+URL = "/billing/usage/series?start=2024-05-01&end=2024-05-31"
+
+
+def test_usage_series_endpoint_and_conditional_requests(app_billing_db):
+    with session_scope() as db:
+        track_usage(db, "series_tenant", "u1", "kb1", "gemini", "gemini-1.5-flash", 10, 5, request_timestamp=datetime(2024, 5, 3, 8))
+    
+    response = client.get(URL, headers=HEADERS)
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["points"]) == 31 and body["total_requests"] == 1
+    assert body["points"][2] == {
+        "date": "2024-05-03", "total_requests": 1, "total_tokens": 15,
+        "total_cost_usd": body["total_cost_usd"], "gemini_requests": 1, "openai_requests": 0
+    }
+    assert response.headers["cache-control"].startswith("private, max-age=")
+    etag = response.headers["etag"]
+    
+    not_modified = client.get(URL, headers={**HEADERS, "If-None-Match": etag})
+    assert (not_modified.status_code, not_modified.content, not_modified.headers["etag"]) == (304, b"", etag)
+    
+    with session_scope() as db:
+        track_usage(db, "series_tenant", "u1", "kb1", "openai", "gpt-4o-mini", 10, 5, request_timestamp=datetime(2024, 5, 3, 9))
+    changed = client.get(URL, headers={**HEADERS, "If-None-Match": etag})
+    assert changed.status_code == 200 and changed.headers["etag"] != etag
+    assert changed.json()["openai_requests"] == 1
+    
+    assert client.get("/billing/usage/series?start=2024-05-02&end=2024-05-01", headers=HEADERS).status_code == 400
+    assert client.get("/billing/usage/series?start=2020-01-01&end=2024-05-01", headers=HEADERS).status_code == 400
+    assert len(client.get("/billing/usage/series", headers=HEADERS).json()["points"]) == 30
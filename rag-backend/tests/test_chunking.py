@@ -0,0 +1,185 @@
+"""
+Tests for hierarchical (small-to-big) chunking and parent expansion.
+"""
+import pytest
+from docx import Document
+
+import app.rag.docstore as docstore_module
+from app.config import settings
+from app.models.schemas import RetrievalResult
+from app.rag.chunking import DocumentChunker
+from app.rag.docstore import DocStore
+from app.rag.ingest import DocumentParser
+from app.rag.retrieval import RetrievalService
+
+HANDBOOK = "\n\n".join([
+    "# Billing",
+    "Invoices are sent monthly.",
+    "## Refunds",
+    "Refunds are issued within five business days. Store credit is instant.",
+    "### Exceptions",
+    "Gift cards are never refunded.",
+    "## Invoices",
+    "Invoices can be downloaded as PDF.",
+    "# Support",
+    "Support is available around the clock."
+])
+
+
+def child_body(child):
+    """Child text without the heading path prefix added for embedding."""
+    return child.content.split("\n", 1)[1] if child.heading_path else child.content
+
+
+def sentence_size(chunker):
+    """Child size that fits one Refunds sentence, so that section packs into two children."""
+    return chunker.count_tokens("Refunds are issued within five business days.")
+
+
+@pytest.fixture
+def chunker():
+    return DocumentChunker()
+
+
+def test_heading_path_tracks_nesting_and_level_pops(chunker):
+    """Deeper headings extend the path; same or higher levels pop back to their parent."""
+    parents, _ = chunker.chunk_hierarchical(HANDBOOK)
+    assert [p.heading_path for p in parents] == [
+        "Billing",
+        "Billing > Refunds",
+        "Billing > Refunds > Exceptions",
+        "Billing > Invoices",
+        "Support",
+    ]
+    # Heading lines are carried in the path, not in the section body
+    assert not any("#" in p.content for p in parents)
+
+
+def test_oversized_section_is_split_into_parents(chunker):
+    """A section longer than parent_size becomes several parents with the same heading path."""
+    paragraphs = [f"Clause {i} covers returns of opened items in region {i}." for i in range(30)]
+    text = "# Returns\n\n" + "\n\n".join(paragraphs)
+    parent_size = chunker.count_tokens("\n\n".join(paragraphs[:5]))
+    
+    parents, children = chunker.chunk_hierarchical(text, parent_size=parent_size, child_size=parent_size // 2)
+    
+    assert len(parents) > 1
+    assert {p.heading_path for p in parents} == {"Returns"}
+    assert [p.chunk_index for p in parents] == list(range(len(parents)))
+    assert all(p.token_count <= parent_size for p in parents)
+    # Every clause is covered by some parent
+    assert all(any(paragraph in p.content for p in parents) for paragraph in paragraphs)
+    assert {c.parent_index for c in children} == {p.chunk_index for p in parents}
+
+
+def test_children_map_to_parents_with_their_own_offsets(chunker):
+    """Each child points at the parent containing it and records its own span of the text."""
+    parents, children = chunker.chunk_hierarchical(HANDBOOK, child_size=sentence_size(chunker))
+    refunds = parents[1]
+    refund_children = [c for c in children if c.parent_index == refunds.chunk_index]
+    assert len(refund_children) == 2
+    
+    for child in children:
+        parent = parents[child.parent_index]
+        body = child_body(child)
+        assert child.heading_path == parent.heading_path
+        assert child.content.startswith(parent.heading_path + "\n")
+        assert body in parent.content
+        assert HANDBOOK[child.start_char:child.end_char] == body
+        assert parent.start_char <= child.start_char < child.end_char <= parent.end_char
+    
+    first, second = refund_children
+    assert first.end_char < second.start_char
+    assert HANDBOOK[refunds.start_char:refunds.end_char] == refunds.content
+
+
+def test_docx_heading_styles_become_heading_paths(tmp_path, chunker):
+    """DOCX Title/Heading N styles are turned into heading lines the chunker nests."""
+    doc = Document()
+    doc.add_heading("Employee Handbook", level=0)
+    doc.add_paragraph("Welcome to the company.")
+    doc.add_heading("Leave", level=1)
+    doc.add_paragraph("Everyone gets 25 days of leave.")
+    doc.add_heading("Sick Leave", level=2)
+    doc.add_paragraph("Sick leave needs a note after three days.")
+    doc.add_heading("Expenses", level=1)
+    doc.add_paragraph("Expenses are reimbursed monthly.")
+    path = tmp_path / "handbook.docx"
+    doc.save(path)
+    
+    parsed = DocumentParser().parse(path)
+    parents, _ = chunker.chunk_hierarchical(parsed.text)
+    
+    assert [p.heading_path for p in parents] == [
+        "Employee Handbook",
+        "Leave",
+        "Leave > Sick Leave",
+        "Expenses",
+    ]
+    assert parents[2].content == "Sick leave needs a note after three days."
+
+
+def test_flat_chunking_keeps_plain_headings(tmp_path, monkeypatch):
+    """Without hierarchical chunking, parsed headings are plain "Heading:" text, not "#" markers."""
+    monkeypatch.setattr(settings, "HIERARCHICAL_CHUNKING", False)
+    markdown_path = tmp_path / "faq.md"
+    markdown_path.write_text("# Billing\n\nInvoices are sent monthly.\n\n## Refunds\n\nRefunds take five days.\n")
+    doc = Document()
+    doc.add_heading("Leave", level=1)
+    doc.add_paragraph("Everyone gets 25 days of leave.")
+    docx_path = tmp_path / "handbook.docx"
+    doc.save(docx_path)
+    
+    markdown_text = DocumentParser().parse(markdown_path).text
+    docx_text = DocumentParser().parse(docx_path).text
+    
+    assert "Billing:" in markdown_text and "Refunds:" in markdown_text
+    assert "#" not in markdown_text
+    assert docx_text == "Leave\n\nEveryone gets 25 days of leave."
+
+
+def test_retrieved_children_expand_to_parent_sections(tmp_path, monkeypatch, chunker):
+    """A matched child is replaced by its whole parent section in the LLM context."""
+    doc_store = DocStore(tmp_path / "docstore.db")
+    monkeypatch.setattr(docstore_module, "_doc_store", doc_store)
+    monkeypatch.setattr(settings, "CONTEXT_COMPRESSION_RATIO", 1.0)
+    
+    parents, children = chunker.chunk_hierarchical(HANDBOOK, child_size=sentence_size(chunker))
+    parent_ids = {p.chunk_index: chunker.create_parent_id("doc1", p) for p in parents}
+    doc_store.add_parents([
+        {
+            "parent_id": parent_ids[p.chunk_index],
+            "tenant_id": "t1",
+            "kb_id": "kb1",
+            "user_id": "u1",
+            "file_name": "handbook.md",
+            "document_id": "doc1",
+            "heading_path": p.heading_path,
+            "content": p.content,
+            "token_count": p.token_count,
+            "page_number": p.page_number
+        }
+        for p in parents
+    ])
+    
+    refunds = parents[1]
+    child = next(c for c in children if c.parent_index == refunds.chunk_index)
+    metadata = chunker.create_chunk_metadata(
+        chunk=child,
+        tenant_id="t1",
+        kb_id="kb1",
+        user_id="u1",
+        file_name="handbook.md",
+        file_type="md",
+        total_chunks=len(children),
+        document_id="doc1",
+        parent_id=parent_ids[child.parent_index]
+    )
+    result = RetrievalResult(chunk_id=metadata["chunk_id"], content=child.content, metadata=metadata, similarity_score=0.9)
+    
+    context, citations = RetrievalService().get_context_for_llm([result])
+    
+    assert child_body(child) != refunds.content
+    assert refunds.content in context
+    assert "(Section: Billing > Refunds)" in context
+    assert [c["chunk_id"] for c in citations] == [metadata["chunk_id"]]
@@ -0,0 +1,61 @@
+"""
+Tests for single-flight coalescing of chat requests.
+"""
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.rag.coalescing import SingleFlight, billable_usage, coalesce_key
+
+
+def test_concurrent_duplicates_share_one_computation():
+    calls = []
+    
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"answer": "shared"}
+    
+    async def burst():
+        group = SingleFlight()
+        outcomes = await asyncio.gather(*(group.do("k", compute) for _ in range(5)))
+        return group, outcomes
+    
+    group, outcomes = asyncio.run(burst())
+    assert len(calls) == 1
+    assert [shared for _, shared in outcomes].count(False) == 1
+    assert all(result == {"answer": "shared"} for result, _ in outcomes)
+    assert group.in_flight == 0  # Released once done, nothing is cached
+
+
+def test_failure_reaches_every_waiter():
+    async def compute():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("llm down")
+    
+    async def burst():
+        group = SingleFlight()
+        return await asyncio.gather(*(group.do("k", compute) for _ in range(3)), return_exceptions=True)
+    
+    assert all(isinstance(r, RuntimeError) for r in asyncio.run(burst()))
+
+
+def test_key_normalizes_question_and_tracks_kb_version():
+    base = coalesce_key("t1", "kb1", "u1", "How do refunds work?", 3)
+    assert coalesce_key("t1", "kb1", "u1", "  how do REFUNDS   work ", 3) == base
+    assert coalesce_key("t1", "kb1", "u1", "How do refunds work?", 4) != base
+    assert coalesce_key("t2", "kb1", "u1", "How do refunds work?", 3) != base
+
+
+@pytest.mark.parametrize("policy,expected", [
+    ("full", 30),
+    ("request_only", 0),
+    ("leader_only", None),
+])
+def test_billing_policy_for_followers(monkeypatch, policy, expected):
+    monkeypatch.setattr(settings, "COALESCED_BILLING_POLICY", policy)
+    usage = {"prompt_tokens": 20, "completion_tokens": 10, "total_tokens": 30, "model_used": "m"}
+    assert billable_usage(usage, shared=False) == usage  # The leader is always billed
+    billed = billable_usage(usage, shared=True)
+    assert (billed["total_tokens"] if billed else None) == expected
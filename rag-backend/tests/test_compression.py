@@ -0,0 +1,73 @@
+"""
+Tests for extractive context compression.
+"""
+import re
+
+from app.rag.compression import ELISION, ContextCompressor
+from app.rag.packing import ContextPacker
+from tests.conftest import count_words, make_result
+
+VOCAB = ["refund", "days", "office", "parking", "holiday", "shipping", "password"]
+
+
+class BagOfWordsEmbeddings:
+    """Deterministic stand-in embedding model: counts of a small vocabulary."""
+    
+    def _vector(self, text):
+        words = re.findall(r"\w+", text.lower())
+        return [sum(w.startswith(v) for w in words) for v in VOCAB]
+    
+    def embed_query(self, query):
+        return self._vector(query)
+    
+    def embed_texts(self, texts):
+        return [self._vector(t) for t in texts]
+
+
+PASSAGE = (
+    "## Refunds\n"
+    "Our office is open on weekdays. "
+    "Refunds are issued within 5 days of the return. "
+    "Parking is available behind the building. "
+    "Holiday hours are posted online."
+)
+
+
+def test_keeps_relevant_sentences_and_heading():
+    compressor = ContextCompressor(ratio=0.4, min_sentences=3, count_tokens=count_words)
+    [compressed] = compressor.compress("How many days for a refund?", [PASSAGE], BagOfWordsEmbeddings())
+    assert "Refunds are issued within 5 days of the return." in compressed
+    assert compressed.startswith("## Refunds")
+    assert "Parking" not in compressed
+    assert count_words(compressed) < count_words(PASSAGE)
+
+
+def test_short_passages_and_ratio_one_are_untouched():
+    short = "Refunds take 5 days. Contact support."
+    compressor = ContextCompressor(ratio=0.3, min_sentences=3, count_tokens=count_words)
+    assert compressor.compress("refund", [short], BagOfWordsEmbeddings()) == [short]
+    assert ContextCompressor(ratio=1.0, count_tokens=count_words).compress("refund", [PASSAGE], None) == [PASSAGE]
+
+
+def test_gaps_are_marked_and_order_is_preserved():
+    compressor = ContextCompressor(ratio=0.5, min_sentences=3, count_tokens=count_words)
+    text = "Shipping is free. Parking is free. Refund in 5 days. Password resets are instant."
+    [compressed] = compressor.compress("shipping and refund days", [text], BagOfWordsEmbeddings())
+    assert compressed == f"Shipping is free.{ELISION}Refund in 5 days."
+
+
+def test_source_headers_survive_packing_with_compression():
+    packer = ContextPacker(count_tokens=count_words)
+    compressor = ContextCompressor(ratio=0.4, min_sentences=3, count_tokens=count_words)
+    results = [
+        make_result("c1", PASSAGE, 0.9, file_name="policy.md"),
+        make_result("c2", "Shipping takes 3 days.", 0.8, file_name="shipping.md"),
+    ]
+    context, citations = packer.pack(
+        results,
+        max_tokens=500,
+        compress=lambda texts: compressor.compress("refund days", texts, BagOfWordsEmbeddings())
+    )
+    assert "[Source 1: policy.md]" in context and "[Source 2: shipping.md]" in context
+    assert "Parking" not in context
+    assert [c["chunk_id"] for c in citations] == ["c1", "c2"]
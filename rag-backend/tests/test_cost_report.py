@@ -0,0 +1,85 @@
+"""
+Tests for the SQL-side cost report: grouped breakdowns, month boundaries,
+aggregate totals and the (tenant_id, request_timestamp) index.
+"""
+from datetime import date, datetime
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app.billing.reports import get_cost_report, get_usage_series, month_bounds, usage_series_etag
+from app.db.database import Base
+from app.db.migrations import add_missing_indexes
+from app.db.models import UsageEvent
+from tests.conftest import track
+
+
+def test_month_bounds_are_half_open():
+    assert month_bounds(2025, 3) == (datetime(2025, 3, 1), datetime(2025, 4, 1))
+    assert month_bounds(2025, 12) == (datetime(2025, 12, 1), datetime(2026, 1, 1))
+
+
+def test_report_groups_in_sql_and_respects_month_boundaries(db):
+    track(db, datetime(2025, 3, 1, 0, 0), tier="fast", latency=100)
+    track(db, datetime(2025, 3, 31, 23, 59, 59, 999999), tier="fast", latency=300)
+    track(db, datetime(2025, 3, 15), "openai", "gpt-4o-mini", tier="large")
+    track(db, datetime(2025, 4, 1, 0, 0))  # Next month
+    track(db, datetime(2025, 2, 28, 23, 59))  # Previous month
+    track(db, datetime(2025, 3, 15), tenant_id="t2")  # Other tenant
+    
+    report = get_cost_report(db, "t1", "month", 2025, 3)
+    march = [e for e in db.query(UsageEvent).filter_by(tenant_id="t1") if e.request_timestamp.month == 3]
+    assert report["total_requests"] == 3
+    assert report["total_tokens"] == 360
+    assert report["total_cost_usd"] == pytest.approx(sum(e.estimated_cost_usd for e in march))
+    assert {k: v["requests"] for k, v in report["breakdown_by_provider"].items()} == {"gemini": 2, "openai": 1}
+    assert report["breakdown_by_model"]["gpt-4o-mini"]["tokens"] == 120
+    assert report["breakdown_by_tier"]["fast"]["avg_latency_ms"] == 200
+    assert report["breakdown_by_tier"]["large"]["avg_latency_ms"] is None
+    
+    all_time = get_cost_report(db, "t1", "all")
+    assert all_time["total_requests"] == 5
+    assert sum(v["requests"] for v in all_time["breakdown_by_model"].values()) == 5
+
+
+def test_month_query_uses_tenant_timestamp_index(db):
+    start, end = month_bounds(2025, 3)
+    plan = db.execute(text(
+        "EXPLAIN QUERY PLAN SELECT provider, count(id) FROM usage_events "
+        "WHERE tenant_id = :t AND request_timestamp >= :s AND request_timestamp < :e GROUP BY provider"
+    ), {"t": "t1", "s": start, "e": end}).all()
+    assert any("ix_usage_events_tenant_timestamp" in row[-1] for row in plan)
+
+
+def test_missing_index_is_added_to_existing_table(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_usage_events_tenant_timestamp"))
+    
+    assert add_missing_indexes(engine) == ["ix_usage_events_tenant_timestamp"]
+    assert add_missing_indexes(engine) == []
+    names = {i["name"] for i in inspect(engine).get_indexes("usage_events")}
+    assert "ix_usage_events_tenant_timestamp" in names
+    engine.dispose()
+
+
+def test_usage_series_zero_fills_and_etag_tracks_updates(db):
+    track(db, datetime(2025, 3, 2, 10))
+    track(db, datetime(2025, 3, 2, 11), "openai", "gpt-4o-mini")
+    track(db, datetime(2025, 3, 4, 9))
+    track(db, datetime(2025, 3, 5, 0))  # Outside the range
+    
+    series = get_usage_series(db, "t1", date(2025, 3, 1), date(2025, 3, 4))
+    assert [p["date"] for p in series["points"]] == [date(2025, 3, d) for d in range(1, 5)]
+    assert [p["total_requests"] for p in series["points"]] == [0, 2, 0, 1]
+    assert (series["points"][1]["gemini_requests"], series["points"][1]["openai_requests"]) == (1, 1)
+    assert (series["total_requests"], series["total_tokens"]) == (3, 360)
+    
+    etag = usage_series_etag("t1", date(2025, 3, 1), date(2025, 3, 4), series["last_updated"])
+    assert etag != usage_series_etag("t2", date(2025, 3, 1), date(2025, 3, 4), series["last_updated"])
+    track(db, datetime(2025, 3, 1, 12))
+    updated = get_usage_series(db, "t1", date(2025, 3, 1), date(2025, 3, 4))
+    assert updated["points"][0]["total_requests"] == 1
+    assert usage_series_etag("t1", date(2025, 3, 1), date(2025, 3, 4), updated["last_updated"]) != etag
+    assert get_usage_series(db, "nobody", date(2025, 3, 1), date(2025, 3, 1))["last_updated"] is None
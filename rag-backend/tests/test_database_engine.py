@@ -0,0 +1,24 @@
+"""
+Tests for billing database engine creation (SQLite PRAGMAs, pool options).
+"""
+from sqlalchemy import text
+
+from app.db.database import create_db_engine, sqlite_pragmas
+
+
+def test_sqlite_connections_get_pragmas(tmp_path):
+    engine = create_db_engine(f"sqlite:///{tmp_path / 'nested' / 'billing.db'}")
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 5000
+    assert engine.pool.size() == 10
+    engine.dispose()
+
+
+def test_pragmas_can_be_overridden_and_memory_databases_work():
+    engine = create_db_engine("sqlite://", pragmas=sqlite_pragmas(journal_mode=None, busy_timeout_ms=250, mmap_size=0))
+    with engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "memory"
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == 250
+    engine.dispose()
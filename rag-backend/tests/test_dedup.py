@@ -0,0 +1,94 @@
+"""
+Tests for MinHash/LSH near-duplicate detection.
+"""
+import pytest
+
+import app.rag.docstore as docstore_module
+from app.rag.docstore import DocStore
+from app.rag.dedup import DedupService, MinHasher, collapse_duplicates
+from app.models.schemas import RetrievalResult
+
+
+POLICY = (
+    "Refunds are available within 30 days of purchase. Customers must provide the original "
+    "receipt and the product must be unused and in its original packaging. Refunds are issued "
+    "to the original payment method within five business days after the return is inspected."
+)
+POLICY_V2 = POLICY.replace("five business days", "five working days")
+SHIPPING = (
+    "Standard shipping takes three to seven business days. Express shipping is available for "
+    "an additional fee and arrives within two business days in most regions."
+)
+
+
+@pytest.fixture
+def doc_store(tmp_path, monkeypatch):
+    """Isolated doc store per test."""
+    store = DocStore(tmp_path / "docstore.db")
+    monkeypatch.setattr(docstore_module, "_doc_store", store)
+    return store
+
+
+def test_signature_similarity_tracks_overlap():
+    """Near-identical texts score high, unrelated texts score low."""
+    hasher = MinHasher()
+    assert hasher.similarity(hasher.signature(POLICY), hasher.signature(POLICY_V2)) > 0.8
+    assert hasher.similarity(hasher.signature(POLICY), hasher.signature(SHIPPING)) < 0.2
+
+
+def test_duplicates_detected_across_documents(doc_store):
+    """A second version of a document is flagged against the first."""
+    service = DedupService()
+    first = service.deduplicate([POLICY, SHIPPING], ["v1_0", "v1_1"], "t1", "kb1", "u1", "v1.pdf")
+    assert first.duplicate_of == [None, None]
+    service.record(first)
+    
+    second = service.deduplicate([POLICY_V2], ["v2_0"], "t1", "kb1", "u1", "v2.pdf")
+    assert second.duplicate_of == ["v1_0"]
+    service.record(second)
+    
+    counts = doc_store.get_dedup_counts({"tenant_id": "t1", "kb_id": "kb1"})
+    assert counts == {"total_chunks": 3, "duplicate_chunks": 1}
+
+
+def test_duplicates_detected_within_document(doc_store):
+    """Boilerplate repeated inside one document keeps only the first occurrence."""
+    result = DedupService().deduplicate([SHIPPING, POLICY, SHIPPING], ["c0", "c1", "c2"], "t1", "kb1", "u1", "f.pdf")
+    assert result.duplicate_of == [None, None, "c0"]
+
+
+def test_dedup_is_tenant_isolated(doc_store):
+    """Another tenant's chunks are never used as canonical copies."""
+    service = DedupService()
+    service.record(service.deduplicate([POLICY], ["a_0"], "tenant_a", "kb1", "u1", "a.pdf"))
+    result = service.deduplicate([POLICY], ["b_0"], "tenant_b", "kb1", "u1", "b.pdf")
+    assert result.duplicate_of == [None]
+
+
+def test_dedup_is_user_scoped(doc_store):
+    """Another user's chunks (not visible to this user's retrieval) are never canonical copies."""
+    service = DedupService()
+    service.record(service.deduplicate([POLICY], ["a_0"], "t1", "kb1", "u1", "a.pdf"))
+    result = service.deduplicate([POLICY_V2], ["b_0"], "t1", "kb1", "u2", "b.pdf")
+    assert result.duplicate_of == [None]
+
+
+def test_delete_signatures_removes_candidates(doc_store):
+    """Deleted documents no longer act as canonical copies."""
+    service = DedupService()
+    service.record(service.deduplicate([POLICY], ["v1_0"], "t1", "kb1", "u1", "v1.pdf"))
+    doc_store.delete_signatures({"tenant_id": "t1", "kb_id": "kb1", "file_name": "v1.pdf"})
+    result = service.deduplicate([POLICY_V2], ["v2_0"], "t1", "kb1", "u1", "v2.pdf")
+    assert result.duplicate_of == [None]
+
+
+def test_collapse_duplicates_keeps_best_hit():
+    """Retrieval keeps one hit per canonical chunk."""
+    results = [
+        RetrievalResult(chunk_id="v2_0", content=POLICY_V2, metadata={"duplicate_of": "v1_0"}, similarity_score=0.9),
+        RetrievalResult(chunk_id="v1_0", content=POLICY, metadata={}, similarity_score=0.88),
+        RetrievalResult(chunk_id="s_0", content=SHIPPING, metadata={}, similarity_score=0.5),
+        RetrievalResult(chunk_id="s_1", content=SHIPPING, metadata={}, similarity_score=0.49),
+    ]
+    collapsed = collapse_duplicates(results, limit=10)
+    assert [r.chunk_id for r in collapsed] == ["v2_0", "s_0"]
@@ -0,0 +1,91 @@
+"""
+Tests for the fake LLM provider and the record/replay round trip.
+"""
+import asyncio
+import json
+
+import pytest
+
+from app.rag.fake_provider import (
+    FakeLLMError, FakeLLMProvider, NO_ANSWER, RecordingProvider, prompt_key
+)
+from app.rag.prompts import format_draft_prompt
+from app.rag.verifier import VERIFIER_PROMPT, VERIFIER_SYSTEM_PROMPT
+
+CONTEXT = (
+    "[Source 1: policy.md] (Section: Refunds)\n"
+    "Refunds are processed within 5 business days. Contact support to start one.\n\n"
+    "[Source 2: plans.md]\n"
+    "The Pro plan includes priority support."
+)
+
+
+def fake(**kwargs) -> FakeLLMProvider:
+    kwargs.setdefault("latency_ms", 0)
+    kwargs.setdefault("error_rate", 0.0)
+    return FakeLLMProvider(**kwargs)
+
+
+def test_synthesized_draft_is_grounded_and_cited():
+    system_prompt, user_prompt = format_draft_prompt(CONTEXT, "How long do refunds take to be processed?")
+    text, usage = fake().generate_with_usage(system_prompt, user_prompt)
+    
+    assert text.startswith("Refunds are processed within 5 business days [Source 1].")
+    assert usage["model_used"] == "fake-llm"
+    assert usage["total_tokens"] == usage["prompt_tokens"] + usage["completion_tokens"] > 0
+    assert fake().generate(system_prompt, user_prompt) == text  # Deterministic per prompt
+
+
+def test_unanswerable_question_gets_no_answer():
+    system_prompt, user_prompt = format_draft_prompt(CONTEXT, "Which databases do you integrate with?")
+    assert fake().generate(system_prompt, user_prompt) == NO_ANSWER
+
+
+def test_verifier_verdict_follows_citations():
+    cited = VERIFIER_PROMPT.format(context=CONTEXT, draft_answer="Refunds take 5 days [Source 1].")
+    uncited = VERIFIER_PROMPT.format(context=CONTEXT, draft_answer="Refunds take 30 days.")
+    assert json.loads(fake().generate(VERIFIER_SYSTEM_PROMPT, cited))["pass"] is True
+    assert json.loads(fake().generate(VERIFIER_SYSTEM_PROMPT, uncited))["pass"] is False
+    wrong_number = VERIFIER_PROMPT.format(context=CONTEXT, draft_answer="Refunds take 30 days [Source 1].")
+    assert json.loads(fake().generate(VERIFIER_SYSTEM_PROMPT, wrong_number))["unsupported_claims"] == ["30"]
+
+
+def test_error_injection():
+    with pytest.raises(FakeLLMError):
+        fake(error_rate=1.0).generate("system", "user")
+    with pytest.raises(FakeLLMError):
+        asyncio.run(fake(error_rate=1.0).agenerate_with_usage("system", "user"))
+
+
+def test_seeded_latency_is_reproducible():
+    first = fake(latency_ms=100, latency_p99_ms=500, seed=7)
+    second = fake(latency_ms=100, latency_p99_ms=500, seed=7)
+    delays = [first._sample_delay() for _ in range(5)]
+    assert delays == [second._sample_delay() for _ in range(5)]
+    assert all(d > 0 for d in delays)
+
+
+def test_record_then_replay(tmp_path):
+    class CannedProvider(FakeLLMProvider):
+        """Stands in for a real provider."""
+        def _respond(self, system_prompt, user_prompt):
+            return "recorded answer [Source 1].", {"prompt_tokens": 7, "completion_tokens": 3, "model_used": "gemini-1.5-flash"}, 0.0
+    
+    path = tmp_path / "recordings.jsonl"
+    recorder = RecordingProvider(CannedProvider(latency_ms=0), path, "gemini")
+    recorder.generate_with_usage("system", "user")
+    stream = recorder.stream_with_usage("system", "streamed")
+    assert "".join(stream) == "recorded answer [Source 1]."
+    
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r["key"] for r in records] == [prompt_key("system", "user"), prompt_key("system", "streamed")]
+    assert records[0]["provider"] == "gemini"
+    
+    replay = fake(mode="replay", recordings_path=path)
+    text, usage = asyncio.run(replay.agenerate_with_usage("system", "user"))
+    assert text == "recorded answer [Source 1]."
+    assert usage["model_used"] == "gemini-1.5-flash"
+    
+    strict = fake(mode="replay", recordings_path=path, strict_replay=True)
+    with pytest.raises(KeyError):
+        strict.generate("system", "never recorded")
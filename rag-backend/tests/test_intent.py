@@ -0,0 +1,49 @@
+"""
+Tests for precompiled intent detection and lexical gating.
+"""
+from app.rag.intent import (
+    ChunkTokens, check_direct_match, detect_intents, get_intent_keywords,
+    has_important_word_match, lexical_tokens
+)
+
+
+def test_detect_intents_matches_whole_words_only():
+    assert detect_intents("How do I connect the API?") == ["integration"]
+    assert detect_intents("Which apiary plugins exist?") == ["general"]
+
+
+def test_phrase_keywords_keep_sub_keyword_intents():
+    """A phrase match still signals the intents of keywords inside it."""
+    assert detect_intents("Do you support a payment gateway?") == ["integration", "billing"]
+    assert detect_intents("Where is my password reset link?") == ["password_reset"]
+
+
+def test_stored_tokens_match_on_the_fly_tokens():
+    text = "Refunds are issued via Stripe within 5 days."
+    stored = ChunkTokens.from_metadata(text, {"lexical_tokens": lexical_tokens(text)})
+    computed = ChunkTokens.from_metadata(text, {})
+    assert stored.tokens == computed.tokens
+    assert stored.has("stripe") and not stored.has("strip")
+    assert stored.has_prefix("refund")
+
+
+def test_check_direct_match_uses_intent_keywords_and_query_words():
+    query = "How do I integrate Stripe payments?"
+    keywords = get_intent_keywords(detect_intents(query))
+    matching = "To integrate Stripe, add your API key under Payments."
+    unrelated = "Our office is closed on public holidays."
+    assert check_direct_match(query, [unrelated, matching], keywords)
+    assert not check_direct_match(query, [unrelated], keywords)
+
+
+def test_check_direct_match_phrase_keyword_in_chunk():
+    query = "Does the payment gateway support refunds?"
+    keywords = {"payment gateway"}
+    assert check_direct_match(query, ["Our payment gateway handles refunds automatically."], keywords)
+    assert not check_direct_match(query, ["Gateway payment refunds."], keywords)
+
+
+def test_lenient_match_accepts_inflections():
+    chunks = [ChunkTokens("Refunds take five business days.")]
+    assert has_important_word_match("What is the refund window?", chunks)
+    assert not has_important_word_match("Where is the office?", chunks)
@@ -0,0 +1,87 @@
+"""
+Tests for the token-budget context packer.
+"""
+from app.rag.packing import ContextPacker
+from tests.conftest import count_words, make_result
+
+
+def test_context_never_exceeds_budget():
+    """The packed context (headers and separators included) fits the budget exactly."""
+    packer = ContextPacker(count_tokens=count_words)
+    results = [
+        make_result(f"c{i}", " ".join(f"word{i}_{j}" for j in range(40)), 0.9 - i * 0.05)
+        for i in range(5)
+    ]
+    context, citations = packer.pack(results, max_tokens=100)
+    assert count_words(context) <= 100
+    assert len(citations) == 2
+    assert [c["index"] for c in citations] == [1, 2]
+
+
+def test_skips_oversized_passage_and_keeps_filling():
+    """A passage that doesn't fit is skipped instead of ending the packing."""
+    packer = ContextPacker(count_tokens=count_words)
+    results = [
+        make_result("big", "x " * 200, 0.9),
+        make_result("small", "refunds take five days", 0.8),
+    ]
+    context, citations = packer.pack(results, max_tokens=50)
+    assert [c["chunk_id"] for c in citations] == ["small"]
+
+
+def test_adjacent_chunk_overlap_is_stripped():
+    """Text repeated from the previous chunk is sent once."""
+    packer = ContextPacker(count_tokens=count_words)
+    shared = "Refunds are issued within five business days."
+    first = f"Returns need a receipt. {shared}"
+    second = f"{shared}\n\nExchanges are free of charge."
+    results = [
+        make_result("c0", first, 0.9, document_id="d1", chunk_index=0, overlap_chars=0),
+        make_result("c1", second, 0.85, document_id="d1", chunk_index=1, overlap_chars=len(shared)),
+    ]
+    context, _ = packer.pack(results, max_tokens=500)
+    assert context.count(shared) == 1
+    assert "Exchanges are free of charge." in context
+
+
+def test_overlap_heuristic_for_chunks_without_recorded_overlap():
+    """Legacy chunks without overlap metadata are still de-overlapped."""
+    packer = ContextPacker(count_tokens=count_words)
+    shared = "Express shipping arrives within two business days in most regions."
+    results = [
+        make_result("c1", f"{shared} Tracking links are emailed.", 0.9, document_id="d1", chunk_index=1),
+        make_result("c0", f"Standard shipping takes a week. {shared}", 0.8, document_id="d1", chunk_index=0),
+    ]
+    context, _ = packer.pack(results, max_tokens=500)
+    assert context.count(shared) == 1
+
+
+def test_mmr_prefers_diverse_passages():
+    """A near-identical second hit loses to a less similar but different one."""
+    packer = ContextPacker(mmr_lambda=0.5, count_tokens=count_words)
+    results = [
+        make_result("a", "refund policy text", 0.9, embedding=[1.0, 0.0]),
+        make_result("a2", "refund policy text again", 0.88, embedding=[0.99, 0.01]),
+        make_result("b", "shipping policy text", 0.7, embedding=[0.0, 1.0]),
+    ]
+    _, citations = packer.pack(results, max_tokens=500)
+    assert [c["chunk_id"] for c in citations][:2] == ["a", "b"]
+
+
+def test_parent_expansion_falls_back_to_child():
+    """Children expand to their parent section unless the parent doesn't fit."""
+    packer = ContextPacker(count_tokens=count_words)
+    parents = {
+        "d1_p0": {"content": "short refunds section with details", "token_count": 5, "heading_path": "Refunds"},
+        "d1_p1": {"content": "y " * 300, "token_count": 300, "heading_path": "Shipping"},
+    }
+    results = [
+        make_result("k0", "refunds child", 0.9, parent_id="d1_p0", document_id="d1"),
+        make_result("k1", "refunds child two", 0.85, parent_id="d1_p0", document_id="d1"),
+        make_result("k2", "shipping child", 0.8, parent_id="d1_p1", document_id="d1"),
+    ]
+    context, citations = packer.pack(results, max_tokens=60, parents=parents)
+    assert "short refunds section with details" in context
+    assert "(Section: Refunds)" in context
+    assert "shipping child" in context
+    assert [c["chunk_id"] for c in citations] == ["k0", "k2"]
@@ -0,0 +1,55 @@
+"""
+Tests for the shared provider registry and pooled HTTP clients.
+"""
+import asyncio
+
+import httpx
+
+from app.config import settings
+from app.rag import providers
+from app.rag.answer import AnswerService
+from app.rag.providers import InstrumentedTransport, _PoolStats, get_llm_provider
+from app.rag.verifier import VerifierService
+from tests.conftest import CITATIONS, CONTEXT, FakeProvider
+
+
+def test_answer_and_verifier_share_one_provider(monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_API_KEY", "sk-test")
+    monkeypatch.setattr(settings, "LLM_PROVIDER", "openai")
+    monkeypatch.setattr(providers, "_providers", {})
+    
+    provider = get_llm_provider()
+    assert AnswerService(provider="openai").provider is provider
+    assert VerifierService().provider is provider
+    assert provider.client._client is providers.get_http_client()
+    assert provider.async_client._client is providers.get_async_http_client()
+
+
+def test_in_flight_released_when_streamed_body_closes(monkeypatch):
+    def fake_handle(self, request):
+        return httpx.Response(200, stream=httpx.ByteStream(b"data"))
+    monkeypatch.setattr(httpx.HTTPTransport, "handle_request", fake_handle)
+    
+    stats = _PoolStats("test", max_connections=4)
+    client = httpx.Client(transport=InstrumentedTransport(stats))
+    with client.stream("GET", "https://llm.example/v1") as response:
+        assert stats.in_flight == 1  # Headers received, body still open
+        assert response.read() == b"data"
+    assert stats.in_flight == 0
+
+
+def test_async_answer_uses_same_gates_and_verifier(monkeypatch):
+    from app.rag.verifier import get_verifier_service
+    service = AnswerService()
+    service._provider = FakeProvider(verdict_pass=True)
+    monkeypatch.setattr(get_verifier_service(), "_provider", FakeProvider(verdict_pass=True))
+    
+    result = asyncio.run(service.agenerate_answer(
+        question="How long do refunds take?",
+        context=CONTEXT,
+        citations_info=CITATIONS,
+        confidence=0.8,
+        has_relevant_results=True
+    ))
+    assert result["verifier_passed"] is True
+    assert result["usage"]["total_tokens"] == 18
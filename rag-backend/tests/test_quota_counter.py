@@ -0,0 +1,112 @@
+"""
+Tests for in-memory quota admission: cross-process leases, slack bound,
+release of unbilled chats, month rollover and reconciliation.
+"""
+import multiprocessing
+from datetime import datetime
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.billing.quota import ensure_tenant_exists, set_tenant_plan
+from app.billing.quota_counter import QuotaService, SharedQuotaStore
+from app.billing.usage_tracker import track_usage
+from app.db.database import create_db_engine
+
+WORKERS = 4
+ADMITS_PER_WORKER = 100
+
+
+def admit_many(db_path: str, counter_path: str, count: int, slack: int, results) -> None:
+    """Worker process: try to admit count chats for the same tenant."""
+    # Not the conftest helper: spawned workers re-import this module, and conftest loads the RAG stack
+    engine = create_db_engine(f"sqlite:///{db_path}", pragmas={"busy_timeout": 60_000})
+    db = sessionmaker(bind=engine)()
+    service = QuotaService(SharedQuotaStore(counter_path), lease_size=10, slack=slack, reconcile_seconds=3600)
+    admitted = sum(1 for _ in range(count) if service.admit(db, "t1")[0])
+    db.close()
+    engine.dispose()
+    results.put(admitted)
+
+
+def set_limit(db, limit: int) -> None:
+    ensure_tenant_exists(db, "t1")
+    plan = set_tenant_plan(db, "t1", "starter")
+    plan.monthly_chat_limit = limit
+    db.commit()
+
+
+def run_workers(db_path, counter_path, slack: int) -> int:
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    workers = [
+        context.Process(target=admit_many, args=(str(db_path), str(counter_path), ADMITS_PER_WORKER, slack, results))
+        for _ in range(WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+    admitted = sum(results.get(timeout=120) for _ in workers)
+    for worker in workers:
+        worker.join(120)
+    assert [w.exitcode for w in workers] == [0] * WORKERS
+    return admitted
+
+
+@pytest.mark.parametrize("slack", [0, 7])
+def test_processes_never_admit_beyond_limit_plus_slack(db, billing_db_path, tmp_path, slack):
+    set_limit(db, 150)
+    
+    admitted = run_workers(billing_db_path, tmp_path / "quota_counters.db", slack)
+    assert 150 <= admitted <= 150 + slack
+    if slack == 0:
+        assert admitted == 150
+
+
+def test_release_gives_back_unbilled_admissions(db, tmp_path):
+    set_limit(db, 3)
+    service = QuotaService(SharedQuotaStore(tmp_path / "quota_counters.db"), lease_size=2, reconcile_seconds=3600)
+    
+    assert [service.admit(db, "t1")[0] for _ in range(3)] == [True, True, True]
+    has_quota, error = service.admit(db, "t1")
+    assert not has_quota and "3/3" in error
+    
+    service.release("t1")  # e.g. the chat was refused before any LLM call
+    assert service.admit(db, "t1")[0]
+    assert not service.admit(db, "t1")[0]
+    
+    # Releases can't mint quota that was never admitted
+    for _ in range(5):
+        service.release("t1")
+    assert [service.admit(db, "t1")[0] for _ in range(6)] == [True] * 3 + [False] * 3
+
+
+def test_month_rollover_starts_from_new_months_billed_usage(db, tmp_path):
+    set_limit(db, 2)
+    now = [datetime(2025, 3, 31, 23, 59)]
+    service = QuotaService(
+        SharedQuotaStore(tmp_path / "quota_counters.db"), lease_size=5, reconcile_seconds=3600, clock=lambda: now[0]
+    )
+    
+    assert [service.admit(db, "t1")[0] for _ in range(3)] == [True, True, False]
+    
+    now[0] = datetime(2025, 4, 1, 0, 1)
+    track_usage(db, "t1", "u1", "kb1", "gemini", "gemini-1.5-flash", 10, 10, request_timestamp=now[0])
+    assert [service.admit(db, "t1")[0] for _ in range(2)] == [True, False]
+    assert service.store.used("t1", "2025-04") == 2
+
+
+def test_reconcile_adopts_billed_usage_and_plan_changes(db, tmp_path):
+    set_limit(db, 5)
+    service = QuotaService(SharedQuotaStore(tmp_path / "quota_counters.db"), lease_size=5, reconcile_seconds=3600)
+    assert service.admit(db, "t1")[0]
+    
+    # Usage billed elsewhere (another host) shows up in UsageMonthly
+    for _ in range(4):
+        track_usage(db, "t1", "u1", "kb1", "gemini", "gemini-1.5-flash", 10, 10)
+    service.invalidate("t1")
+    assert service.admit(db, "t1")[0]
+    assert not service.admit(db, "t1")[0]
+    
+    set_limit(db, 10)
+    service.invalidate("t1")
+    assert [service.admit(db, "t1")[0] for _ in range(6)] == [True] * 5 + [False]
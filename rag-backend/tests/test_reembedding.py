@@ -0,0 +1,182 @@
+"""
+Tests for the background re-embedding migration (shadow index, catch-up, switch).
+"""
+import pytest
+
+import app.rag.migration as migration_module
+import app.rag.vectorstore as vectorstore_module
+from app.config import settings
+from app.rag.embeddings import get_embedding_service
+from app.rag.migration import ReembeddingJob
+from app.rag.retrieval import RetrievalService
+from app.rag.vectorstore import VectorStore
+
+TARGET_MODEL = "test-embedding-v2"
+SCOPE = {"tenant_id": "t1", "kb_id": "kb1", "user_id": "u1"}
+
+
+@pytest.fixture
+def vector_store(tmp_path, monkeypatch):
+    """Isolated vector store per test, used by the migration and retrieval."""
+    store = VectorStore(tmp_path / "vectordb", collection_name="test_chunks")
+    monkeypatch.setattr(vectorstore_module, "_vector_store", store)
+    monkeypatch.setattr(migration_module, "get_vector_store", lambda: store)
+    return store
+
+
+def upload(store, file_name, texts):
+    """Store chunks the way ingestion does: current index, current model, under the tenant lock."""
+    with store.tenant_lock("t1"):
+        index = store.get_tenant_index("t1")
+        store.add_documents(
+            documents=texts,
+            embeddings=get_embedding_service(index["embedding_model"]).embed_texts(texts),
+            metadatas=[{**SCOPE, "file_name": file_name} for _ in texts],
+            ids=[f"{file_name}_{i}" for i in range(len(texts))],
+            index=index
+        )
+
+
+def tenant_ids(store, index):
+    return set(store.get_chunk_ids(index, {"tenant_id": "t1"}))
+
+
+def new_job(batch_size=2):
+    return ReembeddingJob("t1", TARGET_MODEL, "1", batch_size=batch_size, max_chunks_per_second=0)
+
+
+def test_migration_copies_catches_up_and_switches(vector_store, monkeypatch):
+    """Chunks uploaded during the bulk pass are picked up by the catch-up pass before the switch."""
+    upload(vector_store, "policy.pdf", [f"refund policy clause {i}" for i in range(5)])
+    source_index = vector_store.get_tenant_index("t1")
+    
+    copy_chunks = ReembeddingJob._copy_chunks
+    
+    def copy_then_upload(job, store, embedding_service, chunk_ids, throttle=True):
+        copy_chunks(job, store, embedding_service, chunk_ids, throttle)
+        if throttle:
+            # Still routed to the source index: the upload lands there, not in the shadow
+            assert vector_store.get_tenant_index("t1")["shadow"]["embedding_model"] == TARGET_MODEL
+            upload(vector_store, "late.pdf", ["late upload about shipping"])
+    
+    monkeypatch.setattr(ReembeddingJob, "_copy_chunks", copy_then_upload)
+    job = new_job()
+    job.run()
+    
+    assert job.status == "completed"
+    index = vector_store.get_tenant_index("t1")
+    assert index["embedding_model"] == TARGET_MODEL
+    assert "shadow" not in index
+    assert tenant_ids(vector_store, index) == {f"policy.pdf_{i}" for i in range(5)} | {"late.pdf_0"}
+    assert tenant_ids(vector_store, source_index) == set()
+    assert job.to_dict()["progress"] == 1.0
+    assert job.migrated_chunks == job.total_chunks == 6
+
+
+def test_delete_during_migration_is_not_resurrected(vector_store, monkeypatch):
+    """A chunk deleted between a bulk-pass read and its shadow write is dropped before the switch."""
+    upload(vector_store, "keep.pdf", ["warranty covers two years", "warranty excludes water damage"])
+    upload(vector_store, "doomed.pdf", ["obsolete pricing sheet"])
+    
+    get_chunks = vector_store.get_chunks
+    deleted = []
+    
+    def read_then_delete(index, ids):
+        batch = get_chunks(index, ids)
+        if not deleted:
+            deleted.append(vector_store.delete_by_filter({**SCOPE, "file_name": "doomed.pdf"}))
+        return batch  # Already read: the deleted chunk is still in this batch
+    
+    monkeypatch.setattr(vector_store, "get_chunks", read_then_delete)
+    job = new_job(batch_size=10)
+    job.run()
+    
+    assert deleted == [1]
+    assert job.status == "completed"
+    index = vector_store.get_tenant_index("t1")
+    assert tenant_ids(vector_store, index) == {"keep.pdf_0", "keep.pdf_1"}
+    assert job.migrated_chunks == job.total_chunks == 2
+
+
+def test_delete_by_ids_is_mirrored_into_the_shadow_index(vector_store):
+    """Deleting chunks by ID mid-migration removes the shadow copies too."""
+    upload(vector_store, "faq.pdf", ["returns are free", "exchanges take a week"])
+    job = new_job()
+    job.source_index = vector_store.get_tenant_index("t1")
+    job.target_index = {
+        "collection_name": vector_store.collection_name_for(TARGET_MODEL, "1"),
+        "embedding_model": TARGET_MODEL,
+        "embedding_revision": "1"
+    }
+    vector_store.set_shadow_index("t1", job.target_index)
+    job._copy_chunks(vector_store, get_embedding_service(TARGET_MODEL), ["faq.pdf_0", "faq.pdf_1"])
+    
+    vector_store.delete_by_ids(["faq.pdf_0"], tenant_id="t1")
+    
+    assert tenant_ids(vector_store, job.source_index) == {"faq.pdf_1"}
+    assert tenant_ids(vector_store, job.target_index) == {"faq.pdf_1"}
+
+
+def test_failed_migration_keeps_source_and_resumes(vector_store, monkeypatch):
+    """A failure leaves the tenant on the source index; a retry resumes from the shadow contents."""
+    upload(vector_store, "manual.pdf", [f"setup step {i} for the router" for i in range(6)])
+    source_index = vector_store.get_tenant_index("t1")
+    
+    add_documents = vector_store.add_documents
+    writes = []
+    
+    def fail_second_write(*args, **kwargs):
+        writes.append(len(kwargs["ids"]))
+        if len(writes) == 2:
+            raise RuntimeError("embedding backend unavailable")
+        add_documents(*args, **kwargs)
+    
+    monkeypatch.setattr(vector_store, "add_documents", fail_second_write)
+    failed = new_job()
+    failed.run()
+    
+    assert failed.status == "failed"
+    assert "embedding backend unavailable" in failed.error
+    index = vector_store.get_tenant_index("t1")
+    assert index["collection_name"] == source_index["collection_name"]
+    assert "shadow" not in index
+    target_index = failed.target_index
+    partial = tenant_ids(vector_store, target_index)
+    assert len(partial) == 2
+    
+    # Deleted while no migration is running: not mirrored into the leftover shadow copies
+    vector_store.delete_by_filter({**SCOPE, "file_name": "manual.pdf"})
+    upload(vector_store, "manual_v2.pdf", [f"setup step {i} for the router" for i in range(5)])
+    
+    monkeypatch.setattr(vector_store, "add_documents", add_documents)
+    resumed = new_job()
+    resumed.run()
+    
+    assert resumed.status == "completed"
+    assert vector_store.get_tenant_index("t1")["embedding_model"] == TARGET_MODEL
+    assert tenant_ids(vector_store, target_index) == {f"manual_v2.pdf_{i}" for i in range(5)}
+    assert resumed.migrated_chunks == resumed.total_chunks == 5
+
+
+def test_queries_use_source_index_until_switch(vector_store, monkeypatch):
+    """Retrieval embeds with the old model and reads the old index until the switch, then the new one."""
+    monkeypatch.setattr(settings, "DEDUP_MODE", "off")
+    upload(vector_store, "faq.pdf", ["refunds are issued within five business days", "shipping takes a week"])
+    
+    def retrieved_models():
+        results, _, _ = RetrievalService(similarity_threshold=0.0).retrieve("when are refunds issued", **SCOPE)
+        assert results
+        return {r.metadata["embedding_model"] for r in results}
+    
+    copy_chunks = ReembeddingJob._copy_chunks
+    during = []
+    
+    def copy_then_query(job, store, embedding_service, chunk_ids, throttle=True):
+        copy_chunks(job, store, embedding_service, chunk_ids, throttle)
+        during.append(retrieved_models())
+    
+    monkeypatch.setattr(ReembeddingJob, "_copy_chunks", copy_then_query)
+    new_job().run()
+    
+    assert during == [{settings.EMBEDDING_MODEL}]
+    assert retrieved_models() == {TARGET_MODEL}
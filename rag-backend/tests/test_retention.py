@@ -0,0 +1,76 @@
+"""
+Tests for usage event retention: hourly rollups, monthly archives and
+cost reports that combine the hot table with the rollups.
+"""
+from datetime import datetime
+
+import pytest
+
+from app.billing.reports import get_cost_report
+from app.billing.retention import _write_segment, compact_usage_events, month_archive_dir, read_archive
+from app.db.models import UsageEvent, UsageRollupHourly
+from tests.conftest import track
+
+
+def reports(db, tenant_id="t1"):
+    return [
+        get_cost_report(db, tenant_id, "month", 2025, 1),
+        get_cost_report(db, tenant_id, "month", 2025, 2),
+        get_cost_report(db, tenant_id, "all")
+    ]
+
+
+def test_compaction_rolls_up_archives_and_keeps_reports(db, tmp_path):
+    track(db, datetime(2025, 1, 10, 9, 5), tier="fast", latency=100)
+    track(db, datetime(2025, 1, 10, 9, 55), tier="fast", latency=300)
+    track(db, datetime(2025, 1, 10, 9, 30), tier="fast")
+    track(db, datetime(2025, 1, 31, 23, 59), "openai", "gpt-4o-mini")
+    track(db, datetime(2025, 2, 1, 0, 1), "openai", "gpt-4o-mini")
+    track(db, datetime(2025, 2, 20, 12, 0), tier="large", latency=50)  # After the cutoff
+    track(db, datetime(2025, 1, 10, 9, 0), tenant_id="t2")
+    before = reports(db)
+    
+    archive = tmp_path / "archive"
+    stats = compact_usage_events(db, older_than=datetime(2025, 2, 15), archive_dir=archive, batch_size=2)
+    assert (stats.events, stats.batches) == (6, 3)
+    assert [e.request_timestamp for e in db.query(UsageEvent)] == [datetime(2025, 2, 20, 12, 0)]
+    assert reports(db) == before
+    assert get_cost_report(db, "t2", "all")["total_requests"] == 1
+    
+    fast = db.query(UsageRollupHourly).filter_by(tenant_id="t1", model_tier="fast").one()
+    assert (fast.hour, fast.total_requests, fast.total_tokens) == (datetime(2025, 1, 10, 9), 3, 360)
+    assert (fast.latency_ms_total, fast.latency_samples) == (400, 2)
+    assert before[0]["breakdown_by_tier"]["fast"]["avg_latency_ms"] == 200
+    assert db.query(UsageRollupHourly).filter_by(model_tier="").count() == 3
+    
+    assert len(list(read_archive(archive, 2025, 1))) == 5
+    february = list(read_archive(archive, 2025, 2))
+    assert [(r.model, r.request_timestamp) for r in february] == [("gpt-4o-mini", datetime(2025, 2, 1, 0, 1))]
+    
+    # Nothing left to compact
+    assert compact_usage_events(db, older_than=datetime(2025, 2, 15), archive_dir=archive).events == 0
+
+
+def test_failed_transaction_keeps_events_and_archive_dedupes(db, tmp_path, monkeypatch):
+    track(db, datetime(2025, 1, 5, 8, 0))
+    track(db, datetime(2025, 1, 6, 8, 0))
+    archive = tmp_path / "archive"
+    
+    def crash(*args, **kwargs):
+        raise RuntimeError("crash after archiving")
+    
+    monkeypatch.setattr("app.billing.retention.increment_upsert", crash)
+    with pytest.raises(RuntimeError):
+        compact_usage_events(db, older_than=datetime(2025, 2, 1), archive_dir=archive)
+    assert db.query(UsageEvent).count() == 2
+    assert db.query(UsageRollupHourly).count() == 0
+    monkeypatch.undo()
+    
+    # The retry archives the same events again, in a segment that overlaps the first one
+    records = list(read_archive(archive, 2025, 1))
+    _write_segment(month_archive_dir(archive, 2025, 1), records[1:])
+    stats = compact_usage_events(db, older_than=datetime(2025, 2, 1), archive_dir=archive)
+    assert stats.events == 2
+    assert len(list(month_archive_dir(archive, 2025, 1).glob("*.jsonl.gz"))) == 2
+    assert sorted(r.request_timestamp.day for r in read_archive(archive, 2025, 1)) == [5, 6]
+    assert db.query(UsageRollupHourly).count() == 2
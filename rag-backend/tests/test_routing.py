@@ -0,0 +1,108 @@
+"""
+Tests for provider failover, circuit breakers and hedging.
+"""
+import asyncio
+import time
+
+import pytest
+
+from app.config import settings
+from app.rag.answer import LLMProvider
+from app.rag.routing import CircuitBreaker, ProviderRouter
+
+
+class ScriptedProvider(LLMProvider):
+    """Fake provider with fixed latency that can be switched to fail."""
+    
+    def __init__(self, name: str, latency: float = 0.0, fail: bool = False):
+        self.name = name
+        self.latency = latency
+        self.fail = fail
+        self.calls = 0
+    
+    def generate(self, system_prompt: str, user_prompt: str) -> str:
+        return self.generate_with_usage(system_prompt, user_prompt)[0]
+    
+    def generate_with_usage(self, system_prompt: str, user_prompt: str) -> tuple[str, dict]:
+        self.calls += 1
+        time.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError(f"{self.name} unavailable")
+        return f"answer from {self.name}", {"prompt_tokens": 5, "completion_tokens": 3, "model_used": self.name}
+    
+    async def agenerate_with_usage(self, system_prompt: str, user_prompt: str) -> tuple[str, dict]:
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if self.fail:
+            raise RuntimeError(f"{self.name} unavailable")
+        return f"answer from {self.name}", {"prompt_tokens": 5, "completion_tokens": 3, "model_used": self.name}
+
+
+def make_router(primary: ScriptedProvider, backup: ScriptedProvider, clock=time.monotonic) -> ProviderRouter:
+    return ProviderRouter(
+        ["gemini", "openai"],
+        providers={"gemini": primary, "openai": backup},
+        clock=clock
+    )
+
+
+def test_failover_attributes_usage_to_answering_provider():
+    router = make_router(ScriptedProvider("gemini", fail=True), ScriptedProvider("openai"))
+    text, usage = router.generate_with_usage("sys", "user")
+    assert text == "answer from openai"
+    assert usage["provider"] == "openai"
+
+
+def test_breaker_opens_then_probes_after_reset(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_BREAKER_FAILURE_THRESHOLD", 2)
+    now = [0.0]
+    primary = ScriptedProvider("gemini", fail=True)
+    router = make_router(primary, ScriptedProvider("openai"), clock=lambda: now[0])
+    
+    router.generate_with_usage("sys", "user")
+    router.generate_with_usage("sys", "user")
+    assert router.breakers["gemini"].state == CircuitBreaker.OPEN
+    router.generate_with_usage("sys", "user")
+    assert primary.calls == 2  # Skipped while open
+    
+    primary.fail = False
+    now[0] += settings.LLM_BREAKER_RESET_SECONDS
+    _, usage = router.generate_with_usage("sys", "user")
+    assert usage["provider"] == "gemini"
+    assert router.breakers["gemini"].state == CircuitBreaker.CLOSED
+
+
+def test_slow_provider_is_demoted(monkeypatch):
+    router = make_router(ScriptedProvider("gemini"), ScriptedProvider("openai"))
+    for _ in range(3):
+        router.latency["gemini"].record(3.0)
+        router.latency["openai"].record(0.5)
+    assert router.candidates() == ["openai", "gemini"]
+
+
+def test_hedge_fires_backup_after_p95(monkeypatch):
+    monkeypatch.setattr(settings, "LLM_HEDGE_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_HEDGE_MIN_SAMPLES", 5)
+    primary = ScriptedProvider("gemini", latency=0.5)
+    router = make_router(primary, ScriptedProvider("openai", latency=0.01))
+    for _ in range(5):
+        router.latency["gemini"].record(0.05)
+    
+    started = time.monotonic()
+    text, usage = asyncio.run(router.agenerate_with_usage("sys", "user"))
+    assert usage["provider"] == "openai"
+    assert time.monotonic() - started < 0.4
+    assert router.breakers["gemini"].state == CircuitBreaker.CLOSED  # Cancelled hedge isn't a failure
+
+
+def test_all_providers_failing_raises_last_error():
+    router = make_router(ScriptedProvider("gemini", fail=True), ScriptedProvider("openai", fail=True))
+    with pytest.raises(RuntimeError, match="openai unavailable"):
+        asyncio.run(router.agenerate_with_usage("sys", "user"))
+
+
+def test_stream_fails_over_before_first_token():
+    router = make_router(ScriptedProvider("gemini", fail=True), ScriptedProvider("openai"))
+    stream = router.stream_with_usage("sys", "user")
+    assert "".join(stream) == "answer from openai"
+    assert stream.usage["provider"] == "openai"
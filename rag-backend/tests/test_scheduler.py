@@ -0,0 +1,98 @@
+"""
+Tests for the LLM admission scheduler.
+"""
+import asyncio
+
+import pytest
+
+from app.rag.scheduler import AdmissionRejected, AdmissionScheduler, parse_plan_weights
+
+
+def make_scheduler(**kwargs) -> AdmissionScheduler:
+    kwargs.setdefault("max_concurrency", 1)
+    kwargs.setdefault("max_queue", 100)
+    kwargs.setdefault("max_queue_per_tenant", 100)
+    kwargs.setdefault("queue_timeout", 5.0)
+    kwargs.setdefault("plan_weights", parse_plan_weights("starter:1,growth:2,pro:4"))
+    return AdmissionScheduler(**kwargs)
+
+
+def test_concurrency_cap_queues_until_release():
+    async def scenario():
+        scheduler = make_scheduler(max_concurrency=2)
+        first = await scheduler.acquire("t1")
+        await scheduler.acquire("t2")
+        third = asyncio.ensure_future(scheduler.acquire("t3"))
+        await asyncio.sleep(0.01)
+        assert not third.done() and scheduler.queued == 1
+        
+        first.release()
+        first.release()  # Idempotent
+        ticket = await asyncio.wait_for(third, 1)
+        assert ticket.tenant_id == "t3"
+        assert scheduler.in_flight == 2 and scheduler.queued == 0
+    
+    asyncio.run(scenario())
+
+
+def test_weighted_fair_queuing_by_plan():
+    async def scenario():
+        scheduler = make_scheduler()
+        holder = await scheduler.acquire("other")
+        order = []
+        
+        async def request(tenant_id, plan):
+            ticket = await scheduler.acquire(tenant_id, plan)
+            order.append(tenant_id)
+            await asyncio.sleep(0)
+            ticket.release()
+        
+        # The starter tenant queues its burst first; the pro tenant still gets 4x the share
+        tasks = [asyncio.ensure_future(request("starter_tenant", "starter")) for _ in range(4)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.ensure_future(request("pro_tenant", "pro")) for _ in range(4)]
+        await asyncio.sleep(0.01)
+        holder.release()
+        await asyncio.gather(*tasks)
+        return order
+    
+    order = asyncio.run(scenario())
+    assert order[:3] == ["pro_tenant"] * 3
+    assert order[:5].count("pro_tenant") == 4
+    assert sorted(order) == ["pro_tenant"] * 4 + ["starter_tenant"] * 4
+
+
+def test_full_queues_shed_with_429():
+    async def scenario():
+        scheduler = make_scheduler(max_queue=2, max_queue_per_tenant=1)
+        await scheduler.acquire("busy")
+        waiting = asyncio.ensure_future(scheduler.acquire("a"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as tenant_full:
+            await scheduler.acquire("a")
+        asyncio.ensure_future(scheduler.acquire("b"))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as queue_full:
+            await scheduler.acquire("c")
+        waiting.cancel()
+        return tenant_full.value, queue_full.value
+    
+    tenant_full, queue_full = asyncio.run(scenario())
+    assert (tenant_full.status_code, tenant_full.reason) == (429, "tenant_queue_full")
+    assert (queue_full.status_code, queue_full.reason) == (429, "queue_full")
+
+
+def test_queue_deadline_sheds_with_503_and_frees_the_place():
+    async def scenario():
+        scheduler = make_scheduler(queue_timeout=0.05)
+        holder = await scheduler.acquire("busy")
+        with pytest.raises(AdmissionRejected) as rejected:
+            await scheduler.acquire("late")
+        assert rejected.value.status_code == 503
+        assert scheduler.queued == 0
+        
+        holder.release()  # The abandoned waiter must not take the freed slot
+        assert scheduler.in_flight == 0
+        await asyncio.wait_for(scheduler.acquire("next"), 1)
+    
+    asyncio.run(scenario())
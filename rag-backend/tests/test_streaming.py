@@ -0,0 +1,45 @@
+"""
+Tests for streamed answer generation.
+"""
+from app.config import settings
+from app.rag.answer import AnswerService
+from app.rag.verifier import get_verifier_service
+from tests.conftest import CITATIONS, CONTEXT, FakeProvider
+
+
+def run_stream(verdict_pass: bool, confidence: float = 0.8, monkeypatch=None):
+    service = AnswerService()
+    service._provider = FakeProvider(verdict_pass)
+    monkeypatch.setattr(get_verifier_service(), "_provider", FakeProvider(verdict_pass))
+    monkeypatch.setattr(settings, "VERDICT_CACHE_ENABLED", False)  # Verdicts differ per test for the same draft
+    return list(service.stream_answer(
+        question="How long do refunds take?",
+        context=CONTEXT,
+        citations_info=CITATIONS,
+        confidence=confidence,
+        has_relevant_results=True
+    ))
+
+
+def test_stream_emits_tokens_then_verified_result(monkeypatch):
+    events = run_stream(verdict_pass=True, monkeypatch=monkeypatch)
+    assert [e for e, _ in events] == ["token", "result"]
+    result = events[-1][1]
+    assert result["answer"] == "Refunds take 5 days [Source 1]."
+    assert result["retract"] is False
+    assert result["usage"]["total_tokens"] == 18
+
+
+def test_stream_retracts_when_verifier_fails(monkeypatch):
+    events = run_stream(verdict_pass=False, monkeypatch=monkeypatch)
+    result = events[-1][1]
+    assert result["retract"] is True
+    assert result["refused"] is True
+    assert result["usage"]["model_used"] == "fake"  # Draft tokens are still billed
+
+
+def test_stream_gates_refuse_before_llm_call(monkeypatch):
+    events = run_stream(verdict_pass=True, confidence=0.1, monkeypatch=monkeypatch)
+    assert [e for e, _ in events] == ["result"]
+    assert events[0][1]["refused"] is True
+    assert "usage" not in events[0][1]
@@ -0,0 +1,95 @@
+"""
+Tests for single-call structured answers and their local quote checks.
+"""
+import asyncio
+import json
+
+import pytest
+
+from app.config import settings
+from app.rag.answer import AnswerService
+from app.rag.fake_provider import FakeLLMProvider
+from app.rag.structured import (
+    StructuredAnswer, StructuredSentence, check_structured_answer, parse_structured_answer, quote_match_ratio
+)
+
+CONTEXT = (
+    "[Source 1: policy.md] (Section: Refunds)\n"
+    "Refunds are processed within 5 business days. Contact support to start one.\n\n"
+    "[Source 2: plans.md]\n"
+    "The Pro plan includes priority support."
+)
+
+
+def sentence(text: str, quote: str, sources=(1,)) -> StructuredSentence:
+    return StructuredSentence(text=text, sources=list(sources), quote=quote)
+
+
+def test_parse_and_render():
+    raw = json.dumps({"answerable": True, "sentences": [
+        {"text": "Refunds take 5 business days [Source 1].", "sources": [1], "quote": "processed within 5 business days"},
+        {"text": "Pro includes priority support", "sources": ["2"], "quote": "priority support"}
+    ]})
+    answer = parse_structured_answer(f"```json\n{raw}\n```")
+    assert answer.answerable
+    assert answer.render() == "Refunds take 5 business days [Source 1]. Pro includes priority support [Source 2]."
+    
+    assert parse_structured_answer('{"answerable": true, "sentences": []}').answerable is False
+    with pytest.raises(ValueError):
+        parse_structured_answer("Refunds take 5 days.")
+    for bad_sentence in ({"text": "Refunds take 5 days.", "sources": 1}, {"text": "Refunds take 5 days.", "quote": ["5 days"]}):
+        with pytest.raises(ValueError):
+            parse_structured_answer(json.dumps({"answerable": True, "sentences": [bad_sentence]}))
+
+
+def test_quotes_match_exactly_or_fuzzily():
+    source = "Refunds are processed within 5 business days. Contact support to start one."
+    assert quote_match_ratio("refunds are processed within 5 business days", source) == 1.0
+    assert quote_match_ratio("Refunds are processed in 5 business days", source) >= 0.85
+    assert quote_match_ratio("Refunds are instant for annual plans", source) < 0.85
+
+
+def test_check_catches_unsupported_sentences():
+    supported = sentence("Refunds take 5 business days.", "Refunds are processed within 5 business days.")
+    assert check_structured_answer(StructuredAnswer(True, [supported]), CONTEXT)["pass"] is True
+    
+    bad = [
+        sentence("Refunds take 12 business days.", "Refunds are processed within 5 business days."),  # Number not in quote
+        sentence("Refunds are instant.", "Refunds are instant for all plans."),  # Quote not in source
+        sentence("Pro has priority support.", "The Pro plan includes priority support."),  # Cites the wrong source
+        sentence("Refunds take 5 business days.", "", sources=()),
+    ]
+    for claim in bad:
+        verification = check_structured_answer(StructuredAnswer(True, [supported, claim]), CONTEXT)
+        assert verification["pass"] is False
+        assert verification["unsupported_claims"] == [claim.text]
+
+
+def answer_with(provider, question: str) -> dict:
+    service = AnswerService()
+    service._provider = provider
+    citations_info = [{"index": 1, "file_name": "policy.md", "chunk_id": "c1"}, {"index": 2, "file_name": "plans.md", "chunk_id": "c2"}]
+    return asyncio.run(service.agenerate_answer(question, CONTEXT, citations_info, confidence=0.8, has_relevant_results=True))
+
+
+def test_structured_mode_makes_one_call(monkeypatch):
+    monkeypatch.setattr(settings, "ANSWER_MODE", "structured")
+    calls = []
+    
+    class CountingFake(FakeLLMProvider):
+        async def agenerate_with_usage(self, system_prompt, user_prompt, tier=None, json_mode=False):
+            calls.append(json_mode)
+            return await super().agenerate_with_usage(system_prompt, user_prompt, tier, json_mode)
+    
+    result = answer_with(CountingFake(latency_ms=0), "How long do refunds take to be processed?")
+    assert calls == [True]
+    assert result["verifier_passed"] is True
+    assert result["answer"] == "Refunds are processed within 5 business days [Source 1]."
+    assert [c.file_name for c in result["citations"]] == ["policy.md"]
+
+
+def test_structured_mode_refuses_hallucinated_numbers(monkeypatch):
+    monkeypatch.setattr(settings, "ANSWER_MODE", "structured")
+    result = answer_with(FakeLLMProvider(latency_ms=0, hallucination_rate=1.0), "How long do refunds take to be processed?")
+    assert result["refused"] is True
+    assert result["unsupported_claims"] == ["Refunds are processed within 12 business days."]
@@ -0,0 +1,64 @@
+"""
+Tests for the tenant/plan metadata cache.
+"""
+from sqlalchemy import event
+
+from app.billing.quota import check_quota, ensure_tenant_exists, get_tenant_plan_name, set_tenant_plan
+from app.billing.tenant_cache import TenantCache
+from app.billing.usage_tracker import track_usage
+from app.db.models import Tenant, TenantPlan
+
+
+def record_metadata_queries(engine) -> list:
+    """Collect SQL statements that read or write tenants/tenant_plans."""
+    statements = []
+    
+    @event.listens_for(engine, "before_cursor_execute")
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "tenants" in statement or "tenant_plans" in statement:
+            statements.append(statement)
+    
+    return statements
+
+
+def test_known_tenants_cost_no_metadata_queries(billing_engine, db):
+    ensure_tenant_exists(db, "t1")
+    statements = record_metadata_queries(billing_engine)
+    
+    for _ in range(5):
+        ensure_tenant_exists(db, "t1")
+        assert get_tenant_plan_name(db, "t1") == "starter"
+        assert check_quota(db, "t1") == (True, None)
+        track_usage(db, "t1", "u1", "kb1", "gemini", "gemini-1.5-flash", 10, 10)
+    assert statements == []
+
+
+def test_unknown_tenants_are_loaded_and_created_in_one_batch(billing_engine, db):
+    db.add(Tenant(id="existing", name="Existing"))
+    db.add(TenantPlan(tenant_id="existing", plan_name="pro", monthly_chat_limit=-1))
+    db.commit()
+    cache = TenantCache()
+    statements = record_metadata_queries(billing_engine)
+    
+    infos = cache.ensure(db, ["existing", "new1", "new2", "new1"])
+    assert {t: (i.plan_name, i.monthly_chat_limit) for t, i in infos.items()} == {
+        "existing": ("pro", -1), "new1": ("starter", 500), "new2": ("starter", 500)
+    }
+    assert sum(s.lstrip().startswith("SELECT") for s in statements) == 1
+    assert db.query(TenantPlan).filter_by(plan_name="starter").count() == 2
+
+
+def test_plan_change_invalidates_and_ttl_expires(db):
+    assert get_tenant_plan_name(db, "t1") == "starter"
+    set_tenant_plan(db, "t1", "growth")
+    assert get_tenant_plan_name(db, "t1") == "growth"
+    
+    now = [0.0]
+    cache = TenantCache(ttl_seconds=10, clock=lambda: now[0])
+    assert cache.get(db, "t1").monthly_chat_limit == 5000
+    # Changed by another process: this cache only notices once the entry expires
+    db.query(TenantPlan).filter_by(tenant_id="t1").update({"plan_name": "pro", "monthly_chat_limit": -1})
+    db.commit()
+    assert cache.get(db, "t1").plan_name == "growth"
+    now[0] = 11.0
+    assert cache.get(db, "t1").plan_name == "pro"
@@ -0,0 +1,56 @@
+"""
+Tests for the streaming usage export: batching, keyset resume and encodings.
+"""
+from datetime import datetime
+import csv
+import gzip
+import io
+import json
+
+import pytest
+
+from app.billing.export import EXPORT_COLUMNS, export_usage_events, gzip_chunks
+from app.billing.usage_tracker import track_usage
+
+
+@pytest.fixture
+def db(db):
+    """Ten March events for t1, one for t2 and one April event for t1."""
+    for day in range(1, 11):
+        track_usage(db, "t1", "u1", "kb1", "gemini", "gemini-1.5-flash", 100, day, request_timestamp=datetime(2025, 3, day, 12))
+    track_usage(db, "t2", "u2", "kb2", "openai", "gpt-4o-mini", 100, 1, request_timestamp=datetime(2025, 3, 5, 12))
+    track_usage(db, "t1", "u1", "kb1", "gemini", "gemini-1.5-flash", 100, 1, request_timestamp=datetime(2025, 4, 1))
+    return db
+
+
+MARCH = (datetime(2025, 3, 1), datetime(2025, 4, 1))
+
+
+def read_csv(chunks) -> list:
+    return list(csv.DictReader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+
+
+def test_csv_export_streams_one_chunk_per_batch(db):
+    chunks = list(export_usage_events(db, "t1", *MARCH, "csv", batch_size=3))
+    assert len(chunks) == 1 + 4  # Header, then 10 rows in batches of 3
+    rows = read_csv(chunks)
+    assert list(rows[0]) == EXPORT_COLUMNS
+    assert [int(r["completion_tokens"]) for r in rows] == list(range(1, 11))
+    assert {r["tenant_id"] for r in rows} == {"t1"}
+    assert rows[0]["request_timestamp"] == "2025-03-01T12:00:00"
+
+
+def test_keyset_resume_and_limit(db):
+    first_page = read_csv(export_usage_events(db, "t1", *MARCH, "csv", limit=4))
+    assert len(first_page) == 4
+    rest = read_csv(export_usage_events(db, "t1", *MARCH, "csv", after_id=int(first_page[-1]["id"])))
+    assert [int(r["completion_tokens"]) for r in first_page + rest] == list(range(1, 11))
+
+
+def test_ndjson_and_gzip(db):
+    body = gzip.decompress(b"".join(gzip_chunks(export_usage_events(db, "t2", *MARCH, "ndjson"))))
+    records = [json.loads(line) for line in body.decode("utf-8").splitlines()]
+    assert len(records) == 1
+    assert (records[0]["model"], records[0]["total_tokens"], records[0]["model_tier"]) == ("gpt-4o-mini", 101, None)
+    with pytest.raises(ValueError):
+        list(export_usage_events(db, "t1", *MARCH, "xml"))
@@ -0,0 +1,93 @@
+"""
+Tests for atomic usage aggregate upserts and the unique-key migration.
+"""
+import multiprocessing
+from datetime import datetime
+
+from sqlalchemy import inspect, text
+from sqlalchemy.orm import sessionmaker
+
+from app.billing.quota import ensure_tenant_exists
+from app.billing.usage_tracker import track_usage
+from app.db.database import Base, create_db_engine
+from app.db.migrations import add_aggregate_unique_keys
+from app.db.models import UsageDaily, UsageEvent, UsageMonthly
+
+WHEN = datetime(2025, 3, 14, 12, 0)
+WORKERS = 4
+EVENTS_PER_WORKER = 25
+
+
+def track_many(db_path: str, count: int) -> None:
+    """Worker process: record usage events for the same tenant and day."""
+    # Not the conftest helper: spawned workers re-import this module, and conftest loads the RAG stack
+    engine = create_db_engine(f"sqlite:///{db_path}", pragmas={"busy_timeout": 60_000})
+    Session = sessionmaker(bind=engine)
+    for _ in range(count):
+        db = Session()
+        try:
+            track_usage(db, "t1", "u1", "kb1", "gemini", "gemini-1.5-flash", 100, 10, request_timestamp=WHEN)
+        finally:
+            db.close()
+    engine.dispose()
+
+
+def test_concurrent_processes_keep_one_row_and_every_increment(billing_db_path, db):
+    ensure_tenant_exists(db, "t1")
+    
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=track_many, args=(str(billing_db_path), EVENTS_PER_WORKER)) for _ in range(WORKERS)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(120)
+    assert [w.exitcode for w in workers] == [0] * WORKERS
+    
+    db.expire_all()
+    total = WORKERS * EVENTS_PER_WORKER
+    assert db.query(UsageEvent).count() == total
+    daily = db.query(UsageDaily).all()
+    assert [(d.total_requests, d.total_tokens, d.gemini_requests) for d in daily] == [(total, total * 110, total)]
+    monthly = db.query(UsageMonthly).one()
+    assert monthly.total_requests == total
+
+
+def test_migration_merges_duplicates_and_adds_unique_keys(billing_db_path):
+    engine = create_db_engine(f"sqlite:///{billing_db_path}")
+    # Tables as created before the unique keys existed
+    Base.metadata.create_all(bind=engine, tables=[Base.metadata.tables[t] for t in ("tenants", "tenant_plans", "usage_events")])
+    metrics = "total_requests INTEGER, total_tokens INTEGER, total_cost_usd FLOAT, gemini_requests INTEGER, openai_requests INTEGER"
+    timestamps = "created_at DATETIME, updated_at DATETIME"
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE TABLE usage_daily (id INTEGER PRIMARY KEY AUTOINCREMENT, tenant_id VARCHAR, date DATETIME, {metrics}, {timestamps})"))
+        conn.execute(text(f"CREATE TABLE usage_monthly (id INTEGER PRIMARY KEY AUTOINCREMENT, tenant_id VARCHAR, year INTEGER, month INTEGER, {metrics}, {timestamps})"))
+        for requests, openai in ((1, 0), (2, 1), (3, 0)):
+            conn.execute(text(
+                "INSERT INTO usage_daily (tenant_id, date, total_requests, total_tokens, total_cost_usd, gemini_requests, openai_requests, created_at, updated_at) "
+                "VALUES ('t1', '2025-03-14 00:00:00.000000', :r, :r * 10, 0.5, :r - :o, :o, '2025-03-14', '2025-03-14')"
+            ), {"r": requests, "o": openai})
+        conn.execute(text(
+            "INSERT INTO usage_monthly (tenant_id, year, month, total_requests, total_tokens, total_cost_usd, gemini_requests, openai_requests, created_at, updated_at) "
+            "VALUES ('t1', 2025, 3, 6, 60, 1.5, 5, 1, '2025-03-14', '2025-03-14')"
+        ))
+    
+    assert add_aggregate_unique_keys(engine) == {"usage_daily": 2, "usage_monthly": 0}
+    assert add_aggregate_unique_keys(engine) == {}  # Idempotent
+    
+    db = sessionmaker(bind=engine)()
+    daily = db.query(UsageDaily).one()
+    assert (daily.total_requests, daily.total_tokens, daily.openai_requests) == (6, 60, 1)
+    assert abs(daily.total_cost_usd - 1.5) < 1e-9
+    db.close()
+    
+    unique_indexes = [i["column_names"] for i in inspect(engine).get_indexes("usage_daily") if i["unique"]]
+    assert unique_indexes == [["tenant_id", "date"]]
+    
+    # The upsert now lands on the merged row
+    db = sessionmaker(bind=engine)()
+    ensure_tenant_exists(db, "t1")
+    track_usage(db, "t1", "u1", "kb1", "openai", "gpt-4o-mini", 5, 5, request_timestamp=WHEN)
+    assert db.query(UsageDaily).one().total_requests == 7
+    assert db.query(UsageMonthly).one().openai_requests == 2
+    db.close()
+    engine.dispose()
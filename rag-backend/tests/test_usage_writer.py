@@ -0,0 +1,181 @@
+"""
+Tests for write-behind usage tracking: batching, aggregate merging, shutdown flush and journal replay.
+"""
+from datetime import datetime
+
+from dataclasses import replace
+
+from app.billing.usage_writer import UsageWriter, build_usage_record
+from app.db.models import UsageDaily, UsageEvent, UsageMonthly
+
+WHEN = datetime(2025, 3, 14, 12, 0)
+
+
+def record(tenant_id: str = "t1", provider: str = "gemini", tokens: int = 100):
+    return build_usage_record(
+        tenant_id=tenant_id,
+        user_id="u1",
+        kb_id="kb1",
+        provider=provider,
+        model="gemini-1.5-flash" if provider == "gemini" else "gpt-4o-mini",
+        prompt_tokens=tokens,
+        completion_tokens=10,
+        request_timestamp=WHEN
+    )
+
+
+def test_batch_is_bulk_inserted_with_merged_aggregates(session_factory):
+    writer = UsageWriter(session_factory, batch_size=100)
+    for r in [record("t1"), record("t1", "openai"), record("t1"), record("t2"), record("t2")]:
+        writer.submit(r)
+    assert writer.flush() == 5
+    
+    db = session_factory()
+    assert db.query(UsageEvent).count() == 5
+    daily = db.query(UsageDaily).filter_by(tenant_id="t1").all()
+    assert len(daily) == 1
+    assert (daily[0].total_requests, daily[0].total_tokens) == (3, 330)
+    assert (daily[0].gemini_requests, daily[0].openai_requests) == (2, 1)
+    monthly = db.query(UsageMonthly).filter_by(tenant_id="t2", year=2025, month=3).one()
+    assert monthly.total_requests == 2
+    db.close()
+
+
+def test_stop_flushes_queue_and_removes_journal(session_factory, tmp_path):
+    journal = tmp_path / "usage_journal.jsonl"
+    writer = UsageWriter(session_factory, journal_path=journal, flush_interval_ms=60_000).start()
+    writer.submit(record())
+    writer.stop()
+    
+    db = session_factory()
+    assert db.query(UsageEvent).count() == 1
+    db.close()
+    assert list(tmp_path.glob("usage_journal.jsonl*")) == []
+
+
+def test_journal_replay_after_crash_skips_committed_events(session_factory, tmp_path):
+    journal = tmp_path / "usage_journal.jsonl"
+    crashed = UsageWriter(session_factory, journal_path=journal, flush_interval_ms=60_000).start()
+    committed = record()
+    crashed.submit(committed)
+    crashed.flush()
+    crashed.submit(record("t2"))
+    # Crash: the flusher never runs again; a committed event is still journaled and the last line is torn
+    with open(crashed.journal_file, "a") as f:
+        f.write(committed.to_json() + "\n")
+        f.write('{"request_id": "req_torn", "tenant')
+    crashed._owner_lock.close()  # The dead process no longer holds its journal lock
+    
+    restarted = UsageWriter(session_factory, journal_path=journal, flush_interval_ms=60_000)
+    assert restarted.replay_journal() == 1
+    assert list(tmp_path.glob("usage_journal.jsonl*")) == []
+    
+    db = session_factory()
+    assert sorted(e.tenant_id for e in db.query(UsageEvent)) == ["t1", "t2"]
+    assert db.query(UsageMonthly).filter_by(tenant_id="t1").one().total_requests == 1
+    db.close()
+
+
+def test_failed_flush_keeps_events_for_retry(session_factory):
+    sessions = []
+    
+    def locked():
+        raise RuntimeError("database is locked")
+    
+    def flaky_factory():
+        session = session_factory()
+        if not sessions:
+            session.commit = locked
+        sessions.append(session)
+        return session
+    
+    writer = UsageWriter(flaky_factory)
+    writer.submit(record())
+    assert writer.flush() == 0
+    assert writer.pending == 1
+    assert writer.flush() == 1
+    assert writer.pending == 0
+
+
+def test_live_writers_never_replay_each_others_journals(session_factory, tmp_path):
+    journal = tmp_path / "usage_journal.jsonl"
+    first = UsageWriter(session_factory, journal_path=journal, flush_interval_ms=60_000).start()
+    for _ in range(5):
+        first.submit(record())
+    second = UsageWriter(session_factory, journal_path=journal, flush_interval_ms=60_000).start()
+    assert first.journal_file != second.journal_file
+    second.submit(record("t2"))
+    
+    assert second.flush() == 1
+    assert first.flush() == 5
+    assert first.pending == 0
+    for writer in (first, second):
+        writer.stop()
+    db = session_factory()
+    assert db.query(UsageEvent).count() == 6
+    db.close()
+    assert list(tmp_path.glob("usage_journal.jsonl*")) == []
+
+
+def test_missing_journal_does_not_lose_the_batch(session_factory, tmp_path):
+    writer = UsageWriter(session_factory, journal_path=tmp_path / "usage_journal.jsonl", flush_interval_ms=60_000).start()
+    writer.submit(record())
+    writer.journal_file.unlink()
+    writer.submit(record("t2"))  # Journaled to the now unlinked file
+    
+    assert writer.flush() == 2
+    writer.stop()
+    db = session_factory()
+    assert db.query(UsageEvent).count() == 2
+    db.close()
+
+
+def test_rejected_event_does_not_block_the_rest(session_factory):
+    writer = UsageWriter(session_factory)
+    writer.submit(replace(record(), kb_id=None))  # NOT NULL violation
+    writer.submit(record())
+    assert writer.flush() == 1
+    assert writer.pending == 1
+    
+    writer.submit(record("t2"))
+    writer.submit(record("t2"))
+    assert writer.flush() == 2
+    assert writer.pending == 1
+    db = session_factory()
+    assert db.query(UsageEvent).count() == 3
+    assert db.query(UsageMonthly).filter_by(tenant_id="t2").one().total_requests == 2
+    db.close()
+
+
+def test_replay_failures_do_not_block_start(session_factory, tmp_path):
+    journal = tmp_path / "usage_journal.jsonl"
+    crashed = UsageWriter(session_factory, journal_path=journal, flush_interval_ms=60_000).start()
+    crashed.submit(replace(record(), kb_id=None))  # NOT NULL violation
+    crashed.submit(record())
+    crashed._owner_lock.close()
+    
+    sessions = []
+    
+    def outage():
+        raise RuntimeError("database is unavailable")
+    
+    def flaky_factory():
+        session = session_factory()
+        if not sessions:
+            session.commit = outage
+        sessions.append(session)
+        return session
+    
+    restarted = UsageWriter(flaky_factory, journal_path=journal, flush_interval_ms=60_000).start()
+    assert restarted.pending == 2
+    # The dead writer's files now belong to the restarted writer
+    assert not list(tmp_path.glob(f"usage_journal.jsonl.{crashed.owner}*"))
+    
+    assert restarted.flush() == 1
+    assert restarted.pending == 1
+    restarted.stop()
+    db = session_factory()
+    assert db.query(UsageEvent).count() == 1
+    db.close()
+    # The rejected event stays journaled for a later replay
+    assert list(tmp_path.glob(f"usage_journal.jsonl.{restarted.owner}.*"))
@@ -0,0 +1,92 @@
+"""
+Tests for the verifier verdict cache.
+"""
+from app.rag import verdict_cache
+from app.rag.answer import LLMProvider
+from app.rag.verdict_cache import VerdictCache, kb_scope
+from app.rag.verifier import VerifierService
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+    
+    def __call__(self) -> float:
+        return self.now
+
+
+class CountingVerifierLLM(LLMProvider):
+    """Returns a fixed verdict (or raises) and counts calls."""
+    
+    def __init__(self, verdict: str = '{"pass": true, "issues": [], "unsupported_claims": []}', fail: bool = False):
+        self.verdict = verdict
+        self.fail = fail
+        self.calls = 0
+    
+    def generate(self, system_prompt: str, user_prompt: str, **kwargs) -> str:
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("provider down")
+        return self.verdict
+    
+    def generate_with_usage(self, system_prompt: str, user_prompt: str, **kwargs) -> tuple[str, dict]:
+        return self.generate(system_prompt, user_prompt), {}
+
+
+def test_pass_and_fail_ttls_and_lru_bound():
+    clock = Clock()
+    cache = VerdictCache(max_entries=2, pass_ttl=100, fail_ttl=10, clock=clock)
+    cache.put("pass", {"pass": True, "issues": []})
+    cache.put("fail", {"pass": False, "issues": ["x"]})
+    
+    clock.now = 50
+    assert cache.get("pass")["pass"] is True
+    assert cache.get("fail") is None  # Failures expire sooner
+    
+    cache.put("a", {"pass": True})
+    cache.put("b", {"pass": True})
+    assert len(cache) == 2
+    assert cache.get("pass") is None  # Least recently used evicted
+    assert cache.hits == 1 and cache.misses == 2
+    assert round(cache.hit_rate, 2) == 0.33
+
+
+def test_verifier_reuses_verdict_within_scope(monkeypatch):
+    monkeypatch.setattr(verdict_cache, "_verdict_cache", VerdictCache(max_entries=10, pass_ttl=100, fail_ttl=10))
+    llm = CountingVerifierLLM()
+    verifier = VerifierService(provider=llm)
+    scope = kb_scope("t1", "kb1", 3)
+    
+    first = verifier.verify_answer("Refunds take 5 days [Source 1].", "[Source 1: a.md]\nRefunds take 5 days.", [], cache_scope=scope)
+    first["issues"].append("mutated by caller")
+    second = verifier.verify_answer("Refunds take 5 days [Source 1].", "[Source 1: a.md]\nRefunds take 5 days.", [], cache_scope=scope)
+    assert llm.calls == 1
+    assert second["pass"] is True and second["issues"] == []
+    
+    # A new KB version (documents changed) never reuses the old verdict
+    verifier.verify_answer("Refunds take 5 days [Source 1].", "[Source 1: a.md]\nRefunds take 5 days.", [], cache_scope=kb_scope("t1", "kb1", 4))
+    assert llm.calls == 2
+
+
+def test_llm_errors_are_not_cached(monkeypatch):
+    monkeypatch.setattr(verdict_cache, "_verdict_cache", VerdictCache(max_entries=10, pass_ttl=100, fail_ttl=10))
+    llm = CountingVerifierLLM(fail=True)
+    verifier = VerifierService(provider=llm)
+    
+    for _ in range(2):
+        result = verifier.verify_answer("draft [Source 1]", "context", [])
+        assert result["pass"] is False
+    assert llm.calls == 2
+
+
+def test_unparseable_verdicts_are_not_cached(monkeypatch):
+    monkeypatch.setattr(verdict_cache, "_verdict_cache", VerdictCache(max_entries=10, pass_ttl=100, fail_ttl=10))
+    llm = CountingVerifierLLM(verdict="Looks fine to me: pass = yes, all claims are supported.")
+    verifier = VerifierService(provider=llm)
+    
+    for _ in range(2):
+        result = verifier.verify_answer("draft [Source 1]", "context", [])
+        assert result["pass"] is True  # Inferred from text
+        assert "_inferred" not in result
+    assert llm.calls == 2
+    assert len(verdict_cache.get_verdict_cache()) == 0
@@ -102,6 +102,28 @@ export interface UsageResponse {
   end_date: string;
 }
 
+export interface UsageSeriesPoint {
+  date: string;
+  total_requests: number;
+  total_tokens: number;
+  total_cost_usd: number;
+  gemini_requests: number;
+  openai_requests: number;
+}
+
+export interface UsageSeriesResponse {
+  tenant_id: string;
+  start_date: string;
+  end_date: string;
+  total_requests: number;
+  total_tokens: number;
+  total_cost_usd: number;
+  gemini_requests: number;
+  openai_requests: number;
+  last_updated: string | null;
+  points: UsageSeriesPoint[];
+}
+
 export interface PlanLimitsResponse {
   tenant_id: string;
   plan_name: string;
@@ -470,6 +492,19 @@ export class RAGClient {
     return response.data;
   }
 
+  /**
+   * Get daily usage for a date range (YYYY-MM-DD, end inclusive) in one call.
+   * Days without usage are zero; the browser revalidates repeat loads via ETag.
+   */
+  static async getUsageSeries(start?: string, end?: string): Promise<UsageSeriesResponse> {
+    const params: Record<string, any> = {};
+    if (start) params.start = start;
+    if (end) params.end = end;
+
+    const response = await ragClient.get<UsageSeriesResponse>('/billing/usage/series', { params });
+    return response.data;
+  }
+
   /**
    * Get plan limits and current usage
    */